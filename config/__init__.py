@@ -19,6 +19,14 @@ COMMENTER_SERVER_PORT = 48914
 TOOL_SERVER_PORT = 48915
 USER_PLUGIN_SERVER_PORT = 48916
 
+# 会话上下文预算配置（估算 token）
+# 当前会话的上下文（初始提示 + 累计对话）超过预算时才热切换到新会话
+SESSION_CONTEXT_TOKEN_BUDGET = 8000
+# 未交给记忆服务总结的对话超过预算的该比例时，提前在后台增量总结
+SESSION_CONTEXT_SUMMARY_RATIO = 0.25
+# 无论预算如何，单个上游会话的最长保留时间（秒）
+SESSION_MAX_UPTIME = 1200
+
 # MCP Router配置
 MCP_ROUTER_URL = 'http://localhost:3282'
 
@@ -315,6 +323,9 @@ __all__ = [
     'COMMENTER_SERVER_PORT',
     'TOOL_SERVER_PORT',
     'USER_PLUGIN_SERVER_PORT',
+    'SESSION_CONTEXT_TOKEN_BUDGET',
+    'SESSION_CONTEXT_SUMMARY_RATIO',
+    'SESSION_MAX_UPTIME',
     'MCP_ROUTER_URL',
     'TFLINK_UPLOAD_URL',
     'TFLINK_ALLOWED_HOSTS',
@@ -0,0 +1,161 @@
+"""
+会话上下文预算
+替代固定 40 秒的热切换：按轮估算当前上游会话的上下文 token 数，只有超过预算时才触发热切换，
+长对话中上游连接与会话冷启动的次数随之大幅减少。
+
+- 初始提示（人设 + 记忆 + 缓存）在会话建立时计入
+- 每轮的用户输入、模型输出按文本估算；语音会话额外按语音时长计入音频 token，图片按固定值计入
+- 尚未交给记忆服务的对话超过预算的一定比例时，提示调用方提前发送增量总结（summarize history），
+  让 memory_server 在后台增量总结最旧的对话，真正热切换时记忆上下文已经就绪
+- 统计热切换次数、耗时（从触发到切换完成）与新会话的初始提示大小
+"""
+import re
+import time
+from collections import deque
+
+from config import SESSION_CONTEXT_TOKEN_BUDGET, SESSION_CONTEXT_SUMMARY_RATIO, SESSION_MAX_UPTIME
+from utils.frontend_utils import estimate_speech_time
+
+# 语音输入/输出每秒约占用的 token 数（估算值）
+AUDIO_TOKENS_PER_SECOND = 25
+# 每张图片估算的 token 数；连续的屏幕画面每轮最多计入一张
+IMAGE_TOKENS = 1000
+# 统计保留的样本数
+CONTEXT_METRICS_WINDOW = 128
+
+_cjk_pattern = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯]')
+
+
+def estimate_tokens(text):
+    """粗略估算 token 数：CJK 字符按 1 个计，其余字符按 4 个字符 1 个计"""
+    if not text:
+        return 0
+    cjk = len(_cjk_pattern.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+class ContextBudget:
+    """一个角色的会话上下文预算；所有方法都在主事件循环中调用"""
+
+    def __init__(self, budget_tokens=SESSION_CONTEXT_TOKEN_BUDGET,
+                 summary_ratio=SESSION_CONTEXT_SUMMARY_RATIO, max_uptime=SESSION_MAX_UPTIME):
+        self.budget_tokens = budget_tokens
+        self.summary_tokens = int(budget_tokens * summary_ratio)
+        self.max_uptime = max_uptime
+        self.prompt_tokens = 0
+        self.dialog_tokens = 0
+        self.unsummarized_tokens = 0
+        self.turns = 0
+        self.session_started_at = None
+        self._image_in_turn = False
+        self._renew_started_at = None
+        self._pending_prompt_tokens = None
+        # 统计
+        self.sessions_started = 0
+        self.renew_count = 0
+        self.renew_reasons = {}
+        self.summaries_requested = 0
+        self.renew_latency = deque(maxlen=CONTEXT_METRICS_WINDOW)
+        self.prompt_sizes = deque(maxlen=CONTEXT_METRICS_WINDOW)
+
+    @property
+    def used_tokens(self):
+        return self.prompt_tokens + self.dialog_tokens
+
+    def start_session(self, prompt, prompt_tokens=None):
+        """新的上游会话建立（首次启动或热切换完成）"""
+        self.prompt_tokens = estimate_tokens(prompt) if prompt_tokens is None else prompt_tokens
+        self.dialog_tokens = 0
+        self.unsummarized_tokens = 0
+        self.turns = 0
+        self._image_in_turn = False
+        self.session_started_at = time.monotonic()
+        self.sessions_started += 1
+        self.prompt_sizes.append(self.prompt_tokens)
+
+    def _add(self, tokens):
+        self.dialog_tokens += tokens
+        self.unsummarized_tokens += tokens
+
+    def add_text(self, text, spoken=False):
+        """计入一段对话文本；spoken=True 表示它同时以语音形式进入了上游上下文"""
+        tokens = estimate_tokens(text)
+        if spoken and text:
+            tokens += int(estimate_speech_time(text) * AUDIO_TOKENS_PER_SECOND)
+        self._add(tokens)
+
+    def add_image(self):
+        if not self._image_in_turn:
+            self._image_in_turn = True
+            self._add(IMAGE_TOKENS)
+
+    def end_turn(self):
+        """
+        一轮结束时调用，返回需要执行的动作：
+        'renew'（超出预算或会话过久，开始热切换）、'summarize'（提前后台总结）或 None
+        """
+        self.turns += 1
+        self._image_in_turn = False
+        # 初始提示本身接近预算时，至少积累一段对话再切换，避免每轮都热切换
+        if self.used_tokens >= self.budget_tokens and self.dialog_tokens >= self.summary_tokens:
+            return 'renew'
+        if self.session_started_at and time.monotonic() - self.session_started_at >= self.max_uptime:
+            return 'renew'
+        if self.summary_tokens and self.unsummarized_tokens >= self.summary_tokens:
+            return 'summarize'
+        return None
+
+    def mark_summarized(self):
+        """已把当前对话交给记忆服务总结"""
+        self.unsummarized_tokens = 0
+        self.summaries_requested += 1
+
+    def renew_started(self, reason):
+        self.renew_count += 1
+        self.renew_reasons[reason] = self.renew_reasons.get(reason, 0) + 1
+        self._renew_started_at = time.monotonic()
+        self.unsummarized_tokens = 0
+
+    def renew_prepared(self, prompt):
+        """新会话的初始提示已生成（热切换完成时作为新会话的 prompt 大小）"""
+        self._pending_prompt_tokens = estimate_tokens(prompt)
+
+    def renew_finished(self, extra_prompt=''):
+        if self._renew_started_at is not None:
+            self.renew_latency.append((time.monotonic() - self._renew_started_at) * 1000)
+            self._renew_started_at = None
+        prompt_tokens = (self._pending_prompt_tokens or 0) + estimate_tokens(extra_prompt)
+        self._pending_prompt_tokens = None
+        self.start_session(None, prompt_tokens=prompt_tokens)
+
+    def renew_aborted(self):
+        self._renew_started_at = None
+        self._pending_prompt_tokens = None
+
+    @staticmethod
+    def _summary(values):
+        ordered = sorted(values)
+        return {
+            'count': len(ordered),
+            'p50': ordered[len(ordered) // 2] if ordered else None,
+            'p95': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] if ordered else None,
+            'max': ordered[-1] if ordered else None,
+        }
+
+    def snapshot(self):
+        uptime = time.monotonic() - self.session_started_at if self.session_started_at else None
+        return {
+            'budget_tokens': self.budget_tokens,
+            'used_tokens': self.used_tokens,
+            'prompt_tokens': self.prompt_tokens,
+            'dialog_tokens': self.dialog_tokens,
+            'unsummarized_tokens': self.unsummarized_tokens,
+            'turns': self.turns,
+            'session_uptime_s': round(uptime, 1) if uptime is not None else None,
+            'sessions_started': self.sessions_started,
+            'renew_count': self.renew_count,
+            'renew_reasons': dict(self.renew_reasons),
+            'summaries_requested': self.summaries_requested,
+            'renew_latency_ms': self._summary(self.renew_latency),
+            'prompt_tokens_history': self._summary(self.prompt_sizes),
+        }
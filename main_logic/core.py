@@ -15,14 +15,19 @@ from websockets import exceptions as web_exceptions
 from fastapi import WebSocket, WebSocketDisconnect
 from utils.frontend_utils import contains_chinese, replace_blank, replace_corner_mark, remove_bracket, \
     is_only_punctuation
-from utils.screenshot_utils import process_screen_data
+from utils.screenshot_utils import FrameIngest
 from main_logic.omni_realtime_client import OmniRealtimeClient
 from main_logic.omni_offline_client import OmniOfflineClient
-from main_logic.tts_client import get_tts_worker
+from main_logic.tts_client import get_tts_worker, TTS_DISCARD_SIGNAL
+from main_logic.tts_bridge import TTSResponseBridge, TTSLatencyMetrics
+from main_logic.tts_pool import get_tts_worker_pool
+from main_logic.realtime_pool import get_realtime_pool
+from main_logic.context_budget import ContextBudget
+from main_logic.latency_trace import LatencyTracer
 import base64
 from config import MEMORY_SERVER_PORT
 from utils.config_manager import get_config_manager
-from multiprocessing import Process, Queue as MPQueue
+from multiprocessing import Queue as MPQueue
 from uuid import uuid4
 import numpy as np
 import soxr
@@ -46,9 +51,16 @@ class LLMSessionManager:
         self.tts_request_queue = MPQueue() # TTS request (多进程队列)
         self.tts_response_queue = MPQueue() # TTS response (多进程队列)
         self.tts_process = None  # TTS子进程
+        self.tts_handle = None  # 从TTS进程池租用的worker
+        self.tts_bridge = None  # TTS响应桥接（事件驱动地读取tts_response_queue）
+        self.tts_metrics = TTSLatencyMetrics()  # TTS首包/逐chunk延迟统计
+        self.context_budget = ContextBudget()  # 会话上下文token预算，决定何时热切换
+        self.latency_tracer = LatencyTracer()  # 按speech_id记录语音往返各阶段耗时
+        self.frame_ingest = FrameIngest()  # 屏幕/摄像头帧去重与带宽预算
         self.lock = asyncio.Lock()  # 使用异步锁替代同步锁
         self.websocket_lock = None  # websocket操作的共享锁，由main_server设置
         self.current_speech_id = None
+        self.tts_speech_id = None  # 最近一次送入TTS的文本所属的speech_id（打断时据此丢弃其音频）
         self.emoji_pattern = re.compile(r'[^\w\u4e00-\u9fff\s>][^\w\u4e00-\u9fff\s]{2,}[^\w\u4e00-\u9fff\s<]', flags=re.UNICODE)
         self.emoji_pattern2 = re.compile("["
         u"\U0001F600-\U0001F64F"  # emoticons
@@ -80,6 +92,7 @@ class LLMSessionManager:
         realtime_config = self._config_manager.get_model_api_config('realtime')
         self.core_api_type = realtime_config.get('api_type', '') or self._config_manager.get_core_config().get('CORE_API_TYPE', '')
         self.memory_server_port = MEMORY_SERVER_PORT
+        self._memory_context_cache = None  # (etag, text)，配合 /new_dialog 的条件请求
         self.audio_api_key = self._config_manager.get_core_config()['AUDIO_API_KEY']  # 用于CosyVoice自定义音色
         self.voice_id = self.lanlan_basic_config[self.lanlan_name].get('voice_id', '')
         # 注意：use_tts 会在 start_session 中根据 input_mode 重新设置
@@ -137,16 +150,16 @@ class LLMSessionManager:
 
     async def handle_new_message(self):
         """处理新模型输出：清空TTS队列并通知前端"""
+        self.latency_tracer.begin_voice_turn()
         if self.use_tts and self.tts_process and self.tts_process.is_alive():
-            # 清空响应队列中待发送的音频数据
-            while not self.tts_response_queue.empty():
-                try:
-                    self.tts_response_queue.get_nowait()
-                except:
-                    break
-            # 发送终止信号以清空TTS请求队列并停止当前合成
+            # 清空待发送的音频数据，之后到达的被打断回复的音频也一并丢弃
+            if self.tts_bridge:
+                self.tts_bridge.clear(self.tts_speech_id)
+            await self._renew_interrupted_speech_id()
+            self.tts_metrics.cancel_request()
+            # 发送丢弃信号停止当前合成；(None, None) 是本轮结束信号，会把剩余文本合成出来
             try:
-                self.tts_request_queue.put((None, None))
+                self.tts_request_queue.put((TTS_DISCARD_SIGNAL, None))
             except Exception as e:
                 logger.warning(f"⚠️ 发送TTS中断信号失败: {e}")
         
@@ -156,6 +169,12 @@ class LLMSessionManager:
         
         await self.send_user_activity()
 
+    async def _renew_interrupted_speech_id(self):
+        """被打断回复的音频会按 speech_id 丢弃，之后的回复若仍沿用该 speech_id 则换一个新的"""
+        async with self.lock:
+            if self.tts_speech_id is not None and self.current_speech_id == self.tts_speech_id:
+                self.current_speech_id = str(uuid4())
+
     async def handle_text_data(self, text: str, is_first_chunk: bool = False):
         """文本回调：处理文本显示和TTS（用于文本模式）"""
         # 如果是新消息的第一个chunk，清空TTS队列和缓存以打断之前的语音
@@ -163,25 +182,27 @@ class LLMSessionManager:
             async with self.tts_cache_lock:
                 self.tts_pending_chunks.clear()
             
-            if self.tts_process and self.tts_process.is_alive():
-                # 清空响应队列中待发送的音频数据
-                while not self.tts_response_queue.empty():
-                    try:
-                        self.tts_response_queue.get_nowait()
-                    except:
-                        break
+            if self.tts_process and self.tts_process.is_alive() and self.tts_bridge:
+                # 清空待发送的音频数据，之后到达的被打断回复的音频也一并丢弃
+                self.tts_bridge.clear(self.tts_speech_id)
+            await self._renew_interrupted_speech_id()
+            self.tts_metrics.cancel_request()
         
         # 文本模式下，无论是否使用TTS，都要发送文本到前端显示
+        self.latency_tracer.mark('first_text')
         await self.send_lanlan_response(text, is_first_chunk)
         
         # 如果配置了TTS，将文本发送到TTS队列或缓存
         if self.use_tts:
+            self.tts_metrics.mark_request(self.current_speech_id)
+            self.latency_tracer.mark('first_tts_request', speech_id=self.current_speech_id)
             async with self.tts_cache_lock:
                 # 检查TTS是否就绪
                 if self.tts_ready and self.tts_process and self.tts_process.is_alive():
                     # TTS已就绪，直接发送
                     try:
                         self.tts_request_queue.put((self.current_speech_id, text))
+                        self.tts_speech_id = self.current_speech_id
                     except Exception as e:
                         logger.warning(f"⚠️ 发送TTS请求失败: {e}")
                 else:
@@ -220,14 +241,22 @@ class LLMSessionManager:
             return
             
         if hasattr(self, 'is_preparing_new_session') and not self.is_preparing_new_session:
-            if self.session_start_time and \
-                        (datetime.now() - self.session_start_time).total_seconds() >= 40:
-                logger.info(f"[{self.lanlan_name}] Main Listener: Uptime threshold met. Marking for new session preparation.")
+            budget_action = self.context_budget.end_turn() if self.session_start_time else None
+            if budget_action == 'renew':
+                logger.info(f"[{self.lanlan_name}] Main Listener: Context budget reached "
+                            f"({self.context_budget.used_tokens}/{self.context_budget.budget_tokens} tokens). Marking for new session preparation.")
                 self.is_preparing_new_session = True  # Mark that we are in prep mode
                 self.summary_triggered_time = datetime.now()
                 self.message_cache_for_new_session = []  # Reset cache for this new cycle
                 self.initial_cache_snapshot_len = 0  # Reset snapshot marker
+                self.context_budget.renew_started('budget')
                 self.sync_message_queue.put({'type': 'system', 'data': 'renew session'}) 
+            elif budget_action == 'summarize':
+                # 会话继续，但先把已积累的对话交给记忆服务在后台总结，热切换时记忆上下文已经就绪；
+                # 使用单独的 'summarize history'，不会像 renew 那样清空 analyzer 依赖的会话内历史
+                logger.info(f"[{self.lanlan_name}] 📝 未总结对话达到 {self.context_budget.unsummarized_tokens} tokens，后台增量总结")
+                self.context_budget.mark_summarized()
+                self.sync_message_queue.put({'type': 'system', 'data': 'summarize history'})
 
         # If prep mode is active, summary time has passed, and a turn just completed in OLD session:
         # AND background task for initial warmup isn't already running
@@ -266,10 +295,12 @@ class LLMSessionManager:
         if not self.use_tts:
             if self.websocket and hasattr(self.websocket, 'client_state') and self.websocket.client_state == self.websocket.client_state.CONNECTED:
                 # 这里假设audio_data为PCM16字节流，直接推送
+                self.latency_tracer.mark('first_audio')
                 audio = np.frombuffer(audio_data, dtype=np.int16)
                 audio = (soxr.resample(audio.astype(np.float32) / 32768.0, 24000, 48000, quality='HQ')*32767.).clip(-32768, 32767).astype(np.int16)
 
                 await self.send_speech(audio.tobytes())
+                self.latency_tracer.mark('first_browser_byte')
                 # 你可以根据需要加上格式、isNewMessage等标记
                 # await self.websocket.send_json({"type": "cozy_audio", "format": "blob", "isNewMessage": True})
             else:
@@ -279,6 +310,8 @@ class LLMSessionManager:
         """输入转录回调：同步转录文本到消息队列和缓存，并发送到前端显示"""
         # 推送到同步消息队列
         self.sync_message_queue.put({"type": "user", "data": {"input_type": "transcript", "data": transcript.strip()}})
+        # 文本模式下的用户输入同样经由该回调，只有语音会话计入音频token
+        self.context_budget.add_text(transcript, spoken=isinstance(self.session, OmniRealtimeClient))
         
         # 只在语音模式（OmniRealtimeClient）下发送到前端显示用户转录
         # 文本模式下前端会自己显示，无需后端发送，避免重复
@@ -308,16 +341,20 @@ class LLMSessionManager:
     async def handle_output_transcript(self, text: str, is_first_chunk: bool = False):
         """输出转录回调：处理文本显示和TTS（用于语音模式）"""        
         # 无论是否使用TTS，都要发送文本到前端显示
+        self.latency_tracer.mark('first_text')
         await self.send_lanlan_response(text, is_first_chunk)
         
         # 如果配置了TTS，将文本发送到TTS队列或缓存
         if self.use_tts:
+            self.tts_metrics.mark_request(self.current_speech_id)
+            self.latency_tracer.mark('first_tts_request', speech_id=self.current_speech_id)
             async with self.tts_cache_lock:
                 # 检查TTS是否就绪
                 if self.tts_ready and self.tts_process and self.tts_process.is_alive():
                     # TTS已就绪，直接发送
                     try:
                         self.tts_request_queue.put((self.current_speech_id, text))
+                        self.tts_speech_id = self.current_speech_id
                     except Exception as e:
                         logger.warning(f"⚠️ 发送TTS请求失败: {e}")
                 else:
@@ -340,6 +377,7 @@ class LLMSessionManager:
                 }
                 await self.websocket.send_json(message)
                 self.sync_message_queue.put({"type": "json", "data": message})
+                self.context_budget.add_text(text, spoken=not self.use_tts)
                 if hasattr(self, 'is_preparing_new_session') and self.is_preparing_new_session:
                     if not hasattr(self, 'message_cache_for_new_session'):
                         self.message_cache_for_new_session = []
@@ -411,6 +449,8 @@ class LLMSessionManager:
         self.final_swap_task = None
         self.pending_session_warmed_up_event = None
         self.pending_session_final_prime_complete_event = None
+        if not from_final_swap:
+            self.context_budget.renew_aborted()
 
         if clear_main_cache:
             self.message_cache_for_new_session = []
@@ -442,6 +482,7 @@ class LLMSessionManager:
                 for speech_id, text in self.tts_pending_chunks:
                     try:
                         self.tts_request_queue.put((speech_id, text))
+                        self.tts_speech_id = speech_id
                     except Exception as e:
                         logger.error(f"💥 发送缓存的TTS请求失败: {e}")
                         break
@@ -507,6 +548,9 @@ class LLMSessionManager:
         realtime_config = self._config_manager.get_model_api_config('realtime')
         self.core_api_type = realtime_config.get('api_type', '') or self._config_manager.get_core_config().get('CORE_API_TYPE', '')
         self.audio_api_key = self._config_manager.get_core_config()['AUDIO_API_KEY']
+        if input_mode != 'text':
+            # 上游握手与下面的TTS准备、记忆上下文获取并行进行
+            self.prewarm_realtime()
         
         # 重新读取角色配置以获取最新的voice_id（支持角色切换后的音色热更新）
         _,_,_,lanlan_basic_config_updated,_,_,_,_,_,_ = self._config_manager.get_character_data()
@@ -554,19 +598,10 @@ class LLMSessionManager:
             await asyncio.sleep(0.5)
             logger.info("旧session清理完成")
         
-        # 如果当前不需要TTS但TTS进程仍在运行，关闭它
-        if not self.use_tts and self.tts_process and self.tts_process.is_alive():
-            logger.info("当前模式不需要TTS，关闭TTS进程")
-            try:
-                self.tts_request_queue.put((None, None))
-                self.tts_process.terminate()
-                self.tts_process.join(timeout=2.0)
-                if self.tts_process.is_alive():
-                    self.tts_process.kill()
-            except Exception as e:
-                logger.error(f"关闭TTS进程时出错: {e}")
-            finally:
-                self.tts_process = None
+        # 如果当前不需要TTS但仍持有TTS进程，归还到进程池
+        if not self.use_tts and self.tts_handle:
+            logger.info("当前模式不需要TTS，归还TTS进程")
+            self._release_tts_worker()
 
         # 定义 TTS 启动协程（如果需要）
         async def start_tts_if_needed():
@@ -574,62 +609,37 @@ class LLMSessionManager:
             if not self.use_tts:
                 return True
             
-            # 启动TTS子进程
-            if self.tts_process is None or not self.tts_process.is_alive():
-                # 使用工厂函数获取合适的 TTS worker
-                has_custom_voice = bool(self.voice_id)
-                tts_worker = get_tts_worker(
-                    core_api_type=self.core_api_type,
-                    has_custom_voice=has_custom_voice
-                )
+            # 音色或提供方变化时归还旧进程
+            key, tts_worker, api_key = self._tts_worker_spec()
+            if self.tts_handle and (self.tts_handle.key != key or not self.tts_handle.is_alive()):
+                self._release_tts_worker()
+
+            # 从进程池租用TTS子进程（同一音色的预热进程可直接复用）
+            if self.tts_handle is None:
+                handle, warm = await get_tts_worker_pool().lease(key, tts_worker, api_key, self.voice_id)
+                self.tts_handle = handle
+                self.tts_process = handle.process
+                self.tts_request_queue = handle.request_queue
+                self.tts_response_queue = handle.response_queue
+
+                # 响应桥接与租约一一对应
+                self.tts_bridge = TTSResponseBridge(self.tts_response_queue, self.tts_metrics)
+                self.tts_bridge.start()
                 
-                self.tts_request_queue = MPQueue() # TTS request (多进程队列)
-                self.tts_response_queue = MPQueue() # TTS response (多进程队列)
-                # 根据是否有自定义音色选择 TTS API 配置
-                if has_custom_voice:
-                    tts_config = self._config_manager.get_model_api_config('tts_custom')
+                tts_type = "自定义音色(CosyVoice)" if self.voice_id else f"{self.core_api_type}默认TTS"
+                if handle.ready is not None:
+                    # 预热进程的就绪信号已读取过，丢弃上一个会话残留的音频
+                    self.tts_bridge.clear()
+                    logger.info(f"✅ 复用预热的TTS进程 (使用: {tts_type})")
                 else:
-                    tts_config = self._config_manager.get_model_api_config('tts_default')
-                self.tts_process = Process(
-                    target=tts_worker,
-                    args=(self.tts_request_queue, self.tts_response_queue, tts_config['api_key'], self.voice_id)
-                )
-                self.tts_process.daemon = True
-                self.tts_process.start()
-                
-                # 等待TTS进程发送就绪信号（最多等待8秒）
-                tts_type = "自定义音色(CosyVoice)" if has_custom_voice else f"{self.core_api_type}默认TTS"
-                logger.info(f"🎤 TTS进程已启动，等待就绪... (使用: {tts_type})")
-                
-                tts_ready = False
-                start_time = time.time()
-                timeout = 8.0  # 最多等待8秒
-                
-                while time.time() - start_time < timeout:
-                    try:
-                        # 非阻塞检查队列
-                        if not self.tts_response_queue.empty():
-                            msg = self.tts_response_queue.get_nowait()
-                            # 检查是否是就绪信号
-                            if isinstance(msg, tuple) and len(msg) == 2 and msg[0] == "__ready__":
-                                tts_ready = msg[1]
-                                if tts_ready:
-                                    logger.info(f"✅ TTS进程已就绪 (用时: {time.time() - start_time:.2f}秒)")
-                                else:
-                                    logger.error("❌ TTS进程初始化失败")
-                                break
-                            else:
-                                # 不是就绪信号，放回队列
-                                self.tts_response_queue.put(msg)
-                                break
-                    except:
-                        pass
-                    
-                    # 小睡眠避免忙等
-                    await asyncio.sleep(0.05)
-                
-                if not tts_ready:
-                    if time.time() - start_time >= timeout:
+                    # 等待TTS进程发送就绪信号（最多等待8秒）
+                    logger.info(f"🎤 TTS进程已启动，等待就绪... (使用: {tts_type})")
+                    start_time = time.time()
+                    timeout = 8.0  # 最多等待8秒
+                    handle.ready = await self.tts_bridge.wait_ready(timeout)
+                    if handle.ready:
+                        logger.info(f"✅ TTS进程已就绪 (用时: {time.time() - start_time:.2f}秒)")
+                    elif handle.ready is None:
                         logger.warning(f"⚠️ TTS进程就绪信号超时 ({timeout}秒)，继续执行...")
                     else:
                         logger.error("❌ TTS进程初始化失败，但继续执行...")
@@ -661,9 +671,7 @@ class LLMSessionManager:
             
             # 连接 Memory Server 获取记忆上下文
             try:
-                async with httpx.AsyncClient(timeout=2.0) as client:
-                    resp = await client.get(f"http://localhost:{self.memory_server_port}/new_dialog/{self.lanlan_name}")
-                    initial_prompt += resp.text
+                initial_prompt += await self._fetch_memory_context(timeout=2.0)
             except httpx.ConnectError:
                 raise ConnectionError(f"❌ 记忆服务未启动！请先启动记忆服务 (端口 {self.memory_server_port})")
             except httpx.TimeoutException:
@@ -715,6 +723,8 @@ class LLMSessionManager:
             # 连接 session
             if self.session:
                 await self.session.connect(initial_prompt, native_audio = not self.use_tts)
+                self.context_budget.start_session(initial_prompt)
+                self.frame_ingest.reset()
                 logger.info(f"✅ LLM Session 已连接")
                 print(initial_prompt)
                 return True
@@ -872,6 +882,19 @@ class LLMSessionManager:
         except Exception as e:
             logger.error(f"💥 WS Send User Activity Error: {e}")
 
+    async def _fetch_memory_context(self, timeout=5.0):
+        """从 Memory Server 获取记忆上下文；带 If-None-Match 条件请求，内容未变化时复用本地副本"""
+        headers = {}
+        if self._memory_context_cache:
+            headers['If-None-Match'] = self._memory_context_cache[0]
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            resp = await client.get(f"http://localhost:{self.memory_server_port}/new_dialog/{self.lanlan_name}", headers=headers)
+        if resp.status_code == 304 and self._memory_context_cache:
+            return self._memory_context_cache[1]
+        etag = resp.headers.get('etag')
+        self._memory_context_cache = (etag, resp.text) if etag else None
+        return resp.text
+
     def _convert_cache_to_str(self, cache):
         """[热切换相关] 将cache转换为字符串"""
         res = ""
@@ -943,11 +966,10 @@ class LLMSessionManager:
             
             initial_prompt = (f"你是一个角色扮演大师，并且精通电脑操作。请按要求扮演以下角色（{self.lanlan_name}），在对方请求时、回答“我试试”并尝试操纵电脑。" if self._is_agent_enabled() else f"你是一个角色扮演大师。请按要求扮演以下角色（{self.lanlan_name}）。") + self.lanlan_prompt
             self.initial_cache_snapshot_len = len(self.message_cache_for_new_session)
-            async with httpx.AsyncClient() as client:
-                resp = await client.get(f"http://localhost:{self.memory_server_port}/new_dialog/{self.lanlan_name}")
-                initial_prompt += resp.text + self._convert_cache_to_str(self.message_cache_for_new_session)
+            initial_prompt += await self._fetch_memory_context() + self._convert_cache_to_str(self.message_cache_for_new_session)
             # print(initial_prompt)
             await self.pending_session.connect(initial_prompt, native_audio = not self.use_tts)
+            self.context_budget.renew_prepared(initial_prompt)
 
             # 4. Start temporary listener for PENDING session's *first* ignored response
             #    and wait for it to complete.
@@ -976,6 +998,7 @@ class LLMSessionManager:
                 self.summary_triggered_time = datetime.now()
                 self.message_cache_for_new_session = []
                 self.initial_cache_snapshot_len = 0
+                self.context_budget.renew_started('extra_reply')
                 # 立即启动后台预热，不等待10秒
                 self.pending_session_warmed_up_event = asyncio.Event()
                 if not self.background_preparation_task or self.background_preparation_task.done():
@@ -1061,6 +1084,8 @@ class LLMSessionManager:
             logger.info("Final Swap Sequence: Swapping sessions...")
             self.session = self.pending_session
             self.session_start_time = datetime.now()
+            self.context_budget.renew_finished(final_prime_text)
+            self.frame_ingest.reset()
 
             # Start the main listener for the NEWLY PROMOTED self.session
             if self.session and hasattr(self.session, 'handle_messages'):
@@ -1224,8 +1249,10 @@ class LLMSessionManager:
                     # 为每次文本输入生成新的speech_id（用于TTS和lipsync）
                     async with self.lock:
                         self.current_speech_id = str(uuid4())
+                    self.latency_tracer.begin_text_turn(self.current_speech_id)
 
                     await self.send_user_activity()
+                    self.latency_tracer.mark('sent_upstream')
                     await self.session.stream_text(data)
                 else:
                     logger.error(f"💥 Stream: Invalid text data type: {type(data)}")
@@ -1233,6 +1260,7 @@ class LLMSessionManager:
             
             # Audio输入：只有OmniRealtimeClient能处理
             if input_type == 'audio':
+                self.latency_tracer.note_mic_frame(time.monotonic())
                 # 检查 session 类型
                 if not isinstance(self.session, OmniRealtimeClient):
                     # 检查是否允许重建session
@@ -1257,12 +1285,17 @@ class LLMSessionManager:
                     logger.error("💥 Stream: Session websocket not available")
                     return
                 try:
-                    if isinstance(data, list):
+                    if isinstance(data, (bytes, bytearray, memoryview)):
+                        # 二进制帧：data 是指向 WebSocket 帧的 memoryview，不做复制
+                        await self.session.stream_audio(data, sample_rate=message.get("sample_rate"))
+                    elif isinstance(data, list):
+                        # 兼容旧版 JSON 整数列表
                         audio_bytes = struct.pack(f'<{len(data)}h', *data)
                         await self.session.stream_audio(audio_bytes)
                     else:
                         logger.error(f"💥 Stream: Invalid audio data type: {type(data)}")
                         return
+                    self.latency_tracer.note_mic_sent()
 
                 except struct.error as se:
                     logger.error(f"💥 Stream: Struct packing error (audio): {se}")
@@ -1275,14 +1308,15 @@ class LLMSessionManager:
 
             elif input_type in ['screen', 'camera']:
                 try:
-                    # 使用统一的屏幕分享工具处理数据（只验证，不缩放）
-                    image_b64 = await process_screen_data(data)
+                    # 验证、去重（画面未变化的帧直接丢弃），并按带宽预算选择分辨率与质量
+                    image_b64, frame_candidate = await self.frame_ingest.process(data)
                     
                     if image_b64:
                         # 如果是文本模式（OmniOfflineClient），只存储图片，不立即发送
                         if isinstance(self.session, OmniOfflineClient):
                             # 只添加到待发送队列，等待与文本一起发送
                             await self.session.stream_image(image_b64)
+                            self.frame_ingest.commit(frame_candidate)
                         
                         # 如果是语音模式（OmniRealtimeClient），检查是否支持视觉并直接发送
                         elif isinstance(self.session, OmniRealtimeClient):
@@ -1291,10 +1325,12 @@ class LLMSessionManager:
                                 logger.error("💥 Stream: Session websocket not available")
                                 return
                             
-                            # 语音模式直接发送图片
-                            await self.session.stream_image(image_b64)
+                            # 语音模式直接发送图片（没有语音输入时上游不接收，不计入去重基准）
+                            if await self.session.stream_image(image_b64):
+                                self.frame_ingest.commit(frame_candidate)
+                        self.context_budget.add_image()
                     else:
-                        logger.error("💥 Stream: 屏幕数据验证失败")
+                        # 与上一帧几乎相同、超出带宽预算或数据无效（已记录日志），本帧不发送
                         return
                 except asyncio.CancelledError:
                     raise
@@ -1358,29 +1394,8 @@ class LLMSessionManager:
                 pass
             self.tts_handler_task = None
             
-        if self.tts_process and self.tts_process.is_alive():
-            try:
-                self.tts_request_queue.put((None, None))  # 通知子进程退出
-                self.tts_process.terminate()
-                self.tts_process.join(timeout=2.0)
-                if self.tts_process.is_alive():
-                    self.tts_process.kill()  # 强制杀死进程
-            except Exception as e:
-                logger.error(f"💥 关闭TTS进程时出错: {e}")
-            finally:
-                self.tts_process = None
-                
-        # 清理TTS队列和缓存状态
-        try:
-            while not self.tts_request_queue.empty():
-                self.tts_request_queue.get_nowait()
-        except:
-            pass
-        try:
-            while not self.tts_response_queue.empty():
-                self.tts_response_queue.get_nowait()
-        except:
-            pass
+        # TTS子进程归还到进程池保持预热（打断当前合成并清空请求队列）
+        self._release_tts_worker()
         
         # 重置TTS缓存状态
         async with self.tts_cache_lock:
@@ -1499,13 +1514,84 @@ class LLMSessionManager:
             logger.error(f"💥 WS Send Response Error: {e}")
 
     async def tts_response_handler(self):
-        while True:
-            while not self.tts_response_queue.empty():
-                data = self.tts_response_queue.get_nowait()
-                # 过滤掉就绪信号（格式为 ("__ready__", True/False)）
-                if isinstance(data, tuple) and len(data) == 2 and data[0] == "__ready__":
-                    # 这是就绪信号，不是音频数据，跳过
-                    continue
-                await self.send_speech(data)
-            await asyncio.sleep(0.01)
+        """事件驱动地把TTS子进程的音频转发到前端（就绪信号由bridge单独处理）"""
+        bridge = self.tts_bridge
+        if bridge is None:
+            return
+        tracer = self.latency_tracer
+        async for frame, chunk_timestamps in bridge.frames():
+            speech_id = bridge.frame_speech_id
+            if chunk_timestamps[0] is not None:
+                tracer.mark('first_audio', at=chunk_timestamps[0], speech_id=speech_id)
+            await self.send_speech(frame)
+            sent_at = time.monotonic()
+            tracer.mark('first_browser_byte', at=sent_at, speech_id=speech_id)
+            self.tts_metrics.record_frame(sent_at, chunk_timestamps, len(frame))
+
+    def get_context_metrics(self):
+        """返回当前会话的上下文预算与热切换统计"""
+        return {**self.context_budget.snapshot(), 'frames': self.frame_ingest.snapshot()}
+
+    def get_latency_metrics(self):
+        """语音往返各阶段延迟（p50/p95/p99）与TTS延迟统计"""
+        return {
+            'round_trip': self.latency_tracer.snapshot(),
+            'tts': self.tts_metrics.snapshot(),
+        }
+
+    def get_tts_metrics(self):
+        """TTS延迟统计快照（毫秒）"""
+        return self.tts_metrics.snapshot()
+
+    def _tts_worker_spec(self):
+        """当前配置对应的 (进程池键, worker函数, api_key)"""
+        has_custom_voice = bool(self.voice_id)
+        tts_worker = get_tts_worker(
+            core_api_type=self.core_api_type,
+            has_custom_voice=has_custom_voice
+        )
+        # 根据是否有自定义音色选择 TTS API 配置
+        if has_custom_voice:
+            tts_config = self._config_manager.get_model_api_config('tts_custom')
+        else:
+            tts_config = self._config_manager.get_model_api_config('tts_default')
+        key = get_tts_worker_pool().make_key(self.core_api_type, has_custom_voice, tts_config['api_key'], self.voice_id)
+        return key, tts_worker, tts_config['api_key']
+
+    def _release_tts_worker(self):
+        """关闭响应桥接并把TTS进程归还到进程池"""
+        if self.tts_handle and self.tts_handle.ready is None and self.tts_bridge:
+            # 等待就绪超时后才到达的信号也记到进程上，供下次租用判断
+            self.tts_handle.ready = self.tts_bridge.ready_state
+        if self.tts_bridge:
+            self.tts_bridge.close()
+            self.tts_bridge = None
+            logger.info(f"📊 TTS延迟统计: {self.tts_metrics.snapshot()}")
+        if self.tts_handle:
+            get_tts_worker_pool().release(self.tts_handle)
+            self.tts_handle = None
+        self.tts_process = None
+
+    def prewarm_realtime(self):
+        """为当前角色的语音模式预先建立上游Realtime连接，开始语音对话时无需等待握手"""
+        try:
+            realtime_config = self._config_manager.get_model_api_config('realtime')
+            if not realtime_config.get('base_url') or not realtime_config.get('api_key'):
+                return
+            url, headers = OmniRealtimeClient.connection_target(
+                realtime_config['base_url'], realtime_config['api_key'], realtime_config['model'])
+            get_realtime_pool().prewarm(url, headers)
+        except Exception as e:
+            logger.warning(f"⚠️ 预连接Realtime上游失败: {e}")
+
+    def prewarm_tts(self):
+        """为当前角色的文本模式音色预热一个TTS进程（文本模式总是使用TTS）"""
+        if self.tts_handle:
+            return
+        try:
+            key, tts_worker, api_key = self._tts_worker_spec()
+            # 进程在线程池中启动，不等待
+            asyncio.create_task(get_tts_worker_pool().prewarm(key, tts_worker, api_key, self.voice_id))
+        except Exception as e:
+            logger.warning(f"⚠️ 预热TTS进程失败: {e}")
 
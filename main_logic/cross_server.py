@@ -9,16 +9,20 @@
 import ssl
 
 import asyncio
+import queue
+import threading
 import time
 import pickle
 import aiohttp
 import logging
 from config import MONITOR_SERVER_PORT, MEMORY_SERVER_PORT, COMMENTER_SERVER_PORT, TOOL_SERVER_PORT
+from collections import deque
 from datetime import datetime
-import json
 import re
 from utils.frontend_utils import contains_chinese, replace_blank, replace_corner_mark, remove_bracket, \
     is_only_punctuation, split_paragraph
+from utils.config_manager import get_config_manager
+from main_logic.outbox import DeliveryOutbox, compact_json
 
 # Setup logger for this module
 logger = logging.getLogger(__name__)
@@ -59,8 +63,129 @@ async def keep_reader(ws: aiohttp.ClientWebSocketResponse):
         pass
 
 
+# 心跳间隔（秒），monitor 端 25 秒无数据才会超时
+SYNC_HEARTBEAT_INTERVAL = 5.0
+# 断线重连检查间隔（秒）
+SYNC_RECONNECT_INTERVAL = 1.0
+# 读线程单次批量取出的最大消息数
+SYNC_BATCH_SIZE = 64
+# 转发延迟统计保留的样本数
+SYNC_METRICS_WINDOW = 512
+# analyzer 投递的有效期（秒），过期的对话分析没有意义
+ANALYZER_DELIVERY_TTL = 60
+# 发给 analyzer 的最近消息条数；增量总结后会话内历史也只保留这么多
+ANALYZER_CONTEXT_MESSAGES = 6
+# 连接器退出时等待积压投递送达的时间（秒）
+OUTBOX_DRAIN_TIMEOUT = 3.0
+
+
+class SyncMetrics:
+    """单个角色同步连接器的队列深度与转发延迟统计（毫秒）"""
+
+    def __init__(self, window=SYNC_METRICS_WINDOW):
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.forwarded = {}
+        self.latency = {}
+        self._window = window
+        self.outbox = None
+
+    def observe_depth(self, depth):
+        self.queue_depth = depth
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+
+    def record(self, kind, enqueued_at):
+        self.forwarded[kind] = self.forwarded.get(kind, 0) + 1
+        samples = self.latency.get(kind)
+        if samples is None:
+            samples = self.latency[kind] = deque(maxlen=self._window)
+        samples.append((time.monotonic() - enqueued_at) * 1000)
+
+    def snapshot(self):
+        latency = {}
+        for kind, samples in self.latency.items():
+            ordered = sorted(samples)
+            if ordered:
+                latency[kind] = {
+                    'p50': ordered[len(ordered) // 2],
+                    'p95': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+                    'max': ordered[-1],
+                }
+        return {
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'forwarded': dict(self.forwarded),
+            'forward_latency_ms': latency,
+            'outbox': self.outbox.snapshot() if self.outbox else None,
+        }
+
+
+_sync_metrics = {}
+
+
+def get_sync_metrics():
+    """所有角色同步连接器的统计快照"""
+    return {name: metrics.snapshot() for name, metrics in list(_sync_metrics.items())}
+
+
+def _recent_for_analyzer(chat_history):
+    """构造发给 analyzer 的最近消息摘要"""
+    recent = []
+    for item in chat_history[-ANALYZER_CONTEXT_MESSAGES:]:
+        if item.get('role') in ['user', 'assistant']:
+            try:
+                txt = item['content'][0]['text'] if item.get('content') else ''
+            except Exception:
+                txt = ''
+            if txt == '':
+                continue
+            recent.append({'role': item.get('role'), 'text': txt})
+    return recent
+
+
+def _outbox_path(lanlan_name):
+    config_manager = get_config_manager()
+    config_manager.ensure_memory_directory()
+    return config_manager.memory_dir / 'outbox' / f'{lanlan_name}.jsonl'
+
+
+def _queue_reader(message_queue, shutdown_event, loop, inbox, metrics):
+    """专用读线程：阻塞读取主进程的消息队列，批量交给连接器的事件循环"""
+    while not shutdown_event.is_set():
+        try:
+            # 超时只用于检查 shutdown_event，消息到达时立即返回
+            message = message_queue.get(timeout=0.5)
+        except queue.Empty:
+            continue
+        batch = [(time.monotonic(), message)]
+        # 一次取出已积压的消息，减少跨线程唤醒次数
+        while len(batch) < SYNC_BATCH_SIZE:
+            try:
+                batch.append((time.monotonic(), message_queue.get_nowait()))
+            except queue.Empty:
+                break
+        metrics.observe_depth(message_queue.qsize() + len(batch))
+        try:
+            loop.call_soon_threadsafe(inbox.put_nowait, batch)
+        except RuntimeError:
+            # 事件循环已关闭
+            return
+    try:
+        loop.call_soon_threadsafe(inbox.put_nowait, None)
+    except RuntimeError:
+        pass
+
+
 def sync_connector_process(message_queue, shutdown_event, lanlan_name, sync_server_url=f"ws://localhost:{MONITOR_SERVER_PORT}", config=None):
-    """独立进程运行的同步连接器"""
+    """
+    独立线程运行的同步连接器（事件驱动）：
+    - 读线程阻塞读取 message_queue，批量投递到 asyncio 队列，无逐条 sleep
+    - 音频（binary）与文本、用户、系统消息在同一个分发协程中严格按主进程发出的顺序转发，
+      monitor 收到的 user_activity（打断）、turn end 不会落在之后的音频后面；
+      记忆与 analyzer 的投递经发件箱异步发送，不会阻塞音频
+    - 心跳与断线重连各自运行在独立的定时器上
+    """
 
     # 创建一个新的事件循环
     loop = asyncio.new_event_loop()
@@ -70,6 +195,7 @@ def sync_connector_process(message_queue, shutdown_event, lanlan_name, sync_serv
     if config is None:
         config = {}
     config = default_config | config
+    metrics = _sync_metrics[lanlan_name] = SyncMetrics()
 
     async def maintain_connection(chat_history, lanlan_name):
         sync_session = None
@@ -86,216 +212,213 @@ def sync_connector_process(message_queue, shutdown_event, lanlan_name, sync_serv
         text_output_cache = '' # lanlan的当前消息
         current_turn = 'user'
         last_screen = None
+        summarized_len = 0  # chat_history 开头已交给记忆服务增量总结的条数
 
-        while not shutdown_event.is_set():
-            try:
-                # 检查消息队列
-                while not message_queue.empty():
-                    message = message_queue.get()
+        # 记忆与 analyzer 的投递先落盘，再由长连接客户端在后台发送（含上次未送达的请求）
+        outbox = metrics.outbox = DeliveryOutbox(_outbox_path(lanlan_name), lanlan_name)
+        await outbox.start()
 
-                    if message["type"] == "json":
-                        # Forward to monitor if enabled
-                        if config['monitor'] and sync_ws:
-                            await sync_ws.send_json(message["data"])
-
-                        # Only treat assistant turn when it's a gemini_response
-                        if message["data"].get("type") == "gemini_response":
-                            if current_turn == 'user':  # assistant new message starts
-                                if user_input_cache:
-                                    chat_history.append({'role': 'user', 'content': [{"type": "text", "text": user_input_cache}]})
-                                    user_input_cache = ''
-                                current_turn = 'assistant'
-                                text_output_cache = datetime.now().strftime('[%Y%m%d %a %H:%M] ')
-
-                                if config['bullet'] and bullet_ws:
-                                    try:
-                                        last_user = last_ai = None
-                                        for i in chat_history[::-1]:
-                                            if i["role"] == "user":
-                                                last_user = i['content'][0]['text']
-                                                break
-                                        for i in chat_history[::-1]:
-                                            if i["role"] == "assistant":
-                                                last_ai = i['content'][0]['text']
-                                                break
-
-                                        message_data = {
-                                            "user": last_user,
-                                            "ai": last_ai,
-                                            "screen": last_screen
-                                        }
-                                        binary_message = pickle.dumps(message_data)
-                                        await bullet_ws.send_bytes(binary_message)
-                                    except Exception as e:
-                                        logger.error(f"[{lanlan_name}] Error when sending to commenter: {e}")
-
-                            # Append assistant streaming text
+        inbox = asyncio.Queue()  # 读线程投递的消息批次
+        stop_event = asyncio.Event()
+
+        async def handle_control_message(message):
+            nonlocal user_input_cache, text_output_cache, current_turn, last_screen, summarized_len
+            if message["type"] == "json":
+                # Forward to monitor if enabled
+                if config['monitor'] and sync_ws:
+                    await sync_ws.send_json(message["data"])
+
+                # Only treat assistant turn when it's a gemini_response
+                if message["data"].get("type") == "gemini_response":
+                    if current_turn == 'user':  # assistant new message starts
+                        if user_input_cache:
+                            chat_history.append({'role': 'user', 'content': [{"type": "text", "text": user_input_cache}]})
+                            user_input_cache = ''
+                        current_turn = 'assistant'
+                        text_output_cache = datetime.now().strftime('[%Y%m%d %a %H:%M] ')
+
+                        if config['bullet'] and bullet_ws:
                             try:
-                                text_output_cache += message["data"].get("text", "")
-                            except Exception:
-                                pass
+                                last_user = last_ai = None
+                                for i in chat_history[::-1]:
+                                    if i["role"] == "user":
+                                        last_user = i['content'][0]['text']
+                                        break
+                                for i in chat_history[::-1]:
+                                    if i["role"] == "assistant":
+                                        last_ai = i['content'][0]['text']
+                                        break
+
+                                message_data = {
+                                    "user": last_user,
+                                    "ai": last_ai,
+                                    "screen": last_screen
+                                }
+                                binary_message = pickle.dumps(message_data)
+                                await bullet_ws.send_bytes(binary_message)
+                            except Exception as e:
+                                logger.error(f"[{lanlan_name}] Error when sending to commenter: {e}")
+
+                    # Append assistant streaming text
+                    try:
+                        text_output_cache += message["data"].get("text", "")
+                    except Exception:
+                        pass
+
+            elif message["type"] == "user":  # 准备转录
+                data = message["data"].get("data")
+                input_type = message["data"].get("input_type")
+                if input_type == "transcript": # 暂时只处理语音，后续还需要记录图片
+                    if user_input_cache == '' and config['monitor'] and sync_ws:
+                        await sync_ws.send_json({'type': 'user_activity'}) #用于打断前端声音播放
+                    user_input_cache += data
+                    # 发送用户转录到 monitor 供副终端显示
+                    if config['monitor'] and sync_ws and data:
+                        await sync_ws.send_json({'type': 'user_transcript', 'text': data})
+                elif input_type == "screen":
+                    last_screen = data
+
+            elif message["type"] == "system":
+                try:
+                    if message["data"] == "google disconnected":
+                        if len(text_output_cache) > 0:
+                            chat_history.append({'role': 'system', 'content': [
+                                {'type': 'text', 'text': "网络错误，您已断开连接！"}]})
+                        text_output_cache = ''
+
+                    if message["data"] == "renew session":
+                        # 先处理未完成的用户输入缓存（如果有）
+                        if user_input_cache:
+                            chat_history.append({'role': 'user', 'content': [{"type": "text", "text": user_input_cache}]})
+                            user_input_cache = ''
+
+                        # 再处理未完成的输出缓存（如果有）
+                        current_turn = 'user'
+                        text_output_cache = normalize_text(text_output_cache)
+                        if len(text_output_cache) > 0:
+                            chat_history.append(
+                                    {'role': 'assistant', 'content': [{'type': 'text', 'text': text_output_cache}]})
+                        text_output_cache = ''
+                        logger.info(f"[{lanlan_name}] 热重置：聊天历史长度 {len(chat_history)} 条消息")
+                        outbox.enqueue(
+                            'memory',
+                            f"http://localhost:{MEMORY_SERVER_PORT}/renew/{lanlan_name}",
+                            {'input_history': compact_json(chat_history[summarized_len:])},
+                            timeout=30.0,
+                            label='热重置记忆',
+                        )
+                        chat_history.clear()
+                        summarized_len = 0
+
+                    elif message["data"] == "summarize history":
+                        # 会话继续时的增量总结：只投递尚未总结过的部分，不清空会话内历史，
+                        # 仅保留 analyzer 需要的最近几条，之后的 turn end 仍有完整上下文
+                        pending = chat_history[summarized_len:]
+                        if pending:
+                            logger.info(f"[{lanlan_name}] 增量总结：投递 {len(pending)} 条消息")
+                            outbox.enqueue(
+                                'memory',
+                                f"http://localhost:{MEMORY_SERVER_PORT}/renew/{lanlan_name}",
+                                {'input_history': compact_json(pending)},
+                                timeout=30.0,
+                                label='增量总结记忆',
+                            )
+                        del chat_history[:-ANALYZER_CONTEXT_MESSAGES]
+                        summarized_len = len(chat_history)
+
+                    if message["data"] == 'turn end': # lanlan的消息结束了
+                        current_turn = 'user'
+                        text_output_cache = normalize_text(text_output_cache)
+                        if len(text_output_cache) > 0:
+                            chat_history.append(
+                                {'role': 'assistant', 'content': [{'type': 'text', 'text': text_output_cache}]})
+                        text_output_cache = ''
+                        if config['monitor'] and sync_ws:
+                            await sync_ws.send_json({'type': 'turn end'})
+                        # 向tool_server发送最近对话，供分析器识别潜在任务（经发件箱异步投递，不阻塞消息处理）
+                        recent = _recent_for_analyzer(chat_history)
+                        if recent:
+                            outbox.enqueue(
+                                'agent',
+                                f"http://localhost:{TOOL_SERVER_PORT}/analyze_and_plan",
+                                {'messages': recent, 'lanlan_name': lanlan_name},
+                                timeout=5.0,
+                                ttl=ANALYZER_DELIVERY_TTL,
+                                label='analyzer',
+                            )
+
+                        # Turn end时不保存聊天记录，只在session end或renew session时保存
+
+                    elif message["data"] == 'session end': # 当前session结束了
+                        # 先处理未完成的用户输入缓存（如果有）
+                        if user_input_cache:
+                            chat_history.append({'role': 'user', 'content': [{"type": "text", "text": user_input_cache}]})
+                            user_input_cache = ''
+
+                        # 再处理未完成的输出缓存（如果有）
+                        current_turn = 'user'
+                        text_output_cache = normalize_text(text_output_cache)
+                        if len(text_output_cache) > 0:
+                            chat_history.append(
+                                {'role': 'assistant', 'content': [{'type': 'text', 'text': text_output_cache}]})
+                        text_output_cache = ''
 
-                    elif message["type"] == "binary":
+                        # 向tool_server发送最近对话，供分析器识别潜在任务（与turn end逻辑相同）
+                        recent = _recent_for_analyzer(chat_history)
+                        if recent:
+                            outbox.enqueue(
+                                'agent',
+                                f"http://localhost:{TOOL_SERVER_PORT}/analyze_and_plan",
+                                {'messages': recent, 'lanlan_name': lanlan_name},
+                                timeout=5.0,
+                                ttl=ANALYZER_DELIVERY_TTL,
+                                label='analyzer (session end)',
+                            )
+
+                        # 处理聊天历史
+                        logger.info(f"[{lanlan_name}] 会话结束：开始处理聊天历史，共 {len(chat_history)} 条消息")
+                        outbox.enqueue(
+                            'memory',
+                            f"http://localhost:{MEMORY_SERVER_PORT}/process/{lanlan_name}",
+                            {'input_history': compact_json(chat_history[summarized_len:])},
+                            timeout=30.0,
+                            label='会话记忆',
+                        )
+                        chat_history.clear()
+                        summarized_len = 0
+                except Exception as e:
+                    logger.error(f"[{lanlan_name}] System message error: {e}", exc_info=True)
+
+        async def dispatch_loop():
+            """按批次、按原始顺序分发消息（音频与控制消息共用一条通道，保证打断事件不落后于音频）"""
+            nonlocal binary_ws
+            while True:
+                batch = await inbox.get()
+                if batch is None:
+                    break
+                for enqueued_at, message in batch:
+                    if message["type"] == "binary":
                         if config['monitor'] and binary_ws:
-                            await binary_ws.send_bytes(message["data"])
-
-                    elif message["type"] == "user":  # 准备转录
-                        data = message["data"].get("data")
-                        input_type = message["data"].get("input_type")
-                        if input_type == "transcript": # 暂时只处理语音，后续还需要记录图片
-                            if user_input_cache == '' and config['monitor'] and sync_ws:
-                                await sync_ws.send_json({'type': 'user_activity'}) #用于打断前端声音播放
-                            user_input_cache += data
-                            # 发送用户转录到 monitor 供副终端显示
-                            if config['monitor'] and sync_ws and data:
-                                await sync_ws.send_json({'type': 'user_transcript', 'text': data})
-                        elif input_type == "screen":
-                            last_screen = data
-
-                    elif message["type"] == "system":
-                        try:
-                            if message["data"] == "google disconnected":
-                                if len(text_output_cache) > 0:
-                                    chat_history.append({'role': 'system', 'content': [
-                                        {'type': 'text', 'text': "网络错误，您已断开连接！"}]})
-                                text_output_cache = ''
-
-                            if message["data"] == "renew session":
-                                # 先处理未完成的用户输入缓存（如果有）
-                                if user_input_cache:
-                                    chat_history.append({'role': 'user', 'content': [{"type": "text", "text": user_input_cache}]})
-                                    user_input_cache = ''
-                                
-                                # 再处理未完成的输出缓存（如果有）
-                                current_turn = 'user'
-                                text_output_cache = normalize_text(text_output_cache)
-                                if len(text_output_cache) > 0:
-                                    chat_history.append(
-                                            {'role': 'assistant', 'content': [{'type': 'text', 'text': text_output_cache}]})
-                                text_output_cache = ''
-                                logger.info(f"[{lanlan_name}] 热重置：聊天历史长度 {len(chat_history)} 条消息")
-                                try:
-                                    async with aiohttp.ClientSession() as session:
-                                        async with session.post(
-                                            f"http://localhost:{MEMORY_SERVER_PORT}/renew/{lanlan_name}",
-                                            json={'input_history': json.dumps(chat_history, indent=2, ensure_ascii=False)},
-                                            timeout=aiohttp.ClientTimeout(total=30.0)
-                                        ) as response:
-                                            result = await response.json()
-                                            if result.get('status') == 'error':
-                                                logger.error(f"[{lanlan_name}] 热重置记忆处理失败: {result.get('message')}")
-                                            else:
-                                                logger.info(f"[{lanlan_name}] 热重置记忆已成功上传到 memory_server")
-                                except Exception as e:
-                                    logger.exception(f"[{lanlan_name}] 调用 /renew API 失败: {type(e).__name__}: {e}")
-                                chat_history.clear()
-
-                            if message["data"] == 'turn end': # lanlan的消息结束了
-                                current_turn = 'user'
-                                text_output_cache = normalize_text(text_output_cache)
-                                if len(text_output_cache) > 0:
-                                    chat_history.append(
-                                        {'role': 'assistant', 'content': [{'type': 'text', 'text': text_output_cache}]})
-                                text_output_cache = ''
-                                if config['monitor'] and sync_ws:
-                                    await sync_ws.send_json({'type': 'turn end'})
-                                # 非阻塞地向tool_server发送最近对话，供分析器识别潜在任务
-                                try:
-                                    # 构造最近的消息摘要
-                                    recent = []
-                                    for item in chat_history[-6:]:
-                                        if item.get('role') in ['user', 'assistant']:
-                                            try:
-                                                txt = item['content'][0]['text'] if item.get('content') else ''
-                                            except Exception:
-                                                txt = ''
-                                            if txt == '':
-                                                continue
-                                            recent.append({'role': item.get('role'), 'text': txt})
-                                    if recent:
-                                        async with aiohttp.ClientSession() as session:
-                                            async with session.post(
-                                                f"http://localhost:{TOOL_SERVER_PORT}/analyze_and_plan",
-                                                json={'messages': recent, 'lanlan_name': lanlan_name},
-                                                timeout=aiohttp.ClientTimeout(total=5.0)
-                                            ) as resp:
-                                                await resp.read()  # 确保响应被完全读取
-                                        logger.debug(f"[{lanlan_name}] 已发送对话到analyzer进行分析")
-                                except asyncio.TimeoutError:
-                                    logger.warning(f"[{lanlan_name}] 发送到analyzer超时")
-                                except Exception as e:
-                                    logger.warning(f"[{lanlan_name}] 发送到analyzer失败: {e}")
-                                
-                                # Turn end时不保存聊天记录，只在session end或renew session时保存
-
-                            elif message["data"] == 'session end': # 当前session结束了
-                                # 先处理未完成的用户输入缓存（如果有）
-                                if user_input_cache:
-                                    chat_history.append({'role': 'user', 'content': [{"type": "text", "text": user_input_cache}]})
-                                    user_input_cache = ''
-                                
-                                # 再处理未完成的输出缓存（如果有）
-                                current_turn = 'user'
-                                text_output_cache = normalize_text(text_output_cache)
-                                if len(text_output_cache) > 0:
-                                    chat_history.append(
-                                        {'role': 'assistant', 'content': [{'type': 'text', 'text': text_output_cache}]})
-                                text_output_cache = ''
-                                
-                                # 向tool_server发送最近对话，供分析器识别潜在任务（与turn end逻辑相同）
-                                try:
-                                    # 构造最近的消息摘要
-                                    recent = []
-                                    for item in chat_history[-6:]:
-                                        if item.get('role') in ['user', 'assistant']:
-                                            try:
-                                                txt = item['content'][0]['text'] if item.get('content') else ''
-                                            except Exception:
-                                                txt = ''
-                                            if txt == '':
-                                                continue
-                                            recent.append({'role': item.get('role'), 'text': txt})
-                                    if recent:
-                                        async with aiohttp.ClientSession() as session:
-                                            async with session.post(
-                                                f"http://localhost:{TOOL_SERVER_PORT}/analyze_and_plan",
-                                                json={'messages': recent, 'lanlan_name': lanlan_name},
-                                                timeout=aiohttp.ClientTimeout(total=5.0)
-                                            ) as resp:
-                                                await resp.read()  # 确保响应被完全读取
-                                        logger.debug(f"[{lanlan_name}] 已发送对话到analyzer进行分析 (session end)")
-                                except asyncio.TimeoutError:
-                                    logger.warning(f"[{lanlan_name}] 发送到analyzer超时 (session end)")
-                                except Exception as e:
-                                    logger.warning(f"[{lanlan_name}] 发送到analyzer失败: {e} (session end)")
-                                
-                                # 处理聊天历史
-                                logger.info(f"[{lanlan_name}] 会话结束：开始处理聊天历史，共 {len(chat_history)} 条消息")
-                                try:
-                                    async with aiohttp.ClientSession() as session:
-                                        async with session.post(
-                                            f"http://localhost:{MEMORY_SERVER_PORT}/process/{lanlan_name}",
-                                            json={'input_history': json.dumps(chat_history, indent=2, ensure_ascii=False)},
-                                            timeout=aiohttp.ClientTimeout(total=30.0)
-                                        ) as response:
-                                            result = await response.json()
-                                            if result.get('status') == 'error':
-                                                logger.error(f"[{lanlan_name}] 会话记忆处理失败: {result.get('message')}")
-                                            else:
-                                                logger.info(f"[{lanlan_name}] 会话记忆已成功上传到 memory_server")
-                                except Exception as e:
-                                    logger.exception(f"[{lanlan_name}] 调用 /process API 失败")
-                                chat_history.clear()
-                        except Exception as e:
-                            logger.error(f"[{lanlan_name}] System message error: {e}", exc_info=True)
-                    await asyncio.sleep(0.02)
-            except Exception as e:
-                logger.error(f"[{lanlan_name}] Message processing error: {e}", exc_info=True)
-                await asyncio.sleep(0.02)
-            
-            # WebSocket 连接管理（独立于消息处理）
-            try:
-                # 如果连接不存在，尝试建立连接
+                            try:
+                                await binary_ws.send_bytes(message["data"])
+                                metrics.record('binary', enqueued_at)
+                            except Exception as e:
+                                logger.warning(f"[{lanlan_name}] 音频转发失败: {e}")
+                                binary_ws = None
+                        continue
+                    try:
+                        await handle_control_message(message)
+                        metrics.record(message["type"], enqueued_at)
+                    except Exception as e:
+                        logger.error(f"[{lanlan_name}] Message processing error: {e}", exc_info=True)
+                metrics.observe_depth(message_queue.qsize())
+            stop_event.set()
+
+        async def connect_loop():
+            """WebSocket 连接管理（独立于消息处理）：断线后按固定间隔重连"""
+            nonlocal sync_session, sync_ws, sync_reader, binary_session, binary_ws, binary_reader
+            nonlocal bullet_session, bullet_ws, bullet_reader
+            while True:
                 try:
                     if config['monitor']:
                         if sync_ws is None:
@@ -307,10 +430,8 @@ def sync_connector_process(message_queue, shutdown_event, lanlan_name, sync_serv
                                     f"{sync_server_url}/sync/{lanlan_name}",
                                     heartbeat=10,
                                 )
-                                # print(f"[Sync Process] [{lanlan_name}] 文本连接已建立")
                                 sync_reader = asyncio.create_task(keep_reader(sync_ws))
-                            except Exception as e:
-                                # logger.warning(f"[{lanlan_name}] Monitor文本连接失败: {e}")
+                            except Exception:
                                 sync_ws = None
 
                         if binary_ws is None:
@@ -322,25 +443,9 @@ def sync_connector_process(message_queue, shutdown_event, lanlan_name, sync_serv
                                     f"{sync_server_url}/sync_binary/{lanlan_name}",
                                     heartbeat=10,
                                 )
-                                # print(f"[Sync Process] [{lanlan_name}] 二进制连接已建立")
                                 binary_reader = asyncio.create_task(keep_reader(binary_ws))
-                            except Exception as e:
-                                # logger.warning(f"[{lanlan_name}] Monitor二进制连接失败: {e}")
-                                binary_ws = None
-
-                        # 发送心跳（捕获异常以检测连接断开）
-                        if config['monitor'] and sync_ws:
-                            try:
-                                await sync_ws.send_json({"type": "heartbeat", "timestamp": time.time()})
-                            except Exception:
-                                sync_ws = None
-                                
-                        if config['monitor'] and binary_ws:
-                            try:
-                                await binary_ws.send_bytes(b'\x00\x01\x02\x03')
                             except Exception:
                                 binary_ws = None
-
                 except Exception as e:
                     logger.error(f"[{lanlan_name}] Monitor连接异常: {e}", exc_info=True)
                     sync_ws = None
@@ -357,7 +462,6 @@ def sync_connector_process(message_queue, shutdown_event, lanlan_name, sync_serv
                                     f"wss://localhost:{COMMENTER_SERVER_PORT}/sync/{lanlan_name}",
                                     ssl=ssl._create_unverified_context()
                                 )
-                                # print(f"[Sync Process] [{lanlan_name}] Bullet连接已建立")
                                 bullet_reader = asyncio.create_task(keep_reader(bullet_ws))
                             except Exception:
                                 # Bullet 连接失败是正常的（该服务可能未启动）
@@ -365,19 +469,40 @@ def sync_connector_process(message_queue, shutdown_event, lanlan_name, sync_serv
                 except Exception as e:
                     logger.error(f"[{lanlan_name}] Bullet连接异常: {e}", exc_info=True)
                     bullet_ws = None
-                
-                # 短暂休眠避免CPU占用过高
-                await asyncio.sleep(0.02)
 
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                # WebSocket 连接异常，标记连接为失败状态
-                logger.error(f"[{lanlan_name}] WebSocket连接异常: {e}")
-                sync_ws = None
-                binary_ws = None
-                bullet_ws = None
-                await asyncio.sleep(0.03)  # 重连前等待
+                await asyncio.sleep(SYNC_RECONNECT_INTERVAL)
+
+        async def heartbeat_loop():
+            """心跳（捕获异常以检测连接断开，交由 connect_loop 重连）"""
+            nonlocal sync_ws, binary_ws
+            while True:
+                await asyncio.sleep(SYNC_HEARTBEAT_INTERVAL)
+                if config['monitor'] and sync_ws:
+                    try:
+                        await sync_ws.send_json({"type": "heartbeat", "timestamp": time.time()})
+                    except Exception:
+                        sync_ws = None
+                if config['monitor'] and binary_ws:
+                    try:
+                        await binary_ws.send_bytes(b'\x00\x01\x02\x03')
+                    except Exception:
+                        binary_ws = None
+
+        reader_thread = threading.Thread(
+            target=_queue_reader,
+            args=(message_queue, shutdown_event, asyncio.get_running_loop(), inbox, metrics),
+            daemon=True,
+            name=f"SyncReader-{lanlan_name}",
+        )
+        reader_thread.start()
+        tasks = [asyncio.create_task(coro) for coro in (dispatch_loop(), connect_loop(), heartbeat_loop())]
+        try:
+            await stop_event.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await outbox.close(drain_timeout=OUTBOX_DRAIN_TIMEOUT)
 
         # 关闭资源
         for ws in [sync_ws, binary_ws, bullet_ws]:
@@ -404,5 +529,6 @@ def sync_connector_process(message_queue, shutdown_event, lanlan_name, sync_serv
     except Exception as e:
         logger.error(f"[{lanlan_name}] Sync进程错误: {e}", exc_info=True)
     finally:
+        _sync_metrics.pop(lanlan_name, None)
         loop.close()
         logger.info(f"[{lanlan_name}] Sync进程已终止")
@@ -0,0 +1,160 @@
+"""
+语音往返延迟追踪
+按轮（speech_id）记录一次对话从输入到第一帧音频到达前端的各阶段时间点，回答"1.8 秒花在哪里"：
+
+- input_received      最后一帧麦克风音频（或文本输入）到达主进程
+- sent_upstream       该输入发往上游模型
+- speech_end          上游 VAD 判定用户说完（仅语音模式）
+- first_text          第一段回复文本
+- first_tts_request   第一段文本送入 TTS
+- first_audio         第一块音频产生（TTS 子进程发出，或上游原生音频）
+- first_browser_byte  第一帧音频写入前端 WebSocket
+
+所有时间点使用 time.monotonic()：Linux / Windows / macOS 上它是系统范围的单调时钟，
+TTS 子进程打的时间戳可以直接与主进程比较。speech_id 由 worker 输出音频时附在响应上
+（见 tts_bridge.TimestampedQueue），带过进程边界。
+每轮只记录各阶段第一次出现的时间；结束的轮次进入环形缓冲区，snapshot() 给出 p50/p95/p99。
+"""
+import time
+from collections import deque
+
+# 环形缓冲区保留的轮次数
+LATENCY_TRACE_RING = 256
+# snapshot 中附带的最近轮次明细数
+LATENCY_RECENT_TRACES = 10
+
+STAGES = (
+    'input_received',
+    'sent_upstream',
+    'speech_end',
+    'first_text',
+    'first_tts_request',
+    'first_audio',
+    'first_browser_byte',
+)
+
+
+class LatencyTrace:
+    __slots__ = ('kind', 'speech_id', 'marks')
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.speech_id = None
+        self.marks = {}
+
+    def mark(self, stage, at=None):
+        if stage not in self.marks:
+            self.marks[stage] = time.monotonic() if at is None else at
+
+    def offsets(self):
+        """各阶段相对于本轮第一个时间点的偏移（毫秒）"""
+        if not self.marks:
+            return {}
+        start = min(self.marks.values())
+        return {stage: round((self.marks[stage] - start) * 1000, 1) for stage in STAGES if stage in self.marks}
+
+    def to_dict(self):
+        return {'kind': self.kind, 'speech_id': self.speech_id, 'offsets_ms': self.offsets()}
+
+
+def _percentiles(values):
+    ordered = sorted(values)
+    if not ordered:
+        return {'count': 0, 'p50': None, 'p95': None, 'p99': None}
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))], 1)
+
+    return {'count': len(ordered), 'p50': pick(0.5), 'p95': pick(0.95), 'p99': pick(0.99)}
+
+
+class LatencyTracer:
+    """
+    一个角色的延迟追踪器，所有方法在主事件循环中调用。
+    同一时间只有一个进行中的轮次；新一轮开始时上一轮进入环形缓冲区。
+    """
+
+    def __init__(self, ring_size=LATENCY_TRACE_RING):
+        self.traces = deque(maxlen=ring_size)
+        self.current = None
+        self._last_mic_received = None
+        self._last_mic_sent = None
+
+    # ---------- 输入侧 ----------
+
+    def note_mic_frame(self, received_at):
+        """每帧麦克风音频调用，只记时间戳"""
+        self._last_mic_received = received_at
+
+    def note_mic_sent(self):
+        self._last_mic_sent = time.monotonic()
+
+    def _begin(self, kind):
+        if self.current is not None and self.current.marks:
+            self.traces.append(self.current)
+        self.current = LatencyTrace(kind)
+        return self.current
+
+    def begin_voice_turn(self):
+        """上游 VAD 判定用户说完时调用"""
+        trace = self._begin('voice')
+        now = time.monotonic()
+        if self._last_mic_received is not None:
+            trace.mark('input_received', self._last_mic_received)
+        if self._last_mic_sent is not None:
+            trace.mark('sent_upstream', self._last_mic_sent)
+        trace.mark('speech_end', now)
+        return trace
+
+    def begin_text_turn(self, speech_id):
+        trace = self._begin('text')
+        trace.speech_id = speech_id
+        trace.mark('input_received')
+        return trace
+
+    # ---------- 输出侧 ----------
+
+    def mark(self, stage, at=None, speech_id=None):
+        """
+        记录当前轮次的某个阶段。带 speech_id 时：当前轮次尚未绑定则绑定；
+        已绑定其他 speech_id（被打断的旧回复的尾音）则忽略。
+        """
+        trace = self.current
+        if trace is None:
+            return
+        if speech_id is not None:
+            if trace.speech_id is None:
+                trace.speech_id = speech_id
+            elif trace.speech_id != speech_id:
+                return
+        trace.mark(stage, at)
+
+    # ---------- 统计 ----------
+
+    def snapshot(self):
+        traces = list(self.traces)
+        if self.current is not None and 'first_browser_byte' in self.current.marks:
+            traces.append(self.current)
+
+        stage_offsets = {stage: [] for stage in STAGES}
+        segments = {}
+        for trace in traces:
+            offsets = trace.offsets()
+            for stage, offset in offsets.items():
+                stage_offsets[stage].append(offset)
+            # 相邻阶段之间的耗时
+            present = [stage for stage in STAGES if stage in trace.marks]
+            for earlier, later in zip(present, present[1:]):
+                segments.setdefault(f"{earlier}->{later}", []).append(
+                    (trace.marks[later] - trace.marks[earlier]) * 1000)
+
+        completed = [trace for trace in traces if 'first_browser_byte' in trace.marks]
+        return {
+            'traces': len(traces),
+            'completed': len(completed),
+            'end_to_end_ms': _percentiles(
+                [(trace.marks['first_browser_byte'] - min(trace.marks.values())) * 1000 for trace in completed]),
+            'stage_offset_ms': {stage: _percentiles(values) for stage, values in stage_offsets.items() if values},
+            'segment_ms': {name: _percentiles(values) for name, values in segments.items()},
+            'recent': [trace.to_dict() for trace in traces[-LATENCY_RECENT_TRACES:]],
+        }
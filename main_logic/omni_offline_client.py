@@ -9,11 +9,25 @@ from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 from openai import APIConnectionError, InternalServerError, RateLimitError
 from config import get_extra_body
+from config.prompts_sys import recent_history_manager_prompt
 from utils.frontend_utils import calculate_text_similarity
+from utils.screenshot_utils import analyze_image_with_vision_model
+from main_logic.context_budget import estimate_tokens, IMAGE_TOKENS
 
 # Setup logger for this module
 logger = logging.getLogger(__name__)
 
+# 对话历史窗口的token预算（不含系统指令），超出后在后台滚动总结较早的对话
+OFFLINE_HISTORY_TOKEN_BUDGET = 6000
+# 历史超过预算的该倍数时不再等待后台总结，直接丢弃最早的消息
+OFFLINE_HISTORY_HARD_LIMIT = 2
+# 总结时保留原文的最近消息数
+OFFLINE_KEEP_RECENT_MESSAGES = 6
+# 原图只保留在最近几轮用户消息中，更早的图片替换为视觉模型生成的描述
+OFFLINE_RAW_IMAGE_TURNS = 2
+# 图片描述的最大token数
+OFFLINE_CAPTION_MAX_TOKENS = 200
+
 class OmniOfflineClient:
     """
     A client for text-based chat that mimics the interface of OmniRealtimeClient.
@@ -73,6 +87,7 @@ class OmniOfflineClient:
         self.api_key = api_key if api_key and api_key != '' else None
         self.model = model
         self.vision_model = vision_model  # Store vision model for temporary switching
+        self._text_model = model  # 历史中不再有原图时切回的文本模型
         # 视觉模型独立配置（如果未指定则回退到主配置）
         self.vision_base_url = vision_base_url if vision_base_url else base_url
         self.vision_api_key = vision_api_key if vision_api_key else api_key
@@ -99,6 +114,11 @@ class OmniOfflineClient:
         self._instructions = ""
         self._stream_task = None
         self._pending_images = []  # Store pending images to send with next text
+        # 历史窗口
+        self._captions = {}  # image data url -> 生成描述的 asyncio.Task
+        self._summary_task = None
+        self._summary_covered = []  # 正在总结的消息（按对象身份匹配）
+        self.history_stats = {'summaries': 0, 'images_captioned': 0, 'dropped_messages': 0, 'model_reverts': 0}
         
         # 重复度检测
         self._recent_responses = []  # 存储最近3轮助手回复
@@ -157,6 +177,142 @@ class OmniOfflineClient:
                 extra_body=get_extra_body(self.model) or None
             )
     
+    # ---------- 历史窗口 ----------
+
+    @staticmethod
+    def _image_urls(message) -> list:
+        if isinstance(message.content, str):
+            return []
+        return [part['image_url']['url'] for part in message.content
+                if isinstance(part, dict) and part.get('type') == 'image_url']
+
+    @classmethod
+    def _message_tokens(cls, message) -> int:
+        if isinstance(message.content, str):
+            return estimate_tokens(message.content)
+        tokens = 0
+        for part in message.content:
+            if isinstance(part, dict) and part.get('type') == 'image_url':
+                tokens += IMAGE_TOKENS
+            elif isinstance(part, dict):
+                tokens += estimate_tokens(part.get('text', ''))
+        return tokens
+
+    def _history_tokens(self) -> int:
+        return sum(self._message_tokens(message) for message in self._conversation_history[1:])
+
+    def _start_captioning(self, message) -> None:
+        """图片所在轮次结束后，后台为其生成描述，原图移出窗口时用描述代替"""
+        for url in self._image_urls(message):
+            if url not in self._captions:
+                self._captions[url] = asyncio.create_task(analyze_image_with_vision_model(
+                    url.split(',', 1)[1], max_tokens=OFFLINE_CAPTION_MAX_TOKENS))
+
+    def _take_caption(self, url: str) -> Optional[str]:
+        task = self._captions.pop(url, None)
+        if task is None:
+            return None
+        if not task.done():
+            task.cancel()
+            return None
+        if task.cancelled() or task.exception() is not None:
+            return None
+        return task.result()
+
+    def _evict_images(self) -> None:
+        """较早的用户消息中的原图替换为描述文本（原地修改，保持消息对象不变）"""
+        user_turns = 0
+        for message in reversed(self._conversation_history):
+            if not isinstance(message, HumanMessage):
+                continue
+            user_turns += 1
+            if user_turns <= OFFLINE_RAW_IMAGE_TURNS or not self._image_urls(message):
+                continue
+            parts = []
+            for part in message.content:
+                if isinstance(part, dict) and part.get('type') == 'image_url':
+                    caption = self._take_caption(part['image_url']['url'])
+                    parts.append(f"[图片: {caption}]" if caption else "[图片]")
+                    if caption:
+                        self.history_stats['images_captioned'] += 1
+                elif isinstance(part, dict):
+                    parts.append(part.get('text', ''))
+            message.content = "\n".join(parts)
+
+        # 窗口中已没有原图，切回更便宜的文本模型
+        if self.model != self._text_model and \
+                not any(self._image_urls(message) for message in self._conversation_history):
+            logger.info(f"🖼️ 历史中已无原图，切回文本模型: {self._text_model}")
+            self.switch_model(self._text_model)
+            self.history_stats['model_reverts'] += 1
+
+    def _schedule_summary(self) -> None:
+        """历史超出预算时，在后台把最近几条之外的较早消息总结为一条备忘录"""
+        if self._summary_task is not None or self._history_tokens() <= OFFLINE_HISTORY_TOKEN_BUDGET:
+            return
+        cut = len(self._conversation_history) - OFFLINE_KEEP_RECENT_MESSAGES
+        if cut <= 2:
+            return
+        self._summary_covered = self._conversation_history[1:cut]
+        self._summary_task = asyncio.create_task(self._summarize(list(self._summary_covered)))
+
+    async def _summarize(self, messages) -> Optional[SystemMessage]:
+        lines = []
+        for message in messages:
+            role = {'human': 'user', 'ai': 'assistant'}.get(message.type, message.type)
+            if isinstance(message.content, str):
+                text = message.content
+            else:
+                text = "\n".join(part.get('text', '[图片]') for part in message.content if isinstance(part, dict))
+            lines.append(f"{role} | {text}")
+        llm = ChatOpenAI(
+            model=self._text_model,
+            base_url=self.base_url,
+            api_key=self.api_key,
+            temperature=0.3,
+            extra_body=get_extra_body(self._text_model) or None
+        )
+        try:
+            response_content = (await llm.ainvoke(recent_history_manager_prompt % "\n".join(lines))).content
+            if isinstance(response_content, list):
+                response_content = str(response_content)
+            if response_content.startswith("```"):
+                response_content = response_content.replace('```json', '').replace('```', '')
+            summary = json.loads(response_content).get('对话摘要')
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"OmniOfflineClient: 历史总结失败: {e}")
+            return None
+        if not summary:
+            return None
+        return SystemMessage(content=f"先前对话的备忘录: {summary}")
+
+    def _apply_summary(self) -> None:
+        task = self._summary_task
+        if task is None or not task.done():
+            return
+        self._summary_task = None
+        covered, self._summary_covered = self._summary_covered, []
+        summary = None if task.cancelled() or task.exception() is not None else task.result()
+        history = self._conversation_history
+        # 被总结的消息仍在系统指令之后原样存在时才替换（期间历史可能被重复检测清空）
+        if summary is None or len(history) < len(covered) + 1 or \
+                any(a is not b for a, b in zip(history[1:len(covered) + 1], covered)):
+            return
+        history[1:len(covered) + 1] = [summary]
+        self.history_stats['summaries'] += 1
+        logger.info(f"OmniOfflineClient: {len(covered)} 条较早的消息已总结为备忘录，当前历史约 {self._history_tokens()} tokens")
+
+    def _prepare_history(self) -> None:
+        """每次请求前整理历史窗口：应用已完成的总结、替换旧图片、必要时截断"""
+        self._apply_summary()
+        self._evict_images()
+        limit = OFFLINE_HISTORY_TOKEN_BUDGET * OFFLINE_HISTORY_HARD_LIMIT
+        while self._history_tokens() > limit and len(self._conversation_history) > OFFLINE_KEEP_RECENT_MESSAGES + 1:
+            self._conversation_history.pop(1)
+            self.history_stats['dropped_messages'] += 1
+
     async def _check_repetition(self, response: str) -> bool:
         """
         检查回复是否与近期回复高度重复。
@@ -214,8 +370,8 @@ class OmniOfflineClient:
         
         # Prepare user message content
         if has_images:
-            # Switch to vision model permanently for this session
-            # (cannot switch back because image data remains in conversation history)
+            # Switch to vision model while raw images remain in the history window
+            # (_evict_images switches back once they have been replaced by captions)
             if self.vision_model and self.vision_model != self.model:
                 logger.info(f"🖼️ Temporarily switching to vision model: {self.vision_model} (from {self.model})")
                 self.switch_model(self.vision_model, use_vision_config=True)
@@ -248,6 +404,7 @@ class OmniOfflineClient:
             user_message = HumanMessage(content=text.strip())
         
         self._conversation_history.append(user_message)
+        self._prepare_history()
         
         # Callback for user input
         if self.on_input_transcript:
@@ -341,6 +498,9 @@ class OmniOfflineClient:
                     break  # 非重试类错误直接退出
         finally:
             self._is_responding = False
+            if has_images:
+                self._start_captioning(user_message)
+            self._schedule_summary()
             # Call response done callback
             if self.on_response_done:
                 await self.on_response_done()
@@ -408,5 +568,10 @@ class OmniOfflineClient:
         self._is_responding = False
         self._conversation_history = []
         self._pending_images.clear()
+        for task in list(self._captions.values()) + [self._summary_task]:
+            if task is not None and not task.done():
+                task.cancel()
+        self._captions.clear()
+        self._summary_task = None
         logger.info("OmniOfflineClient closed")
 
@@ -6,12 +6,14 @@ import json
 import base64
 import time
 import logging
+import numpy as np
 
 from typing import Optional, Callable, Dict, Any, Awaitable
 from enum import Enum
 from utils.config_manager import get_config_manager
 from utils.audio_processor import AudioProcessor
 from utils.frontend_utils import calculate_text_similarity
+from main_logic.realtime_pool import get_realtime_pool
 
 # Setup logger for this module
 logger = logging.getLogger(__name__)
@@ -179,13 +181,23 @@ class OmniRealtimeClient:
         except Exception as e:
             logger.error(f"静默检测任务出错: {e}")
 
-    async def connect(self, instructions: str, native_audio=True) -> None:
-        """Establish WebSocket connection with the Realtime API."""
-        url = f"{self.base_url}?model={self.model}" if self.model != "free-model" else self.base_url
+    @staticmethod
+    def connection_target(base_url: str, api_key: str, model: str):
+        """Return the (url, headers) used to open the upstream WebSocket."""
+        url = f"{base_url}?model={model}" if model != "free-model" else base_url
         headers = {
-            "Authorization": f"Bearer {self.api_key}"
-        } 
-        self.ws = await websockets.connect(url, additional_headers=headers)
+            "Authorization": f"Bearer {api_key}"
+        }
+        return url, headers
+
+    async def connect(self, instructions: str, native_audio=True) -> None:
+        """Establish WebSocket connection with the Realtime API.
+
+        The connection is leased from the realtime connection pool, so the
+        TCP/TLS/auth handshake has usually already been done in the background.
+        """
+        url, headers = self.connection_target(self.base_url, self.api_key, self.model)
+        self.ws = await get_realtime_pool().lease(url, headers)
         
         # 启动静默检测任务（只在启用时）
         self._last_speech_time = time.time()
@@ -322,19 +334,29 @@ class OmniRealtimeClient:
         }
         await self.send_event(event)
 
-    async def stream_audio(self, audio_chunk: bytes) -> None:
+    async def stream_audio(self, audio_chunk, sample_rate: Optional[int] = None) -> None:
         """Stream raw audio data to the API.
         
         Supports two input modes:
         - 48kHz from PC: Apply RNNoise then downsample to 16kHz
         - 16kHz from mobile: Pass through directly (no RNNoise)
+
+        audio_chunk may be bytes, a memoryview into a binary WebSocket frame,
+        or an int16 numpy array; it is only copied once, by base64 encoding.
+        sample_rate comes from the binary frame header; when omitted (legacy
+        JSON path) it is inferred from the chunk size.
         """
-        # Detect input sample rate based on chunk size
-        # 48kHz: 480 samples (10ms) = 960 bytes
-        # 16kHz: 512 samples (~32ms) = 1024 bytes
-        num_samples = len(audio_chunk) // 2  # 16-bit = 2 bytes per sample
-        is_48khz = (num_samples == 480)  # RNNoise frame size
-        
+        if isinstance(audio_chunk, np.ndarray):
+            audio_chunk = memoryview(np.ascontiguousarray(audio_chunk, dtype='<i2')).cast('B')
+
+        if sample_rate is not None:
+            is_48khz = (sample_rate == AudioProcessor.RNNOISE_SAMPLE_RATE)
+        else:
+            # Detect input sample rate based on chunk size
+            # 48kHz: 480 samples (10ms) = 960 bytes
+            # 16kHz: 512 samples (~32ms) = 1024 bytes
+            num_samples = len(audio_chunk) // 2  # 16-bit = 2 bytes per sample
+            is_48khz = (num_samples == 480)  # RNNoise frame size
         
         # Apply RNNoise noise reduction only for 48kHz input (PC)
         if is_48khz and self._audio_processor is not None:
@@ -384,13 +406,17 @@ class OmniRealtimeClient:
                     await self.on_status_message("⚠️ 图片内容被审查系统拦截，请尝试更换图片或内容。")
             return "图片识别发生严重错误！"
     
-    async def stream_image(self, image_b64: str) -> None:
-        """Stream raw image data to the API."""
+    async def stream_image(self, image_b64: str) -> bool:
+        """Stream raw image data to the API.
+
+        Returns True if the frame was consumed (sent upstream or analyzed by
+        the vision model), False if it was ignored.
+        """
 
         try:
             if '用户的实时屏幕截图或相机画面正在分析中' in self._image_description and self.model in ['step', 'free']:
                 await self._analyze_image_with_vision_model(image_b64)
-                return
+                return True
 
             if self._audio_in_buffer:
                 if "qwen" in self.model:
@@ -439,13 +465,15 @@ class OmniRealtimeClient:
                         self._image_recognized_this_turn = True
                     
                     if self._image_being_analyzed:
-                        return
+                        return False
                     
                     logger.info(f"⚠️ Model {self.model} does not support video streaming, using VISION_MODEL")
                     await self._analyze_image_with_vision_model(image_b64)
-                    return
+                    return True
                     
                 await self.send_event(append_event)
+                return True
+            return False
         except Exception as e:
             logger.error(f"Error streaming image: {e}")
             raise e
@@ -665,6 +693,11 @@ class OmniRealtimeClient:
 
     async def close(self) -> None:
         """Close the WebSocket connection."""
+        if self._audio_processor is not None:
+            stats = self._audio_processor.get_stats()
+            if stats['audio_seconds'] > 0:
+                logger.info(f"🎤 Audio input stats: {stats}")
+
         # 取消静默检测任务
         if self._silence_check_task:
             self._silence_check_task.cancel()
@@ -0,0 +1,280 @@
+"""
+跨服务投递的持久化发件箱（outbox）
+cross_server 在 turn end / session end / renew session 时向 memory_server 与 agent server 投递的请求
+先追加写入磁盘，再由后台协程通过长连接的 aiohttp 客户端投递：
+
+- 追加式 JSONL 日志：每行一个 put / ack / drop 记录，启动时回放，未确认的请求重新投递
+- 每个目标（memory / agent）一条独立的 FIFO 通道，memory_server 宕机不会阻塞 analyzer 的投递
+- 连接失败、超时、5xx、{"status": "error"} 均按指数退避重试；4xx 视为请求本身有误，直接丢弃
+- 请求体使用紧凑 JSON，并附带 X-Delivery-Id 头，接收端据此对超时重试去重
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+import uuid
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# 重试退避（秒）
+OUTBOX_RETRY_BASE = 1.0
+OUTBOX_RETRY_MAX = 120.0
+# 服务可达但返回错误时的最大尝试次数（连接失败不计入，会一直重试）
+OUTBOX_MAX_REJECTS = 20
+# 已确认的记录累计多少条后重写日志文件
+OUTBOX_COMPACT_RECORDS = 64
+# 长连接池的每主机连接数
+OUTBOX_CONNECTIONS_PER_HOST = 4
+
+
+def compact_json(data):
+    """紧凑 JSON（无缩进、无多余空白），用于跨服务的请求体"""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+class DeliveryOutbox:
+    """
+    一个角色的同步连接器对应一个 outbox。enqueue() 可在任意时刻调用；
+    投递协程由 start() 在连接器的事件循环中启动。
+
+    用法：
+        outbox = DeliveryOutbox(path, lanlan_name)
+        await outbox.start()
+        outbox.enqueue('memory', url, {'input_history': ...}, timeout=30.0)
+        ...
+        await outbox.close(drain_timeout=3.0)
+    """
+
+    def __init__(self, path, name=''):
+        self.path = str(path)
+        self.name = name
+        self._entries = {}  # id -> put 记录，按入队顺序
+        self._wakeups = {}  # target -> asyncio.Event
+        self._tasks = {}  # target -> asyncio.Task
+        self._session = None
+        self._idle = None
+        self._settled_records = 0
+        self.stats = {'enqueued': 0, 'delivered': 0, 'retries': 0, 'dropped': 0, 'expired': 0, 'replayed': 0}
+        self._load()
+
+    # ---------- 持久化 ----------
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 崩溃时写了一半的末行
+                        continue
+                    op = record.get('op')
+                    if op == 'put':
+                        self._entries[record['id']] = record
+                    elif op in ('ack', 'drop'):
+                        self._entries.pop(record.get('id'), None)
+                        self._settled_records += 2
+        except OSError as e:
+            logger.error(f"[{self.name}] 读取发件箱失败: {e}")
+            return
+        self.stats['replayed'] = len(self._entries)
+        if self._entries:
+            logger.info(f"[{self.name}] 📮 发件箱中有 {len(self._entries)} 条未确认的投递，将重新发送")
+        self._maybe_compact()
+
+    def _append(self, record, durable=False):
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(compact_json(record) + '\n')
+                if durable:
+                    f.flush()
+                    os.fsync(f.fileno())
+        except OSError as e:
+            logger.error(f"[{self.name}] 写入发件箱失败: {e}")
+
+    def _maybe_compact(self):
+        """已确认的记录过多时，只保留未确认的 put 记录重写日志（临时文件 + rename）"""
+        if self._entries and self._settled_records < OUTBOX_COMPACT_RECORDS:
+            return
+        try:
+            if not self._entries:
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+            else:
+                tmp_path = self.path + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    for record in self._entries.values():
+                        f.write(compact_json(record) + '\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            self._settled_records = 0
+        except OSError as e:
+            logger.warning(f"[{self.name}] 压缩发件箱失败: {e}")
+
+    def _settle(self, entry, op):
+        if self._entries.pop(entry['id'], None) is None:
+            return
+        self._append({'op': op, 'id': entry['id']})
+        self._settled_records += 2
+        self._maybe_compact()
+        if not self._entries and self._idle is not None:
+            self._idle.set()
+
+    # ---------- 入队与投递 ----------
+
+    def enqueue(self, target, url, body, timeout=30.0, ttl=None, label=''):
+        """
+        追加一条投递请求并唤醒对应通道。
+        target: 通道名（同一通道内按顺序投递）；ttl: 过期秒数，None 表示直到送达为止
+        """
+        now = time.time()
+        entry = {
+            'op': 'put',
+            'id': uuid.uuid4().hex,
+            'target': target,
+            'url': url,
+            'body': body,
+            'timeout': timeout,
+            'created': now,
+            'expires': now + ttl if ttl else None,
+            'label': label,
+        }
+        # 无过期时间的投递（记忆）必须落盘后才算入队
+        self._append(entry, durable=ttl is None)
+        self._entries[entry['id']] = entry
+        self.stats['enqueued'] += 1
+        if self._idle is not None:
+            self._idle.clear()
+        self._wake(target)
+        return entry['id']
+
+    def _wake(self, target):
+        if self._session is None:
+            return  # 尚未 start()，启动时会为积压的通道创建协程
+        event = self._wakeups.get(target)
+        if event is None:
+            event = self._wakeups[target] = asyncio.Event()
+            self._tasks[target] = asyncio.create_task(self._lane(target, event))
+        event.set()
+
+    async def start(self):
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit_per_host=OUTBOX_CONNECTIONS_PER_HOST, keepalive_timeout=60),
+        )
+        self._idle = asyncio.Event()
+        if not self._entries:
+            self._idle.set()
+        for target in {entry['target'] for entry in self._entries.values()}:
+            self._wake(target)
+
+    def _next(self, target):
+        for entry in self._entries.values():
+            if entry['target'] == target:
+                return entry
+        return None
+
+    async def _post(self, entry):
+        """返回 (结果, 说明)；结果为 'ok' / 'retry'（不可达） / 'error'（服务返回错误） / 'reject'（4xx）"""
+        try:
+            async with self._session.post(
+                entry['url'],
+                data=compact_json(entry['body']).encode('utf-8'),
+                headers={'Content-Type': 'application/json', 'X-Delivery-Id': entry['id']},
+                timeout=aiohttp.ClientTimeout(total=entry['timeout']),
+            ) as response:
+                if response.status >= 500:
+                    return 'retry', f"HTTP {response.status}"
+                if response.status >= 400:
+                    return 'reject', f"HTTP {response.status}"
+                try:
+                    result = await response.json(content_type=None)
+                except ValueError:
+                    result = None
+                if isinstance(result, dict) and result.get('status') == 'error':
+                    return 'error', result.get('message')
+                return 'ok', None
+        except asyncio.TimeoutError:
+            return 'retry', "超时"
+        except aiohttp.ClientError as e:
+            return 'retry', f"{type(e).__name__}: {e}"
+
+    async def _lane(self, target, wakeup):
+        backoff = OUTBOX_RETRY_BASE
+        rejects = 0
+        while True:
+            entry = self._next(target)
+            if entry is None:
+                wakeup.clear()
+                await wakeup.wait()
+                continue
+            label = entry.get('label') or target
+            if entry.get('expires') and time.time() > entry['expires']:
+                logger.debug(f"[{self.name}] 投递已过期，丢弃: {label}")
+                self.stats['expired'] += 1
+                self._settle(entry, 'drop')
+                continue
+
+            outcome, detail = await self._post(entry)
+            if outcome == 'ok':
+                if entry.get('attempts'):
+                    logger.info(f"[{self.name}] 📮 {label} 重试 {entry['attempts']} 次后投递成功")
+                elif entry.get('expires') is None:
+                    logger.info(f"[{self.name}] 📮 {label} 投递成功")
+                else:
+                    logger.debug(f"[{self.name}] 📮 {label} 投递成功")
+                self.stats['delivered'] += 1
+                self._settle(entry, 'ack')
+                backoff = OUTBOX_RETRY_BASE
+                rejects = 0
+                continue
+
+            if outcome == 'error':
+                rejects += 1
+            if outcome == 'reject' or rejects >= OUTBOX_MAX_REJECTS:
+                logger.error(f"[{self.name}] ❌ {label} 投递被拒绝，已丢弃: {detail}")
+                self.stats['dropped'] += 1
+                self._settle(entry, 'drop')
+                backoff = OUTBOX_RETRY_BASE
+                rejects = 0
+                continue
+
+            entry['attempts'] = entry.get('attempts', 0) + 1
+            self.stats['retries'] += 1
+            logger.warning(f"[{self.name}] ⚠️ {label} 投递失败（{detail}），{backoff:.1f}秒后重试")
+            await asyncio.sleep(backoff * (0.8 + 0.4 * random.random()))
+            backoff = min(backoff * 2, OUTBOX_RETRY_MAX)
+
+    def pending(self):
+        return len(self._entries)
+
+    def snapshot(self):
+        by_target = {}
+        for entry in self._entries.values():
+            by_target[entry['target']] = by_target.get(entry['target'], 0) + 1
+        return {'pending': by_target, **self.stats}
+
+    async def close(self, drain_timeout=0.0):
+        """停止投递；drain_timeout > 0 时先尽量把积压的请求发完，未送达的留在磁盘上下次回放"""
+        if drain_timeout > 0 and self._idle is not None and self._entries:
+            try:
+                await asyncio.wait_for(self._idle.wait(), drain_timeout)
+            except asyncio.TimeoutError:
+                logger.info(f"[{self.name}] 📮 仍有 {len(self._entries)} 条投递未送达，下次启动时重试")
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+        self._wakeups.clear()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
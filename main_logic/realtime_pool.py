@@ -0,0 +1,227 @@
+"""
+上游 Realtime WebSocket 连接池
+OmniRealtimeClient 每次 connect() 都要重新走一遍 TCP + TLS + WebSocket 握手与鉴权，
+会话启动要等这段时间。用户表现出语音对话意图（点击麦克风、开始语音会话）时，连接池为该上游
+（url + api_key）预先建立一条连接，connect() 时直接租用。
+
+- 只在语音意图出现时预连接：纯文本用户、只打开页面的用户不会建立上游 Realtime 会话
+- 池中只放从未使用过的新连接；租出的连接归会话所有，关闭后不回收（上游会话带有对话状态）
+- 租出后不补充；同一上游还有租出且未关闭的连接（语音会话进行中）时也不预连接，
+  不会在整个语音会话期间额外占用一条上游会话
+- 预连接在 REALTIME_POOL_PREWARM_TTL 秒内没有被租用就关闭，不再补充
+- 不按固定间隔替换空闲连接：上游关闭空闲预连接时记录其存活时间，作为该上游实际的空闲超时，
+  之后预连接存活到该时间的 REALTIME_POOL_REFRESH_MARGIN 倍时提前替换（仍限于 TTL 之内）；
+  尚未观测到时保留到上游关闭或 TTL 结束
+- 会话配置（instructions 含记忆上下文，每次不同）仍由 connect() 在租到连接后发送
+- 统计握手耗时与预热命中节省的时间
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from collections import deque
+
+import websockets
+from websockets.protocol import State
+
+logger = logging.getLogger(__name__)
+
+# 每个上游保持的预连接数
+REALTIME_POOL_SIZE = 1
+# 语音意图出现后预连接的保留时间（秒），期间没有开始语音会话则关闭、不再补充
+REALTIME_POOL_PREWARM_TTL = 120
+# 预连接存活到上游空闲超时的该比例时提前替换
+REALTIME_POOL_REFRESH_MARGIN = 0.8
+# 后台检查间隔（秒）
+REALTIME_POOL_CHECK_INTERVAL = 10
+# 握手耗时统计保留的样本数
+REALTIME_POOL_METRICS_WINDOW = 64
+
+
+class RealtimeConnectionPool:
+    """所有方法在主事件循环中调用"""
+
+    def __init__(self, size=REALTIME_POOL_SIZE, prewarm_ttl=REALTIME_POOL_PREWARM_TTL):
+        self.size = size
+        self.prewarm_ttl = prewarm_ttl
+        self._idle = {}  # key -> deque[(ws, opened_at)]
+        self._targets = {}  # key -> (url, headers)，仅在预连接有效期内
+        self._prewarm_until = {}  # key -> monotonic
+        self._leased = {}  # key -> [ws]，租出的连接，关闭后剔除
+        self._idle_timeouts = {}  # key -> 观测到的上游空闲超时（秒）
+        self._filling = {}  # key -> asyncio.Task
+        self._maintainer = None
+        self._handshake_ms = deque(maxlen=REALTIME_POOL_METRICS_WINDOW)
+        self.stats = {'warm_hits': 0, 'cold_connects': 0, 'prewarmed': 0, 'refreshed': 0,
+                      'expired': 0, 'skipped_in_session': 0, 'failed': 0, 'saved_ms': 0.0}
+
+    @staticmethod
+    def make_key(url, headers):
+        authorization = (headers or {}).get('Authorization', '')
+        return url, hashlib.sha1(authorization.encode('utf-8')).hexdigest()[:8]
+
+    async def _open(self, url, headers):
+        started = time.monotonic()
+        ws = await websockets.connect(url, additional_headers=headers)
+        self._handshake_ms.append((time.monotonic() - started) * 1000)
+        return ws
+
+    @staticmethod
+    def _is_usable(ws):
+        return ws.state is State.OPEN
+
+    @staticmethod
+    def _discard(ws):
+        asyncio.create_task(ws.close())
+
+    def _avg_handshake_ms(self):
+        if not self._handshake_ms:
+            return 0.0
+        return sum(self._handshake_ms) / len(self._handshake_ms)
+
+    def _in_session(self, key):
+        """该上游是否还有租出且未关闭的连接"""
+        leased = [ws for ws in self._leased.get(key, ()) if self._is_usable(ws)]
+        if leased:
+            self._leased[key] = leased
+        else:
+            self._leased.pop(key, None)
+        return bool(leased)
+
+    def _is_fresh(self, key, opened_at, now):
+        idle_timeout = self._idle_timeouts.get(key)
+        return idle_timeout is None or now - opened_at < idle_timeout * REALTIME_POOL_REFRESH_MARGIN
+
+    def _stop_prewarm(self, key):
+        self._targets.pop(key, None)
+        self._prewarm_until.pop(key, None)
+        for ws, _ in self._idle.pop(key, ()):
+            self._discard(ws)
+
+    async def lease(self, url, headers):
+        """取得一条新的上游连接：优先使用预连接，没有则当场建立。租出后不补充。"""
+        key = self.make_key(url, headers)
+        idle = self._idle.get(key)
+        now = time.monotonic()
+        ws = None
+        while idle:
+            candidate, opened_at = idle.popleft()
+            if self._is_usable(candidate) and self._is_fresh(key, opened_at, now):
+                ws = candidate
+                break
+            self._discard(candidate)
+        # 语音意图已经兑现，剩余的预连接与补充一并停止
+        self._stop_prewarm(key)
+        if ws is not None:
+            saved = self._avg_handshake_ms()
+            self.stats['warm_hits'] += 1
+            self.stats['saved_ms'] += saved
+            logger.info(f"⚡ Realtime连接池: 复用预连接（省去约 {saved:.0f}ms 握手）")
+        else:
+            self.stats['cold_connects'] += 1
+            ws = await self._open(url, headers)
+        self._leased.setdefault(key, []).append(ws)
+        return ws
+
+    def prewarm(self, url, headers):
+        """用户表现出语音对话意图时调用：预先为该上游建立连接（不等待完成）"""
+        key = self.make_key(url, headers)
+        if self._in_session(key):
+            self.stats['skipped_in_session'] += 1
+            return
+        self._targets[key] = (url, headers)
+        self._prewarm_until[key] = time.monotonic() + self.prewarm_ttl
+        self._schedule_fill(key)
+
+    def _schedule_fill(self, key):
+        task = self._filling.get(key)
+        if task is None or task.done():
+            self._filling[key] = asyncio.create_task(self._fill(key))
+        if self._maintainer is None or self._maintainer.done():
+            self._maintainer = asyncio.create_task(self._maintain())
+
+    async def _fill(self, key):
+        idle = self._idle.setdefault(key, deque())
+        while key in self._targets and len(idle) < self.size and not self._in_session(key):
+            url, headers = self._targets[key]
+            try:
+                ws = await self._open(url, headers)
+            except Exception as e:
+                self.stats['failed'] += 1
+                logger.warning(f"⚠️ Realtime连接池: 预连接失败，等待下次补充: {e}")
+                return
+            if key not in self._targets:
+                # 建立期间已被租用或预连接已过期
+                self._discard(ws)
+                return
+            idle = self._idle.setdefault(key, deque())
+            idle.append((ws, time.monotonic()))
+            self.stats['prewarmed'] += 1
+
+    async def _maintain(self):
+        while self._targets:
+            await asyncio.sleep(REALTIME_POOL_CHECK_INTERVAL)
+            now = time.monotonic()
+            for key in list(self._targets):
+                keep = deque()
+                for ws, opened_at in self._idle.get(key, ()):
+                    if not self._is_usable(ws):
+                        # 上游关闭了空闲连接：记下实际的空闲超时，之后赶在它之前替换
+                        observed = now - opened_at
+                        previous = self._idle_timeouts.get(key)
+                        self._idle_timeouts[key] = observed if previous is None else min(previous, observed)
+                        logger.info(f"Realtime连接池: {key[0]} 的空闲连接约 {observed:.0f}s 后被上游关闭")
+                        continue
+                    if not self._is_fresh(key, opened_at, now):
+                        self.stats['refreshed'] += 1
+                        self._discard(ws)
+                        continue
+                    keep.append((ws, opened_at))
+                self._idle[key] = keep
+                if now >= self._prewarm_until.get(key, 0):
+                    # 语音意图过期：关掉剩余连接，不再补充
+                    self.stats['expired'] += 1
+                    self._stop_prewarm(key)
+                    logger.info(f"Realtime连接池: {key[0]} 的预连接 {self.prewarm_ttl}s 内未被使用，停止预连接")
+                elif self._in_session(key):
+                    self._stop_prewarm(key)
+                elif len(keep) < self.size:
+                    self._schedule_fill(key)
+
+    def snapshot(self):
+        ordered = sorted(self._handshake_ms)
+        return {
+            'idle': {key[0]: len(idle) for key, idle in self._idle.items()},
+            'leased': {key[0]: len(leased) for key, leased in self._leased.items()},
+            'observed_idle_timeout_s': {key[0]: round(value, 1) for key, value in self._idle_timeouts.items()},
+            'handshake_ms': {
+                'count': len(ordered),
+                'p50': round(ordered[len(ordered) // 2], 1) if ordered else None,
+                'max': round(ordered[-1], 1) if ordered else None,
+            },
+            **{k: round(v, 1) if isinstance(v, float) else v for k, v in self.stats.items()},
+        }
+
+    async def close(self):
+        for task in list(self._filling.values()) + [self._maintainer]:
+            if task is not None and not task.done():
+                task.cancel()
+        for idle in self._idle.values():
+            for ws, _ in idle:
+                try:
+                    await ws.close()
+                except Exception:
+                    pass
+        self._idle.clear()
+        self._targets.clear()
+        self._prewarm_until.clear()
+
+
+_realtime_pool = None
+
+
+def get_realtime_pool():
+    global _realtime_pool
+    if _realtime_pool is None:
+        _realtime_pool = RealtimeConnectionPool()
+    return _realtime_pool
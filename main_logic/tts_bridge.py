@@ -0,0 +1,255 @@
+"""
+TTS 响应桥接模块
+把 TTS 子进程写入 multiprocessing 队列的音频事件驱动地转交给主进程的事件循环，替代 10ms 轮询：
+
+- 后台线程阻塞在 MPQueue.get() 上，收到数据后通过 call_soon_threadsafe 唤醒事件循环，
+  空闲时不占 CPU，也没有轮询带来的抖动（跨平台：Windows 的 Proactor 循环不支持 add_reader）
+- 消费端把当前已到达的小 chunk 合并成不超过 frame_bytes 的帧再发送，不为凑帧额外等待
+- 子进程端用 TimestampedQueue 包装响应队列，主进程据此统计每个 chunk 的排队延迟与首包延迟；
+  时间戳使用系统范围的 time.monotonic()，并附带 worker 输出该 chunk 时给出的 speech_id
+- 打断时 clear() 把被打断回复的 speech_id 记为过期：已经通过 call_soon_threadsafe 排队、
+  或之后才从子进程到达的该回复的 chunk 都在消费端丢弃
+"""
+import asyncio
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# 合并后单帧音频的目标大小（48kHz PCM16 下 9600 字节 = 100ms）
+TTS_FRAME_BYTES = 9600
+# 延迟统计保留的样本数
+TTS_METRICS_WINDOW = 512
+# 记住的已打断（过期）speech_id 数
+TTS_STALE_SPEECH_IDS = 32
+
+READY_SIGNAL = "__ready__"
+STOP_SIGNAL = "__bridge_stop__"
+
+
+class TimestampedQueue:
+    """
+    TTS 子进程使用的响应队列包装：put 时附带发送时间戳与该 chunk 所属的 speech_id。
+    speech_id 由 worker 的输出端在发出音频时给出（就绪信号等非音频消息为 None），
+    异步 worker 在下一条请求到达后才发出的旧回复尾音仍归属原来的回复。
+    """
+
+    def __init__(self, mp_queue):
+        self._queue = mp_queue
+
+    def put(self, item, *args, speech_id=None, **kwargs):
+        self._queue.put((time.monotonic(), speech_id, item), *args, **kwargs)
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class TTSLatencyMetrics:
+    """
+    TTS 延迟统计（毫秒）：
+    - chunk_latency: chunk 从 TTS 子进程发出到写入前端 WebSocket 的时间
+    - first_audio: 一轮回复的第一段文本送入 TTS 到第一帧音频发往前端的时间（time-to-first-audio）
+    """
+
+    def __init__(self, window=TTS_METRICS_WINDOW):
+        self.chunk_latency = deque(maxlen=window)
+        self.first_audio = deque(maxlen=window)
+        self.frames_sent = 0
+        self.chunks_sent = 0
+        self.bytes_sent = 0
+        self._speech_id = None
+        self._request_time = None
+
+    def mark_request(self, speech_id):
+        """一轮回复的文本开始送入 TTS 时调用；同一 speech_id 只记录第一次"""
+        if speech_id != self._speech_id:
+            self._speech_id = speech_id
+            self._request_time = time.monotonic()
+
+    def cancel_request(self):
+        """回复被打断时调用，避免把下一轮的音频计入本轮首包延迟"""
+        self._request_time = None
+
+    def record_frame(self, sent_at, chunk_timestamps, size):
+        self.frames_sent += 1
+        self.chunks_sent += len(chunk_timestamps)
+        self.bytes_sent += size
+        for ts in chunk_timestamps:
+            if ts is not None:
+                self.chunk_latency.append((sent_at - ts) * 1000)
+        if self._request_time is not None:
+            self.first_audio.append((sent_at - self._request_time) * 1000)
+            self._request_time = None
+
+    @staticmethod
+    def _summary(values):
+        ordered = sorted(values)
+        return {
+            'count': len(ordered),
+            'p50': _percentile(ordered, 0.5),
+            'p95': _percentile(ordered, 0.95),
+            'max': ordered[-1] if ordered else None,
+        }
+
+    def snapshot(self):
+        return {
+            'first_audio_ms': self._summary(self.first_audio),
+            'chunk_latency_ms': self._summary(self.chunk_latency),
+            'frames_sent': self.frames_sent,
+            'chunks_sent': self.chunks_sent,
+            'bytes_sent': self.bytes_sent,
+        }
+
+
+class TTSResponseBridge:
+    """
+    一个 TTS 子进程响应队列对应一个 bridge。必须在事件循环中调用 start()。
+
+    用法：
+        bridge = TTSResponseBridge(response_queue, metrics)
+        bridge.start()
+        ok = await bridge.wait_ready(timeout=8.0)
+        async for frame, timestamps in bridge.frames():
+            ...
+    """
+
+    def __init__(self, response_queue, metrics=None, frame_bytes=TTS_FRAME_BYTES):
+        self.response_queue = response_queue
+        self.metrics = metrics or TTSLatencyMetrics()
+        self.frame_bytes = frame_bytes
+        self._pending = deque()  # [(worker_timestamp, speech_id, bytes), ...]
+        self._stale_speech_ids = deque(maxlen=TTS_STALE_SPEECH_IDS)  # 已被打断的回复，其音频一律丢弃
+        self.dropped_chunks = 0
+        self.frame_speech_id = None  # 最近一次产出的帧所属的 speech_id
+        self._data_event = asyncio.Event()
+        self._loop = None
+        self._ready = None
+        self._thread = None
+        self._closed = False
+        # 队列可能随 TTS 进程被后续会话复用，停止信号带上本实例的标识
+        self._stop_token = (STOP_SIGNAL, id(self))
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._ready = self._loop.create_future()
+        self._thread = threading.Thread(target=self._reader, name="tts-response-bridge", daemon=True)
+        self._thread.start()
+
+    def _reader(self):
+        while not self._closed:
+            try:
+                # 超时只用于检查关闭标志，不影响数据到达时的唤醒
+                item = self.response_queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError, ValueError):
+                break
+            if isinstance(item, tuple) and len(item) == 2 and item[0] == STOP_SIGNAL:
+                if item == self._stop_token:
+                    break
+                continue  # 之前的 bridge 遗留的停止信号
+            try:
+                self._loop.call_soon_threadsafe(self._dispatch, item)
+            except RuntimeError:
+                # 事件循环已关闭
+                break
+
+    def _dispatch(self, item):
+        # 子进程经 TimestampedQueue 发送 (timestamp, speech_id, payload)；兼容未包装的直接 put
+        if isinstance(item, tuple) and len(item) == 3 and isinstance(item[0], float):
+            timestamp, speech_id, payload = item
+        else:
+            timestamp, speech_id, payload = None, None, item
+
+        if isinstance(payload, tuple) and len(payload) == 2 and payload[0] == READY_SIGNAL:
+            if not self._ready.done():
+                self._ready.set_result(bool(payload[1]))
+            return
+        if not payload:
+            return
+        if speech_id is not None and speech_id in self._stale_speech_ids:
+            # 被打断的回复在 clear() 之后才到达的尾音
+            self.dropped_chunks += 1
+            return
+        self._pending.append((timestamp, speech_id, payload))
+        self._data_event.set()
+
+    async def wait_ready(self, timeout):
+        """等待子进程的就绪信号；返回 True/False，超时返回 None"""
+        try:
+            return await asyncio.wait_for(asyncio.shield(self._ready), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    @property
+    def ready_state(self):
+        """已收到的就绪信号（True/False），尚未收到时为 None"""
+        if self._ready is None or not self._ready.done():
+            return None
+        return self._ready.result()
+
+    def clear(self, speech_id=None):
+        """
+        丢弃尚未发送的音频（打断时调用）
+        speech_id: 被打断回复的 speech_id；之后到达的、属于该回复的音频也会被丢弃
+        """
+        if speech_id is not None and speech_id not in self._stale_speech_ids:
+            self._stale_speech_ids.append(speech_id)
+        for _, pending_speech_id, _ in self._pending:
+            if pending_speech_id is not None and pending_speech_id not in self._stale_speech_ids:
+                self._stale_speech_ids.append(pending_speech_id)
+        self.dropped_chunks += len(self._pending)
+        self._pending.clear()
+        self._data_event.clear()
+        try:
+            while True:
+                item = self.response_queue.get_nowait()
+                if item == self._stop_token:
+                    # 读线程已退出前的停止信号不能丢，放回去
+                    self.response_queue.put(item)
+                    break
+        except (queue.Empty, EOFError, OSError, ValueError):
+            pass
+
+    def _next_frame(self):
+        timestamp, speech_id, data = self._pending.popleft()
+        self.frame_speech_id = speech_id
+        if not self._pending or len(data) >= self.frame_bytes:
+            return data, [timestamp]
+        parts, timestamps, size = [data], [timestamp], len(data)
+        # 不把不同 speech_id 的音频合并进同一帧
+        while self._pending and self._pending[0][1] == speech_id \
+                and size + len(self._pending[0][2]) <= self.frame_bytes:
+            timestamp, _, data = self._pending.popleft()
+            parts.append(data)
+            timestamps.append(timestamp)
+            size += len(data)
+        return b''.join(parts), timestamps
+
+    async def frames(self):
+        """异步迭代合并后的音频帧：(frame_bytes, [各 chunk 的子进程时间戳])"""
+        while not self._closed:
+            await self._data_event.wait()
+            if self._closed:
+                # close() 唤醒了等待中的消费者，迭代随之结束
+                return
+            self._data_event.clear()
+            while self._pending:
+                yield self._next_frame()
+
+    def close(self):
+        self._closed = True
+        self._pending.clear()
+        self._data_event.set()  # 唤醒阻塞在 frames() 中的消费者
+        try:
+            # 唤醒阻塞在 get() 上的读线程
+            self.response_queue.put(self._stop_token)
+        except (OSError, ValueError):
+            pass
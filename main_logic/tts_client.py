@@ -17,8 +17,333 @@ import io
 import wave
 import aiohttp
 from functools import partial
+from utils.frontend_utils import split_paragraph
 logger = logging.getLogger(__name__)
 
+# TTS 输出到前端的采样率
+TTS_OUTPUT_SAMPLE_RATE = 48000
+# 输出级每处理多少秒音频记录一次实时率
+TTS_RTF_LOG_INTERVAL = 60.0
+# 请求队列中的丢弃信号 (TTS_DISCARD_SIGNAL, None)：立即停止当前合成并丢弃未合成的文本，
+# 与 (None, None)（本轮文本结束，把剩余文本合成完）不同
+TTS_DISCARD_SIGNAL = "__discard__"
+# 实时 TTS worker 预先握手的备用上游连接最长保留时间（秒），之后关闭，下一轮回复取用时再握手
+TTS_STANDBY_MAX_AGE = 240
+# 备用连接失效/过期检查间隔（秒）
+TTS_STANDBY_CHECK_INTERVAL = 30
+
+
+class TTSOutputStage:
+    """
+    所有 TTS worker 共用的输出级：上游 PCM → 48kHz PCM16 字节。
+
+    - 每个 speech_id（或其他流标识，如 CogTTS 的分句）一个带状态的 soxr.ResampleStream，
+      chunk 之间无接缝；替代 np.repeat 的采样点复制（会产生混叠）和逐 chunk 一次性 soxr.resample
+    - 直接在 int16 上重采样（实测比 float32 往返快一倍）；float32 输入先写入预分配缓冲区再转换
+    - frame_bytes > 0 时按固定帧长输出，不足一帧的部分留到下次或 finish()
+    - 统计处理耗时与音频时长之比（实时率 RTF）
+
+    emit(bytes, speech_id=...) 输出音频，speech_id 为产生这段音频时的当前 speech_id，
+    由输出端打标签，而不是按请求队列最近取出的请求推断。
+    """
+
+    def __init__(self, emit=None, output_rate=TTS_OUTPUT_SAMPLE_RATE, frame_bytes=0, name='TTS'):
+        self.emit = emit
+        self.output_rate = output_rate
+        self.frame_bytes = frame_bytes
+        self.name = name
+        self.speech_id = None
+        self._resamplers = {}  # 流标识 -> (输入采样率, soxr.ResampleStream)
+        self._float_buffer = np.empty(0, dtype=np.float32)
+        self._int16_buffer = np.empty(0, dtype=np.int16)
+        self._pending = bytearray()
+        self._audio_seconds = 0.0
+        self._cpu_seconds = 0.0
+        self._logged_at = 0.0
+
+    def begin(self, speech_id):
+        """新的一轮回复：丢弃上一轮的重采样状态和未凑满的帧"""
+        self.speech_id = speech_id
+        self._resamplers.clear()
+        self._pending.clear()
+
+    def _to_int16(self, pcm):
+        if isinstance(pcm, np.ndarray):
+            if pcm.dtype == np.int16:
+                return pcm
+            n = len(pcm)
+            if len(self._int16_buffer) < n:
+                self._float_buffer = np.empty(n, dtype=np.float32)
+                self._int16_buffer = np.empty(n, dtype=np.int16)
+            scaled = self._float_buffer[:n]
+            out = self._int16_buffer[:n]
+            # float32 [-1, 1] → int16，在预分配缓冲区中缩放与截断，不产生临时数组
+            np.multiply(pcm, 32768.0, out=scaled)
+            np.clip(scaled, -32768, 32767, out=scaled)
+            np.copyto(out, scaled, casting='unsafe')
+            return out
+        return np.frombuffer(pcm, dtype=np.int16)
+
+    def convert(self, pcm, sample_rate, stream=None, last=False):
+        """
+        重采样一段音频并返回 48kHz PCM16 字节（不分帧、不调用 emit）。
+        stream 默认为当前 speech_id；last=True 时冲刷该流的重采样器尾部并释放它。
+        """
+        start = time.perf_counter()
+        key = self.speech_id if stream is None else stream
+        audio = self._to_int16(pcm)
+        if sample_rate != self.output_rate:
+            entry = self._resamplers.get(key)
+            if entry is None or entry[0] != sample_rate:
+                entry = self._resamplers[key] = (
+                    sample_rate,
+                    soxr.ResampleStream(sample_rate, self.output_rate, 1, dtype='int16', quality='HQ'),
+                )
+            audio = entry[1].resample_chunk(audio, last=last)
+        if last:
+            self._resamplers.pop(key, None)
+        data = audio.tobytes()
+        self._cpu_seconds += time.perf_counter() - start
+        self._audio_seconds += len(audio) / self.output_rate
+        if self._audio_seconds - self._logged_at >= TTS_RTF_LOG_INTERVAL:
+            self._logged_at = self._audio_seconds
+            logger.info(f"🔊 {self.name} 输出级: 已处理 {self._audio_seconds:.0f}s 音频，RTF={self.real_time_factor:.4f}")
+        return data
+
+    def drain(self, stream=None):
+        """返回某个流重采样器中剩余的尾部音频并释放该流"""
+        key = self.speech_id if stream is None else stream
+        entry = self._resamplers.get(key)
+        if entry is None:
+            return b''
+        return self.convert(np.empty(0, dtype=np.int16), entry[0], stream=key, last=True)
+
+    def process(self, pcm, sample_rate):
+        """重采样当前 speech_id 的音频并通过 emit 输出（按需分帧）"""
+        self._output(self.convert(pcm, sample_rate))
+
+    def finish(self):
+        """一轮回复结束：冲刷重采样器尾部与不足一帧的剩余音频"""
+        self._output(self.drain())
+        if self._pending:
+            self.emit(bytes(self._pending), speech_id=self.speech_id)
+            self._pending.clear()
+
+    def _output(self, data):
+        if not data:
+            return
+        if self.frame_bytes <= 0:
+            self.emit(data, speech_id=self.speech_id)
+            return
+        self._pending += data
+        frame_bytes = self.frame_bytes
+        if len(self._pending) < frame_bytes:
+            return
+        usable = len(self._pending) - len(self._pending) % frame_bytes
+        view = memoryview(self._pending)
+        for offset in range(0, usable, frame_bytes):
+            self.emit(bytes(view[offset:offset + frame_bytes]), speech_id=self.speech_id)
+        view.release()
+        del self._pending[:usable]
+
+    @property
+    def real_time_factor(self):
+        """处理耗时 / 音频时长；越小越好"""
+        if self._audio_seconds == 0:
+            return 0.0
+        return self._cpu_seconds / self._audio_seconds
+
+    def get_stats(self):
+        return {
+            'audio_seconds': round(self._audio_seconds, 2),
+            'cpu_seconds': round(self._cpu_seconds, 4),
+            'real_time_factor': round(self.real_time_factor, 5),
+        }
+
+
+# 分句流水线：同时合成的句子数上限
+TTS_SEGMENT_CONCURRENCY = 2
+# 单次合成请求的最大字符数（CogTTS 上限为 1024）
+TTS_SEGMENT_MAX_CHARS = 1024
+
+
+class SentencePipeline:
+    """
+    分句流水线：把只接受完整文本的（请求/响应式）TTS 后端包装成流式输入。
+
+    - 文本增量到达时用 split_paragraph 切出已经结束的句子，立即提交合成，不必等整段回复结束
+    - 第一句允许在逗号处切分，尽早出声；之后按整句切分，保证韵律
+    - 最多 max_concurrency 句同时合成，音频按句子顺序重新排序后输出；
+      正在播放的那一句边合成边输出，后面的句子先缓存
+    - speech_id 变化（被打断）时取消旧回复尚未完成的合成
+
+    synthesize(text, first) 为异步生成器，逐块 yield 音频字节，first 表示是否为本轮回复的第一句；
+    emit(bytes, speech_id=...) 输出音频，speech_id 为该句所属回复的 speech_id。
+    """
+
+    def __init__(self, synthesize, emit, max_concurrency=TTS_SEGMENT_CONCURRENCY, max_chars=TTS_SEGMENT_MAX_CHARS):
+        self.synthesize = synthesize
+        self.emit = emit
+        self.max_chars = max_chars
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.speech_id = None
+        self._buffer = ''
+        self._segment_count = 0
+        self._producers = set()
+        self._segments = asyncio.Queue()  # 按句子顺序排列的各句音频队列
+        self._emitter = asyncio.create_task(self._emit_loop(self._segments, None))
+
+    def feed(self, speech_id, text):
+        """送入一段增量文本"""
+        if speech_id != self.speech_id:
+            self.reset(speech_id)
+        if not text:
+            return
+        self._buffer += text
+        ready, self._buffer = split_paragraph(self._buffer, comma_split=self._segment_count == 0)
+        if ready:
+            self._submit(ready)
+
+    def flush(self):
+        """本轮文本结束：把剩余文本作为最后一句提交"""
+        rest, self._buffer = self._buffer, ''
+        if rest.strip():
+            self._submit(rest)
+
+    def reset(self, speech_id=None):
+        """丢弃旧回复的文本与尚未输出的音频"""
+        self.speech_id = speech_id
+        self._buffer = ''
+        self._segment_count = 0
+        for task in self._producers:
+            task.cancel()
+        self._producers.clear()
+        self._emitter.cancel()
+        self._segments = asyncio.Queue()
+        self._emitter = asyncio.create_task(self._emit_loop(self._segments, speech_id))
+
+    def _submit(self, text):
+        for start in range(0, len(text), self.max_chars):
+            piece = text[start:start + self.max_chars]
+            if not piece.strip():
+                continue
+            audio_queue = asyncio.Queue()
+            self._segments.put_nowait(audio_queue)
+            task = asyncio.create_task(self._produce(piece, self._segment_count == 0, audio_queue))
+            self._producers.add(task)
+            task.add_done_callback(self._producers.discard)
+            self._segment_count += 1
+
+    async def _produce(self, text, first, audio_queue):
+        try:
+            async with self._semaphore:
+                async for chunk in self.synthesize(text, first):
+                    if chunk:
+                        audio_queue.put_nowait(chunk)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"分句合成失败: {e}")
+        finally:
+            audio_queue.put_nowait(None)
+
+    async def _emit_loop(self, segments, speech_id):
+        while True:
+            audio_queue = await segments.get()
+            while True:
+                chunk = await audio_queue.get()
+                if chunk is None:
+                    break
+                self.emit(chunk, speech_id=speech_id)
+
+    async def close(self):
+        self.reset()
+        self._emitter.cancel()
+
+
+class StandbyConnection:
+    """
+    实时 TTS worker 的备用上游连接。
+
+    这类 worker 每轮回复使用一条新的 WebSocket 会话。空闲时（启动后、一轮回复结束或被丢弃后）
+    prepare() 在后台提前建立并握手好下一条，新一轮回复 take() 直接取用，不必等握手；
+    进程池中空闲的 worker 因此也持有一条可用的上游连接。
+
+    - 最多持有一条备用连接，正在回复时不额外占用上游会话
+    - 后台每 TTS_STANDBY_CHECK_INTERVAL 秒检查一次：被服务器关闭或持有超过 TTS_STANDBY_MAX_AGE 秒的
+      备用连接直接关闭，不立即重建（空闲的 worker 不反复新建上游会话），下一轮回复取用时再握手
+    - take() 取到的连接已失效时当场重新握手
+
+    open_session() 为协程，返回握手完成的 (ws, 会话信息)，失败时返回 None。
+    """
+
+    def __init__(self, open_session, name='TTS', max_age=TTS_STANDBY_MAX_AGE,
+                 check_interval=TTS_STANDBY_CHECK_INTERVAL):
+        self._open_session = open_session
+        self.name = name
+        self.max_age = max_age
+        self.check_interval = check_interval
+        self._conn = None  # (ws, 会话信息, 建立时间)
+        self._opening = None
+        self._checker = asyncio.create_task(self._check_loop())
+
+    def put(self, ws, info):
+        """交给备用槽一条已握手的连接（如启动时用于发送就绪信号的那条）"""
+        self._conn = (ws, info, time.monotonic())
+
+    def prepare(self):
+        """在后台建立下一条备用连接（已有或正在建立时不重复）"""
+        if self._conn is None and (self._opening is None or self._opening.done()):
+            self._opening = asyncio.create_task(self._open())
+
+    async def _open(self):
+        try:
+            result = await self._open_session()
+        except Exception as e:
+            logger.warning(f"{self.name} 预建上游连接失败: {e}")
+            return
+        if result is not None:
+            self._conn = (result[0], result[1], time.monotonic())
+
+    def _usable(self, conn):
+        ws, _, opened_at = conn
+        return ws.close_code is None and time.monotonic() - opened_at < self.max_age
+
+    async def take(self):
+        """取出一条可用的已握手连接，返回 (ws, 会话信息)；无法建立时返回 None"""
+        if self._opening is not None and not self._opening.done():
+            await asyncio.shield(self._opening)
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            if self._usable(conn):
+                return conn[0], conn[1]
+            await _close_ws(conn[0])
+        return await self._open_session()
+
+    async def _check_loop(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            conn = self._conn
+            if conn is not None and not self._usable(conn):
+                self._conn = None
+                logger.debug(f"{self.name} 备用上游连接已失效或空闲过久，关闭")
+                await _close_ws(conn[0])
+
+    async def close(self):
+        self._checker.cancel()
+        if self._opening is not None and not self._opening.done():
+            self._opening.cancel()
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            await _close_ws(conn[0])
+
+
+async def _close_ws(ws):
+    try:
+        await ws.close()
+    except Exception:
+        pass
+
 
 def step_realtime_tts_worker(request_queue, response_queue, audio_api_key, voice_id, free_mode=False):
     """
@@ -43,129 +368,141 @@ def step_realtime_tts_worker(request_queue, response_queue, audio_api_key, voice
             tts_url = "wss://lanlan.tech/tts"
         else:
             tts_url = "wss://api.stepfun.com/v1/realtime/audio?model=step-tts-2"
+        output = TTSOutputStage(response_queue.put, name='StepFun TTS')
+        headers = {"Authorization": f"Bearer {audio_api_key}"}
         ws = None
         current_speech_id = None
         receive_task = None
         session_id = None
-        session_ready = asyncio.Event()
         response_done = asyncio.Event()  # 用于标记当前响应是否完成
-        
-        try:
-            # 连接WebSocket
-            headers = {"Authorization": f"Bearer {audio_api_key}"}
-            
-            ws = await websockets.connect(tts_url, additional_headers=headers)
-            
-            # 等待连接成功事件
+        standby = None
+
+        async def open_session():
+            """建立一条上游连接并完成握手（连接 → tts.connection.done → tts.create），返回 (ws, session_id)"""
+            conn = await websockets.connect(tts_url, additional_headers=headers)
+
             async def wait_for_connection():
                 """等待连接成功"""
-                nonlocal session_id
-                try:
-                    async for message in ws:
-                        event = json.loads(message)
-                        event_type = event.get("type")
-                        
-                        if event_type == "tts.connection.done":
-                            session_id = event.get("data", {}).get("session_id")
-                            session_ready.set()
-                            break
-                        elif event_type == "tts.response.error":
-                            logger.error(f"TTS服务器错误: {event}")
-                            break
-                except Exception as e:
-                    logger.error(f"等待连接时出错: {e}")
-            
-            # 等待连接成功
+                async for message in conn:
+                    event = json.loads(message)
+                    event_type = event.get("type")
+                    if event_type == "tts.connection.done":
+                        return event.get("data", {}).get("session_id")
+                    elif event_type == "tts.response.error":
+                        logger.error(f"TTS服务器错误: {event}")
+                        return None
+                return None
+
+            async def wait_for_session_ready():
+                async for message in conn:
+                    event = json.loads(message)
+                    event_type = event.get("type")
+                    if event_type == "tts.response.created":
+                        break
+                    elif event_type == "tts.response.error":
+                        logger.error(f"创建会话错误: {event}")
+                        break
+
             try:
-                await asyncio.wait_for(wait_for_connection(), timeout=5.0)
+                new_session_id = await asyncio.wait_for(wait_for_connection(), timeout=5.0)
+                if not new_session_id:
+                    logger.error("连接未能正确建立")
+                    await _close_ws(conn)
+                    return None
+                # 发送创建会话事件
+                await conn.send(json.dumps({
+                    "type": "tts.create",
+                    "data": {
+                        "session_id": new_session_id,
+                        "voice_id": voice_id,
+                        "response_format": "wav",
+                        "sample_rate": 24000
+                    }
+                }))
+                try:
+                    await asyncio.wait_for(wait_for_session_ready(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    logger.warning("会话创建超时")
             except asyncio.TimeoutError:
                 logger.error("等待连接超时")
+                await _close_ws(conn)
+                return None
+            except Exception:
+                await _close_ws(conn)
+                raise
+            return conn, new_session_id
+
+        async def receive_messages(conn):
+            """接收一轮回复的音频"""
+            try:
+                async for message in conn:
+                    event = json.loads(message)
+                    event_type = event.get("type")
+
+                    if event_type == "tts.response.error":
+                        logger.error(f"TTS错误: {event}")
+                    elif event_type == "tts.response.audio.delta":
+                        try:
+                            # StepFun 返回 BASE64 编码的完整音频（包含 wav header）
+                            audio_b64 = event.get("data", {}).get("audio", "")
+                            if audio_b64:
+                                audio_bytes = base64.b64decode(audio_b64)
+                                # 使用 wave 模块读取 WAV 数据
+                                with io.BytesIO(audio_bytes) as wav_io:
+                                    with wave.open(wav_io, 'rb') as wav_file:
+                                        # 读取音频数据
+                                        pcm_data = wav_file.readframes(wav_file.getnframes())
+                                        sample_rate = wav_file.getframerate()
+
+                                # 流式重采样 24000Hz -> 48000Hz
+                                output.process(pcm_data, sample_rate)
+                        except Exception as e:
+                            logger.error(f"处理音频数据时出错: {e}")
+                    elif event_type in ["tts.response.done", "tts.response.audio.done"]:
+                        # 服务器明确表示音频生成完成，设置完成标志
+                        logger.debug(f"收到响应完成事件: {event_type}")
+                        output.finish()
+                        response_done.set()
+            except websockets.exceptions.ConnectionClosed:
+                pass
+            except Exception as e:
+                logger.error(f"消息接收出错: {e}")
+
+        async def end_reply():
+            """停止接收并关闭本轮回复的连接，空闲时预建下一条"""
+            nonlocal ws, receive_task, session_id, current_speech_id
+            if receive_task and not receive_task.done():
+                receive_task.cancel()
+                try:
+                    await receive_task
+                except asyncio.CancelledError:
+                    pass
+            receive_task = None
+            if ws:
+                await _close_ws(ws)
+                ws = None
+            session_id = None
+            current_speech_id = None
+            standby.prepare()
+
+        try:
+            # 启动时握手的连接用于判断是否就绪，之后留作第一轮回复的备用连接
+            try:
+                first = await open_session()
+            except Exception as e:
+                logger.error(f"连接StepFun TTS失败: {e}")
+                first = None
+            if first is None:
                 # 发送失败信号
                 response_queue.put(("__ready__", False))
                 return
-            
-            if not session_ready.is_set() or not session_id:
-                logger.error("连接未能正确建立")
-                # 发送失败信号
-                response_queue.put(("__ready__", False))
-                return
-            
-            # 发送创建会话事件
-            create_event = {
-                "type": "tts.create",
-                "data": {
-                    "session_id": session_id,
-                    "voice_id": voice_id,
-                    "response_format": "wav",
-                    "sample_rate": 24000
-                }
-            }
-            await ws.send(json.dumps(create_event))
-            
-            # 等待会话创建成功
-            async def wait_for_session_ready():
-                try:
-                    async for message in ws:
-                        event = json.loads(message)
-                        event_type = event.get("type")
-                        
-                        if event_type == "tts.response.created":
-                            break
-                        elif event_type == "tts.response.error":
-                            logger.error(f"创建会话错误: {event}")
-                            break
-                except Exception as e:
-                    logger.error(f"等待会话创建时出错: {e}")
-            
-            try:
-                await asyncio.wait_for(wait_for_session_ready(), timeout=1.0)
-            except asyncio.TimeoutError:
-                logger.warning("会话创建超时")
-            
+            standby = StandbyConnection(open_session, name='StepFun TTS')
+            standby.put(*first)
+
             # 发送就绪信号，通知主进程 TTS 已经可以使用
             logger.info("StepFun TTS 已就绪，发送就绪信号")
             response_queue.put(("__ready__", True))
-            
-            # 初始接收任务
-            async def receive_messages_initial():
-                """初始接收任务"""
-                try:
-                    async for message in ws:
-                        event = json.loads(message)
-                        event_type = event.get("type")
-                        
-                        if event_type == "tts.response.error":
-                            logger.error(f"TTS错误: {event}")
-                        elif event_type == "tts.response.audio.delta":
-                            try:
-                                # StepFun 返回 BASE64 编码的完整音频（包含 wav header）
-                                audio_b64 = event.get("data", {}).get("audio", "")
-                                if audio_b64:
-                                    audio_bytes = base64.b64decode(audio_b64)
-                                    # 使用 wave 模块读取 WAV 数据
-                                    with io.BytesIO(audio_bytes) as wav_io:
-                                        with wave.open(wav_io, 'rb') as wav_file:
-                                            # 读取音频数据
-                                            pcm_data = wav_file.readframes(wav_file.getnframes())
-                                    
-                                    # 转换为 numpy 数组
-                                    audio_array = np.frombuffer(pcm_data, dtype=np.int16)
-                                    # 重采样 24000Hz -> 48000Hz
-                                    resampled = np.repeat(audio_array, 48000 // 24000)
-                                    response_queue.put(resampled.tobytes())
-                            except Exception as e:
-                                logger.error(f"处理音频数据时出错: {e}")
-                        elif event_type in ["tts.response.done", "tts.response.audio.done"]:
-                            # 服务器明确表示音频生成完成，设置完成标志
-                            logger.debug(f"收到响应完成事件: {event_type}")
-                            response_done.set()
-                except websockets.exceptions.ConnectionClosed:
-                    pass
-                except Exception as e:
-                    logger.error(f"消息接收出错: {e}")
-            
-            receive_task = asyncio.create_task(receive_messages_initial())
-            
+
             # 主循环：处理请求队列
             loop = asyncio.get_running_loop()
             while True:
@@ -173,7 +510,13 @@ def step_realtime_tts_worker(request_queue, response_queue, audio_api_key, voice
                     sid, tts_text = await loop.run_in_executor(None, request_queue.get)
                 except Exception:
                     break
-                
+
+                if sid == TTS_DISCARD_SIGNAL:
+                    # 丢弃当前合成：关闭本轮连接，并预建下一条备用连接，空闲的进程仍持有可用的上游连接
+                    await end_reply()
+                    output.begin(None)
+                    continue
+
                 if sid is None:
                     # 提交缓冲区完成当前合成
                     if ws and session_id and current_speech_id is not None:
@@ -190,133 +533,38 @@ def step_realtime_tts_worker(request_queue, response_queue, audio_api_key, voice
                                 logger.debug("音频生成完成，主动关闭连接")
                             except asyncio.TimeoutError:
                                 logger.warning("等待响应完成超时（30秒），强制关闭连接")
-                            
-                            # 主动关闭连接，避免连接一直保持到超时
-                            if ws:
-                                try:
-                                    await ws.close()
-                                except:
-                                    pass
-                                ws = None
-                            if receive_task and not receive_task.done():
-                                receive_task.cancel()
-                                try:
-                                    await receive_task
-                                except asyncio.CancelledError:
-                                    pass
-                                receive_task = None
-                            session_id = None
-                            session_ready.clear()
-                            current_speech_id = None  # 清空ID以便下次重连
                         except Exception as e:
                             logger.error(f"完成生成失败: {e}")
+                        # 主动关闭连接，避免连接一直保持到超时
+                        await end_reply()
                     continue
-                
-                # 新的语音ID，重新建立连接
+
+                # 新的语音ID，取用已握手的备用连接
                 if current_speech_id != sid:
+                    # 先停掉旧回复的接收任务再切换 speech_id，旧音频不会被记到新一轮名下
+                    await end_reply()
                     current_speech_id = sid
                     response_done.clear()
-                    if ws:
-                        try:
-                            await ws.close()
-                        except:
-                            pass
-                    if receive_task and not receive_task.done():
-                        receive_task.cancel()
-                        try:
-                            await receive_task
-                        except asyncio.CancelledError:
-                            pass
-                    
-                    # 建立新连接
+                    output.begin(sid)
+
                     try:
-                        ws = await websockets.connect(tts_url, additional_headers=headers)
-                        
-                        # 等待连接成功
-                        session_id = None
-                        session_ready.clear()
-                        
-                        async def wait_conn():
-                            nonlocal session_id
-                            try:
-                                async for message in ws:
-                                    event = json.loads(message)
-                                    if event.get("type") == "tts.connection.done":
-                                        session_id = event.get("data", {}).get("session_id")
-                                        session_ready.set()
-                                        break
-                            except Exception:
-                                pass
-                        
-                        try:
-                            await asyncio.wait_for(wait_conn(), timeout=1.0)
-                        except asyncio.TimeoutError:
-                            logger.warning("新连接超时")
-                            continue
-                        
-                        if not session_id:
-                            continue
-                        
-                        # 创建会话
-                        await ws.send(json.dumps({
-                            "type": "tts.create",
-                            "data": {
-                                "session_id": session_id,
-                                "voice_id": voice_id,
-                                "response_format": "wav",
-                                "sample_rate": 24000
-                            }
-                        }))
-                        
-                        # 启动新的接收任务
-                        async def receive_messages():
-                            try:
-                                async for message in ws:
-                                    event = json.loads(message)
-                                    event_type = event.get("type")
-                                    
-                                    if event_type == "tts.response.error":
-                                        logger.error(f"TTS错误: {event}")
-                                    elif event_type == "tts.response.audio.delta":
-                                        try:
-                                            audio_b64 = event.get("data", {}).get("audio", "")
-                                            if audio_b64:
-                                                audio_bytes = base64.b64decode(audio_b64)
-                                                # 使用 wave 模块读取 WAV 数据
-                                                with io.BytesIO(audio_bytes) as wav_io:
-                                                    with wave.open(wav_io, 'rb') as wav_file:
-                                                        # 读取音频数据
-                                                        pcm_data = wav_file.readframes(wav_file.getnframes())
-                                                
-                                                # 转换为 numpy 数组
-                                                audio_array = np.frombuffer(pcm_data, dtype=np.int16)
-                                                # 重采样 24000Hz -> 48000Hz
-                                                resampled = np.repeat(audio_array, 48000 // 24000)
-                                                response_queue.put(resampled.tobytes())
-                                        except Exception as e:
-                                            logger.error(f"处理音频数据时出错: {e}")
-                                    elif event_type in ["tts.response.done", "tts.response.audio.done"]:
-                                        # 服务器明确表示音频生成完成，设置完成标志
-                                        logger.debug(f"收到响应完成事件: {event_type}")
-                                        response_done.set()
-                            except websockets.exceptions.ConnectionClosed:
-                                pass
-                            except Exception as e:
-                                logger.error(f"消息接收出错: {e}")
-                        
-                        receive_task = asyncio.create_task(receive_messages())
-                        
+                        conn = await standby.take()
                     except Exception as e:
                         logger.error(f"重新建立连接失败: {e}")
+                        conn = None
+                    if conn is None:
                         continue
-                
+                    ws, session_id = conn
+                    # 启动新的接收任务
+                    receive_task = asyncio.create_task(receive_messages(ws))
+
                 # 检查文本有效性
                 if not tts_text or not tts_text.strip():
                     continue
-                
+
                 if not ws or not session_id:
                     continue
-                
+
                 # 发送文本
                 try:
                     text_event = {
@@ -330,12 +578,8 @@ def step_realtime_tts_worker(request_queue, response_queue, audio_api_key, voice
                 except Exception as e:
                     logger.error(f"发送TTS文本失败: {e}")
                     # 连接已关闭，标记为无效以便下次重连
-                    ws = None
-                    session_id = None
-                    current_speech_id = None  # 清空ID以强制下次重连
-                    if receive_task and not receive_task.done():
-                        receive_task.cancel()
-        
+                    await end_reply()
+
         except Exception as e:
             logger.error(f"StepFun实时TTS Worker错误: {e}")
         finally:
@@ -346,12 +590,11 @@ def step_realtime_tts_worker(request_queue, response_queue, audio_api_key, voice
                     await receive_task
                 except asyncio.CancelledError:
                     pass
-            
+
             if ws:
-                try:
-                    await ws.close()
-                except Exception:
-                    pass
+                await _close_ws(ws)
+            if standby is not None:
+                await standby.close()
     
     # 运行异步worker
     try:
@@ -379,17 +622,17 @@ def qwen_realtime_tts_worker(request_queue, response_queue, audio_api_key, voice
     async def async_worker():
         """异步TTS worker主循环"""
         tts_url = "wss://dashscope.aliyuncs.com/api-ws/v1/realtime?model=qwen3-tts-flash-realtime-2025-09-18"
+        output = TTSOutputStage(response_queue.put, name='Qwen TTS')
+        headers = {"Authorization": f"Bearer {audio_api_key}"}
         ws = None
         current_speech_id = None
         receive_task = None
         session_ready = asyncio.Event()
         response_done = asyncio.Event()  # 用于标记当前响应是否完成
-        
-        try:
-            # 连接WebSocket
-            headers = {"Authorization": f"Bearer {audio_api_key}"}
-            
-            # 配置会话消息模板（在重连时复用）
+        standby = None
+
+        async def open_session():
+            """建立一条上游连接并完成会话配置，返回 (ws, None)"""
             # 使用 SERVER_COMMIT 模式：多次 append 文本，最后手动 commit 触发合成
             # 这样可以累积文本，避免"一个字一个字往外蹦"的问题
             config_message = {
@@ -404,85 +647,111 @@ def qwen_realtime_tts_worker(request_queue, response_queue, audio_api_key, voice
                     "bit_depth": 16
                 }
             }
-            
-            ws = await websockets.connect(tts_url, additional_headers=headers)
-            
-            # 等待并处理初始消息
+            conn = await websockets.connect(tts_url, additional_headers=headers)
+
             async def wait_for_session_ready():
                 """等待会话创建确认"""
-                try:
-                    async for message in ws:
-                        event = json.loads(message)
-                        event_type = event.get("type")
-                        
-                        # Qwen TTS API 返回 session.updated 而不是 session.created
-                        if event_type in ["session.created", "session.updated"]:
-                            session_ready.set()
-                            break
-                        elif event_type == "error":
-                            logger.error(f"TTS服务器错误: {event}")
-                            break
-                except Exception as e:
-                    logger.error(f"等待会话就绪时出错: {e}")
-            
-            # 发送配置
-            await ws.send(json.dumps(config_message))
-            
-            # 等待会话就绪（超时5秒）
+                async for message in conn:
+                    event = json.loads(message)
+                    event_type = event.get("type")
+                    # Qwen TTS API 返回 session.updated 而不是 session.created
+                    if event_type in ["session.created", "session.updated"]:
+                        return True
+                    elif event_type == "error":
+                        logger.error(f"TTS服务器错误: {event}")
+                        return False
+                return False
+
             try:
-                await asyncio.wait_for(wait_for_session_ready(), timeout=5.0)
+                # 发送配置
+                await conn.send(json.dumps(config_message))
+                # 等待会话就绪（超时5秒）
+                ready = await asyncio.wait_for(wait_for_session_ready(), timeout=5.0)
             except asyncio.TimeoutError:
                 logger.error("❌ 等待会话就绪超时")
-                response_queue.put(("__ready__", False))
-                return
-            
-            if not session_ready.is_set():
+                ready = False
+            except Exception:
+                await _close_ws(conn)
+                raise
+            if not ready:
                 logger.error("❌ 会话未能正确初始化")
+                await _close_ws(conn)
+                return None
+            return conn, None
+
+        async def receive_messages(conn):
+            """接收一轮回复的音频"""
+            try:
+                async for message in conn:
+                    event = json.loads(message)
+                    event_type = event.get("type")
+
+                    if event_type == "error":
+                        logger.error(f"TTS错误: {event}")
+                    elif event_type == "response.audio.delta":
+                        try:
+                            audio_bytes = base64.b64decode(event.get("delta", ""))
+                            output.process(audio_bytes, 24000)
+                        except Exception as e:
+                            logger.error(f"处理音频数据时出错: {e}")
+                    elif event_type in ["response.done", "response.audio.done", "output.done"]:
+                        # 服务器明确表示音频生成完成，设置完成标志
+                        logger.debug(f"收到响应完成事件: {event_type}")
+                        output.finish()
+                        response_done.set()
+            except websockets.exceptions.ConnectionClosed:
+                pass
+            except Exception as e:
+                logger.error(f"消息接收出错: {e}")
+
+        async def end_reply():
+            """停止接收并关闭本轮回复的连接，空闲时预建下一条"""
+            nonlocal ws, receive_task, current_speech_id
+            if receive_task and not receive_task.done():
+                receive_task.cancel()
+                try:
+                    await receive_task
+                except asyncio.CancelledError:
+                    pass
+            receive_task = None
+            if ws:
+                await _close_ws(ws)
+                ws = None
+            session_ready.clear()
+            current_speech_id = None
+            standby.prepare()
+
+        try:
+            # 启动时握手的连接用于判断是否就绪，之后留作第一轮回复的备用连接
+            try:
+                first = await open_session()
+            except Exception as e:
+                logger.error(f"连接Qwen TTS失败: {e}")
+                first = None
+            if first is None:
                 response_queue.put(("__ready__", False))
                 return
-            
+            standby = StandbyConnection(open_session, name='Qwen TTS')
+            standby.put(*first)
+
             # 发送就绪信号
             logger.info("Qwen TTS 已就绪，发送就绪信号")
             response_queue.put(("__ready__", True))
-            
-            # 初始接收任务（会在每次新 speech_id 时重新创建）
-            async def receive_messages_initial():
-                """初始接收任务"""
-                try:
-                    async for message in ws:
-                        event = json.loads(message)
-                        event_type = event.get("type")
-                        
-                        if event_type == "error":
-                            logger.error(f"TTS错误: {event}")
-                        elif event_type == "response.audio.delta":
-                            try:
-                                audio_bytes = base64.b64decode(event.get("delta", ""))
-                                audio_array = np.frombuffer(audio_bytes, dtype=np.int16)
-                                resampled = np.repeat(audio_array, 2)
-                                response_queue.put(resampled.tobytes())
-                            except Exception as e:
-                                logger.error(f"处理音频数据时出错: {e}")
-                        elif event_type in ["response.done", "response.audio.done", "output.done"]:
-                            # 服务器明确表示音频生成完成，设置完成标志
-                            logger.debug(f"收到响应完成事件: {event_type}")
-                            response_done.set()
-                except websockets.exceptions.ConnectionClosed:
-                    pass
-                except Exception as e:
-                    logger.error(f"消息接收出错: {e}")
-            
-            receive_task = asyncio.create_task(receive_messages_initial())
-            
+
             # 主循环：处理请求队列
             loop = asyncio.get_running_loop()
             while True:
-                # 非阻塞检查队列
                 try:
                     sid, tts_text = await loop.run_in_executor(None, request_queue.get)
                 except Exception:
                     break
-                
+
+                if sid == TTS_DISCARD_SIGNAL:
+                    # 丢弃当前合成：关闭本轮连接，并预建下一条备用连接，空闲的进程仍持有可用的上游连接
+                    await end_reply()
+                    output.begin(None)
+                    continue
+
                 if sid is None:
                     # 提交缓冲区完成当前合成（仅当之前有文本时）
                     if ws and session_ready.is_set() and current_speech_id is not None:
@@ -498,111 +767,39 @@ def qwen_realtime_tts_worker(request_queue, response_queue, audio_api_key, voice
                                 logger.debug("音频生成完成，主动关闭连接")
                             except asyncio.TimeoutError:
                                 logger.warning("等待响应完成超时（30秒），强制关闭连接")
-                            
-                            # 主动关闭连接，避免连接一直保持到超时
-                            if ws:
-                                try:
-                                    await ws.close()
-                                except:
-                                    pass
-                                ws = None
-                            if receive_task and not receive_task.done():
-                                receive_task.cancel()
-                                try:
-                                    await receive_task
-                                except asyncio.CancelledError:
-                                    pass
-                                receive_task = None
-                            session_ready.clear()
-                            current_speech_id = None  # 清空ID以便下次重连
                         except Exception as e:
                             logger.error(f"提交缓冲区失败: {e}")
+                        # 主动关闭连接，避免连接一直保持到超时
+                        await end_reply()
                     continue
-                
-                # 新的语音ID，重新建立连接（类似 speech_synthesis_worker 的逻辑）
-                # 直接关闭旧连接，打断旧语音
+
+                # 新的语音ID，取用已配置好会话的备用连接，直接关闭旧连接，打断旧语音
                 if current_speech_id != sid:
+                    # 先停掉旧回复的接收任务再切换 speech_id，旧音频不会被记到新一轮名下
+                    await end_reply()
                     current_speech_id = sid
                     response_done.clear()
-                    if ws:
-                        try:
-                            await ws.close()
-                        except:
-                            pass
-                    if receive_task and not receive_task.done():
-                        receive_task.cancel()
-                        try:
-                            await receive_task
-                        except asyncio.CancelledError:
-                            pass
-                    
-                    # 建立新连接
+                    output.begin(sid)
+
                     try:
-                        ws = await websockets.connect(tts_url, additional_headers=headers)
-                        await ws.send(json.dumps(config_message))
-                        
-                        # 等待 session.created
-                        session_ready.clear()
-                        
-                        async def wait_ready():
-                            try:
-                                async for message in ws:
-                                    event = json.loads(message)
-                                    event_type = event.get("type")
-                                    # Qwen TTS API 返回 session.updated 而不是 session.created
-                                    if event_type in ["session.created", "session.updated"]:
-                                        session_ready.set()
-                                        break
-                                    elif event_type == "error":
-                                        logger.error(f"等待期间收到错误: {event}")
-                                        break
-                            except Exception as e:
-                                logger.error(f"wait_ready 异常: {e}")
-                        
-                        try:
-                            await asyncio.wait_for(wait_ready(), timeout=2.0)
-                        except asyncio.TimeoutError:
-                            logger.warning("新会话创建超时")
-                        
-                        # 启动新的接收任务
-                        async def receive_messages():
-                            try:
-                                async for message in ws:
-                                    event = json.loads(message)
-                                    event_type = event.get("type")
-                                    
-                                    if event_type == "error":
-                                        logger.error(f"TTS错误: {event}")
-                                    elif event_type == "response.audio.delta":
-                                        try:
-                                            audio_bytes = base64.b64decode(event.get("delta", ""))
-                                            audio_array = np.frombuffer(audio_bytes, dtype=np.int16)
-                                            resampled = np.repeat(audio_array, 2)
-                                            response_queue.put(resampled.tobytes())
-                                        except Exception as e:
-                                            logger.error(f"处理音频数据时出错: {e}")
-                                    elif event_type in ["response.done", "response.audio.done", "output.done"]:
-                                        # 服务器明确表示音频生成完成，设置完成标志
-                                        logger.debug(f"收到响应完成事件: {event_type}")
-                                        response_done.set()
-                            except websockets.exceptions.ConnectionClosed:
-                                pass
-                            except Exception as e:
-                                logger.error(f"消息接收出错: {e}")
-                        
-                        receive_task = asyncio.create_task(receive_messages())
-                        
+                        conn = await standby.take()
                     except Exception as e:
                         logger.error(f"重新建立连接失败: {e}")
+                        conn = None
+                    if conn is None:
                         continue
-                
+                    ws = conn[0]
+                    session_ready.set()
+                    # 启动新的接收任务
+                    receive_task = asyncio.create_task(receive_messages(ws))
+
                 # 检查文本有效性
                 if not tts_text or not tts_text.strip():
                     continue
-                
+
                 if not ws or not session_ready.is_set():
                     continue
-                
+
                 # 追加文本到缓冲区（不立即提交，等待响应完成时的终止信号再 commit）
                 try:
                     await ws.send(json.dumps({
@@ -613,12 +810,8 @@ def qwen_realtime_tts_worker(request_queue, response_queue, audio_api_key, voice
                 except Exception as e:
                     logger.error(f"发送TTS文本失败: {e}")
                     # 连接已关闭，标记为无效以便下次重连
-                    ws = None
-                    current_speech_id = None  # 清空ID以强制下次重连
-                    session_ready.clear()
-                    if receive_task and not receive_task.done():
-                        receive_task.cancel()
-        
+                    await end_reply()
+
         except Exception as e:
             logger.error(f"Qwen实时TTS Worker错误: {e}")
         finally:
@@ -629,12 +822,11 @@ def qwen_realtime_tts_worker(request_queue, response_queue, audio_api_key, voice
                     await receive_task
                 except asyncio.CancelledError:
                     pass
-            
+
             if ws:
-                try:
-                    await ws.close()
-                except Exception:
-                    pass
+                await _close_ws(ws)
+            if standby is not None:
+                await standby.close()
     
     # 运行异步worker
     try:
@@ -663,8 +855,10 @@ def cosyvoice_vc_tts_worker(request_queue, response_queue, audio_api_key, voice_
     response_queue.put(("__ready__", True))
     
     class Callback(ResultCallback):
-        def __init__(self, response_queue):
+        # 每个合成器一个回调，音频按该合成器所属的 speech_id 打标签
+        def __init__(self, response_queue, speech_id):
             self.response_queue = response_queue
+            self.speech_id = speech_id
             
         def on_open(self): 
             pass
@@ -683,9 +877,8 @@ def cosyvoice_vc_tts_worker(request_queue, response_queue, audio_api_key, voice_
             
         def on_data(self, data: bytes) -> None:
             # 直接转发 OGG OPUS 数据到前端解码
-            self.response_queue.put(data)
+            self.response_queue.put(data, speech_id=self.speech_id)
             
-    callback = Callback(response_queue)
     current_speech_id = None
     synthesizer = None
     
@@ -697,6 +890,17 @@ def cosyvoice_vc_tts_worker(request_queue, response_queue, audio_api_key, voice_
 
         sid, tts_text = request_queue.get()
 
+        if sid == TTS_DISCARD_SIGNAL:
+            # 丢弃当前合成，不提交剩余文本
+            if synthesizer is not None:
+                try:
+                    synthesizer.close()
+                except Exception:
+                    pass
+                synthesizer = None
+            current_speech_id = None
+            continue
+
         if sid is None:
             # 停止当前合成
             if synthesizer is not None:
@@ -719,7 +923,7 @@ def cosyvoice_vc_tts_worker(request_queue, response_queue, audio_api_key, voice_
                     voice=voice_id,
                     speech_rate=1.1,
                     format=AudioFormat.OGG_OPUS_48KHZ_MONO_64KBPS,
-                    callback=callback,
+                    callback=Callback(response_queue, sid),
                 )
             except Exception as e:
                 print("TTS Error: ", e)
@@ -746,7 +950,7 @@ def cogtts_tts_worker(request_queue, response_queue, audio_api_key, voice_id):
     智谱AI CogTTS worker（用于默认音色）
     使用智谱AI的CogTTS API（cogtts）
     注意：CogTTS不支持流式输入，只支持流式输出
-    因此需要累积文本后一次性发送，但可以流式接收音频
+    因此通过 SentencePipeline 按句切分：每句结束后立即发起合成，多句并发、按顺序输出音频
     
     Args:
         request_queue: 多进程请求队列，接收(speech_id, text)元组
@@ -763,8 +967,105 @@ def cogtts_tts_worker(request_queue, response_queue, audio_api_key, voice_id):
     async def async_worker():
         """异步TTS worker主循环"""
         tts_url = "https://open.bigmodel.cn/api/paas/v4/audio/speech"
-        current_speech_id = None
-        text_buffer = []  # 累积文本缓冲区
+        headers = {
+            "Authorization": f"Bearer {audio_api_key}",
+            "Content-Type": "application/json"
+        }
+        # 各句的合成请求共用一个连接池
+        session = aiohttp.ClientSession()
+        output = TTSOutputStage(name='CogTTS')
+
+        async def synthesize(text, first):
+            """合成一句文本，逐块 yield 48kHz PCM16 音频；first 为本轮回复的第一句"""
+            payload = {
+                "model": "cogtts",
+                "input": text,
+                "voice": voice_id,
+                "response_format": "pcm",
+                "encode_format": "base64",  # 返回base64编码的PCM
+                "speed": 1.0,
+                "volume": 1.0,
+                "stream": True,
+            }
+            segment = object()  # 本句的重采样流标识
+            try:
+                async with session.post(tts_url, headers=headers, json=payload) as resp:
+                    if resp.status != 200:
+                        error_text = await resp.text()
+                        logger.error(f"CogTTS API错误 ({resp.status}): {error_text}")
+                        return
+                    # CogTTS返回SSE格式: data: {...JSON...}
+                    # 使用缓冲区逐块读取，避免 "Chunk too big" 错误
+                    buffer = ""
+                    # 只有一轮回复的第一句需要裁剪开头的噪音，后续句子裁剪会切掉每句的起音
+                    first_audio_received = not first
+                    async for chunk in resp.content.iter_any():
+                        # 解码并添加到缓冲区
+                        buffer += chunk.decode('utf-8')
+                    
+                        # 按行分割处理
+                        while '\n' in buffer:
+                            line, buffer = buffer.split('\n', 1)
+                            line = line.strip()
+                        
+                            # 跳过空行；解析SSE格式: data: {...}
+                            if not line or not line.startswith('data: '):
+                                continue
+                            try:
+                                event_data = json.loads(line[6:])  # 去掉 "data: " 前缀
+                            
+                                # 提取音频数据: choices[0].delta.content
+                                choices = event_data.get('choices', [])
+                                if not choices or 'delta' not in choices[0]:
+                                    continue
+                                delta = choices[0]['delta']
+                                audio_b64 = delta.get('content', '')
+                                if not audio_b64:
+                                    continue
+                                # Base64解码得到PCM数据
+                                audio_bytes = base64.b64decode(audio_b64)
+                            
+                                # 跳过过小的音频块（可能是初始化数据）
+                                # 至少需要 100 个采样点（约 4ms@24kHz）才处理
+                                if len(audio_bytes) < 200:  # 100 samples * 2 bytes
+                                    logger.debug(f"跳过过小的音频块: {len(audio_bytes)} bytes")
+                                    continue
+                            
+                                # CogTTS返回PCM格式（24000Hz, mono, 16bit）
+                                # 从返回的 return_sample_rate 获取采样率
+                                sample_rate = delta.get('return_sample_rate', 24000)
+                            
+                                # 转换为 float32 进行高质量重采样
+                                audio_array = np.frombuffer(audio_bytes, dtype=np.int16).astype(np.float32) / 32768.0
+                            
+                                # 对本轮回复第一句的第一个音频块，裁剪掉开头的噪音部分（CogTTS初始化噪音）
+                                if not first_audio_received:
+                                    first_audio_received = True
+                                    # 裁剪掉前 1s 的音频（通常包含初始化噪音）
+                                    trim_samples = int(sample_rate)
+                                    if len(audio_array) > trim_samples:
+                                        audio_array = audio_array[trim_samples:]
+                                        logger.debug(f"裁剪第一个音频块的前 {trim_samples} 个采样点（{trim_samples/sample_rate:.2f}秒）")
+                                    # 对裁剪后的开头应用短淡入（10ms），平滑过渡
+                                    fade_samples = min(int(sample_rate * 0.01), len(audio_array))
+                                    if fade_samples > 0:
+                                        fade_curve = np.linspace(0.0, 1.0, fade_samples)
+                                        audio_array[:fade_samples] *= fade_curve
+                            
+                                # 流式高质量重采样（每句一个重采样流）
+                                yield output.convert(audio_array, sample_rate, stream=segment)
+                            except json.JSONDecodeError as e:
+                                logger.warning(f"解析SSE JSON失败: {e}")
+                            except Exception as e:
+                                logger.error(f"处理音频数据时出错: {e}")
+                # 冲刷本句重采样器的尾部
+                tail = output.drain(segment)
+                if tail:
+                    yield tail
+            finally:
+                output.drain(segment)
+
+        pipeline = SentencePipeline(synthesize, response_queue.put)
         
         # CogTTS 是基于 HTTP 的，无需建立持久连接，直接发送就绪信号
         logger.info("CogTTS TTS 已就绪，发送就绪信号")
@@ -779,123 +1080,24 @@ def cogtts_tts_worker(request_queue, response_queue, audio_api_key, voice_id):
                 except Exception:
                     break
                 
-                # 新的语音ID，清空缓冲区并重新开始
-                if current_speech_id != sid and sid is not None:
-                    current_speech_id = sid
-                    text_buffer = []
+                if sid == TTS_DISCARD_SIGNAL:
+                    # 丢弃尚未合成与尚未输出的内容
+                    pipeline.reset()
+                    continue
                 
                 if sid is None:
-                    # 收到终止信号，合成累积的文本
-                    if text_buffer and current_speech_id is not None:
-                        full_text = "".join(text_buffer)
-                        if full_text.strip():
-                            try:
-                                # 发送HTTP请求进行TTS合成
-                                headers = {
-                                    "Authorization": f"Bearer {audio_api_key}",
-                                    "Content-Type": "application/json"
-                                }
-                                
-                                payload = {
-                                    "model": "cogtts",
-                                    "input": full_text[:1024],  # CogTTS最大支持1024字符
-                                    "voice": voice_id,
-                                    "response_format": "pcm",
-                                    "encode_format": "base64",  # 返回base64编码的PCM
-                                    "speed": 1.0,
-                                    "volume": 1.0,
-                                    "stream": True,
-                                }
-                                
-                                # 使用异步HTTP客户端流式接收SSE响应
-                                async with aiohttp.ClientSession() as session:
-                                    async with session.post(tts_url, headers=headers, json=payload) as resp:
-                                        if resp.status == 200:
-                                            # CogTTS返回SSE格式: data: {...JSON...}
-                                            # 使用缓冲区逐块读取，避免 "Chunk too big" 错误
-                                            buffer = ""
-                                            first_audio_received = False  # 用于调试第一个音频块
-                                            async for chunk in resp.content.iter_any():
-                                                # 解码并添加到缓冲区
-                                                buffer += chunk.decode('utf-8')
-                                                
-                                                # 按行分割处理
-                                                while '\n' in buffer:
-                                                    line, buffer = buffer.split('\n', 1)
-                                                    line = line.strip()
-                                                    
-                                                    # 跳过空行
-                                                    if not line:
-                                                        continue
-                                                    
-                                                    # 解析SSE格式: data: {...}
-                                                    if line.startswith('data: '):
-                                                        json_str = line[6:]  # 去掉 "data: " 前缀
-                                                        try:
-                                                            event_data = json.loads(json_str)
-                                                            
-                                                            # 提取音频数据: choices[0].delta.content
-                                                            choices = event_data.get('choices', [])
-                                                            if choices and 'delta' in choices[0]:
-                                                                delta = choices[0]['delta']
-                                                                audio_b64 = delta.get('content', '')
-                                                                
-                                                                if audio_b64:
-                                                                    # Base64解码得到PCM数据
-                                                                    audio_bytes = base64.b64decode(audio_b64)
-                                                                    
-                                                                    # 跳过过小的音频块（可能是初始化数据）
-                                                                    # 至少需要 100 个采样点（约 4ms@24kHz）才处理
-                                                                    if len(audio_bytes) < 200:  # 100 samples * 2 bytes
-                                                                        logger.debug(f"跳过过小的音频块: {len(audio_bytes)} bytes")
-                                                                        continue
-                                                                    
-                                                                    # CogTTS返回PCM格式（24000Hz, mono, 16bit）
-                                                                    # 从返回的 return_sample_rate 获取采样率
-                                                                    sample_rate = delta.get('return_sample_rate', 24000)
-                                                                    
-                                                                    # 转换为 float32 进行高质量重采样
-                                                                    audio_array = np.frombuffer(audio_bytes, dtype=np.int16).astype(np.float32) / 32768.0
-                                                                    
-                                                                    # 对第一个音频块，裁剪掉开头的噪音部分（CogTTS有初始化噪音）
-                                                                    if not first_audio_received:
-                                                                        first_audio_received = True
-                                                                        # 裁剪掉前 1s 的音频（通常包含初始化噪音）
-                                                                        trim_samples = int(sample_rate)
-                                                                        if len(audio_array) > trim_samples:
-                                                                            audio_array = audio_array[trim_samples:]
-                                                                            logger.debug(f"裁剪第一个音频块的前 {trim_samples} 个采样点（{trim_samples/sample_rate:.2f}秒）")
-                                                                        # 对裁剪后的开头应用短淡入（10ms），平滑过渡
-                                                                        fade_samples = min(int(sample_rate * 0.01), len(audio_array))
-                                                                        if fade_samples > 0:
-                                                                            fade_curve = np.linspace(0.0, 1.0, fade_samples)
-                                                                            audio_array[:fade_samples] *= fade_curve
-                                                                    
-                                                                    # 使用 soxr 进行高质量重采样
-                                                                    resampled = soxr.resample(audio_array, sample_rate, 48000, quality='HQ')
-                                                                    # 转回 int16 格式
-                                                                    resampled_int16 = (resampled * 32768.0).clip(-32768, 32767).astype(np.int16)
-                                                                    response_queue.put(resampled_int16.tobytes())
-                                                        except json.JSONDecodeError as e:
-                                                            logger.warning(f"解析SSE JSON失败: {e}")
-                                                        except Exception as e:
-                                                            logger.error(f"处理音频数据时出错: {e}")
-                                        else:
-                                            error_text = await resp.text()
-                                            logger.error(f"CogTTS API错误 ({resp.status}): {error_text}")
-                            except Exception as e:
-                                logger.error(f"CogTTS合成失败: {e}")
-                    
-                    # 清空缓冲区
-                    text_buffer = []
+                    # 收到终止信号，提交剩余的文本
+                    pipeline.flush()
                     continue
                 
-                # 累积文本到缓冲区（不立即发送）
-                if tts_text and tts_text.strip():
-                    text_buffer.append(tts_text)
+                # 新的语音ID会取消上一轮尚未完成的合成；结束的句子立即开始合成
+                pipeline.feed(sid, tts_text)
         
         except Exception as e:
             logger.error(f"CogTTS Worker错误: {e}")
+        finally:
+            await pipeline.close()
+            await session.close()
     
     # 运行异步worker
     try:
@@ -924,8 +1126,8 @@ def dummy_tts_worker(request_queue, response_queue, audio_api_key, voice_id):
         try:
             # 持续清空队列以避免阻塞，但不做任何处理
             sid, tts_text = request_queue.get()
-            # 如果收到结束信号，继续等待下一个请求
-            if sid is None:
+            # 如果收到结束或丢弃信号，继续等待下一个请求
+            if sid is None or sid == TTS_DISCARD_SIGNAL:
                 continue
         except Exception as e:
             logger.error(f"Dummy TTS Worker 错误: {e}")
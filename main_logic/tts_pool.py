@@ -0,0 +1,264 @@
+"""
+TTS worker 进程池
+会话结束或切换角色时不再杀掉 TTS 子进程，而是归还到池中保持预热（进程已启动、依赖已导入），
+下次以相同 (provider, voice_id) 启动会话时直接租用，省去冷启动。
+实时 TTS worker（StepFun / Qwen）在空闲时还持有一条预先握手的备用上游连接（tts_client.StandbyConnection），
+租用后的第一轮回复也不必等握手；备用连接被服务器关闭或空闲超过 TTS_STANDBY_MAX_AGE 后由 worker 自行关闭。
+
+- 以 (provider, voice_id, api_key 指纹) 为键租用/归还
+- 空闲超过 TTS_POOL_IDLE_TTL 秒或超过 TTS_POOL_MAX_IDLE 个的空闲进程会被回收
+- 启动进程在线程池中执行，关闭进程（terminate + join）交给后台回收线程，都不阻塞事件循环
+- 归还时发送 TTS_DISCARD_SIGNAL：丢弃未合成的文本，不会像 (None, None) 那样把剩余文本合成出来；
+  实时 TTS worker 随即预建下一条备用上游连接
+- occupancy() 返回池占用情况
+"""
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from multiprocessing import Process, Queue as MPQueue
+
+from main_logic.tts_bridge import TimestampedQueue
+from main_logic.tts_client import TTS_DISCARD_SIGNAL
+
+logger = logging.getLogger(__name__)
+
+# 空闲进程保留时间（秒）
+TTS_POOL_IDLE_TTL = 600
+# 最多保留的空闲进程数
+TTS_POOL_MAX_IDLE = 4
+# 后台回收检查间隔（秒）
+TTS_POOL_REAP_INTERVAL = 30
+
+
+class TTSWorkerHandle:
+    """一个 TTS 子进程及其请求/响应队列"""
+
+    def __init__(self, key, process, request_queue, response_queue):
+        self.key = key
+        self.process = process
+        self.request_queue = request_queue
+        self.response_queue = response_queue
+        self.ready = None  # None 表示就绪信号尚未被读取
+        self.spawned_at = time.time()
+        self.last_used = self.spawned_at
+        self.leases = 0
+
+    def is_alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def drain_requests(self):
+        try:
+            while not self.request_queue.empty():
+                self.request_queue.get_nowait()
+        except Exception:
+            pass
+
+    def terminate(self):
+        if self.process is None:
+            return
+        try:
+            self.request_queue.put((None, None))
+            self.process.terminate()
+            self.process.join(timeout=2.0)
+            if self.process.is_alive():
+                self.process.kill()
+        except Exception as e:
+            logger.error(f"💥 关闭TTS进程时出错: {e}")
+        finally:
+            self.process = None
+
+
+class TTSWorkerPool:
+    def __init__(self, max_idle=TTS_POOL_MAX_IDLE, idle_ttl=TTS_POOL_IDLE_TTL):
+        self.max_idle = max_idle
+        self.idle_ttl = idle_ttl
+        self._idle = []  # 按归还时间排序的空闲 handle
+        self._leased = set()
+        self._prewarming = set()  # 正在预热的键
+        self._retiring = []  # 等待回收线程关闭的 handle
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._reaper = None
+        self.stats = {'spawned': 0, 'warm_hits': 0, 'cold_starts': 0, 'recycled': 0}
+
+    @staticmethod
+    def make_key(core_api_type, has_custom_voice, api_key, voice_id):
+        """自定义音色统一走 CosyVoice，否则由 core_api 决定 TTS 提供方"""
+        provider = 'cosyvoice' if has_custom_voice else core_api_type
+        fingerprint = hashlib.sha1((api_key or '').encode('utf-8')).hexdigest()[:8]
+        return (provider, voice_id or '', fingerprint)
+
+    def _spawn(self, key, worker, api_key, voice_id):
+        request_queue = MPQueue()
+        response_queue = MPQueue()
+        process = Process(
+            target=worker,
+            args=(request_queue, TimestampedQueue(response_queue), api_key, voice_id)
+        )
+        process.daemon = True
+        process.start()
+        self.stats['spawned'] += 1
+        return TTSWorkerHandle(key, process, request_queue, response_queue)
+
+    async def lease(self, key, worker, api_key, voice_id):
+        """
+        租用一个 TTS 进程，优先复用同键的空闲进程。
+        返回 (handle, warm)；warm 为 True 表示复用了已启动的进程。
+        """
+        with self._lock:
+            self._retire_locked(self._recycle_locked())
+            handle = None
+            for candidate in reversed(self._idle):
+                if candidate.key == key:
+                    handle = candidate
+                    break
+            if handle is not None:
+                self._idle.remove(handle)
+                self.stats['warm_hits'] += 1
+            else:
+                self.stats['cold_starts'] += 1
+        warm = handle is not None
+        if handle is None:
+            handle = await asyncio.to_thread(self._spawn, key, worker, api_key, voice_id)
+        with self._lock:
+            handle.leases += 1
+            handle.last_used = time.time()
+            self._leased.add(handle)
+        logger.info(f"🎤 TTS进程池: {'复用预热进程' if warm else '冷启动新进程'} {key[:2]}，{self._format_occupancy()}")
+        self._ensure_reaper()
+        return handle, warm
+
+    def release(self, handle):
+        """归还进程：打断当前合成并清空请求队列，进程保持运行"""
+        if handle is None:
+            return
+        with self._lock:
+            self._leased.discard(handle)
+            if not handle.is_alive() or handle.ready is False:
+                self._retire_locked([handle])
+                return
+            handle.drain_requests()
+            try:
+                # 丢弃未合成完的文本，空闲进程不应再合成上一个会话的内容
+                handle.request_queue.put((TTS_DISCARD_SIGNAL, None))
+            except Exception as e:
+                logger.warning(f"⚠️ 发送TTS丢弃信号失败: {e}")
+                self._retire_locked([handle])
+                return
+            handle.last_used = time.time()
+            self._idle.append(handle)
+            self._retire_locked(self._recycle_locked())
+        logger.info(f"🎤 TTS进程池: 归还 {handle.key[:2]}，{self._format_occupancy()}")
+
+    def discard(self, handle):
+        """不再复用（如进程初始化失败），直接关闭"""
+        if handle is None:
+            return
+        with self._lock:
+            self._leased.discard(handle)
+            if handle in self._idle:
+                self._idle.remove(handle)
+            self._retire_locked([handle])
+
+    async def prewarm(self, key, worker, api_key, voice_id):
+        """在没有同键空闲进程时预先启动一个，供之后的会话租用"""
+        with self._lock:
+            if key in self._prewarming or any(h.key == key and h.is_alive() for h in self._idle):
+                return
+            self._prewarming.add(key)
+        try:
+            handle = await asyncio.to_thread(self._spawn, key, worker, api_key, voice_id)
+        except Exception as e:
+            logger.warning(f"⚠️ 预热TTS进程失败: {e}")
+            return
+        finally:
+            with self._lock:
+                self._prewarming.discard(key)
+        with self._lock:
+            self._idle.append(handle)
+            self._retire_locked(self._recycle_locked())
+        logger.info(f"🎤 TTS进程池: 预热 {key[:2]}，{self._format_occupancy()}")
+        self._ensure_reaper()
+
+    def _recycle_locked(self, now=None):
+        """从空闲列表中移出需要回收的进程并返回（由调用方交给 _retire_locked）"""
+        now = now or time.time()
+        keep, expired = [], []
+        for handle in self._idle:
+            if not handle.is_alive() or now - handle.last_used > self.idle_ttl:
+                expired.append(handle)
+            else:
+                keep.append(handle)
+        # 超出上限时回收最久未使用的
+        while len(keep) > self.max_idle:
+            expired.append(keep.pop(0))
+        self.stats['recycled'] += len(expired)
+        self._idle = keep
+        return expired
+
+    def _retire_locked(self, handles):
+        """交给回收线程关闭（terminate + join 可能耗时数秒，不能在事件循环中执行）"""
+        if not handles:
+            return
+        self._retiring.extend(handles)
+        self._wakeup.set()
+        self._ensure_reaper()
+
+    def recycle_idle(self):
+        with self._lock:
+            expired = self._recycle_locked()
+            retiring, self._retiring = self._retiring, []
+        for handle in expired + retiring:
+            handle.terminate()
+
+    def _ensure_reaper(self):
+        if self._reaper is not None and self._reaper.is_alive():
+            return
+        self._reaper = threading.Thread(target=self._reap_loop, name="tts-pool-reaper", daemon=True)
+        self._reaper.start()
+
+    def _reap_loop(self):
+        while True:
+            self._wakeup.wait(TTS_POOL_REAP_INTERVAL)
+            self._wakeup.clear()
+            self.recycle_idle()
+
+    def occupancy(self):
+        with self._lock:
+            by_key = {}
+            for state, handles in (('leased', self._leased), ('idle', self._idle)):
+                for handle in handles:
+                    label = f"{handle.key[0]}/{handle.key[1] or 'default'}"
+                    entry = by_key.setdefault(label, {'leased': 0, 'idle': 0})
+                    entry[state] += 1
+            return {
+                'leased': len(self._leased),
+                'idle': len(self._idle),
+                'by_voice': by_key,
+                **self.stats,
+            }
+
+    def _format_occupancy(self):
+        occupancy = self.occupancy()
+        return f"占用 {occupancy['leased']} / 空闲 {occupancy['idle']}"
+
+    def shutdown(self):
+        with self._lock:
+            handles = list(self._idle) + list(self._leased) + self._retiring
+            self._idle.clear()
+            self._leased.clear()
+            self._retiring = []
+        for handle in handles:
+            handle.terminate()
+
+
+_tts_worker_pool = None
+
+
+def get_tts_worker_pool():
+    global _tts_worker_pool
+    if _tts_worker_pool is None:
+        _tts_worker_pool = TTSWorkerPool()
+    return _tts_worker_pool
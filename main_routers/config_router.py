@@ -356,6 +356,7 @@ async def update_core_config(request: Request):
         
         with open(core_config_path, 'w', encoding='utf-8') as f:
             json.dump(core_cfg, f, indent=2, ensure_ascii=False)
+        config_manager.invalidate_config_cache('core_config.json')
         
         # API配置更新后，需要先通知所有客户端，再关闭session，最后重新加载配置
         logger.info("API配置已更新，准备通知客户端并重置所有session...")
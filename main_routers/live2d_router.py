@@ -12,6 +12,7 @@ Handles Live2D model-related endpoints including:
 
 import os
 import json
+import asyncio
 import logging
 import pathlib
 
@@ -21,77 +22,59 @@ from fastapi.responses import JSONResponse
 from .shared_state import get_config_manager
 from .workshop_router import get_subscribed_workshop_items
 from utils.frontend_utils import find_models, find_model_directory, find_model_by_workshop_item_id, find_workshop_item_by_id
+from utils.model_catalog import get_model_catalog
 router = APIRouter(prefix="/api/live2d", tags=["live2d"])
 logger = logging.getLogger("Main")
 
 
+def _add_workshop_models(models, items):
+    """遍历所有物品，提取已安装的模型（目录内容来自模型目录索引，按名称去重）"""
+    catalog = get_model_catalog()
+    known_names = {m['name'] for m in models}
+    for item in items:
+        # 直接使用get_subscribed_workshop_items返回的installedFolder
+        installed_folder = item.get('installedFolder')
+        # 从publishedFileId字段获取物品ID，而不是item_id
+        item_id = item.get('publishedFileId')
+        
+        if installed_folder and item_id and os.path.isdir(installed_folder):
+            # 安装目录下的.model3.json文件，以及 子目录/子目录名.model3.json
+            for model_name, relative_path in catalog.installed_item_models(installed_folder):
+                # 避免重复添加
+                if model_name in known_names:
+                    continue
+                known_names.add(model_name)
+                # 构建正确的/workshop URL路径，移除可能的额外引号
+                path_value = f'/workshop/{item_id}/{relative_path}'.strip('"')
+                models.append({
+                    'name': model_name,
+                    'path': path_value,
+                    'source': 'steam_workshop',
+                    'item_id': item_id
+                })
+    catalog.flush()
+
+
 @router.get("/models")
-def get_live2d_models(simple: bool = False):
+async def get_live2d_models(simple: bool = False):
     """
     获取Live2D模型列表
     Args:
         simple: 如果为True，只返回模型名称列表；如果为False，返回完整的模型信息
     """
     try:
-        # 先获取本地模型
-        models = find_models()
+        # 先获取本地模型（文件系统访问在线程中执行）
+        models = await asyncio.to_thread(find_models)
         
         # 再获取Steam创意工坊模型
         try:
-            workshop_items_result = get_subscribed_workshop_items()
+            workshop_items_result = await get_subscribed_workshop_items()
             
             # 处理响应结果
             if isinstance(workshop_items_result, dict) and workshop_items_result.get('success', False):
                 items = workshop_items_result.get('items', [])
                 logger.info(f"获取到{len(items)}个订阅的创意工坊物品")
-                
-                # 遍历所有物品，提取已安装的模型
-                for item in items:
-                    # 直接使用get_subscribed_workshop_items返回的installedFolder
-                    installed_folder = item.get('installedFolder')
-                    # 从publishedFileId字段获取物品ID，而不是item_id
-                    item_id = item.get('publishedFileId')
-                    
-                    if installed_folder and os.path.exists(installed_folder) and os.path.isdir(installed_folder) and item_id:
-                        # 检查安装目录下是否有.model3.json文件
-                        for filename in os.listdir(installed_folder):
-                            if filename.endswith('.model3.json'):
-                                model_name = os.path.splitext(os.path.splitext(filename)[0])[0]
-                                
-                                # 避免重复添加
-                                if model_name not in [m['name'] for m in models]:
-                                    # 构建正确的/workshop URL路径，确保没有多余的引号
-                                    path_value = f'/workshop/{item_id}/{filename}'
-                                    logger.debug(f"添加模型路径: {path_value!r}, item_id类型: {type(item_id)}, filename类型: {type(filename)}")
-                                    # 移除可能的额外引号
-                                    path_value = path_value.strip('"')
-                                    models.append({
-                                        'name': model_name,
-                                        'path': path_value,
-                                        'source': 'steam_workshop',
-                                        'item_id': item_id
-                                    })
-                            
-                        # 检查安装目录下的子目录
-                        for subdir in os.listdir(installed_folder):
-                            subdir_path = os.path.join(installed_folder, subdir)
-                            if os.path.isdir(subdir_path):
-                                model_name = subdir
-                                json_file = os.path.join(subdir_path, f'{model_name}.model3.json')
-                                if os.path.exists(json_file):
-                                    # 避免重复添加
-                                    if model_name not in [m['name'] for m in models]:
-                                        # 构建正确的/workshop URL路径，确保没有多余的引号
-                                        path_value = f'/workshop/{item_id}/{model_name}/{model_name}.model3.json'
-                                        logger.debug(f"添加子目录模型路径: {path_value!r}, item_id类型: {type(item_id)}, model_name类型: {type(model_name)}")
-                                        # 移除可能的额外引号
-                                        path_value = path_value.strip('"')
-                                        models.append({
-                                            'name': model_name,
-                                            'path': path_value,
-                                            'source': 'steam_workshop',
-                                            'item_id': item_id
-                                        })
+                await asyncio.to_thread(_add_workshop_models, models, items)
         except Exception as e:
             logger.error(f"获取创意工坊模型时出错: {e}")
         
@@ -797,6 +780,7 @@ async def upload_live2d_model(files: list[UploadFile] = File(...)):
             
             # 复制模型根目录到用户文档的live2d目录
             shutil.copytree(model_root_dir, target_model_dir)
+            get_model_catalog().invalidate()
 
             # 上传后：遍历模型目录中的所有动作文件（*.motion3.json），
             # 将官方白名单参数及模型自身在 .model3.json 中声明为 LipSync 的参数的 Segments 清空为 []。
@@ -186,8 +186,9 @@ async def get_recent_file(filename: str):
     if not resolved_path.exists():
         return JSONResponse({"success": False, "error": "文件不存在"}, status_code=404)
     
-    with open(resolved_path, 'r', encoding='utf-8') as f:
-        content = f.read()
+    # 近期记忆由快照 + 追加日志组成，需合并后返回
+    from utils.recent_store import read_recent_file
+    content = json.dumps(read_recent_file(str(resolved_path)), ensure_ascii=False, indent=2)
     return {"content": content}
 
 
@@ -238,8 +239,9 @@ async def save_recent_file(request: Request):
             }
         })
     try:
-        with open(resolved_path, 'w', encoding='utf-8') as f:
-            json.dump(arr, f, ensure_ascii=False, indent=2)
+        # 原子写入新快照并丢弃旧的追加日志
+        from utils.recent_store import write_recent_file
+        write_recent_file(str(resolved_path), arr)
         return {"success": True}
     except Exception as e:
         logger.error(f"Failed to save recent file: {e}")
@@ -296,16 +298,11 @@ async def update_catgirl_name(request: Request):
             logger.warning(f"记忆文件不存在: {old_file_path}")
             return JSONResponse({"success": False, "error": f"记忆文件不存在: {old_filename}"}, status_code=404)
         
-        # 如果新文件已存在，先删除
-        if os.path.exists(new_file_path):
-            os.remove(new_file_path)
-        
-        # 重命名文件
-        os.rename(old_file_path, new_file_path)
+        # 读取旧记忆（快照 + 追加日志）
+        from utils.recent_store import read_recent_file, write_recent_file, remove_journal
+        file_content = read_recent_file(str(old_file_path))
         
         # 2. 更新文件内容中的猫娘名称引用
-        with open(new_file_path, 'r', encoding='utf-8') as f:
-            file_content = json.load(f)
         
         # 遍历所有消息，仅在特定字段中更新猫娘名称
         for item in file_content:
@@ -351,9 +348,10 @@ async def update_catgirl_name(request: Request):
                         
                         data['content'] = content
         
-        # 保存更新后的内容
-        with open(new_file_path, 'w', encoding='utf-8') as f:
-            json.dump(file_content, f, ensure_ascii=False, indent=2)
+        # 保存更新后的内容到新文件（会覆盖已存在的新文件），然后删除旧文件
+        write_recent_file(str(new_file_path), file_content)
+        os.remove(old_file_path)
+        remove_journal(str(old_file_path))
         
         logger.info(f"已更新猫娘名称从 '{old_name}' 到 '{new_name}' 的记忆文件")
         return {"success": True}
@@ -405,6 +403,7 @@ async def update_review_config(request: Request):
         # 保存配置
         with open(config_path, 'w', encoding='utf-8') as f:
             json.dump(config_data, f, ensure_ascii=False, indent=2)
+        config_manager.invalidate_config_cache('core_config.json')
         
         logger.info(f"记忆整理配置已更新: enabled={enabled}")
         return {"success": True, "enabled": enabled}
@@ -7,6 +7,8 @@ Handles system-related endpoints including:
 - Emotion analysis
 - Steam achievements
 - File utilities (file-exists, find-first-image, proxy-image)
+- Debug metrics (sync connector, session context budget, round-trip latency, worker/connection pools,
+  model catalog, proactive-chat content caches, config snapshots)
 """
 
 import os
@@ -242,6 +244,66 @@ async def list_achievements():
         return JSONResponse(content={"error": "Steamworks未初始化"}, status_code=500)
 
 
+@router.get('/debug/sync')
+async def get_sync_connector_metrics():
+    """各角色同步连接器（cross_server）的队列深度与转发延迟"""
+    from main_logic.cross_server import get_sync_metrics
+    return JSONResponse(content=get_sync_metrics())
+
+
+@router.get('/debug/context')
+async def get_context_budget_metrics():
+    """各角色会话的上下文token用量、热切换次数与耗时"""
+    session_manager = get_session_manager()
+    return JSONResponse(content={
+        name: manager.get_context_metrics()
+        for name, manager in session_manager.items()
+        if hasattr(manager, 'get_context_metrics')
+    })
+
+
+@router.get('/debug/latency')
+async def get_latency_metrics():
+    """各角色语音往返的分阶段延迟（输入 -> 上游 -> 首段文本 -> TTS -> 首帧音频到达前端）"""
+    session_manager = get_session_manager()
+    return JSONResponse(content={
+        name: manager.get_latency_metrics()
+        for name, manager in session_manager.items()
+        if hasattr(manager, 'get_latency_metrics')
+    })
+
+
+@router.get('/debug/pools')
+async def get_pool_metrics():
+    """TTS进程池与上游Realtime连接池的占用情况"""
+    from main_logic.tts_pool import get_tts_worker_pool
+    from main_logic.realtime_pool import get_realtime_pool
+    return JSONResponse(content={
+        'tts': get_tts_worker_pool().occupancy(),
+        'realtime': get_realtime_pool().snapshot(),
+    })
+
+
+@router.get('/debug/model_catalog')
+async def get_model_catalog_metrics():
+    """Live2D模型目录索引的条目数与增量扫描统计"""
+    from utils.model_catalog import get_model_catalog
+    return JSONResponse(content=get_model_catalog().snapshot())
+
+
+@router.get('/debug/config')
+async def get_config_cache_metrics():
+    """配置快照（core_config.json、characters.json）的版本号与命中统计"""
+    return JSONResponse(content=get_config_manager().get_config_cache_stats())
+
+
+@router.get('/debug/proactive')
+async def get_proactive_fetch_metrics():
+    """主动搭话内容（首页推荐、窗口搜索）的缓存命中，以及热门内容的预取状态"""
+    from utils.web_scraper import get_prefetch_stats
+    return JSONResponse(content=get_prefetch_stats())
+
+
 @router.get('/file-exists')
 async def check_file_exists(path: str = None):
     """
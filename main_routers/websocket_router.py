@@ -3,7 +3,8 @@
 WebSocket Router
 
 Handles WebSocket endpoints including:
-- Main WebSocket connection for chat
+- Main WebSocket connection for chat (JSON text frames, plus binary
+  PCM16 audio frames - see utils.audio_processor.decode_audio_frame)
 - Proactive chat
 - Task notifications
 """
@@ -15,6 +16,7 @@ import logging
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
+from utils.audio_processor import decode_audio_frame
 from .shared_state import (
     get_session_manager, 
     get_config_manager,
@@ -67,10 +69,14 @@ async def websocket_endpoint(websocket: WebSocket, lanlan_name: str):
     # 注意：这里设置后，即使cleanup()被调用，websocket也会在start_session时重新设置
     session_manager[lanlan_name].websocket = websocket
     logger.info(f"✅ 已设置 {lanlan_name} 的WebSocket连接")
+    # 提前预热TTS进程，首次开始对话时无需冷启动（上游Realtime连接等用户表现出语音意图再建立）
+    session_manager[lanlan_name].prewarm_tts()
 
     try:
         while True:
-            data = await websocket.receive_text()
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
             # 安全检查：如果角色已被重命名或删除，lanlan_name 可能不再存在
             if lanlan_name not in session_id or lanlan_name not in session_manager:
                 logger.info(f"角色 {lanlan_name} 已被重命名或删除，关闭旧连接")
@@ -80,7 +86,21 @@ async def websocket_endpoint(websocket: WebSocket, lanlan_name: str):
                 await session_manager[lanlan_name].send_status(f"切换至另一个终端...")
                 await websocket.close()
                 break
-            message = json.loads(data)
+            if frame.get("bytes") is not None:
+                # 二进制帧：麦克风 PCM16 音频，跳过 JSON 解析与逐样本转换
+                try:
+                    sample_rate, pcm = decode_audio_frame(frame["bytes"])
+                except ValueError as e:
+                    logger.warning(f"Invalid binary audio frame: {e}")
+                    continue
+                asyncio.create_task(session_manager[lanlan_name].stream_data({
+                    "input_type": "audio",
+                    "data": pcm,
+                    "sample_rate": sample_rate,
+                }))
+                continue
+
+            message = json.loads(frame["text"])
             action = message.get("action")
             # logger.debug(f"WebSocket received action: {action}") # Optional debug log
 
@@ -105,6 +125,10 @@ async def websocket_endpoint(websocket: WebSocket, lanlan_name: str):
                 session_manager[lanlan_name].active_session_is_idle = True
                 asyncio.create_task(session_manager[lanlan_name].end_session())
 
+            elif action == "prepare_voice":
+                # 用户点击了麦克风：在语音会话真正开始前预先建立上游Realtime连接
+                session_manager[lanlan_name].prewarm_realtime()
+
             elif action == "ping":
                 # 心跳保活消息，回复pong
                 await websocket.send_text(json.dumps({"type": "pong"}))
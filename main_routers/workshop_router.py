@@ -26,40 +26,267 @@ from utils.workshop_utils import (
     ensure_workshop_folder_exists,
     get_workshop_path,
 )
+from utils.workshop_item_cache import get_workshop_item_cache, query_ugc_details
+from utils.local_content_index import get_local_content_index
 
 router = APIRouter(prefix="/api/steam/workshop", tags=["workshop"])
 logger = logging.getLogger("Main")
 
 def get_folder_size(folder_path):
-    """获取文件夹大小（字节）"""
-    total_size = 0
-    for dirpath, dirnames, filenames in os.walk(folder_path):
-        for filename in filenames:
-            filepath = os.path.join(dirpath, filename)
-            try:
-                total_size += os.path.getsize(filepath)
-            except (OSError, FileNotFoundError):
-                continue
-    return total_size
+    """获取文件夹大小（字节），按目录 mtime 缓存，只重新统计变化过的子目录"""
+    return get_local_content_index().folder_size(folder_path)
 
 
 def find_preview_image_in_folder(folder_path):
     """在文件夹中查找预览图片，只查找指定的8个图片名称"""
-    preview_image_names = ['preview.jpg', 'preview.png', 'thumbnail.jpg', 'thumbnail.png', 
-                         'icon.jpg', 'icon.png', 'header.jpg', 'header.png']
+    return get_local_content_index().preview_image(folder_path)
+
+def _read_local_item_info(steamworks, item_id):
+    """
+    读取物品的本地状态（订阅状态、安装信息、下载信息），均为本地调用，不访问网络
+    返回 (物品信息, 本地安装版本的时间戳)
+    """
+    # 获取物品状态
+    item_state = steamworks.Workshop.GetItemState(item_id)
+    logger.debug(f'物品 {item_id} 状态: {item_state}')
+    
+    # 初始化基本物品信息（确保所有字段都有默认值）
+    # 确保publishedFileId始终为字符串类型，避免前端toString()错误
+    item_info = {
+        "publishedFileId": str(item_id),
+        "title": f"未知物品_{item_id}",
+        "description": "无法获取详细描述",
+        "tags": [],
+        "state": {
+            "subscribed": bool(item_state & 1),  # EItemState.SUBSCRIBED
+            "legacyItem": bool(item_state & 2),
+            "installed": False,
+            "needsUpdate": bool(item_state & 8),  # EItemState.NEEDS_UPDATE
+            "downloading": False,
+            "downloadPending": bool(item_state & 32),  # EItemState.DOWNLOAD_PENDING
+            "isWorkshopItem": bool(item_state & 128)  # EItemState.IS_WORKSHOP_ITEM
+        },
+        "installedFolder": None,
+        "fileSizeOnDisk": 0,
+        "downloadProgress": {
+            "bytesDownloaded": 0,
+            "bytesTotal": 0,
+            "percentage": 0
+        },
+        # 添加额外的时间戳信息 - 使用datetime替代time模块避免命名冲突
+        "timeAdded": int(datetime.now().timestamp()),
+        "timeUpdated": int(datetime.now().timestamp())
+    }
+    
+    # 尝试获取物品安装信息（如果已安装）
+    installed_timestamp = 0
+    try:
+        logger.debug(f'获取物品 {item_id} 的安装信息')
+        result = steamworks.Workshop.GetItemInstallInfo(item_id)
+        
+        # 检查返回值的结构 - 支持字典格式（根据日志显示）
+        if isinstance(result, dict):
+            logger.debug(f'物品 {item_id} 安装信息字典: {result}')
+            
+            # 从字典中提取信息
+            item_info["state"]["installed"] = True  # 如果返回字典，假设已安装
+            # 获取安装路径 - workshop.py中已经将folder解码为字符串
+            folder_path = result.get('folder', '')
+            item_info["installedFolder"] = str(folder_path) if folder_path else None
+            logger.debug(f'物品 {item_id} 的安装路径: {item_info["installedFolder"]}')
+            
+            # 处理磁盘大小 - GetItemInstallInfo返回的disk_size是普通整数
+            disk_size = result.get('disk_size', 0)
+            item_info["fileSizeOnDisk"] = int(disk_size) if isinstance(disk_size, (int, float)) else 0
+            installed_timestamp = int(result.get('timestamp', 0) or 0)
+        # 也支持元组格式作为备选
+        elif isinstance(result, tuple) and len(result) >= 3:
+            installed, folder, size = result
+            logger.debug(f'物品 {item_id} 安装状态: 已安装={installed}, 路径={folder}, 大小={size}')
+            
+            # 安全的类型转换
+            item_info["state"]["installed"] = bool(installed)
+            item_info["installedFolder"] = str(folder) if folder and isinstance(folder, (str, bytes)) else None
+            
+            # 处理大小值
+            if isinstance(size, (int, float)):
+                item_info["fileSizeOnDisk"] = int(size)
+            else:
+                item_info["fileSizeOnDisk"] = 0
+        else:
+            logger.warning(f'物品 {item_id} 的安装信息返回格式未知: {type(result)} - {result}')
+            item_info["state"]["installed"] = False
+    except Exception as e:
+        logger.warning(f'获取物品 {item_id} 安装信息失败: {e}')
+        item_info["state"]["installed"] = False
+    
+    # 尝试获取物品下载信息（如果正在下载）
+    try:
+        logger.debug(f'获取物品 {item_id} 的下载信息')
+        result = steamworks.Workshop.GetItemDownloadInfo(item_id)
+        
+        # 检查返回值的结构 - 支持字典格式（与安装信息保持一致）
+        if isinstance(result, dict):
+            logger.debug(f'物品 {item_id} 下载信息字典: {result}')
+            
+            # 使用正确的键名获取下载信息
+            downloaded = result.get('downloaded', 0)
+            total = result.get('total', 0)
+            progress = result.get('progress', 0.0)
+            
+            # 根据total和downloaded确定是否正在下载
+            item_info["state"]["downloading"] = total > 0 and downloaded < total
+            
+            # 设置下载进度信息
+            if downloaded > 0 or total > 0:
+                item_info["downloadProgress"] = {
+                    "bytesDownloaded": int(downloaded),
+                    "bytesTotal": int(total),
+                    "percentage": progress * 100 if isinstance(progress, (int, float)) else 0
+                }
+        # 也支持元组格式作为备选
+        elif isinstance(result, tuple) and len(result) >= 3:
+            # 元组中应该包含下载状态、已下载字节数和总字节数
+            downloaded, total, progress = result if len(result) >= 3 else (0, 0, 0.0)
+            logger.debug(f'物品 {item_id} 下载状态: 已下载={downloaded}, 总计={total}, 进度={progress}')
+            
+            # 根据total和downloaded确定是否正在下载
+            item_info["state"]["downloading"] = total > 0 and downloaded < total
+            
+            # 设置下载进度信息
+            if downloaded > 0 or total > 0:
+                # 处理可能的类型转换
+                try:
+                    downloaded_value = int(downloaded.value) if hasattr(downloaded, 'value') else int(downloaded)
+                    total_value = int(total.value) if hasattr(total, 'value') else int(total)
+                    progress_value = float(progress.value) if hasattr(progress, 'value') else float(progress)
+                except:
+                    downloaded_value, total_value, progress_value = 0, 0, 0.0
+                    
+                item_info["downloadProgress"] = {
+                    "bytesDownloaded": downloaded_value,
+                    "bytesTotal": total_value,
+                    "percentage": progress_value * 100
+                }
+        else:
+            logger.warning(f'物品 {item_id} 的下载信息返回格式未知: {type(result)} - {result}')
+            item_info["state"]["downloading"] = False
+    except Exception as e:
+        logger.warning(f'获取物品 {item_id} 下载信息失败: {e}')
+        item_info["state"]["downloading"] = False
+    
+    return item_info, installed_timestamp
+
+
+def _basic_item_info(item_id, item_error):
+    """获取物品信息出错时返回的最基本信息"""
+    return {
+        "publishedFileId": str(item_id),  # 确保是字符串类型
+        "title": f"未知物品_{item_id}",
+        "description": "无法获取详细信息",
+        "state": {
+            "subscribed": True,
+            "installed": False,
+            "downloading": False,
+            "needsUpdate": False,
+            "error": True
+        },
+        "error_message": str(item_error)
+    }
+
+
+def _complete_item_info(item_info, details):
+    """填入批量查询得到的物品详情；没有详情时尝试从本地文件获取，并查找预览图"""
+    item_id = item_info['publishedFileId']
+    if details:
+        if details.get('title'):
+            item_info['title'] = details['title']
+        if details.get('description'):
+            item_info['description'] = details['description']
+        # 创建和更新时间、作者、文件大小
+        item_info['timeAdded'] = details['timeCreated']
+        item_info['timeUpdated'] = details['timeUpdated']
+        item_info['steamIDOwner'] = details['steamIDOwner']
+        item_info['fileSizeOnDisk'] = details['fileSize']
+    
+    # 作为备选方案，如果本地有安装路径，尝试从本地文件获取信息
+    if item_info['title'].startswith('未知物品_') or not item_info['description']:
+        install_folder = item_info.get('installedFolder')
+        if install_folder and os.path.exists(install_folder):
+            logger.debug(f'尝试从安装文件夹获取物品信息: {install_folder}')
+            # 查找可能的配置文件来获取更多信息
+            config_files = [
+                os.path.join(install_folder, "config.json"),
+                os.path.join(install_folder, "package.json"),
+                os.path.join(install_folder, "info.json"),
+                os.path.join(install_folder, "manifest.json"),
+                os.path.join(install_folder, "README.md"),
+                os.path.join(install_folder, "README.txt")
+            ]
+            
+            for config_path in config_files:
+                if os.path.exists(config_path):
+                    try:
+                        with open(config_path, 'r', encoding='utf-8') as f:
+                            if config_path.endswith('.json'):
+                                config_data = json.load(f)
+                                # 尝试从配置文件中提取标题和描述
+                                if "title" in config_data and config_data["title"]:
+                                    item_info["title"] = config_data["title"]
+                                elif "name" in config_data and config_data["name"]:
+                                    item_info["title"] = config_data["name"]
+                                
+                                if "description" in config_data and config_data["description"]:
+                                    item_info["description"] = config_data["description"]
+                            else:
+                                # 对于文本文件，将第一行作为标题
+                                first_line = f.readline().strip()
+                                if first_line and item_info['title'].startswith('未知物品_'):
+                                    item_info['title'] = first_line[:100]  # 限制长度
+                        logger.info(f"从本地文件 {os.path.basename(config_path)} 成功获取物品 {item_id} 的信息")
+                        break
+                    except Exception as file_error:
+                        logger.warning(f"读取配置文件 {config_path} 时出错: {file_error}")
+    # 移除了没有对应try块的except语句
+    
+    # 确保publishedFileId是字符串类型
+    item_info['publishedFileId'] = str(item_info['publishedFileId'])
     
-    for image_name in preview_image_names:
-        image_path = os.path.join(folder_path, image_name)
-        if os.path.exists(image_path) and os.path.isfile(image_path):
-            return image_path
+    # 尝试获取预览图信息 - 优先从本地文件夹查找
+    preview_url = None
+    install_folder = item_info.get('installedFolder')
+    if install_folder and os.path.exists(install_folder):
+        try:
+            # 使用辅助函数查找预览图
+            preview_image_path = find_preview_image_in_folder(install_folder)
+            if preview_image_path:
+                # 为前端提供代理访问的路径格式
+                # 需要将路径标准化，确保可以通过proxy-image API访问
+                if os.name == 'nt':
+                    # Windows路径处理
+                    proxy_path = preview_image_path.replace('\\', '/')
+                else:
+                    proxy_path = preview_image_path
+                preview_url = f"/api/steam/proxy-image?image_path={quote(proxy_path)}"
+                logger.debug(f'为物品 {item_id} 找到本地预览图: {preview_url}')
+        except Exception as preview_error:
+            logger.warning(f'查找物品 {item_id} 预览图时出错: {preview_error}')
     
-    return None
+    # 添加预览图URL到物品信息
+    if preview_url:
+        item_info['previewUrl'] = preview_url
+    
+    return item_info
+
 
 @router.get('/subscribed-items')
-def get_subscribed_workshop_items():
+async def get_subscribed_workshop_items():
     """
     获取用户订阅的Steam创意工坊物品列表
     返回包含物品ID、基本信息和状态的JSON数据
+    
+    物品详情（标题、描述等）通过一次批量UGC查询获取并缓存到磁盘（utils.workshop_item_cache），
+    只有从未获取过的物品需要等待查询，过期的缓存在后台刷新
     """
     steamworks = get_steamworks()
     
@@ -88,299 +315,55 @@ def get_subscribed_workshop_items():
         subscribed_items = steamworks.Workshop.GetSubscribedItems()
         logger.info(f'获取到 {len(subscribed_items)} 个订阅的创意工坊物品')
         
-        # 存储处理后的物品信息
-        items_info = []
-        
-        # 为每个物品获取基本信息和状态
+        item_ids = []
         for item_id in subscribed_items:
+            # 确保item_id是整数类型
             try:
-                # 确保item_id是整数类型
-                if isinstance(item_id, str):
-                    try:
-                        item_id = int(item_id)
-                    except ValueError:
-                        logger.error(f"无效的物品ID: {item_id}")
-                        continue
-                
-                logger.info(f'正在处理物品ID: {item_id}')
-                
-                # 获取物品状态
-                item_state = steamworks.Workshop.GetItemState(item_id)
-                logger.debug(f'物品 {item_id} 状态: {item_state}')
-                
-                # 初始化基本物品信息（确保所有字段都有默认值）
-                # 确保publishedFileId始终为字符串类型，避免前端toString()错误
-                item_info = {
-                    "publishedFileId": str(item_id),
-                    "title": f"未知物品_{item_id}",
-                    "description": "无法获取详细描述",
-                    "tags": [],
-                    "state": {
-                        "subscribed": bool(item_state & 1),  # EItemState.SUBSCRIBED
-                        "legacyItem": bool(item_state & 2),
-                        "installed": False,
-                        "needsUpdate": bool(item_state & 8),  # EItemState.NEEDS_UPDATE
-                        "downloading": False,
-                        "downloadPending": bool(item_state & 32),  # EItemState.DOWNLOAD_PENDING
-                        "isWorkshopItem": bool(item_state & 128)  # EItemState.IS_WORKSHOP_ITEM
-                    },
-                    "installedFolder": None,
-                    "fileSizeOnDisk": 0,
-                    "downloadProgress": {
-                        "bytesDownloaded": 0,
-                        "bytesTotal": 0,
-                        "percentage": 0
-                    },
-                    # 添加额外的时间戳信息 - 使用datetime替代time模块避免命名冲突
-                    "timeAdded": int(datetime.now().timestamp()),
-                    "timeUpdated": int(datetime.now().timestamp())
-                }
-                
-                # 尝试获取物品安装信息（如果已安装）
-                try:
-                    logger.debug(f'获取物品 {item_id} 的安装信息')
-                    result = steamworks.Workshop.GetItemInstallInfo(item_id)
-                    
-                    # 检查返回值的结构 - 支持字典格式（根据日志显示）
-                    if isinstance(result, dict):
-                        logger.debug(f'物品 {item_id} 安装信息字典: {result}')
-                        
-                        # 从字典中提取信息
-                        item_info["state"]["installed"] = True  # 如果返回字典，假设已安装
-                        # 获取安装路径 - workshop.py中已经将folder解码为字符串
-                        folder_path = result.get('folder', '')
-                        item_info["installedFolder"] = str(folder_path) if folder_path else None
-                        logger.debug(f'物品 {item_id} 的安装路径: {item_info["installedFolder"]}')
-                        
-                        # 处理磁盘大小 - GetItemInstallInfo返回的disk_size是普通整数
-                        disk_size = result.get('disk_size', 0)
-                        item_info["fileSizeOnDisk"] = int(disk_size) if isinstance(disk_size, (int, float)) else 0
-                    # 也支持元组格式作为备选
-                    elif isinstance(result, tuple) and len(result) >= 3:
-                        installed, folder, size = result
-                        logger.debug(f'物品 {item_id} 安装状态: 已安装={installed}, 路径={folder}, 大小={size}')
-                        
-                        # 安全的类型转换
-                        item_info["state"]["installed"] = bool(installed)
-                        item_info["installedFolder"] = str(folder) if folder and isinstance(folder, (str, bytes)) else None
-                        
-                        # 处理大小值
-                        if isinstance(size, (int, float)):
-                            item_info["fileSizeOnDisk"] = int(size)
-                        else:
-                            item_info["fileSizeOnDisk"] = 0
-                    else:
-                        logger.warning(f'物品 {item_id} 的安装信息返回格式未知: {type(result)} - {result}')
-                        item_info["state"]["installed"] = False
-                except Exception as e:
-                    logger.warning(f'获取物品 {item_id} 安装信息失败: {e}')
-                    item_info["state"]["installed"] = False
-                
-                # 尝试获取物品下载信息（如果正在下载）
-                try:
-                    logger.debug(f'获取物品 {item_id} 的下载信息')
-                    result = steamworks.Workshop.GetItemDownloadInfo(item_id)
-                    
-                    # 检查返回值的结构 - 支持字典格式（与安装信息保持一致）
-                    if isinstance(result, dict):
-                        logger.debug(f'物品 {item_id} 下载信息字典: {result}')
-                        
-                        # 使用正确的键名获取下载信息
-                        downloaded = result.get('downloaded', 0)
-                        total = result.get('total', 0)
-                        progress = result.get('progress', 0.0)
-                        
-                        # 根据total和downloaded确定是否正在下载
-                        item_info["state"]["downloading"] = total > 0 and downloaded < total
-                        
-                        # 设置下载进度信息
-                        if downloaded > 0 or total > 0:
-                            item_info["downloadProgress"] = {
-                                "bytesDownloaded": int(downloaded),
-                                "bytesTotal": int(total),
-                                "percentage": progress * 100 if isinstance(progress, (int, float)) else 0
-                            }
-                    # 也支持元组格式作为备选
-                    elif isinstance(result, tuple) and len(result) >= 3:
-                        # 元组中应该包含下载状态、已下载字节数和总字节数
-                        downloaded, total, progress = result if len(result) >= 3 else (0, 0, 0.0)
-                        logger.debug(f'物品 {item_id} 下载状态: 已下载={downloaded}, 总计={total}, 进度={progress}')
-                        
-                        # 根据total和downloaded确定是否正在下载
-                        item_info["state"]["downloading"] = total > 0 and downloaded < total
-                        
-                        # 设置下载进度信息
-                        if downloaded > 0 or total > 0:
-                            # 处理可能的类型转换
-                            try:
-                                downloaded_value = int(downloaded.value) if hasattr(downloaded, 'value') else int(downloaded)
-                                total_value = int(total.value) if hasattr(total, 'value') else int(total)
-                                progress_value = float(progress.value) if hasattr(progress, 'value') else float(progress)
-                            except:
-                                downloaded_value, total_value, progress_value = 0, 0, 0.0
-                                
-                            item_info["downloadProgress"] = {
-                                "bytesDownloaded": downloaded_value,
-                                "bytesTotal": total_value,
-                                "percentage": progress_value * 100
-                            }
-                    else:
-                        logger.warning(f'物品 {item_id} 的下载信息返回格式未知: {type(result)} - {result}')
-                        item_info["state"]["downloading"] = False
-                except Exception as e:
-                    logger.warning(f'获取物品 {item_id} 下载信息失败: {e}')
-                    item_info["state"]["downloading"] = False
-                
-                # 尝试获取物品详细信息（标题、描述等）- 使用官方推荐的方式
+                item_ids.append(int(item_id))
+            except (TypeError, ValueError):
+                logger.error(f"无效的物品ID: {item_id}")
+        
+        # 读取每个物品的本地状态（在线程中执行，不阻塞事件循环）
+        def read_local_items():
+            results = []
+            for item_id in item_ids:
                 try:
-                    # 使用官方推荐的CreateQueryUGCDetailsRequest和SendQueryUGCRequest方法
-                    logger.debug(f'使用官方推荐方法获取物品 {item_id} 的详细信息')
-                    
-                    # 创建UGC详情查询请求
-                    query_handle = steamworks.Workshop.CreateQueryUGCDetailsRequest([item_id])
-                    
-                    if query_handle:
-                        # 设置回调函数
-                        details_received = False
-                        
-                        def query_completed_callback(result):
-                            nonlocal details_received
-                            details_received = True
-                            # 回调结果会在主线程中通过GetQueryUGCResult获取
-                            pass
-                        
-                        # 发送查询请求
-                        steamworks.Workshop.SendQueryUGCRequest(query_handle, callback=query_completed_callback, override_callback=True)
-                        
-                        # 等待查询完成（简单的轮询方式）
-                        import time
-                        timeout = 2  # 2秒超时
-                        start_time = time.time()
-                        
-                        # 由于这是异步回调，我们简单地等待一小段时间让查询有机会完成
-                        time.sleep(0.5)  # 等待0.5秒
-                        
-                        try:
-                            # 尝试获取查询结果
-                            result = steamworks.Workshop.GetQueryUGCResult(query_handle, 0)
-                            if result:
-                                # 从结果中提取信息
-                                if hasattr(result, 'title') and result.title:
-                                    item_info['title'] = result.title.decode('utf-8', errors='replace')
-                                if hasattr(result, 'description') and result.description:
-                                    item_info['description'] = result.description.decode('utf-8', errors='replace')
-                                # 获取创建和更新时间
-                                if hasattr(result, 'timeCreated'):
-                                    item_info['timeAdded'] = int(result.timeCreated)
-                                if hasattr(result, 'timeUpdated'):
-                                    item_info['timeUpdated'] = int(result.timeUpdated)
-                                # 获取作者信息
-                                if hasattr(result, 'steamIDOwner'):
-                                    item_info['steamIDOwner'] = str(result.steamIDOwner)
-                                # 获取文件大小信息
-                                if hasattr(result, 'fileSize'):
-                                    item_info['fileSizeOnDisk'] = int(result.fileSize)
-                                
-                                logger.info(f"成功获取物品 {item_id} 的详情信息")
-                        except Exception as query_error:
-                            logger.warning(f"获取查询结果时出错: {query_error}")
-                except Exception as api_error:
-                    logger.warning(f"使用官方API获取物品 {item_id} 详情时出错: {api_error}")
-                
-                # 作为备选方案，如果本地有安装路径，尝试从本地文件获取信息
-                if item_info['title'].startswith('未知物品_') or not item_info['description']:
-                    install_folder = item_info.get('installedFolder')
-                    if install_folder and os.path.exists(install_folder):
-                        logger.debug(f'尝试从安装文件夹获取物品信息: {install_folder}')
-                        # 查找可能的配置文件来获取更多信息
-                        config_files = [
-                            os.path.join(install_folder, "config.json"),
-                            os.path.join(install_folder, "package.json"),
-                            os.path.join(install_folder, "info.json"),
-                            os.path.join(install_folder, "manifest.json"),
-                            os.path.join(install_folder, "README.md"),
-                            os.path.join(install_folder, "README.txt")
-                        ]
-                        
-                        for config_path in config_files:
-                            if os.path.exists(config_path):
-                                try:
-                                    with open(config_path, 'r', encoding='utf-8') as f:
-                                        if config_path.endswith('.json'):
-                                            config_data = json.load(f)
-                                            # 尝试从配置文件中提取标题和描述
-                                            if "title" in config_data and config_data["title"]:
-                                                item_info["title"] = config_data["title"]
-                                            elif "name" in config_data and config_data["name"]:
-                                                item_info["title"] = config_data["name"]
-                                            
-                                            if "description" in config_data and config_data["description"]:
-                                                item_info["description"] = config_data["description"]
-                                        else:
-                                            # 对于文本文件，将第一行作为标题
-                                            first_line = f.readline().strip()
-                                            if first_line and item_info['title'].startswith('未知物品_'):
-                                                item_info['title'] = first_line[:100]  # 限制长度
-                                    logger.info(f"从本地文件 {os.path.basename(config_path)} 成功获取物品 {item_id} 的信息")
-                                    break
-                                except Exception as file_error:
-                                    logger.warning(f"读取配置文件 {config_path} 时出错: {file_error}")
-                # 移除了没有对应try块的except语句
-                
-                # 确保publishedFileId是字符串类型
-                item_info['publishedFileId'] = str(item_info['publishedFileId'])
-                
-                # 尝试获取预览图信息 - 优先从本地文件夹查找
-                preview_url = None
-                install_folder = item_info.get('installedFolder')
-                if install_folder and os.path.exists(install_folder):
+                    item_info, installed_timestamp = _read_local_item_info(steamworks, item_id)
+                    results.append((item_id, item_info, installed_timestamp, None))
+                except Exception as item_error:
+                    logger.error(f"获取物品 {item_id} 信息时出错: {item_error}")
+                    results.append((item_id, None, 0, item_error))
+            return results
+        
+        local_items = await asyncio.to_thread(read_local_items)
+        
+        # 批量获取物品详情（缓存命中时无需访问Steam）
+        try:
+            details = await get_workshop_item_cache().get_details(
+                steamworks,
+                [item_id for item_id, item_info, _, _ in local_items if item_info is not None],
+                {item_id: installed_timestamp for item_id, _, installed_timestamp, _ in local_items},
+            )
+        except Exception as api_error:
+            logger.warning(f"批量获取创意工坊物品详情时出错: {api_error}")
+            details = {}
+        
+        # 补全详情、本地备选信息与预览图（涉及文件访问，同样在线程中执行）
+        def complete_items():
+            items_info = []
+            for item_id, item_info, _, item_error in local_items:
+                if item_info is not None:
                     try:
-                        # 使用辅助函数查找预览图
-                        preview_image_path = find_preview_image_in_folder(install_folder)
-                        if preview_image_path:
-                            # 为前端提供代理访问的路径格式
-                            # 需要将路径标准化，确保可以通过proxy-image API访问
-                            if os.name == 'nt':
-                                # Windows路径处理
-                                proxy_path = preview_image_path.replace('\\', '/')
-                            else:
-                                proxy_path = preview_image_path
-                            preview_url = f"/api/steam/proxy-image?image_path={quote(proxy_path)}"
-                            logger.debug(f'为物品 {item_id} 找到本地预览图: {preview_url}')
-                    except Exception as preview_error:
-                        logger.warning(f'查找物品 {item_id} 预览图时出错: {preview_error}')
-                
-                # 添加预览图URL到物品信息
-                if preview_url:
-                    item_info['previewUrl'] = preview_url
-                
-                # 添加物品信息到结果列表
-                items_info.append(item_info)
-                logger.debug(f'物品 {item_id} 信息已添加到结果列表: {item_info["title"]}')
-                
-            except Exception as item_error:
-                logger.error(f"获取物品 {item_id} 信息时出错: {item_error}")
+                        items_info.append(_complete_item_info(item_info, details.get(item_id)))
+                        continue
+                    except Exception as e:
+                        item_error = e
+                        logger.error(f"获取物品 {item_id} 信息时出错: {item_error}")
                 # 即使出错，也添加一个最基本的物品信息到列表中
-                try:
-                    basic_item_info = {
-                        "publishedFileId": str(item_id),  # 确保是字符串类型
-                        "title": f"未知物品_{item_id}",
-                        "description": "无法获取详细信息",
-                        "state": {
-                            "subscribed": True,
-                            "installed": False,
-                            "downloading": False,
-                            "needsUpdate": False,
-                            "error": True
-                        },
-                        "error_message": str(item_error)
-                    }
-                    items_info.append(basic_item_info)
-                    logger.info(f'已添加物品 {item_id} 的基本信息到结果列表')
-                except Exception as basic_error:
-                    logger.error(f"添加基本物品信息也失败了: {basic_error}")
-                # 继续处理下一个物品
-                continue
+                items_info.append(_basic_item_info(item_id, item_error))
+            return items_info
+        
+        items_info = await asyncio.to_thread(complete_items)
         
         return {
             "success": True,
@@ -396,6 +379,7 @@ def get_subscribed_workshop_items():
         }, status_code=500)
 
 
+
 @router.get('/item/{item_id}/path')
 def get_workshop_item_path(item_id: str):
     """
@@ -464,7 +448,7 @@ def get_workshop_item_path(item_id: str):
 
 
 @router.get('/item/{item_id}')
-def get_workshop_item_details(item_id: str):
+async def get_workshop_item_details(item_id: str):
     """
     获取单个Steam创意工坊物品的详细信息
     """
@@ -485,16 +469,8 @@ def get_workshop_item_details(item_id: str):
         # 获取物品状态
         item_state = steamworks.Workshop.GetItemState(item_id_int)
         
-        # 创建查询请求，传入必要的published_file_ids参数
-        query_handle = steamworks.Workshop.CreateQueryUGCDetailsRequest([item_id_int])
-        
-        # 发送查询请求
-        # 注意：SendQueryUGCRequest返回None而不是布尔值
-        steamworks.Workshop.SendQueryUGCRequest(query_handle)
-        time.sleep(0.5)
-        
-        # 直接获取查询结果，不检查handle
-        result = steamworks.Workshop.GetQueryUGCResult(query_handle, 0)
+        # 查询物品详情（等待查询完成的回调，而不是固定等待）
+        result = (await query_ugc_details(steamworks, [item_id_int])).get(item_id_int)
             
         if result:
             # 获取物品安装信息 - 支持字典格式（根据workshop.py的实现）
@@ -751,8 +727,9 @@ async def scan_local_workshop_items(request: Request):
         # 获取Steam下载的workshop路径，这个路径需要被排除
         steam_workshop_path = get_workshop_path()
         
-        # 遍历文件夹，扫描所有子文件夹
-        for item_folder in os.listdir(folder_path):
+        # 遍历文件夹，找出所有子文件夹
+        item_folders = []
+        for item_folder in await asyncio.to_thread(os.listdir, folder_path):
             item_path = os.path.join(folder_path, item_folder)
             if os.path.isdir(item_path):
                     
@@ -760,21 +737,24 @@ async def scan_local_workshop_items(request: Request):
                 if os.path.normpath(item_path) == os.path.normpath(steam_workshop_path):
                     logger.info(f"跳过Steam下载的workshop目录: {item_path}")
                     continue
-                stat_info = os.stat(item_path)
-                
-                # 处理预览图路径（如果有）
-                preview_image = find_preview_image_in_folder(item_path)
-                
-                local_items.append({
-                    "id": f"local_{item_id}",
-                    "name": item_folder,
-                    "path": item_path,  # 返回绝对路径
-                    "lastModified": stat_info.st_mtime,
-                    "size": get_folder_size(item_path),
-                    "tags": ["本地文件"],
-                    "previewImage": preview_image  # 返回绝对路径
-                })
-                item_id += 1
+                item_folders.append((item_folder, item_path))
+        
+        # 在线程池中并发获取修改时间、大小与预览图（未变化的目录直接使用缓存）
+        index = get_local_content_index()
+        descriptions = await index.describe_many([item_path for _, item_path in item_folders])
+        for (item_folder, item_path), description in zip(item_folders, descriptions):
+            if description is None:
+                continue
+            local_items.append({
+                "id": f"local_{item_id}",
+                "name": item_folder,
+                "path": item_path,  # 返回绝对路径
+                "lastModified": description["lastModified"],
+                "size": description["size"],
+                "tags": ["本地文件"],
+                "previewImage": description["previewImage"]  # 返回绝对路径
+            })
+            item_id += 1
         
         logger.info(f"扫描完成，找到 {len(local_items)} 个本地创意工坊物品")
         
@@ -845,17 +825,17 @@ async def get_local_workshop_item(item_id: str, folder_path: str = None):
                 # 检查folder_path是否已经是项目文件夹路径
                 if os.path.isdir(folder_path):
                     # 情况1：folder_path直接指向项目文件夹
-                    stat_info = os.stat(folder_path)
                     item_name = os.path.basename(folder_path)
+                    description = await asyncio.to_thread(get_local_content_index().describe, folder_path)
                     
                     item = {
                         "id": item_id,
                         "name": item_name,
                         "path": folder_path,
-                        "lastModified": stat_info.st_mtime,
-                        "size": get_folder_size(folder_path),
+                        "lastModified": description["lastModified"],
+                        "size": description["size"],
                         "tags": ["模组"],
-                        "previewImage": find_preview_image_in_folder(folder_path)
+                        "previewImage": description["previewImage"]
                     }
                     
                     return JSONResponse(content={"success": True, "item": item})
@@ -865,15 +845,15 @@ async def get_local_workshop_item(item_id: str, folder_path: str = None):
                     for i, item_folder in enumerate(os.listdir(folder_path)):
                         item_path = os.path.join(folder_path, item_folder)
                         if os.path.isdir(item_path) and i + 1 == index:
-                            stat_info = os.stat(item_path)
+                            description = await asyncio.to_thread(get_local_content_index().describe, item_path)
                             items.append({
                                 "id": f"local_{i + 1}",
                                 "name": item_folder,
                                 "path": item_path,
-                                "lastModified": stat_info.st_mtime,
-                                "size": get_folder_size(item_path),
+                                "lastModified": description["lastModified"],
+                                "size": description["size"],
                                 "tags": ["模组"],
-                                "previewImage": find_preview_image_in_folder(item_path)
+                                "previewImage": description["previewImage"]
                             })
                             break
                     
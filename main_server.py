@@ -38,6 +38,7 @@ import logging
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from main_logic import core as core, cross_server as cross_server
+from main_logic.tts_pool import get_tts_worker_pool
 from fastapi.templating import Jinja2Templates
 from threading import Thread, Event as ThreadEvent
 from queue import Queue
@@ -144,6 +145,11 @@ def cleanup():
                 sync_message_queue[k].get_nowait()
         except:
             pass
+    # 关闭TTS进程池中预热的子进程
+    try:
+        get_tts_worker_pool().shutdown()
+    except Exception as e:
+        logger.warning(f"关闭TTS进程池失败: {e}")
     logger.info("Cleanup completed")
 
 # 只在主进程中注册 cleanup 函数，防止子进程退出时执行清理
@@ -379,6 +385,10 @@ if _IS_MAIN_PROCESS:
         app.mount("/user_mods", CustomStaticFiles(directory=user_mod_path), name="user_mods")
         logger.info(f"已挂载用户mod路径: {user_mod_path}")
 
+    # 后台建立/校验Live2D模型目录索引，首次打开模型列表时无需等待扫描
+    from utils.model_catalog import get_model_catalog
+    get_model_catalog().warm()
+
 # --- Initialize Shared State and Mount Routers ---
 # Import and mount routers from main_routers package
 from main_routers import (
@@ -543,33 +553,6 @@ def _format_size(size_bytes):
 
 
 
-# 辅助函数
-def get_folder_size(folder_path):
-    """获取文件夹大小（字节）"""
-    total_size = 0
-    for dirpath, dirnames, filenames in os.walk(folder_path):
-        for filename in filenames:
-            filepath = os.path.join(dirpath, filename)
-            try:
-                total_size += os.path.getsize(filepath)
-            except (OSError, FileNotFoundError):
-                continue
-    return total_size
-
-def find_preview_image_in_folder(folder_path):
-    """在文件夹中查找预览图片，只查找指定的8个图片名称"""
-    # 按优先级顺序查找指定的图片文件列表
-    preview_image_names = ['preview.jpg', 'preview.png', 'thumbnail.jpg', 'thumbnail.png', 
-                         'icon.jpg', 'icon.png', 'header.jpg', 'header.png']
-    
-    for image_name in preview_image_names:
-        image_path = os.path.join(folder_path, image_name)
-        if os.path.exists(image_path) and os.path.isfile(image_path):
-            return image_path
-    
-    # 如果找不到指定的图片名称，返回None
-    return None
-
 # --- Run the Server ---
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+记忆写入用的嵌入服务层
+
+- 按内容哈希去重，同一段文本只嵌入一次
+- 持久化嵌入缓存（SQLite），键为 (model, hash)，API 后端的 model 为 "模型名@base_url"
+- 合并并发请求（/process 与 /renew 同时到达时）为批量 API 调用
+- 提供离线可用的本地哈希嵌入后端（HashingEmbedder）
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import zlib
+
+import numpy as np
+
+from config import SEMANTIC_MODEL
+from utils.config_manager import get_config_manager
+
+logger = logging.getLogger(__name__)
+
+# DashScope 兼容接口单次最多接受 10 条文本
+EMBEDDING_BATCH_SIZE = 10
+# 合并并发请求的等待窗口（秒）
+EMBEDDING_BATCH_WINDOW = 0.02
+# 本地哈希嵌入的维度
+HASHING_EMBEDDING_DIM = 512
+
+_CJK_RE = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯]')
+_TOKEN_RE = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯]|[A-Za-z0-9_]+')
+
+
+def content_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class HashingEmbedder:
+    """本地哈希嵌入：CJK 字符一元/二元组 + 拉丁词，使用带符号的特征哈希，完全离线"""
+
+    def __init__(self, dim=HASHING_EMBEDDING_DIM):
+        self.dim = dim
+        self.model_name = f"local-hashing-{dim}"
+
+    def _features(self, text):
+        tokens = _TOKEN_RE.findall(text.lower())
+        features = list(tokens)
+        for a, b in zip(tokens, tokens[1:]):
+            if _CJK_RE.fullmatch(a) and _CJK_RE.fullmatch(b):
+                features.append(a + b)
+        return features
+
+    def _embed(self, text):
+        counts = {}
+        for feature in self._features(text):
+            h = zlib.crc32(feature.encode('utf-8'))
+            counts[h] = counts.get(h, 0) + 1
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for h, tf in counts.items():
+            sign = 1.0 if (h >> 31) & 1 else -1.0
+            vector[h % self.dim] += sign * (1.0 + math.log(tf))
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+    async def aembed_documents(self, texts):
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text):
+        return self.embed_query(text)
+
+
+class EmbeddingCache:
+    """持久化嵌入缓存，向量以 float32 字节存储"""
+
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embedding_cache ("
+                "model TEXT NOT NULL, hash TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, hash))"
+            )
+            self._conn.commit()
+
+    def get_many(self, model, hashes):
+        if not hashes:
+            return {}
+        result = {}
+        with self._lock:
+            # SQLite 默认单条语句最多 999 个参数
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT hash, vector FROM embedding_cache WHERE model = ? AND hash IN ({placeholders})",
+                    [model, *chunk]
+                ).fetchall()
+                for h, blob in rows:
+                    result[h] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return result
+
+    def put_many(self, model, items):
+        if not items:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (model, hash, vector) VALUES (?, ?, ?)",
+                [(model, h, np.asarray(v, dtype=np.float32).tobytes()) for h, v in items]
+            )
+            self._conn.commit()
+
+
+class EmbeddingService:
+    """带缓存与批量合并的嵌入服务，接口与 langchain Embeddings 保持一致"""
+
+    def __init__(self, backend, model_name, cache, batch_size=EMBEDDING_BATCH_SIZE, batch_window=EMBEDDING_BATCH_WINDOW):
+        self.backend = backend
+        self.model_name = model_name
+        self.cache = cache
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self._queued = {}   # hash -> text，等待下一次批量调用
+        self._futures = {}  # hash -> Future，包括已发出但未返回的请求
+        self._flush_task = None
+        self.stats = {'requested': 0, 'cache_hits': 0, 'api_calls': 0, 'embedded': 0}
+
+    # --- 异步批量路径 ---
+
+    async def aembed_documents(self, texts):
+        texts = list(texts)
+        if not texts:
+            return []
+        hashes = [content_hash(t) for t in texts]
+        unique = dict(zip(hashes, texts))
+        self.stats['requested'] += len(texts)
+
+        result = await asyncio.to_thread(self.cache.get_many, self.model_name, list(unique))
+        self.stats['cache_hits'] += len(result)
+
+        loop = asyncio.get_running_loop()
+        waiting = {}
+        for h, t in unique.items():
+            if h in result:
+                continue
+            if h not in self._futures:
+                self._futures[h] = loop.create_future()
+                self._queued[h] = t
+            waiting[h] = self._futures[h]
+
+        if self._queued and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+        for h, fut in waiting.items():
+            result[h] = await asyncio.shield(fut)
+        return [result[h] for h in hashes]
+
+    async def aembed_query(self, text):
+        return (await self.aembed_documents([text]))[0]
+
+    async def _flush_loop(self):
+        # 等待一个短窗口，让同时到达的请求合并进同一批
+        await asyncio.sleep(self.batch_window)
+        while self._queued:
+            batch = list(self._queued.items())[:self.batch_size]
+            for h, _ in batch:
+                del self._queued[h]
+            batch_hashes = [h for h, _ in batch]
+            batch_texts = [t for _, t in batch]
+            try:
+                self.stats['api_calls'] += 1
+                vectors = await self.backend.aembed_documents(batch_texts)
+            except Exception as e:
+                logger.error(f"[Embedding] 批量嵌入失败 ({len(batch_texts)} 条): {e}")
+                for h in batch_hashes:
+                    fut = self._futures.pop(h, None)
+                    if fut is not None and not fut.done():
+                        fut.set_exception(e)
+                continue
+
+            self.stats['embedded'] += len(vectors)
+            try:
+                await asyncio.to_thread(self.cache.put_many, self.model_name, list(zip(batch_hashes, vectors)))
+            except Exception as e:
+                logger.warning(f"[Embedding] 写入嵌入缓存失败: {e}")
+            for h, v in zip(batch_hashes, vectors):
+                fut = self._futures.pop(h, None)
+                if fut is not None and not fut.done():
+                    fut.set_result(v)
+
+    # --- 同步路径（供非异步调用方使用） ---
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        if not texts:
+            return []
+        hashes = [content_hash(t) for t in texts]
+        unique = dict(zip(hashes, texts))
+        self.stats['requested'] += len(texts)
+
+        result = self.cache.get_many(self.model_name, list(unique))
+        self.stats['cache_hits'] += len(result)
+        missing = [(h, t) for h, t in unique.items() if h not in result]
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            self.stats['api_calls'] += 1
+            vectors = self.backend.embed_documents([t for _, t in batch])
+            self.stats['embedded'] += len(vectors)
+            items = list(zip([h for h, _ in batch], vectors))
+            self.cache.put_many(self.model_name, items)
+            result.update(items)
+        return [result[h] for h in hashes]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+_embedding_cache = None
+_embedding_services = {}
+
+
+def get_embedding_service(backend='auto'):
+    """
+    获取嵌入服务单例（所有角色共享，以便合并并发请求）
+
+    Args:
+        backend: 'api' 使用 summary 模型对应的 OpenAI 兼容嵌入接口，
+                 'local' 使用离线哈希嵌入，'auto' 在未配置 API Key 时回退到 local
+    """
+    global _embedding_cache
+    config_manager = get_config_manager()
+    api_config = config_manager.get_model_api_config('summary')
+    if backend == 'auto':
+        backend = 'api' if api_config.get('api_key') else 'local'
+
+    if backend == 'local':
+        key = ('local',)
+    else:
+        key = ('api', SEMANTIC_MODEL, api_config['base_url'], api_config['api_key'])
+    if key in _embedding_services:
+        return _embedding_services[key]
+
+    if _embedding_cache is None:
+        config_manager.ensure_memory_directory()
+        _embedding_cache = EmbeddingCache(os.path.join(str(config_manager.memory_dir), 'embedding_cache.db'))
+
+    if backend == 'local':
+        embedder = HashingEmbedder()
+        service = EmbeddingService(embedder, embedder.model_name, _embedding_cache, batch_size=256)
+    else:
+        from langchain_openai import OpenAIEmbeddings
+        embedder = OpenAIEmbeddings(
+            base_url=api_config['base_url'],
+            model=SEMANTIC_MODEL,
+            api_key=api_config['api_key'],
+            chunk_size=EMBEDDING_BATCH_SIZE,
+            # 非 OpenAI 的兼容接口不接受 token id 形式的输入
+            check_embedding_ctx_length=False,
+        )
+        # 同名模型在不同服务商处的向量不通用，缓存与向量索引都以 模型名@base_url 区分
+        service = EmbeddingService(embedder, f"{SEMANTIC_MODEL}@{api_config['base_url']}", _embedding_cache)
+    _embedding_services[key] = service
+    return service
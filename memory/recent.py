@@ -2,13 +2,14 @@ from datetime import datetime
 from config import get_extra_body
 from utils.config_manager import get_config_manager
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage, messages_to_dict, messages_from_dict, HumanMessage, AIMessage
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 import json
 import os
 import asyncio
 import logging
 from openai import APIConnectionError, InternalServerError, RateLimitError
 
+from utils.recent_store import RecentHistoryStore
 from config.prompts_sys import recent_history_manager_prompt, detailed_recent_history_manager_prompt, further_summarize_prompt, history_review_prompt
 
 # Setup logger
@@ -24,13 +25,10 @@ class CompressedRecentHistoryManager:
         self.log_file_path = recent_log
         self.name_mapping = name_mapping
         self.user_histories = {}
+        self._stores = {}
         for ln in self.log_file_path:
-            if os.path.exists(self.log_file_path[ln]):
-                with open(self.log_file_path[ln], encoding='utf-8') as f:
-                    self.user_histories[ln] = messages_from_dict(json.load(f))
-            else:
-                self.user_histories[ln] = []
-    
+            self.user_histories[ln] = self._get_store(ln).messages
+
     def _get_llm(self):
         """动态获取LLM实例以支持配置热重载"""
         api_config = self._config_manager.get_model_api_config('summary')
@@ -53,8 +51,25 @@ class CompressedRecentHistoryManager:
             extra_body=get_extra_body(api_config['model']) or None
         )
 
-    async def update_history(self, new_messages, lanlan_name, detailed=False):
-        # 检查角色是否存在于配置中，如果不存在则创建默认路径
+    def _get_store(self, lanlan_name):
+        """获取角色的历史记录存储，路径变化（如角色改名）时重新创建"""
+        path = self.log_file_path[lanlan_name]
+        store = self._stores.get(lanlan_name)
+        if store is None or store.snapshot_path != path:
+            store = RecentHistoryStore(path)
+            self._stores[lanlan_name] = store
+        return store
+
+    def get_history_version(self, lanlan_name):
+        """返回角色近期记忆的版本标识（文件被外部修改时先重新加载），尚未加载过时返回 None"""
+        store = self._stores.get(lanlan_name)
+        if store is None:
+            return None
+        store.ensure_fresh()
+        return (id(store), store.version)
+
+    def _resolve_log_path(self, lanlan_name):
+        """确保 self.log_file_path 中有该角色的路径，不在配置中时使用默认路径；失败返回 False"""
         try:
             _, _, _, _, _, _, _, _, _, recent_log = self._config_manager.get_character_data()
             # 更新文件路径映射
@@ -81,62 +96,33 @@ class CompressedRecentHistoryManager:
                     logger.info(f"[RecentHistory] 使用默认路径: {default_path}")
             except Exception as e2:
                 logger.error(f"创建默认路径失败: {e2}")
-                return
-        
-        # 确保角色在 user_histories 中
-        if lanlan_name not in self.user_histories:
-            self.user_histories[lanlan_name] = []
-        
-        # 如果文件存在，加载历史记录
-        if lanlan_name in self.log_file_path and os.path.exists(self.log_file_path[lanlan_name]):
-            try:
-                with open(self.log_file_path[lanlan_name], encoding='utf-8') as f:
-                    file_content = json.load(f)
-                    if file_content:
-                        self.user_histories[lanlan_name] = messages_from_dict(file_content)
-            except (json.JSONDecodeError, Exception) as e:
-                logger.warning(f"读取 {lanlan_name} 的历史记录文件失败: {e}，使用空列表")
-                self.user_histories[lanlan_name] = []
+                return False
+        return True
 
-        try:
-            self.user_histories[lanlan_name].extend(new_messages)
-            logger.info(f"[RecentHistory] {lanlan_name} 添加了 {len(new_messages)} 条新消息，当前共 {len(self.user_histories[lanlan_name])} 条")
+    async def update_history(self, new_messages, lanlan_name, detailed=False):
+        if not self._resolve_log_path(lanlan_name):
+            return
 
-            # 确保文件目录存在
-            file_path = self.log_file_path[lanlan_name]
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            
-            with open(file_path, "w", encoding='utf-8') as f:  # Save the updated history to file before compressing
-                json.dump(messages_to_dict(self.user_histories[lanlan_name]), f, indent=2, ensure_ascii=False)
+        try:
+            store = self._get_store(lanlan_name)
+            # 内存副本是权威的，只有文件被外部修改过才重新加载
+            store.ensure_fresh()
+            # 只把新消息追加进日志，磁盘写入量与新消息数成正比
+            store.append(new_messages)
+            self.user_histories[lanlan_name] = store.messages
+            logger.info(f"[RecentHistory] {lanlan_name} 添加了 {len(new_messages)} 条新消息，当前共 {len(store.messages)} 条")
 
-            if len(self.user_histories[lanlan_name]) > self.max_history_length:
+            if len(store.messages) > self.max_history_length:
                 # 压缩旧消息
-                to_compress = self.user_histories[lanlan_name][:-self.max_history_length+1]
-                compressed = [(await self.compress_history(to_compress, lanlan_name, detailed))[0]]
+                to_compress = store.messages[:-self.max_history_length+1]
+                compressed = (await self.compress_history(to_compress, lanlan_name, detailed))[0]
 
-                # 只保留最近的max_history_length条消息
-                self.user_histories[lanlan_name] = compressed + self.user_histories[lanlan_name][-self.max_history_length+1:]
+                # 只保留最近的max_history_length条消息；压缩期间追加到尾部的消息不受影响
+                store.compress_head(len(to_compress), compressed)
+                self.user_histories[lanlan_name] = store.messages
+            logger.info(f"[RecentHistory] {lanlan_name} 历史记录已保存到文件: {store.snapshot_path}")
         except Exception as e:
             logger.error(f"[RecentHistory] 更新历史记录时出错: {e}", exc_info=True)
-            # 即使出错，也尝试保存当前状态
-            try:
-                file_path = self.log_file_path[lanlan_name]
-                os.makedirs(os.path.dirname(file_path), exist_ok=True)
-                with open(file_path, "w", encoding='utf-8') as f:
-                    json.dump(messages_to_dict(self.user_histories.get(lanlan_name, [])), f, indent=2, ensure_ascii=False)
-            except Exception as save_error:
-                logger.error(f"[RecentHistory] 保存历史记录失败: {save_error}", exc_info=True)
-            return
-
-        # 最终保存
-        try:
-            file_path = self.log_file_path[lanlan_name]
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            with open(file_path, "w", encoding='utf-8') as f:
-                json.dump(messages_to_dict(self.user_histories[lanlan_name]), f, indent=2, ensure_ascii=False)
-            logger.info(f"[RecentHistory] {lanlan_name} 历史记录已保存到文件: {file_path}")
-        except Exception as e:
-            logger.error(f"[RecentHistory] 最终保存历史记录失败: {e}", exc_info=True)
 
 
     # detailed: 保留尽可能多的细节
@@ -248,47 +234,16 @@ class CompressedRecentHistoryManager:
         return None
 
     def get_recent_history(self, lanlan_name):
-        # 检查角色是否存在于配置中，如果不存在则创建默认路径
+        if not self._resolve_log_path(lanlan_name):
+            return []
+
         try:
-            _, _, _, _, _, _, _, _, _, recent_log = self._config_manager.get_character_data()
-            # 更新文件路径映射
-            self.log_file_path = recent_log
-            
-            # 如果角色不在配置中，使用默认路径
-            if lanlan_name not in recent_log:
-                # 确保memory目录存在
-                self._config_manager.ensure_memory_directory()
-                memory_base = str(self._config_manager.memory_dir)
-                default_path = os.path.join(memory_base, f'recent_{lanlan_name}.json')
-                self.log_file_path[lanlan_name] = default_path
-                logger.info(f"[RecentHistory] 角色 '{lanlan_name}' 不在配置中，使用默认路径: {default_path}")
+            store = self._get_store(lanlan_name)
+            self.user_histories[lanlan_name] = store.ensure_fresh()
         except Exception as e:
-            logger.error(f"检查角色配置失败: {e}")
-            # 即使配置检查失败，也尝试使用默认路径
-            try:
-                memory_base = str(self._config_manager.memory_dir)
-                default_path = f'{memory_base}/recent_{lanlan_name}.json'
-                if lanlan_name not in self.log_file_path:
-                    self.log_file_path[lanlan_name] = default_path
-            except Exception as e2:
-                logger.error(f"创建默认路径失败: {e2}")
-                return []
-        
-        # 确保角色在 user_histories 中
-        if lanlan_name not in self.user_histories:
+            logger.warning(f"读取 {lanlan_name} 的历史记录文件失败: {e}，使用空列表")
             self.user_histories[lanlan_name] = []
         
-        # 如果文件存在，加载历史记录
-        if lanlan_name in self.log_file_path and os.path.exists(self.log_file_path[lanlan_name]):
-            try:
-                with open(self.log_file_path[lanlan_name], encoding='utf-8') as f:
-                    file_content = json.load(f)
-                    if file_content:
-                        self.user_histories[lanlan_name] = messages_from_dict(file_content)
-            except (json.JSONDecodeError, Exception) as e:
-                logger.warning(f"读取 {lanlan_name} 的历史记录文件失败: {e}，使用空列表")
-                self.user_histories[lanlan_name] = []
-        
         return self.user_histories.get(lanlan_name, [])
 
     async def review_history(self, lanlan_name, cancel_event=None):
@@ -401,12 +356,10 @@ class CompressedRecentHistoryManager:
                             # 默认作为用户消息处理
                             corrected_messages.append(HumanMessage(content=content))
                     
-                    # 更新历史记录
-                    self.user_histories[lanlan_name] = corrected_messages
-                    
-                    # 保存到文件
-                    with open(self.log_file_path[lanlan_name], "w", encoding='utf-8') as f:
-                        json.dump(messages_to_dict(corrected_messages), f, indent=2, ensure_ascii=False)
+                    # 更新历史记录并原子写入新快照
+                    store = self._get_store(lanlan_name)
+                    store.replace(corrected_messages)
+                    self.user_histories[lanlan_name] = store.messages
                     
                     print(f"✅ {lanlan_name} 的记忆已修正并保存")
                     return True
@@ -1,17 +1,56 @@
 # from langchain_chroma import Chroma
-# ↑ 这个库引入了Chroma和onnx依赖，显著增大了一键包体积，暂时注释掉
+# ↑ 这个库引入了Chroma和onnx依赖，显著增大了一键包体积，改用本地的 LocalVectorIndex
 from typing import List
 from langchain_core.documents import Document
+from langchain_core.messages import messages_from_dict
+from sqlalchemy import text
 from datetime import datetime
 from memory.recent import CompressedRecentHistoryManager
-from config import SEMANTIC_MODEL, RERANKER_MODEL, get_extra_body
+from memory.vectorindex import LocalVectorIndex
+from memory.embedding import get_embedding_service
+from config import RERANKER_MODEL, TIME_ORIGINAL_TABLE_NAME, TIME_COMPRESSED_TABLE_NAME, get_extra_body
 from utils.config_manager import get_config_manager
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from langchain_openai import ChatOpenAI
 from config.prompts_sys import semantic_manager_prompt
 import json
 import asyncio
+import logging
 from openai import APIConnectionError, InternalServerError, RateLimitError
 
+logger = logging.getLogger(__name__)
+
+# 从时间索引 SQLite 增量同步时，每批读取的行数
+SYNC_BATCH_ROWS = 256
+
+
+def _build_metadata(event_id, role, when=None):
+    """构造向量索引的元数据，when 为空时使用当前时间"""
+    if when is None:
+        when = datetime.now()
+    return {
+        "event_id": event_id,
+        "role": role,
+        "year": str(when.year),
+        "month": "%02d" % (when.month),
+        "day": "%02d" % (when.day),
+        "weekday": "%02d" % (when.weekday()),
+        "hour": "%02d" % (when.hour),
+        "minute": "%02d" % (when.minute),
+        "timestamp": when.isoformat()
+    }
+
+
+def _parse_timestamp(value):
+    if isinstance(value, datetime):
+        return value
+    if value:
+        try:
+            return datetime.fromisoformat(str(value))
+        except ValueError:
+            pass
+    return None
+
+
 class SemanticMemory:
     def __init__(self, recent_history_manager: CompressedRecentHistoryManager, persist_directory=None):
         self._config_manager = get_config_manager()
@@ -30,14 +69,22 @@ class SemanticMemory:
         api_config = self._config_manager.get_model_api_config('summary')
         return ChatOpenAI(model=RERANKER_MODEL, base_url=api_config['base_url'], api_key=api_config['api_key'], temperature=0.1, extra_body=get_extra_body(RERANKER_MODEL) or None)
 
-    async def store_conversation(self, event_id, messages, lanlan_name):
-        self.original_memory[lanlan_name].store_conversation(event_id, messages)
-        await self.compressed_memory[lanlan_name].store_compressed_summary(event_id, messages)
+    async def store_conversation(self, event_id, messages, lanlan_name, summary=None):
+        await self.original_memory[lanlan_name].store_conversation(event_id, messages)
+        await self.compressed_memory[lanlan_name].store_compressed_summary(event_id, messages, summary)
+
+    async def sync_from_time_index(self, lanlan_name, time_manager):
+        """从时间索引 SQLite 增量重建向量索引，只处理水位线之后的新行"""
+        engine = time_manager.engine.get(lanlan_name)
+        if engine is None or lanlan_name not in self.original_memory:
+            return
+        await self.original_memory[lanlan_name].sync_from_table(engine, TIME_ORIGINAL_TABLE_NAME)
+        await self.compressed_memory[lanlan_name].sync_from_table(engine, TIME_COMPRESSED_TABLE_NAME)
 
-    async def hybrid_search(self, query, lanlan_name, with_rerank=True, k=10):
+    async def hybrid_search(self, query, lanlan_name, with_rerank=True, k=10, filter=None):
         # 从原始和压缩记忆中获取结果
-        original_results = self.original_memory[lanlan_name].retrieve_by_query(query, k)
-        compressed_results = self.compressed_memory[lanlan_name].retrieve_by_query(query, k)
+        original_results = await self.original_memory[lanlan_name].retrieve_by_query(query, k, filter)
+        compressed_results = await self.compressed_memory[lanlan_name].retrieve_by_query(query, k, filter)
         combined = original_results + compressed_results
 
         if with_rerank:
@@ -98,21 +145,94 @@ class SemanticMemory:
         return []
 
 
-class SemanticMemoryOriginal:
-    def __init__(self, persist_directory, lanlan_name, name_mapping):
-        config_manager = get_config_manager()
-        api_config = config_manager.get_model_api_config('summary')
-        self.embeddings = OpenAIEmbeddings(base_url=api_config['base_url'], model=SEMANTIC_MODEL, api_key=api_config['api_key'])
+class _IndexedSemanticStore:
+    """SemanticMemoryOriginal / SemanticMemoryCompressed 共用的索引读写逻辑，子类提供 _row_to_text(message) -> (role, text)"""
+    collection_name = None
+
+    def _init_index(self, persist_directory, lanlan_name):
+        # 所有角色共享同一个带缓存、可合并批量请求的嵌入服务
+        self.embeddings = get_embedding_service()
         # self.vectorstore = Chroma(
-        #     collection_name="Origin",
+        #     collection_name=self.collection_name,
         #     persist_directory=persist_directory[lanlan_name],
         #     embedding_function=self.embeddings
         # )
-        self.vectorstore = None
+        self.vectorstore = LocalVectorIndex(
+            collection_name=self.collection_name,
+            persist_directory=persist_directory[lanlan_name],
+            embedding_function=self.embeddings
+        )
+
+    @staticmethod
+    def _fetch_rows(engine, table_name, last_rowid):
+        with engine.connect() as conn:
+            return conn.execute(
+                text(f"SELECT id, session_id, message, timestamp FROM {table_name} WHERE id > :last_rowid ORDER BY id LIMIT :limit"),
+                {"last_rowid": last_rowid, "limit": SYNC_BATCH_ROWS}
+            ).fetchall()
+
+    async def sync_from_table(self, engine, table_name):
+        last_rowid = self.vectorstore.synced_rowid
+        # 同步开始前已在索引中的事件（通过 store_conversation 直接写入）不再重复索引；
+        # 不能直接查 vectorstore.event_ids，本次同步写入的事件也会加入其中，导致同一会话后续批次的行被跳过
+        indexed_event_ids = set(self.vectorstore.event_ids)
+        while True:
+            rows = await asyncio.to_thread(self._fetch_rows, engine, table_name, last_rowid)
+            if not rows:
+                break
+
+            texts, metadatas = [], []
+            for rowid, session_id, message, timestamp in rows:
+                if session_id in indexed_event_ids:
+                    continue
+                try:
+                    msg = messages_from_dict([json.loads(message)])[0]
+                except Exception as e:
+                    logger.warning(f"[SemanticMemory] 跳过无法解析的记录 {table_name}#{rowid}: {e}")
+                    continue
+                role, content = self._row_to_text(msg)
+                if not content:
+                    continue
+                texts.append(content)
+                metadatas.append(_build_metadata(session_id, role, _parse_timestamp(timestamp)))
+
+            await self.vectorstore.aadd_texts(texts=texts, metadatas=metadatas)
+            last_rowid = rows[-1][0]
+            self.vectorstore.set_synced_rowid(last_rowid)
+            if len(rows) < SYNC_BATCH_ROWS:
+                break
+
+    async def retrieve_by_query(self, query, k=10, filter=None):
+        return await self.vectorstore.asimilarity_search(query, k=k, filter=filter)
+
+
+class SemanticMemoryOriginal(_IndexedSemanticStore):
+    collection_name = "Origin"
+
+    def __init__(self, persist_directory, lanlan_name, name_mapping):
         self.lanlan_name = lanlan_name
         self.name_mapping = name_mapping
+        self._init_index(persist_directory, lanlan_name)
+
+    def _format_message(self, message, name_mapping):
+        try:
+            parts = []
+            for i in message.content:
+                if isinstance(i, dict):
+                    parts.append(i.get("text", f"|{i.get('type','')}|"))
+                else:
+                    parts.append(str(i))
+            joined = "\n".join(parts)
+        except Exception:
+            joined = str(message.content)
+        return f"{name_mapping.get(message.type, message.type)} | {joined}\n"
+
+    def _row_to_text(self, message):
+        name_mapping = self.name_mapping.copy()
+        name_mapping['ai'] = self.lanlan_name
+        return message.type, self._format_message(message, name_mapping)
 
-    def store_conversation(self, event_id, messages):
+    async def store_conversation(self, event_id, messages):
         # 将对话转换为文本
         texts = []
         metadatas = []
@@ -120,72 +240,32 @@ class SemanticMemoryOriginal:
         name_mapping['ai'] = self.lanlan_name
 
         for message in messages:
-            try:
-                parts = []
-                for i in message.content:
-                    if isinstance(i, dict):
-                        parts.append(i.get("text", f"|{i.get('type','')}|"))
-                    else:
-                        parts.append(str(i))
-                joined = "\n".join(parts)
-            except Exception:
-                joined = str(message.content)
-            texts.append(f"{name_mapping[message.type]} | {joined}\n")
-            metadatas.append({
-                "event_id": event_id,
-                "role": message.type,
-                "year": str(datetime.now().year),
-                "month": "%02d" % (datetime.now().month),
-                "day": "%02d" % (datetime.now().day),
-                "weekday": "%02d" % (datetime.now().weekday()),
-                "hour": "%02d" % (datetime.now().hour),
-                "minute": "%02d" % (datetime.now().minute),
-                "timestamp": datetime.now().isoformat()
-            })
+            texts.append(self._format_message(message, name_mapping))
+            metadatas.append(_build_metadata(event_id, message.type))
 
         # 存储到向量数据库
-        self.vectorstore.add_texts(texts=texts, metadatas=metadatas)
+        await self.vectorstore.aadd_texts(texts=texts, metadatas=metadatas)
 
-    def retrieve_by_query(self, query, k=10):
-        # 在原始对话上进行精确语义搜索
-        return self.vectorstore.similarity_search(query, k=k)
 
+class SemanticMemoryCompressed(_IndexedSemanticStore):
+    collection_name = "Compressed"
 
-class SemanticMemoryCompressed:
     def __init__(self, persist_directory, lanlan_name, recent_history_manager: CompressedRecentHistoryManager, name_mapping):
         self.lanlan_name = lanlan_name
         self.name_mapping = name_mapping
-        config_manager = get_config_manager()
-        api_config = config_manager.get_model_api_config('summary')
-        self.embeddings = OpenAIEmbeddings(base_url=api_config['base_url'], model=SEMANTIC_MODEL, api_key=api_config['api_key'])
-        self.vectorstore = None
-        # self.vectorstore = Chroma(
-        #     collection_name="Compressed",
-        #     persist_directory=persist_directory[lanlan_name],
-        #     embedding_function=self.embeddings
-        # )
+        self._init_index(persist_directory, lanlan_name)
         self.recent_history_manager = recent_history_manager
 
-    async def store_compressed_summary(self, event_id, messages):
-        # 存储压缩摘要的嵌入
-        _, summary = await self.recent_history_manager.compress_history(messages, self.lanlan_name)
+    def _row_to_text(self, message):
+        return "SYSTEM_SUMMARY", message.content if isinstance(message.content, str) else str(message.content)
+
+    async def store_compressed_summary(self, event_id, messages, summary=None):
+        # 存储压缩摘要的嵌入；summary 由调用方预先计算时直接复用
+        if summary is None:
+            _, summary = await self.recent_history_manager.compress_history(messages, self.lanlan_name)
         if not summary:
             return
-        self.vectorstore.add_texts(
+        await self.vectorstore.aadd_texts(
             texts=[summary],
-            metadatas=[{
-                "event_id": event_id,
-                "role": "SYSTEM_SUMMARY",
-                "year": str(datetime.now().year),
-                "month": "%02d" % (datetime.now().month),
-                "day": "%02d" % (datetime.now().day),
-                "weekday": "%02d" % (datetime.now().weekday()),
-                "hour": "%02d" % (datetime.now().hour),
-                "minute": "%02d" % (datetime.now().minute),
-                "timestamp": datetime.now().isoformat()
-            }]
+            metadatas=[_build_metadata(event_id, "SYSTEM_SUMMARY")]
         )
-
-    def retrieve_by_query(self, query, k=10):
-        # 在压缩摘要上进行语义搜索
-        return self.vectorstore.similarity_search(query, k=k)
\ No newline at end of file
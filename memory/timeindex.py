@@ -1,34 +1,64 @@
-from langchain_community.chat_message_histories import SQLChatMessageHistory
-from langchain_core.messages import SystemMessage
-from sqlalchemy import create_engine, text
+from langchain_core.messages import SystemMessage, message_to_dict
+from sqlalchemy import create_engine, event, text
 from config import TIME_ORIGINAL_TABLE_NAME, TIME_COMPRESSED_TABLE_NAME
 from utils.config_manager import get_config_manager
 from datetime import datetime
+import asyncio
+import json
 import logging
 import os
 
 logger = logging.getLogger(__name__)
 
+
+def _create_sqlite_engine(db_path):
+    """每个角色一个共享连接池的引擎，连接建立时开启 WAL 模式"""
+    engine = create_engine(
+        f"sqlite:///{db_path}",
+        # 写入在线程池中执行，连接需允许跨线程使用
+        connect_args={"check_same_thread": False, "timeout": 30},
+    )
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragma(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+    return engine
+
+
 class TimeIndexedMemory:
     def __init__(self, recent_history_manager):
         self.engine = {}
         self.recent_history_manager = recent_history_manager
         _, _, _, _, _, _, _, time_store, _, _ = get_config_manager().get_character_data()
         for i in time_store:
-            self.engine[i] = create_engine(f"sqlite:///{time_store[i]}")
+            self._init_engine(i, time_store[i])
 
-            _ = SQLChatMessageHistory(
-                connection=self.engine[i],
-                session_id="",
-                table_name=TIME_ORIGINAL_TABLE_NAME,
-            )
+    def _init_engine(self, lanlan_name, db_path):
+        self.engine[lanlan_name] = _create_sqlite_engine(db_path)
+        self.create_tables(lanlan_name)
+        self.check_table_schema(lanlan_name)
+        self.create_indexes(lanlan_name)
 
-            _ = SQLChatMessageHistory(
-                connection=self.engine[i],
-                session_id="",
-                table_name=TIME_COMPRESSED_TABLE_NAME,
-            )
-            self.check_table_schema(i)
+    def create_tables(self, lanlan_name):
+        # 表结构与 langchain SQLChatMessageHistory 保持兼容，额外增加 timestamp 列
+        with self.engine[lanlan_name].connect() as conn:
+            for table_name in (TIME_ORIGINAL_TABLE_NAME, TIME_COMPRESSED_TABLE_NAME):
+                conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {table_name} ("
+                    f"id INTEGER NOT NULL PRIMARY KEY, session_id TEXT, message TEXT, timestamp DATETIME)"
+                ))
+            conn.commit()
+
+    def create_indexes(self, lanlan_name):
+        with self.engine[lanlan_name].connect() as conn:
+            for table_name in (TIME_ORIGINAL_TABLE_NAME, TIME_COMPRESSED_TABLE_NAME):
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_timestamp ON {table_name} (timestamp, session_id)"))
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_session_id ON {table_name} (session_id)"))
+            conn.commit()
 
     def add_timestamp_column(self, lanlan_name):
         with self.engine[lanlan_name].connect() as conn:
@@ -45,102 +75,65 @@ class TimeIndexedMemory:
                     return
             self.add_timestamp_column(lanlan_name)
 
-    async def store_conversation(self, event_id, messages, lanlan_name, timestamp=None):
-        # 检查角色是否存在于配置中，如果不存在则创建默认路径
+    def _ensure_engine(self, lanlan_name):
+        """确保角色的数据库引擎存在；角色不在配置中时使用默认路径"""
+        if lanlan_name in self.engine:
+            return True
         try:
             _, _, _, _, _, _, _, time_store, _, _ = get_config_manager().get_character_data()
-            
-            # 如果角色不在配置中，使用默认路径创建
-            if lanlan_name not in time_store:
-                config_mgr = get_config_manager()
-                # 确保memory目录存在
-                config_mgr.ensure_memory_directory()
-                memory_base = str(config_mgr.memory_dir)
-                default_path = os.path.join(memory_base, f'time_indexed_{lanlan_name}')
-                time_store[lanlan_name] = default_path
-                logger.info(f"[TimeIndexedMemory] 角色 '{lanlan_name}' 不在配置中，使用默认路径: {default_path}")
-            
-            # 确保数据库引擎存在
-            if lanlan_name not in self.engine:
-                # 创建数据库引擎和表
-                db_path = time_store[lanlan_name]
-                self.engine[lanlan_name] = create_engine(f"sqlite:///{db_path}")
-                _ = SQLChatMessageHistory(
-                    connection=self.engine[lanlan_name],
-                    session_id="",
-                    table_name=TIME_ORIGINAL_TABLE_NAME,
-                )
-                _ = SQLChatMessageHistory(
-                    connection=self.engine[lanlan_name],
-                    session_id="",
-                    table_name=TIME_COMPRESSED_TABLE_NAME,
-                )
-                self.check_table_schema(lanlan_name)
-                logger.info(f"[TimeIndexedMemory] 为角色 {lanlan_name} 创建数据库引擎: {db_path}")
+            db_path = time_store.get(lanlan_name)
         except Exception as e:
             logger.error(f"检查角色配置失败: {e}")
-            # 即使配置检查失败，也尝试使用默认路径
-            try:
+            db_path = None
+
+        try:
+            if db_path is None:
                 config_mgr = get_config_manager()
                 # 确保memory目录存在
                 config_mgr.ensure_memory_directory()
-                memory_base = str(config_mgr.memory_dir)
-                default_path = os.path.join(memory_base, f'time_indexed_{lanlan_name}')
-                if lanlan_name not in self.engine:
-                    self.engine[lanlan_name] = create_engine(f"sqlite:///{default_path}")
-                    _ = SQLChatMessageHistory(
-                        connection=self.engine[lanlan_name],
-                        session_id="",
-                        table_name=TIME_ORIGINAL_TABLE_NAME,
-                    )
-                    _ = SQLChatMessageHistory(
-                        connection=self.engine[lanlan_name],
-                        session_id="",
-                        table_name=TIME_COMPRESSED_TABLE_NAME,
-                    )
-                    self.check_table_schema(lanlan_name)
-                    logger.info(f"[TimeIndexedMemory] 使用默认路径创建数据库: {default_path}")
-            except Exception as e2:
-                logger.error(f"创建默认数据库失败: {e2}")
-                return
-        
-        if timestamp is None:
-            timestamp = datetime.now()
+                db_path = os.path.join(str(config_mgr.memory_dir), f'time_indexed_{lanlan_name}')
+                logger.info(f"[TimeIndexedMemory] 角色 '{lanlan_name}' 不在配置中，使用默认路径: {db_path}")
+            self._init_engine(lanlan_name, db_path)
+            logger.info(f"[TimeIndexedMemory] 为角色 {lanlan_name} 创建数据库引擎: {db_path}")
+            return True
+        except Exception as e:
+            logger.error(f"创建默认数据库失败: {e}")
+            return False
 
-        if lanlan_name not in self.engine:
+    def _insert_rows(self, lanlan_name, event_id, messages, summary, timestamp):
+        # 时间戳与消息在同一条 INSERT 中写入，两张表在同一事务内批量提交
+        with self.engine[lanlan_name].begin() as conn:
+            conn.execute(
+                text(f"INSERT INTO {TIME_ORIGINAL_TABLE_NAME} (session_id, message, timestamp) VALUES (:session_id, :message, :timestamp)"),
+                [
+                    {"session_id": event_id, "message": json.dumps(message_to_dict(m)), "timestamp": timestamp}
+                    for m in messages
+                ]
+            )
+            conn.execute(
+                text(f"INSERT INTO {TIME_COMPRESSED_TABLE_NAME} (session_id, message, timestamp) VALUES (:session_id, :message, :timestamp)"),
+                {"session_id": event_id, "message": json.dumps(message_to_dict(SystemMessage(summary))), "timestamp": timestamp}
+            )
+
+    async def store_conversation(self, event_id, messages, lanlan_name, timestamp=None, summary=None):
+        if not self._ensure_engine(lanlan_name):
             logger.error(f"角色 '{lanlan_name}' 的数据库引擎不存在")
             return
 
-        origin_history = SQLChatMessageHistory(
-            connection=self.engine[lanlan_name],
-            session_id=event_id,
-            table_name=TIME_ORIGINAL_TABLE_NAME,
-        )
-
-        compressed_history = SQLChatMessageHistory(
-            connection=self.engine[lanlan_name],
-            session_id=event_id,
-            table_name=TIME_COMPRESSED_TABLE_NAME,
-        )
+        if timestamp is None:
+            timestamp = datetime.now()
 
-        origin_history.add_messages(messages)
-        compressed_history.add_message(SystemMessage((await self.recent_history_manager.compress_history(messages, lanlan_name))[1]))
+        # summary 由调用方预先计算时直接复用，避免同一批消息被重复摘要
+        if summary is None:
+            summary = (await self.recent_history_manager.compress_history(messages, lanlan_name))[1]
 
-        with self.engine[lanlan_name].connect() as conn:
-            conn.execute(
-                text(f"UPDATE {TIME_ORIGINAL_TABLE_NAME} SET timestamp = :timestamp WHERE session_id = :session_id"),
-                {"timestamp": timestamp, "session_id": event_id}
-            )
-            conn.execute(
-                text(f"UPDATE {TIME_COMPRESSED_TABLE_NAME} SET timestamp = :timestamp WHERE session_id = :session_id"),
-                {"timestamp": timestamp, "session_id": event_id}
-            )
-            conn.commit()
+        # SQLite 写入在线程池中执行，不阻塞事件循环
+        await asyncio.to_thread(self._insert_rows, lanlan_name, event_id, list(messages), summary, timestamp)
 
     def retrieve_summary_by_timeframe(self, lanlan_name, start_time, end_time):
         with self.engine[lanlan_name].connect() as conn:
             result = conn.execute(
-                text(f"SELECT session_id, message FROM {TIME_COMPRESSED_TABLE_NAME} WHERE timestamp BETWEEN :start_time AND :end_time"),
+                text(f"SELECT session_id, message FROM {TIME_COMPRESSED_TABLE_NAME} WHERE timestamp BETWEEN :start_time AND :end_time ORDER BY timestamp"),
                 {"start_time": start_time, "end_time": end_time}
             )
             return result.fetchall()
@@ -149,7 +142,13 @@ class TimeIndexedMemory:
         # 查询指定时间范围内的对话
         with self.engine[lanlan_name].connect() as conn:
             result = conn.execute(
-                text(f"SELECT session_id, message FROM {TIME_ORIGINAL_TABLE_NAME} WHERE timestamp BETWEEN :start_time AND :end_time"),
+                text(f"SELECT session_id, message FROM {TIME_ORIGINAL_TABLE_NAME} WHERE timestamp BETWEEN :start_time AND :end_time ORDER BY timestamp"),
                 {"start_time": start_time, "end_time": end_time}
             )
-            return result.fetchall()
\ No newline at end of file
+            return result.fetchall()
+
+    async def aretrieve_summary_by_timeframe(self, lanlan_name, start_time, end_time):
+        return await asyncio.to_thread(self.retrieve_summary_by_timeframe, lanlan_name, start_time, end_time)
+
+    async def aretrieve_original_by_timeframe(self, lanlan_name, start_time, end_time):
+        return await asyncio.to_thread(self.retrieve_original_by_timeframe, lanlan_name, start_time, end_time)
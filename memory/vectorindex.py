@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+本地嵌入式向量索引
+用于替代被注释掉的 Chroma（Chroma 引入了 onnx 依赖，显著增大一键包体积）
+
+存储布局（位于 semantic_memory_{name} 目录下，每个 collection、每个嵌入模型三个文件，
+{tag} 为嵌入模型标识的哈希，不同模型的向量空间互不兼容，各自维护独立的索引）：
+    {collection}-{tag}.f32    归一化后的 float32 向量，按行追加，以 memmap 方式读取
+    {collection}-{tag}.jsonl  每行一条文档 {"text": ..., "metadata": {...}}
+    {collection}-{tag}.json   索引状态（嵌入模型、维度、已同步的 SQLite rowid 水位线）
+
+切换嵌入模型（如配置或移除 API Key）后使用的是新模型对应的索引，
+其水位线从 0 开始，由 SemanticMemory.sync_from_time_index 从时间索引 SQLite 重新回填。
+
+检索时对 memmap 矩阵做批量矩阵乘法得到余弦相似度，
+year/month/day/role 过滤条件在列式 numpy 数组上求值。
+"""
+import hashlib
+import json
+import os
+import threading
+import logging
+
+import numpy as np
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+# 列式过滤支持的元数据字段
+FILTER_FIELDS = ('year', 'month', 'day', 'role')
+
+# 单次矩阵乘法处理的最大行数，避免大索引一次性换入全部页面
+_SEARCH_BLOCK_ROWS = 65536
+
+
+class LocalVectorIndex:
+    """单个 collection 的追加式向量索引，接口与 Chroma 的 add_texts / similarity_search 保持一致"""
+
+    def __init__(self, collection_name, persist_directory, embedding_function):
+        self.collection_name = collection_name
+        self.persist_directory = persist_directory
+        self.embedding_function = embedding_function
+        os.makedirs(persist_directory, exist_ok=True)
+
+        self.model = getattr(embedding_function, 'model_name', None) or type(embedding_function).__name__
+        base = f"{collection_name}-{hashlib.sha1(self.model.encode('utf-8')).hexdigest()[:8]}"
+        self._vec_path = os.path.join(persist_directory, f"{base}.f32")
+        self._doc_path = os.path.join(persist_directory, f"{base}.jsonl")
+        self._state_path = os.path.join(persist_directory, f"{base}.json")
+        self._lock = threading.Lock()
+
+        self.dim = None
+        self.synced_rowid = 0
+        self._matrix = None
+        self._texts = []
+        self._metadatas = []
+        self.event_ids = set()
+        self._columns = {
+            'year': np.zeros(0, dtype=np.int16),
+            'month': np.zeros(0, dtype=np.int8),
+            'day': np.zeros(0, dtype=np.int8),
+            'role': np.zeros(0, dtype=np.int16),
+        }
+        self._role_codes = {}
+        self._load()
+
+    def __len__(self):
+        return len(self._texts)
+
+    # --- 持久化 ---
+
+    def _load(self):
+        if os.path.exists(self._state_path):
+            try:
+                with open(self._state_path, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+                if state.get('model') == self.model:
+                    self.dim = state.get('dim')
+                    self.synced_rowid = state.get('synced_rowid', 0)
+                else:
+                    # 标识哈希冲突或文件被替换：向量空间不一致，丢弃后重新回填
+                    logger.warning(f"[VectorIndex] {self._state_path} 的嵌入模型 {state.get('model')} 与当前 {self.model} 不一致，重建索引")
+            except Exception as e:
+                logger.warning(f"[VectorIndex] 读取 {self._state_path} 失败: {e}，将重建状态")
+
+        texts, metadatas = [], []
+        # offsets[i] 为前 i 条文档在 jsonl 中所占的字节数
+        offsets = [0]
+        if os.path.exists(self._doc_path):
+            with open(self._doc_path, 'rb') as f:
+                for line in f:
+                    # 最后一行可能因崩溃而写了一半，遇到解析失败即停止
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        doc = json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+                    texts.append(doc['text'])
+                    metadatas.append(doc.get('metadata', {}))
+                    offsets.append(offsets[-1] + len(line))
+
+        n_vecs = 0
+        if self.dim and os.path.exists(self._vec_path):
+            n_vecs = os.path.getsize(self._vec_path) // (self.dim * 4)
+
+        # 向量文件与文档文件按较短者对齐，截掉崩溃时多写的尾部
+        n = min(len(texts), n_vecs)
+        texts, metadatas = texts[:n], metadatas[:n]
+        if os.path.exists(self._doc_path) and os.path.getsize(self._doc_path) != offsets[n]:
+            with open(self._doc_path, 'r+b') as f:
+                f.truncate(offsets[n])
+        if os.path.exists(self._vec_path) and os.path.getsize(self._vec_path) != n * (self.dim or 0) * 4:
+            with open(self._vec_path, 'r+b') as f:
+                f.truncate(n * (self.dim or 0) * 4)
+
+        self._texts = texts
+        self._metadatas = metadatas
+        self.event_ids = {m.get('event_id') for m in metadatas if m.get('event_id')}
+        self._columns = self._build_columns(metadatas)
+        self._remap()
+
+    def _save_state(self):
+        tmp_path = self._state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'model': self.model, 'dim': self.dim, 'synced_rowid': self.synced_rowid}, f)
+        os.replace(tmp_path, self._state_path)
+
+    def _remap(self):
+        n = len(self._texts)
+        if n == 0 or not self.dim:
+            self._matrix = None
+            return
+        self._matrix = np.memmap(self._vec_path, dtype=np.float32, mode='r', shape=(n, self.dim))
+
+    @staticmethod
+    def _encode_doc(text, metadata):
+        return (json.dumps({'text': text, 'metadata': metadata}, ensure_ascii=False) + '\n').encode('utf-8')
+
+    # --- 列式元数据 ---
+
+    def _role_code(self, role):
+        if role not in self._role_codes:
+            self._role_codes[role] = len(self._role_codes) + 1
+        return self._role_codes[role]
+
+    @staticmethod
+    def _to_int(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return 0
+
+    def _build_columns(self, metadatas):
+        return {
+            'year': np.fromiter((self._to_int(m.get('year')) for m in metadatas), dtype=np.int16, count=len(metadatas)),
+            'month': np.fromiter((self._to_int(m.get('month')) for m in metadatas), dtype=np.int8, count=len(metadatas)),
+            'day': np.fromiter((self._to_int(m.get('day')) for m in metadatas), dtype=np.int8, count=len(metadatas)),
+            'role': np.fromiter((self._role_code(m.get('role', '')) for m in metadatas), dtype=np.int16, count=len(metadatas)),
+        }
+
+    def _filter_mask(self, filter):
+        """将 {'year': '2025', 'role': ['human', 'ai']} 形式的过滤条件转为布尔掩码，None 表示不过滤"""
+        if not filter:
+            return None
+        mask = np.ones(len(self._texts), dtype=bool)
+        for key, value in filter.items():
+            if key not in FILTER_FIELDS:
+                raise ValueError(f"Unsupported filter field: {key}. Valid fields: {list(FILTER_FIELDS)}")
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            if key == 'role':
+                codes = [self._role_codes.get(v, -1) for v in values]
+            else:
+                codes = [self._to_int(v) for v in values]
+            mask &= np.isin(self._columns[key], codes)
+        return mask
+
+    # --- 写入 ---
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def add_embeddings(self, texts, embeddings, metadatas=None):
+        """追加已计算好的向量（不调用嵌入模型）"""
+        if not texts:
+            return
+        if metadatas is None:
+            metadatas = [{} for _ in texts]
+        vectors = self._normalize(embeddings)
+        if len(vectors) != len(texts):
+            raise ValueError(f"texts 与 embeddings 数量不一致: {len(texts)} != {len(vectors)}")
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                self._save_state()
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"向量维度不匹配: 索引为 {self.dim}，输入为 {vectors.shape[1]}")
+
+            # 先写向量再写文档：崩溃时多出来的向量会在加载时被截掉
+            with open(self._vec_path, 'ab') as f:
+                f.write(vectors.tobytes())
+            with open(self._doc_path, 'ab') as f:
+                f.write(b''.join(self._encode_doc(t, m) for t, m in zip(texts, metadatas)))
+
+            self._texts.extend(texts)
+            self._metadatas.extend(metadatas)
+            self.event_ids.update(m.get('event_id') for m in metadatas if m.get('event_id'))
+            new_columns = self._build_columns(metadatas)
+            for key in self._columns:
+                self._columns[key] = np.concatenate([self._columns[key], new_columns[key]])
+            self._remap()
+
+    def add_texts(self, texts, metadatas=None):
+        texts = list(texts)
+        if not texts:
+            return
+        self.add_embeddings(texts, self.embedding_function.embed_documents(texts), metadatas)
+
+    async def aadd_texts(self, texts, metadatas=None):
+        texts = list(texts)
+        if not texts:
+            return
+        self.add_embeddings(texts, await self.embedding_function.aembed_documents(texts), metadatas)
+
+    def set_synced_rowid(self, rowid):
+        """记录已从时间索引 SQLite 同步到的 rowid"""
+        with self._lock:
+            self.synced_rowid = rowid
+            self._save_state()
+
+    # --- 检索 ---
+
+    def similarity_search_by_vector_with_score(self, embedding, k=10, filter=None):
+        if self._matrix is None:
+            return []
+        query = self._normalize(embedding)[0]
+        if query.shape[0] != self.dim:
+            raise ValueError(f"查询向量维度不匹配: 索引为 {self.dim}，输入为 {query.shape[0]}")
+
+        mask = self._filter_mask(filter)
+        if mask is None:
+            n = self._matrix.shape[0]
+            scores = np.empty(n, dtype=np.float32)
+            for start in range(0, n, _SEARCH_BLOCK_ROWS):
+                end = min(start + _SEARCH_BLOCK_ROWS, n)
+                scores[start:end] = self._matrix[start:end] @ query
+            candidates = None
+        else:
+            candidates = np.flatnonzero(mask)
+            if candidates.size == 0:
+                return []
+            scores = self._matrix[candidates] @ query
+
+        k = min(k, scores.shape[0])
+        if k <= 0:
+            return []
+        if k < scores.shape[0]:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(scores.shape[0])
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        for i in top:
+            row = int(i) if candidates is None else int(candidates[i])
+            results.append((Document(page_content=self._texts[row], metadata=self._metadatas[row]), float(scores[i])))
+        return results
+
+    def similarity_search(self, query, k=10, filter=None):
+        embedding = self.embedding_function.embed_query(query)
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    async def asimilarity_search(self, query, k=10, filter=None):
+        embedding = await self.embedding_function.aembed_query(query)
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
@@ -2,7 +2,9 @@
 import sys, os
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from memory import CompressedRecentHistoryManager, SemanticMemory, ImportantSettingsManager, TimeIndexedMemory
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Header
+from fastapi.responses import JSONResponse, Response
+import hashlib
 import json
 import uvicorn
 from langchain_core.messages import convert_to_messages
@@ -14,6 +16,8 @@ import re
 import asyncio
 import logging
 import argparse
+from collections import OrderedDict
+from typing import Optional
 
 # Setup logger
 from utils.logger_config import setup_logging
@@ -55,6 +59,7 @@ async def reload_memory_components():
             semantic_manager = new_semantic
             settings_manager = new_settings
             time_manager = new_time
+            context_cache.invalidate()
             
             logger.info("[MemoryServer] ✅ 记忆组件配置重新加载完成")
             return True
@@ -62,6 +67,165 @@ async def reload_memory_components():
             logger.error(f"[MemoryServer] ❌ 重新加载记忆组件配置失败: {e}", exc_info=True)
             return False
 
+# 下面两个阶段需要消耗token，但当前版本实用性近乎于0。尤其是，Qwen与GPT等旗舰模型相比性能差距过大。
+ENABLE_SETTINGS_EXTRACTION = False
+ENABLE_SEMANTIC_STORE = False
+
+
+class MemoryIngestionPipeline:
+    """记忆写入流水线
+
+    每个角色一个队列，保证同一角色的批次按到达顺序写入；
+    批次内的派生产物（摘要、设定提取、嵌入）只计算一次，
+    再并发分发给 recent / 时间索引 / 语义 / 设定 各存储。
+    """
+
+    # 记住最近多少个投递 ID，用于对 cross_server 发件箱的超时重试去重
+    DELIVERY_DEDUP_SIZE = 256
+
+    def __init__(self):
+        self._queues = {}   # {lanlan_name: asyncio.Queue}
+        self._workers = {}  # {lanlan_name: asyncio.Task}
+        self._deliveries = OrderedDict()  # {delivery_id: asyncio.Future}
+
+    async def submit(self, lanlan_name, messages, detailed=False, delivery_id=None):
+        """提交一个批次并等待其写入完成；相同 delivery_id 的重复提交复用第一次的结果"""
+        if delivery_id:
+            previous = self._deliveries.get(delivery_id)
+            if previous is not None and not (previous.done() and previous.exception() is not None):
+                logger.info(f"[MemoryServer] 重复投递 {delivery_id}，跳过写入")
+                return await asyncio.shield(previous)
+        worker = self._workers.get(lanlan_name)
+        if worker is None or worker.done():
+            self._queues[lanlan_name] = asyncio.Queue()
+            self._workers[lanlan_name] = asyncio.create_task(self._worker(lanlan_name, self._queues[lanlan_name]))
+        future = asyncio.get_running_loop().create_future()
+        if delivery_id:
+            self._deliveries[delivery_id] = future
+            while len(self._deliveries) > self.DELIVERY_DEDUP_SIZE:
+                self._deliveries.popitem(last=False)
+        await self._queues[lanlan_name].put((messages, detailed, future))
+        return await asyncio.shield(future)
+
+    async def _worker(self, lanlan_name, queue):
+        while True:
+            messages, detailed, future = await queue.get()
+            try:
+                await self._ingest(lanlan_name, messages, detailed)
+                if not future.done():
+                    future.set_result(None)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                queue.task_done()
+
+    async def _ingest(self, lanlan_name, messages, detailed):
+        uid = str(uuid4())
+        # 本批次的摘要只计算一次，由时间索引与语义记忆共享
+        summary_task = asyncio.create_task(recent_history_manager.compress_history(messages, lanlan_name))
+
+        async def _store_time_indexed():
+            _, summary = await summary_task
+            await time_manager.store_conversation(uid, messages, lanlan_name, summary=summary)
+
+        async def _store_semantic():
+            _, summary = await summary_task
+            await semantic_manager.store_conversation(uid, messages, lanlan_name, summary=summary)
+
+        stages = {
+            'recent': recent_history_manager.update_history(messages, lanlan_name, detailed=detailed),
+            'time_indexed': _store_time_indexed(),
+        }
+        if ENABLE_SETTINGS_EXTRACTION:
+            stages['settings'] = settings_manager.extract_and_update_settings(messages, lanlan_name)
+        if ENABLE_SEMANTIC_STORE:
+            stages['semantic'] = _store_semantic()
+
+        try:
+            results = await asyncio.gather(*stages.values(), return_exceptions=True)
+        finally:
+            if not summary_task.done():
+                summary_task.cancel()
+
+        first_error = None
+        for stage, result in zip(stages, results):
+            if isinstance(result, BaseException):
+                logger.error(f"[MemoryServer] {lanlan_name} 的记忆写入阶段 {stage} 失败: {result}")
+                first_error = first_error or result
+        if first_error is not None:
+            raise first_error
+
+    async def shutdown(self):
+        for worker in self._workers.values():
+            worker.cancel()
+        self._workers.clear()
+        self._queues.clear()
+
+
+ingestion_pipeline = MemoryIngestionPipeline()
+
+
+def _file_signature(path):
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+
+class PromptContextCache:
+    """按角色缓存 /new_dialog 与 /get_recent_history 生成的上下文
+
+    版本由近期记忆的版本号、characters.json 与 settings 文件的 mtime/size 组成，
+    只有其中之一变化时才重新构建；ETag 为上下文内容的哈希，供调用方做条件请求。
+    """
+
+    def __init__(self):
+        self._entries = {}  # {(kind, lanlan_name): (version, etag, text)}
+
+    @staticmethod
+    def current_version(lanlan_name):
+        return (
+            id(recent_history_manager),
+            recent_history_manager.get_history_version(lanlan_name),
+            _file_signature(str(_config_manager.get_config_path('characters.json'))),
+            _file_signature(os.path.join(str(_config_manager.memory_dir), f'settings_{lanlan_name}.json')),
+        )
+
+    def get(self, kind, lanlan_name):
+        """命中时返回 (etag, text)，否则返回 None"""
+        entry = self._entries.get((kind, lanlan_name))
+        if entry is not None and entry[0] == self.current_version(lanlan_name):
+            return entry[1], entry[2]
+        return None
+
+    def put(self, kind, lanlan_name, text):
+        etag = '"%s"' % hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+        # 构建过程中会加载近期记忆，因此版本在构建完成后再取
+        self._entries[(kind, lanlan_name)] = (self.current_version(lanlan_name), etag, text)
+        return etag, text
+
+    def invalidate(self, lanlan_name=None):
+        if lanlan_name is None:
+            self._entries.clear()
+        else:
+            for key in [k for k in self._entries if k[1] == lanlan_name]:
+                del self._entries[key]
+
+
+context_cache = PromptContextCache()
+
+# 正则表达式：删除所有类型括号及其内容（包括[]、()、{}、<>、【】、（）等）
+BRACKETS_PATTERN = re.compile(r'(\[.*?\]|\(.*?\)|（.*?）|【.*?】|\{.*?\}|<.*?>)')
+
+
+def _context_response(request: Request, etag, text):
+    """支持 If-None-Match 的上下文响应，内容未变时返回 304"""
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return JSONResponse(content=text, headers={"ETag": etag})
+
 # 全局变量用于控制服务器关闭
 shutdown_event = asyncio.Event()
 # 全局变量控制是否响应退出请求
@@ -90,7 +254,7 @@ async def shutdown_memory_server():
 async def shutdown_event_handler():
     """应用关闭时执行清理工作"""
     logger.info("Memory server正在关闭...")
-    # 这里可以添加任何需要的清理工作
+    await ingestion_pipeline.shutdown()
     logger.info("Memory server已关闭")
 
 
@@ -120,8 +284,22 @@ async def _run_review_in_background(lanlan_name: str):
         if lanlan_name in correction_cancel_flags:
             correction_cancel_flags[lanlan_name].clear()
 
+async def _restart_review_task(lanlan_name: str):
+    """取消该角色正在运行的review任务，并在后台启动新的review任务"""
+    if lanlan_name in correction_tasks and not correction_tasks[lanlan_name].done():
+        # 如果已有任务在运行，取消它
+        correction_tasks[lanlan_name].cancel()
+        try:
+            await correction_tasks[lanlan_name]
+        except asyncio.CancelledError:
+            pass
+    
+    # 启动新的review任务
+    task = asyncio.create_task(_run_review_in_background(lanlan_name))
+    correction_tasks[lanlan_name] = task
+
 @app.post("/process/{lanlan_name}")
-async def process_conversation(request: HistoryRequest, lanlan_name: str):
+async def process_conversation(request: HistoryRequest, lanlan_name: str, x_delivery_id: Optional[str] = Header(None)):
     global correction_tasks
     try:
         # 检查角色是否存在于配置中，如果不存在则记录信息但继续处理（允许新角色）
@@ -133,29 +311,12 @@ async def process_conversation(request: HistoryRequest, lanlan_name: str):
         except Exception as e:
             logger.warning(f"检查角色配置失败: {e}，继续处理")
         
-        uid = str(uuid4())
         input_history = convert_to_messages(json.loads(request.input_history))
         logger.info(f"[MemoryServer] 收到 {lanlan_name} 的对话历史处理请求，消息数: {len(input_history)}")
-        await recent_history_manager.update_history(input_history, lanlan_name)
-        """
-        下面屏蔽了两个模块，因为这两个模块需要消耗token，但当前版本实用性近乎于0。尤其是，Qwen与GPT等旗舰模型相比性能差距过大。
-        """
-        # await settings_manager.extract_and_update_settings(input_history, lanlan_name)
-        # await semantic_manager.store_conversation(uid, input_history, lanlan_name)
-        await time_manager.store_conversation(uid, input_history, lanlan_name)
+        await ingestion_pipeline.submit(lanlan_name, input_history, delivery_id=x_delivery_id)
         
         # 在后台启动review_history任务
-        if lanlan_name in correction_tasks and not correction_tasks[lanlan_name].done():
-            # 如果已有任务在运行，取消它
-            correction_tasks[lanlan_name].cancel()
-            try:
-                await correction_tasks[lanlan_name]
-            except asyncio.CancelledError:
-                pass
-        
-        # 启动新的review任务
-        task = asyncio.create_task(_run_review_in_background(lanlan_name))
-        correction_tasks[lanlan_name] = task
+        await _restart_review_task(lanlan_name)
         
         return {"status": "processed"}
     except Exception as e:
@@ -163,7 +324,7 @@ async def process_conversation(request: HistoryRequest, lanlan_name: str):
         return {"status": "error", "message": str(e)}
 
 @app.post("/renew/{lanlan_name}")
-async def process_conversation_for_renew(request: HistoryRequest, lanlan_name: str):
+async def process_conversation_for_renew(request: HistoryRequest, lanlan_name: str, x_delivery_id: Optional[str] = Header(None)):
     global correction_tasks
     try:
         # 检查角色是否存在于配置中，如果不存在则记录信息但继续处理（允许新角色）
@@ -175,33 +336,23 @@ async def process_conversation_for_renew(request: HistoryRequest, lanlan_name: s
         except Exception as e:
             logger.warning(f"检查角色配置失败: {e}，继续处理")
         
-        uid = str(uuid4())
         input_history = convert_to_messages(json.loads(request.input_history))
         logger.info(f"[MemoryServer] renew: 收到 {lanlan_name} 的对话历史处理请求，消息数: {len(input_history)}")
-        await recent_history_manager.update_history(input_history, lanlan_name, detailed=True)
-        # await settings_manager.extract_and_update_settings(input_history, lanlan_name)
-        # await semantic_manager.store_conversation(uid, input_history, lanlan_name)
-        await time_manager.store_conversation(uid, input_history, lanlan_name)
+        await ingestion_pipeline.submit(lanlan_name, input_history, detailed=True, delivery_id=x_delivery_id)
         
         # 在后台启动review_history任务
-        if lanlan_name in correction_tasks and not correction_tasks[lanlan_name].done():
-            # 如果已有任务在运行，取消它
-            correction_tasks[lanlan_name].cancel()
-            try:
-                await correction_tasks[lanlan_name]
-            except asyncio.CancelledError:
-                pass
-        
-        # 启动新的review任务
-        task = asyncio.create_task(_run_review_in_background(lanlan_name))
-        correction_tasks[lanlan_name] = task
+        await _restart_review_task(lanlan_name)
         
         return {"status": "processed"}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
 @app.get("/get_recent_history/{lanlan_name}")
-def get_recent_history(lanlan_name: str):
+def get_recent_history(lanlan_name: str, request: Request):
+    cached = context_cache.get('recent_history', lanlan_name)
+    if cached is not None:
+        return _context_response(request, *cached)
+
     # 检查角色是否存在于配置中
     try:
         character_data = _config_manager.load_characters()
@@ -224,10 +375,15 @@ def get_recent_history(lanlan_name: str):
             texts = [j['text'] for j in i.content if j['type']=='text']
             joined = "\n".join(texts)
             result += f"{name_mapping[i.type]} | {joined}\n"
-    return result
+    return _context_response(request, *context_cache.put('recent_history', lanlan_name, result))
 
 @app.get("/search_for_memory/{lanlan_name}/{query}")
 async def get_memory(query: str, lanlan_name:str):
+    # 检索前先把时间索引中新增的记录增量同步进向量索引
+    try:
+        await semantic_manager.sync_from_time_index(lanlan_name, time_manager)
+    except Exception as e:
+        logger.warning(f"[MemoryServer] 同步 {lanlan_name} 的向量索引失败: {e}")
     return await semantic_manager.query(query, lanlan_name)
 
 @app.get("/get_settings/{lanlan_name}")
@@ -260,19 +416,20 @@ async def reload_config():
         return {"status": "error", "message": str(e)}
 
 @app.get("/new_dialog/{lanlan_name}")
-async def new_dialog(lanlan_name: str):
+async def new_dialog(lanlan_name: str, request: Request):
     global correction_tasks, correction_cancel_flags
     
-    # 检查角色是否存在于配置中
-    try:
-        character_data = _config_manager.load_characters()
-        catgirl_names = list(character_data.get('猫娘', {}).keys())
-        if lanlan_name not in catgirl_names:
-            logger.warning(f"角色 '{lanlan_name}' 不在配置中，返回空上下文")
+    # 检查角色是否存在于配置中（缓存命中说明 characters.json 未变化，无需重新解析）
+    if context_cache.get('new_dialog', lanlan_name) is None:
+        try:
+            character_data = _config_manager.load_characters()
+            catgirl_names = list(character_data.get('猫娘', {}).keys())
+            if lanlan_name not in catgirl_names:
+                logger.warning(f"角色 '{lanlan_name}' 不在配置中，返回空上下文")
+                return ""
+        except Exception as e:
+            logger.error(f"检查角色配置失败: {e}")
             return ""
-    except Exception as e:
-        logger.error(f"检查角色配置失败: {e}")
-        return ""
     
     # 中断正在进行的correction任务
     if lanlan_name in correction_tasks and not correction_tasks[lanlan_name].done():
@@ -291,20 +448,23 @@ async def new_dialog(lanlan_name: str):
         except Exception as e:
             logger.warning(f"⚠️ 中断 {lanlan_name} 的correction任务时出现异常: {e}")
     
-    # 正则表达式：删除所有类型括号及其内容（包括[]、()、{}、<>、【】、（）等）
-    brackets_pattern = re.compile(r'(\[.*?\]|\(.*?\)|（.*?）|【.*?】|\{.*?\}|<.*?>)')
+    # 近期记忆、设定与角色配置都未变化时直接复用上次构建的上下文
+    cached = context_cache.get('new_dialog', lanlan_name)
+    if cached is not None:
+        return _context_response(request, *cached)
+    
     master_name, _, _, _, name_mapping, _, _, _, _, _ = _config_manager.get_character_data()
     name_mapping['ai'] = lanlan_name
     result = f"\n========{lanlan_name}的内心活动========\n{lanlan_name}的脑海里经常想着自己和{master_name}的事情，她记得{json.dumps(settings_manager.get_settings(lanlan_name), ensure_ascii=False)}\n\n"
     result += f"开始聊天前，{lanlan_name}又在脑海内整理了近期发生的事情。\n"
     for i in recent_history_manager.get_recent_history(lanlan_name):
         if type(i.content) == str:
-            cleaned_content = brackets_pattern.sub('', i.content).strip()
+            cleaned_content = BRACKETS_PATTERN.sub('', i.content).strip()
             result += f"{name_mapping[i.type]} | {cleaned_content}\n"
         else:
-            texts = [brackets_pattern.sub('', j['text']).strip() for j in i.content if j['type'] == 'text']
+            texts = [BRACKETS_PATTERN.sub('', j['text']).strip() for j in i.content if j['type'] == 'text']
             result += f"{name_mapping[i.type]} | " + "\n".join(texts) + "\n"
-    return result
+    return _context_response(request, *context_cache.put('new_dialog', lanlan_name, result))
 
 if __name__ == "__main__":
     import threading
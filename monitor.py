@@ -17,6 +17,7 @@ from fastapi.templating import Jinja2Templates
 from utils.frontend_utils import find_models, find_model_config_file, find_model_directory
 from utils.workshop_utils import get_default_workshop_folder
 from utils.preferences import load_user_preferences
+from utils.broadcast_hub import BroadcastHub
 
 # Setup logger
 from utils.logger_config import setup_logging
@@ -170,8 +171,8 @@ async def get_index(request: Request, lanlan_name: str):
     })
 
 
-# 存储所有连接的客户端
-connected_clients = set()
+# 按角色的广播中心：每个观看端一个写协程，慢的观看端不会阻塞主服务器的同步连接
+broadcast_hub = BroadcastHub()
 subtitle_clients = set()
 current_subtitle = ""
 should_clear_next = False
@@ -259,10 +260,9 @@ async def sync_endpoint(websocket: WebSocket, lanlan_name:str):
         while True:
             try:
                 global current_subtitle
-                data = await asyncio.wait_for(websocket.receive_text(), timeout=25)
+                raw = await asyncio.wait_for(websocket.receive_text(), timeout=25)
 
-                # 广播到所有连接的客户端
-                data = json.loads(data)
+                data = json.loads(raw)
                 msg_type = data.get("type", "unknown")
 
 
@@ -296,7 +296,8 @@ async def sync_endpoint(websocket: WebSocket, lanlan_name:str):
                     should_clear_next = True
 
                 if msg_type != "heartbeat":
-                    await broadcast_message(data)
+                    # 原样转发主服务器发来的 JSON 文本，不再逐个客户端重新序列化
+                    broadcast_hub.publish_text(lanlan_name, raw)
             except asyncio.exceptions.TimeoutError:
                 pass
     except WebSocketDisconnect:
@@ -316,7 +317,7 @@ async def sync_binary_endpoint(websocket: WebSocket, lanlan_name:str):
             try:
                 data = await asyncio.wait_for(websocket.receive_bytes(), timeout=25)
                 if len(data)>4:
-                    await broadcast_binary(data)
+                    broadcast_hub.publish_binary(lanlan_name, data)
             except asyncio.exceptions.TimeoutError:
                 pass
     except WebSocketDisconnect:
@@ -329,82 +330,28 @@ async def sync_binary_endpoint(websocket: WebSocket, lanlan_name:str):
 @app.websocket("/ws/{lanlan_name}")
 async def websocket_endpoint(websocket: WebSocket, lanlan_name:str):
     await websocket.accept()
-    print(f"✅ [CLIENT] 查看客户端已连接: {websocket.client}, 当前总数: {len(connected_clients) + 1}")
-
-    # 添加到连接集合
-    connected_clients.add(websocket)
+    subscriber = broadcast_hub.subscribe(lanlan_name, websocket)
+    logger.info(f"✅ [CLIENT] 查看客户端已连接: {websocket.client} ({lanlan_name})，当前总数: {broadcast_hub.subscriber_count(lanlan_name)}")
 
     try:
-        # 保持连接直到客户端断开
+        # 保持连接直到客户端断开；观看端发来的消息（文本或二进制）只用于保活，直接忽略
         while True:
-            # 接收任何类型的消息（文本或二进制），主要用于保持连接
-            try:
-                await websocket.receive_text()
-            except:
-                # 如果收到的是二进制数据，receive_text() 会失败，尝试 receive_bytes()
-                try:
-                    await websocket.receive_bytes()
-                except:
-                    # 如果两者都失败，等待一下再继续
-                    await asyncio.sleep(0.1)
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
     except WebSocketDisconnect:
-        print(f"❌ [CLIENT] 查看客户端已断开: {websocket.client}")
+        pass
     except Exception as e:
-        print(f"❌ [CLIENT] 客户端连接异常: {e}")
+        logger.warning(f"❌ [CLIENT] 客户端连接异常: {e}")
     finally:
-        # 安全地移除客户端（即使已经被移除也不会报错）
-        connected_clients.discard(websocket)
-        print(f"🗑️ [CLIENT] 已移除客户端，当前剩余: {len(connected_clients)}")
-
-
-# 广播消息到所有客户端
-async def broadcast_message(message):
-    clients = connected_clients.copy()
-    success_count = 0
-    fail_count = 0
-    disconnected_clients = []
-    
-    for client in clients:
-        try:
-            await client.send_json(message)
-            success_count += 1
-        except Exception as e:
-            print(f"❌ [BROADCAST] 广播错误到 {client.client}: {e}")
-            fail_count += 1
-            disconnected_clients.append(client)
-    
-    # 移除所有断开的客户端
-    for client in disconnected_clients:
-        connected_clients.discard(client)
-        print(f"🗑️ [BROADCAST] 移除断开的客户端: {client.client}")
-    
-    if success_count > 0:
-        print(f"✅ [BROADCAST] 成功广播到 {success_count} 个客户端" + (f", 失败并移除 {fail_count} 个" if fail_count > 0 else ""))
-
-
-# 广播二进制数据到所有客户端
-async def broadcast_binary(data):
-    clients = connected_clients.copy()
-    success_count = 0
-    fail_count = 0
-    disconnected_clients = []
-    
-    for client in clients:
-        try:
-            await client.send_bytes(data)
-            success_count += 1
-        except Exception as e:
-            print(f"❌ [BINARY BROADCAST] 二进制广播错误到 {client.client}: {e}")
-            fail_count += 1
-            disconnected_clients.append(client)
-    
-    # 移除所有断开的客户端
-    for client in disconnected_clients:
-        connected_clients.discard(client)
-        print(f"🗑️ [BINARY BROADCAST] 移除断开的客户端: {client.client}")
-    
-    if success_count > 0:
-        print(f"✅ [BINARY BROADCAST] 成功广播音频到 {success_count} 个客户端" + (f", 失败并移除 {fail_count} 个" if fail_count > 0 else ""))
+        subscriber.stop()
+        logger.info(f"🗑️ [CLIENT] 查看客户端已断开: {websocket.client}，{lanlan_name} 剩余: {broadcast_hub.subscriber_count(lanlan_name)}")
+
+
+@app.get("/api/debug/broadcast")
+async def get_broadcast_stats():
+    """各角色频道的发布数与每个观看端的积压、丢弃和发送延迟"""
+    return broadcast_hub.snapshot()
 
 
 # 定期清理断开的连接
@@ -415,18 +362,9 @@ async def startup_event():
 
 async def cleanup_disconnected_clients():
     while True:
-        try:
-            # 检查并移除已断开的客户端
-            for client in list(connected_clients):
-                try:
-                    await client.send_json({"type": "heartbeat"})
-                except Exception as e:
-                    print("广播错误:", e)
-                    connected_clients.remove(client)
-            await asyncio.sleep(60)  # 每分钟检查一次
-        except Exception as e:
-            print(f"清理客户端错误: {e}")
-            await asyncio.sleep(60)
+        # 定期心跳：写协程发送失败时会自行移除断开的客户端
+        broadcast_hub.publish_json_all({"type": "heartbeat"})
+        await asyncio.sleep(60)  # 每分钟检查一次
 
 
 if __name__ == "__main__":
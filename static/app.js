@@ -1221,6 +1221,13 @@ function init_app() {
         // 立即显示准备提示
         showVoicePreparingToast(window.t ? window.t('app.voiceSystemPreparing') : '语音系统准备中...');
 
+        // 通知后端即将开始语音会话，提前建立上游连接
+        if (socket.readyState === WebSocket.OPEN) {
+            socket.send(JSON.stringify({
+                action: 'prepare_voice'
+            }));
+        }
+
         // 如果有活跃的文本会话，先结束它
         if (isTextSessionActive) {
             isSwitchingMode = true; // 开始模式切换
@@ -2078,11 +2085,16 @@ function init_app() {
                 }
 
                 if (isRecording && socket.readyState === WebSocket.OPEN) {
-                    socket.send(JSON.stringify({
-                        action: 'stream_data',
-                        data: Array.from(audioData),
-                        input_type: 'audio'
-                    }));
+                    // 二进制帧：8字节头部（magic 'PCM1' + uint32 采样率，小端）+ PCM16 样本
+                    const frame = new ArrayBuffer(8 + audioData.byteLength);
+                    const header = new DataView(frame);
+                    header.setUint8(0, 0x50); // 'P'
+                    header.setUint8(1, 0x43); // 'C'
+                    header.setUint8(2, 0x4D); // 'M'
+                    header.setUint8(3, 0x31); // '1'
+                    header.setUint32(4, targetSampleRate, true);
+                    new Int16Array(frame, 8).set(audioData);
+                    socket.send(frame);
                 }
             };
 
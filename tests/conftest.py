@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+"""测试从仓库根目录导入项目模块（utils、steamworks 等）"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+utils.workshop_item_cache 的测试，用假的 STEAMWORKS 对象代替 Steam 客户端：
+CreateQueryUGCDetailsRequest 返回递增的句柄，run_callbacks 按与发送相反的顺序分发
+SteamUGCQueryCompleted，GetQueryUGCResult 按句柄读出该批物品的详情。
+"""
+import asyncio
+import time
+
+import pytest
+
+from steamworks.structs import SteamUGCDetails_t, SteamUGCQueryCompleted_t
+import utils.workshop_item_cache as wic
+from utils.workshop_item_cache import WorkshopItemCache, query_ugc_details
+
+RESULT_OK = 1
+RESULT_FAIL = 2
+
+
+class FakeWorkshop:
+    def __init__(self, missing_ids=(), titles=None):
+        self.missing_ids = set(missing_ids)
+        self.titles = titles or {}
+        self.requests = []  # 每次 CreateQueryUGCDetailsRequest 的物品ID列表
+        self.queries = {}  # 句柄 -> 物品ID列表
+        self.callbacks = {}  # 句柄 -> 回调
+        self._next_handle = 1000
+
+    def CreateQueryUGCDetailsRequest(self, item_ids):
+        handle = self._next_handle
+        self._next_handle += 1
+        self.requests.append(list(item_ids))
+        self.queries[handle] = list(item_ids)
+        return handle
+
+    def SendQueryUGCRequest(self, handle, callback=None, override_callback=False):
+        self.callbacks[handle] = callback
+
+    def GetQueryUGCResult(self, handle, index):
+        details = SteamUGCDetails_t()
+        item_id = self.queries[handle][index]
+        if item_id in self.missing_ids:
+            return details  # 已删除或隐藏：result 为 0
+        details.publishedFileId = item_id
+        details.result = RESULT_OK
+        details.title = self.titles.get(item_id, f'item {item_id}').encode('utf-8')
+        details.description = b'desc'
+        details.timeCreated = 50
+        details.timeUpdated = 100
+        details.fileSize = 123
+        return details
+
+
+class FakeSteamworks:
+    def __init__(self, workshop=None, silent=False, eresults=None):
+        self.Workshop = workshop or FakeWorkshop()
+        self.silent = silent  # 为 True 时从不分发回调，模拟查询超时
+        self.eresults = eresults or {}  # 句柄 -> EResult
+        self.pumps = 0
+
+    def run_callbacks(self):
+        self.pumps += 1
+        if self.silent:
+            return
+        # 按发送的相反顺序分发，验证结果按句柄而不是按顺序对应
+        for handle in sorted(self.Workshop.callbacks, reverse=True):
+            callback = self.Workshop.callbacks.pop(handle)
+            completed = SteamUGCQueryCompleted_t()
+            completed.handle = handle
+            completed.result = self.eresults.get(handle, RESULT_OK)
+            completed.numResultsReturned = len(self.Workshop.queries[handle])
+            callback(completed)
+
+
+@pytest.fixture
+def cache_path(tmp_path, monkeypatch):
+    path = tmp_path / wic.WORKSHOP_CACHE_FILE
+    monkeypatch.setattr(WorkshopItemCache, '_cache_path', staticmethod(lambda: str(path)))
+    return path
+
+
+def test_query_batches_over_50_ids():
+    steam = FakeSteamworks()
+    item_ids = list(range(1, 121))
+
+    details = asyncio.run(query_ugc_details(steam, item_ids))
+
+    assert [len(batch) for batch in steam.Workshop.requests] == [50, 50, 20]
+    assert sorted(details) == item_ids
+    assert details[73].title == b'item 73'
+    assert not wic._pending_queries
+
+
+def test_callbacks_dispatched_by_handle():
+    steam = FakeSteamworks(eresults={1001: RESULT_FAIL})
+
+    # 其他代码发出的查询的回调直接忽略
+    completed = SteamUGCQueryCompleted_t()
+    completed.handle = 42
+    wic._on_query_completed(completed)
+
+    details = asyncio.run(query_ugc_details(steam, list(range(1, 121))))
+
+    # 第二批（句柄 1001）失败，其余批次按各自句柄读取结果
+    assert sorted(details) == list(range(1, 51)) + list(range(101, 121))
+    assert all(details[item_id].publishedFileId == item_id for item_id in details)
+
+
+def test_query_times_out_without_callback():
+    steam = FakeSteamworks(silent=True)
+
+    started = time.monotonic()
+    details = asyncio.run(query_ugc_details(steam, [1, 2, 3], timeout=0.2))
+
+    assert 0.2 <= time.monotonic() - started < 1.0
+    assert steam.pumps >= 2
+    # 回调没有到达时仍尝试读取结果
+    assert sorted(details) == [1, 2, 3]
+    assert not wic._pending_queries
+
+
+def test_missing_items_cached_and_retried(cache_path):
+    steam = FakeSteamworks(FakeWorkshop(missing_ids={2}))
+    cache = WorkshopItemCache()
+
+    async def run():
+        first = await cache.get_details(steam, [1, 2])
+        second = await cache.get_details(steam, [1, 2])
+        # 超过重试间隔后，查询不到的物品在后台重新查询
+        cache._items['2']['fetchedAt'] -= wic.WORKSHOP_DETAILS_MISSING_RETRY + 1
+        steam.Workshop.missing_ids.clear()
+        third = await cache.get_details(steam, [1, 2])
+        await cache._refresh_task
+        fourth = await cache.get_details(steam, [1, 2])
+        return first, second, third, fourth
+
+    first, second, third, fourth = asyncio.run(run())
+
+    assert sorted(first) == [1] and sorted(second) == [1] and sorted(third) == [1]
+    assert sorted(fourth) == [1, 2]
+    assert steam.Workshop.requests == [[1, 2], [2]]
+
+
+def test_stale_items_served_then_refreshed(cache_path):
+    workshop = FakeWorkshop()
+    steam = FakeSteamworks(workshop)
+    cache = WorkshopItemCache()
+
+    async def run():
+        await cache.get_details(steam, [1, 2])
+        cache._items['1']['fetchedAt'] -= wic.WORKSHOP_DETAILS_MAX_AGE + 1
+        workshop.titles = {1: 'renamed', 2: 'updated'}
+        # 过期的物品先返回缓存的旧详情
+        stale = await cache.get_details(steam, [1, 2], installed_timestamps={2: 200})
+        await cache._refresh_task
+        fresh = await cache.get_details(steam, [1, 2])
+        return stale, fresh
+
+    stale, fresh = asyncio.run(run())
+
+    assert stale[1]['title'] == 'item 1' and stale[2]['title'] == 'item 2'
+    # 物品 1 超过 WORKSHOP_DETAILS_MAX_AGE，物品 2 本地安装的版本比缓存新，一次后台查询一起刷新
+    assert sorted(workshop.requests[1]) == [1, 2]
+    assert fresh[1]['title'] == 'renamed' and fresh[2]['title'] == 'updated'
+    assert cache.stats['background_refreshes'] == 1
+
+
+def test_cache_persisted_across_instances(cache_path):
+    steam = FakeSteamworks(FakeWorkshop(missing_ids={3}))
+    asyncio.run(WorkshopItemCache().get_details(steam, [1, 2, 3]))
+    assert cache_path.exists()
+
+    reloaded = WorkshopItemCache()
+    details = asyncio.run(reloaded.get_details(steam, [1, 2, 3]))
+
+    assert sorted(details) == [1, 2]
+    assert details[1]['title'] == 'item 1' and details[1]['fileSize'] == 123
+    assert len(steam.Workshop.requests) == 1  # 第二个实例完全命中持久化的缓存
+    assert reloaded.stats['hits'] == 3
@@ -12,7 +12,8 @@ RNNoise 是 Mozilla 开发的实时降噪算法，使用 GRU 神经网络，
 
 import numpy as np
 import logging
-from typing import Optional
+import struct
+from typing import Optional, Tuple, Union
 import soxr
 import time
 
@@ -37,6 +38,36 @@ def _get_rnnoise():
     return _RNNoise if _rnnoise_available else None
 
 
+# 前端麦克风音频的二进制 WebSocket 帧格式：
+#   [0:4]  magic b'PCM1'
+#   [4:8]  采样率 (uint32, little-endian)
+#   [8:]   单声道 PCM16 little-endian 样本
+# 头部 8 字节保证样本区 2 字节对齐，可直接用 np.frombuffer 零拷贝读取
+AUDIO_FRAME_MAGIC = b'PCM1'
+AUDIO_FRAME_HEADER = struct.Struct('<4sI')
+
+PCM16Input = Union[bytes, bytearray, memoryview, np.ndarray]
+
+
+def decode_audio_frame(payload: Union[bytes, bytearray, memoryview]) -> Tuple[int, memoryview]:
+    """
+    解析二进制音频帧，返回 (sample_rate, pcm)，pcm 为指向原始帧的 memoryview（不复制）。
+
+    Raises:
+        ValueError: 帧头不合法或样本区长度不是偶数
+    """
+    view = memoryview(payload)
+    if len(view) < AUDIO_FRAME_HEADER.size:
+        raise ValueError(f"audio frame too short: {len(view)} bytes")
+    magic, sample_rate = AUDIO_FRAME_HEADER.unpack_from(view)
+    if magic != AUDIO_FRAME_MAGIC:
+        raise ValueError(f"bad audio frame magic: {magic!r}")
+    pcm = view[AUDIO_FRAME_HEADER.size:]
+    if len(pcm) % 2:
+        raise ValueError(f"odd PCM16 payload length: {len(pcm)}")
+    return sample_rate, pcm
+
+
 class AudioProcessor:
     """
     Real-time audio processor using RNNoise for noise reduction.
@@ -47,10 +78,15 @@ class AudioProcessor:
     IMPORTANT: Call reset() after each speech turn to clear RNNoise's
     internal GRU state and prevent state drift during silence/background.
     
+    Processing is block-based: incoming samples are appended to a
+    preallocated int16 buffer, every complete 480-sample frame in it is
+    submitted to RNNoise in a single call, and the result is fed to a
+    persistent soxr.ResampleStream so filter state carries across chunks.
+    
     Thread Safety:
         This class is NOT safe for concurrent use. The following mutable
-        state is unprotected: _frame_buffer, _last_speech_prob,
-        _last_speech_time, _needs_reset, _denoiser.
+        state is unprotected: _frame_buffer, _buffered, _resampler,
+        _last_speech_prob, _last_speech_time, _needs_reset, _denoiser.
         
         Callers must NOT invoke process_chunk() or reset() from multiple
         threads or coroutines simultaneously. If concurrent access is
@@ -65,6 +101,9 @@ class AudioProcessor:
     # Reset denoiser if no speech detected for this many seconds
     RESET_TIMEOUT_SECONDS = 2.0
     
+    # Max samples kept while waiting for a complete frame (1 second)
+    MAX_BUFFER_SAMPLES = RNNOISE_SAMPLE_RATE
+    
     def __init__(
         self,
         input_sample_rate: int = 48000,
@@ -79,8 +118,17 @@ class AudioProcessor:
         self._denoiser = None
         self._init_denoiser()
         
-        # Buffer for incomplete frames (int16 for pyrnnoise)
-        self._frame_buffer = np.array([], dtype=np.int16)
+        # Preallocated buffer for incomplete frames (int16 for pyrnnoise);
+        # _buffered is the number of valid samples at its head
+        self._frame_buffer = np.zeros(self.MAX_BUFFER_SAMPLES, dtype=np.int16)
+        self._buffered = 0
+        
+        # Streaming resampler, created on first use
+        self._resampler = None
+        
+        # Processing cost vs. audio duration, for real-time factor reporting
+        self._audio_seconds = 0.0
+        self._cpu_seconds = 0.0
         
         # Track voice activity for auto-reset
         self._last_speech_prob = 0.0
@@ -112,18 +160,24 @@ class AudioProcessor:
                 logger.exception("❌ Failed to initialize RNNoise")
                 self._denoiser = None
     
-    def process_chunk(self, audio_bytes: bytes) -> bytes:
+    def process_chunk(self, audio_bytes: PCM16Input) -> bytes:
         """
         Process a chunk of PCM16 audio data.
         
         Args:
-            audio_bytes: Raw PCM16 audio bytes at input_sample_rate (48kHz)
+            audio_bytes: Raw PCM16 audio at input_sample_rate (48kHz). Any
+                buffer-protocol object (bytes / memoryview / int16 ndarray)
+                is read in place without copying.
             
         Returns:
             Processed audio as PCM16 bytes at output_sample_rate (16kHz)
         """
+        start = time.perf_counter()
         # Keep as int16 - pyrnnoise expects int16!
-        audio_int16 = np.frombuffer(audio_bytes, dtype=np.int16)
+        if isinstance(audio_bytes, np.ndarray):
+            audio_int16 = audio_bytes.astype(np.int16, copy=False).reshape(-1)
+        else:
+            audio_int16 = np.frombuffer(audio_bytes, dtype=np.int16)
         
         # Check if we need to reset (after long silence or on request)
         current_time = time.time()
@@ -134,75 +188,101 @@ class AudioProcessor:
                 logger.info("🔄 RNNoise state auto-reset after silence")
             self._needs_reset = False
         
+        self._audio_seconds += len(audio_int16) / self.input_sample_rate
+        
         # Apply RNNoise if available (processes int16, returns int16)
         if self._denoiser is not None and self.noise_reduce_enabled:
-            processed = self._process_with_rnnoise(audio_int16)
-            if len(processed) == 0:
-                return b''  # Buffering
-            audio_int16 = processed
+            audio_int16 = self._process_with_rnnoise(audio_int16)
         
-        # Downsample from 48kHz to 16kHz using high-quality soxr
+        # Downsample from 48kHz to 16kHz using high-quality streaming soxr
         if self.input_sample_rate != self.output_sample_rate and len(audio_int16) > 0:
-            # Convert to float for soxr, resample, then back to int16
-            audio_float = audio_int16.astype(np.float32) / 32768.0
-            audio_float = soxr.resample(
-                audio_float, 
-                self.input_sample_rate, 
-                self.output_sample_rate, 
+            audio_int16 = self._resample(audio_int16)
+        
+        result = audio_int16.tobytes()
+        self._cpu_seconds += time.perf_counter() - start
+        return result  # Empty while RNNoise / resampler are buffering
+    
+    def _resample(self, audio: np.ndarray) -> np.ndarray:
+        """Resample int16 audio through a persistent soxr stream.
+        
+        soxr works on int16 directly, so no float conversion is needed. The
+        stream releases output in blocks (~30ms for HQ), so some calls
+        return an empty array.
+        """
+        if self._resampler is None:
+            self._resampler = soxr.ResampleStream(
+                self.input_sample_rate,
+                self.output_sample_rate,
+                1,
+                dtype='int16',
                 quality='HQ'
             )
-            audio_int16 = (audio_float * 32768.0).clip(-32768, 32767).astype(np.int16)
-        
-        return audio_int16.tobytes()
+        return self._resampler.resample_chunk(audio)
     
     def _process_with_rnnoise(self, audio: np.ndarray) -> np.ndarray:
-        """Process audio through RNNoise frame by frame.
+        """Process audio through RNNoise, all complete frames in one batch.
         
         Args:
             audio: int16 numpy array
             
         Returns:
-            Denoised int16 numpy array
+            Denoised int16 numpy array (empty if no complete frame yet)
         """
-        # Add to frame buffer (int16)
-        self._frame_buffer = np.concatenate([self._frame_buffer, audio])
-        
-        # Limit buffer size to prevent memory issues (max 1 second of audio)
-        max_buffer_samples = self.RNNOISE_SAMPLE_RATE
-        if len(self._frame_buffer) > max_buffer_samples:
-            self._frame_buffer = self._frame_buffer[-max_buffer_samples:]
-        
-        # Process complete frames
-        output_frames = []
-        while len(self._frame_buffer) >= self.RNNOISE_FRAME_SIZE:
-            frame = self._frame_buffer[:self.RNNOISE_FRAME_SIZE]
-            self._frame_buffer = self._frame_buffer[self.RNNOISE_FRAME_SIZE:]
-            
-            # RNNoise expects [channels, samples] format with int16
-            frame_2d = frame.reshape(1, -1)
-            
-            try:
-                # Process frame - pyrnnoise takes int16 and returns int16
-                for speech_prob, denoised_frame in self._denoiser.denoise_chunk(frame_2d):
-                    prob = float(speech_prob[0])
-                    self._last_speech_prob = prob
-                    
-                    # Track last time speech was detected
-                    if prob > 0.5:
-                        self._last_speech_time = time.time()
-                    
-                    output_frames.append(denoised_frame.flatten())
-            except Exception as e:
-                logger.error(f"❌ RNNoise processing error: {e}")
-                output_frames.append(frame)
+        frame_size = self.RNNOISE_FRAME_SIZE
+        capacity = self.MAX_BUFFER_SAMPLES
+        n = len(audio)
+        
+        # Append to buffer, keeping at most the latest second of audio
+        if self._buffered + n <= capacity:
+            self._frame_buffer[self._buffered:self._buffered + n] = audio
+            self._buffered += n
+        elif n >= capacity:
+            self._frame_buffer[:] = audio[-capacity:]
+            self._buffered = capacity
+        else:
+            keep = capacity - n
+            self._frame_buffer[:keep] = self._frame_buffer[self._buffered - keep:self._buffered]
+            self._frame_buffer[keep:] = audio
+            self._buffered = capacity
+        
+        num_frames = self._buffered // frame_size
+        if num_frames == 0:
+            return np.zeros(0, dtype=np.int16)
+        block_len = num_frames * frame_size
+        block = self._frame_buffer[:block_len]
+        output = np.empty(block_len, dtype=np.int16)
         
-        if output_frames:
-            return np.concatenate(output_frames)
-        return np.array([], dtype=np.int16)
+        # RNNoise expects [channels, samples] format with int16; submit all
+        # complete frames at once, it yields one denoised frame per 480 samples
+        written = 0
+        try:
+            speech_detected = False
+            for speech_prob, denoised_frame in self._denoiser.denoise_chunk(block.reshape(1, -1)):
+                prob = float(speech_prob[0])
+                self._last_speech_prob = prob
+                if prob > 0.5:
+                    speech_detected = True
+                denoised = denoised_frame.reshape(-1)
+                output[written:written + len(denoised)] = denoised
+                written += len(denoised)
+            # Track last time speech was detected
+            if speech_detected:
+                self._last_speech_time = time.time()
+        except Exception as e:
+            logger.error(f"❌ RNNoise processing error: {e}")
+        # Frames RNNoise did not return pass through unprocessed
+        if written < block_len:
+            output[written:] = block[written:]
+        
+        # Move the incomplete tail frame to the head of the buffer
+        remainder = self._buffered - block_len
+        self._frame_buffer[:remainder] = self._frame_buffer[block_len:self._buffered]
+        self._buffered = remainder
+        return output
     
     def _reset_internal_state(self) -> None:
         """Reset RNNoise internal state without full reinitialization."""
-        self._frame_buffer = np.array([], dtype=np.int16)
+        self._buffered = 0
         self._last_speech_prob = 0.0
         # Reset denoiser GRU hidden states (do not reinitialize)
         if self._denoiser is not None:
@@ -229,9 +309,58 @@ class AudioProcessor:
         """Get the last detected speech probability (0.0-1.0)."""
         return self._last_speech_prob
     
+    @property
+    def real_time_factor(self) -> float:
+        """Processing time / audio duration so far (lower is better, <1 is real-time)."""
+        if self._audio_seconds <= 0:
+            return 0.0
+        return self._cpu_seconds / self._audio_seconds
+    
+    def get_stats(self) -> dict:
+        """Per-session processing stats, used to size hosts (sessions per core ~= 1 / rtf)."""
+        return {
+            'audio_seconds': round(self._audio_seconds, 3),
+            'cpu_seconds': round(self._cpu_seconds, 4),
+            'rtf': round(self.real_time_factor, 5),
+            'rnnoise': self._denoiser is not None and self.noise_reduce_enabled,
+        }
+    
     def set_enabled(self, enabled: bool) -> None:
         """Enable or disable noise reduction."""
         self.noise_reduce_enabled = enabled
         if enabled and self._denoiser is None:
             self._init_denoiser()
         logger.info(f"🎤 Noise reduction {'enabled' if enabled else 'disabled'}")
+
+
+def benchmark(seconds: float = 30.0, chunk_samples: int = 480, noise_reduce: bool = True) -> dict:
+    """
+    Micro-benchmark: push `seconds` of synthetic 48kHz speech-like audio
+    through one AudioProcessor in chunks of `chunk_samples` (480 = browser
+    frame size) and report the real-time factor of that session.
+    """
+    processor = AudioProcessor(noise_reduce_enabled=noise_reduce)
+    rate = processor.input_sample_rate
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * rate)) / rate
+    # Amplitude-modulated harmonics plus background noise
+    signal = (np.sin(2 * np.pi * 220 * t) + 0.5 * np.sin(2 * np.pi * 440 * t)) * (0.5 + 0.5 * np.sin(2 * np.pi * 3 * t))
+    signal = signal * 6000 + rng.normal(0, 800, len(t))
+    audio = signal.clip(-32768, 32767).astype(np.int16)
+    
+    output_samples = 0
+    for start in range(0, len(audio) - chunk_samples + 1, chunk_samples):
+        output_samples += len(processor.process_chunk(audio[start:start + chunk_samples])) // 2
+    
+    stats = processor.get_stats()
+    stats['chunk_samples'] = chunk_samples
+    stats['output_samples'] = output_samples
+    stats['sessions_per_core'] = round(1 / stats['rtf']) if stats['rtf'] > 0 else None
+    return stats
+
+
+if __name__ == "__main__":
+    # python -m utils.audio_processor
+    logging.basicConfig(level=logging.WARNING)
+    for noise_reduce in (True, False):
+        print(benchmark(noise_reduce=noise_reduce))
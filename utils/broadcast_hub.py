@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+Monitor 的按角色发布/订阅中心
+
+- 每个角色（lanlan_name）一个频道，频道内是一个定长环形缓冲区，消息只编码一次后写入
+- 发布只做一次写入 + 一次唤醒，开销与观看端数量无关
+- 每个订阅者一个独立的写协程，按自己的游标从环形缓冲区读取并发送，慢的观看端不会拖慢其他人，
+  也不会阻塞 /sync、/sync_binary 的接收循环
+- 订阅者落后过多时：音频丢弃最旧的帧（直接追到最新），文本消息在被环形缓冲区覆盖之前都会送达
+- 每个订阅者记录发送数、丢弃数、当前积压与发送延迟
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# 每个频道环形缓冲区的容量（条）
+HUB_RING_SIZE = 1024
+# 订阅者音频积压超过多少条时开始丢弃最旧的音频帧
+HUB_AUDIO_MAX_LAG = 48
+# 单次发送超时（秒），超时视为观看端已失联
+HUB_SEND_TIMEOUT = 10.0
+# 发送延迟统计保留的样本数
+HUB_LATENCY_WINDOW = 256
+
+
+class BroadcastChannel:
+    """一个角色的广播频道：环形缓冲区 + 共享唤醒事件"""
+
+    def __init__(self, name, ring_size=HUB_RING_SIZE):
+        self.name = name
+        self.ring_size = ring_size
+        self._ring = [None] * ring_size  # (seq, is_binary, payload, published_at)
+        self.head = 0  # 下一条消息的序号
+        self._wakeup = asyncio.Event()
+        self.subscribers = set()
+        self.published = {'text': 0, 'binary': 0}
+
+    def publish(self, payload, binary=False):
+        """写入一条已编码的消息（str 或 bytes）并唤醒所有写协程"""
+        seq = self.head
+        self._ring[seq % self.ring_size] = (seq, binary, payload, time.monotonic())
+        self.head = seq + 1
+        self.published['binary' if binary else 'text'] += 1
+        # 换一个新的事件再 set 旧的：等待中的写协程全部被唤醒，之后的等待不受影响
+        wakeup, self._wakeup = self._wakeup, asyncio.Event()
+        wakeup.set()
+
+    @property
+    def oldest(self):
+        return max(0, self.head - self.ring_size)
+
+    def entry(self, seq):
+        return self._ring[seq % self.ring_size]
+
+    async def wait_beyond(self, seq):
+        """等待直到频道中出现序号 >= seq 的消息"""
+        while self.head <= seq:
+            await self._wakeup.wait()
+
+
+class Subscriber:
+    """一个观看端连接；run() 是它的写协程"""
+
+    def __init__(self, channel, websocket, audio_max_lag=HUB_AUDIO_MAX_LAG):
+        self.channel = channel
+        self.websocket = websocket
+        self.audio_max_lag = audio_max_lag
+        self.cursor = channel.head  # 只接收订阅之后的消息
+        self.sent = 0
+        self.dropped_audio = 0
+        self.dropped_text = 0
+        self.latency = deque(maxlen=HUB_LATENCY_WINDOW)
+        self.connected_at = time.time()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def _send(self, binary, payload):
+        if binary:
+            await self.websocket.send_bytes(payload)
+        else:
+            await self.websocket.send_text(payload)
+
+    async def run(self):
+        channel = self.channel
+        try:
+            while True:
+                if self.cursor >= channel.head:
+                    await channel.wait_beyond(self.cursor)
+                if self.cursor < channel.oldest:
+                    # 积压超过环形缓冲区容量，被覆盖的消息已无法送达
+                    self.dropped_text += channel.oldest - self.cursor
+                    self.cursor = channel.oldest
+                seq, binary, payload, published_at = channel.entry(self.cursor)
+                self.cursor += 1
+                if binary and channel.head - seq > self.audio_max_lag:
+                    self.dropped_audio += 1
+                    continue
+                await asyncio.wait_for(self._send(binary, payload), HUB_SEND_TIMEOUT)
+                self.sent += 1
+                self.latency.append((time.monotonic() - published_at) * 1000)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ [HUB] 观看端 {self.websocket.client} 发送超时，断开连接")
+        except Exception as e:
+            logger.info(f"🗑️ [HUB] 观看端 {self.websocket.client} 发送失败，停止推送: {e}")
+        finally:
+            channel.subscribers.discard(self)
+        try:
+            await self.websocket.close()
+        except Exception:
+            pass
+
+    def stop(self):
+        self.channel.subscribers.discard(self)
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    def snapshot(self):
+        ordered = sorted(self.latency)
+        return {
+            'client': str(self.websocket.client),
+            'connected_seconds': round(time.time() - self.connected_at, 1),
+            'sent': self.sent,
+            'lag': self.channel.head - self.cursor,
+            'dropped_audio': self.dropped_audio,
+            'dropped_text': self.dropped_text,
+            'send_latency_ms': {
+                'p50': ordered[len(ordered) // 2] if ordered else None,
+                'p95': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] if ordered else None,
+                'max': ordered[-1] if ordered else None,
+            },
+        }
+
+
+class BroadcastHub:
+    """按角色名管理频道"""
+
+    def __init__(self, ring_size=HUB_RING_SIZE):
+        self.ring_size = ring_size
+        self.channels = {}
+
+    def channel(self, name):
+        channel = self.channels.get(name)
+        if channel is None:
+            channel = self.channels[name] = BroadcastChannel(name, self.ring_size)
+        return channel
+
+    def subscribe(self, name, websocket):
+        channel = self.channel(name)
+        subscriber = Subscriber(channel, websocket)
+        channel.subscribers.add(subscriber)
+        subscriber.start()
+        return subscriber
+
+    def publish_text(self, name, text):
+        """发布已序列化的 JSON 文本；没有订阅者的频道不保留消息"""
+        channel = self.channels.get(name)
+        if channel is not None and channel.subscribers:
+            channel.publish(text)
+
+    def publish_json(self, name, message):
+        channel = self.channels.get(name)
+        if channel is not None and channel.subscribers:
+            channel.publish(json.dumps(message, ensure_ascii=False))
+
+    def publish_binary(self, name, data):
+        channel = self.channels.get(name)
+        if channel is not None and channel.subscribers:
+            channel.publish(bytes(data), binary=True)
+
+    def publish_json_all(self, message):
+        """向所有频道发布同一条消息（只编码一次）"""
+        text = json.dumps(message, ensure_ascii=False)
+        for channel in list(self.channels.values()):
+            if channel.subscribers:
+                channel.publish(text)
+
+    def subscriber_count(self, name=None):
+        if name is not None:
+            channel = self.channels.get(name)
+            return len(channel.subscribers) if channel else 0
+        return sum(len(channel.subscribers) for channel in self.channels.values())
+
+    def snapshot(self):
+        return {
+            name: {
+                'published': dict(channel.published),
+                'head': channel.head,
+                'subscribers': [subscriber.snapshot() for subscriber in list(channel.subscribers)],
+            }
+            for name, channel in list(self.channels.items())
+        }
@@ -8,8 +8,10 @@ import os
 import json
 import shutil
 import logging
+import time
 from copy import deepcopy
 from pathlib import Path
+from types import MappingProxyType
 
 from config import (
     APP_NAME,
@@ -29,6 +31,9 @@ from utils.api_config_loader import (
 
 logger = logging.getLogger(__name__)
 
+# 配置快照检查文件是否变化（stat）的最小间隔（秒）；其他进程写入的配置最迟在此间隔后生效
+CONFIG_SNAPSHOT_CHECK_INTERVAL = 0.5
+
 
 class ConfigManager:
     """配置文件管理器"""
@@ -52,6 +57,14 @@ class ConfigManager:
 
         self.project_config_dir = self._get_project_config_directory()
         self.project_memory_dir = self._get_project_memory_directory()
+
+        # 配置快照：(文件名, 种类) -> (文件签名, 快照)
+        self._snapshots = {}
+        # 文件名 -> (检查时间, 文件签名)
+        self._signatures = {}
+        # 每次重新构建快照时递增，调用方可据此判断配置是否变化
+        self.config_version = 0
+        self._snapshot_stats = {'hits': 0, 'rebuilds': 0}
     
     def _log(self, msg):
         """仅在主进程中打印调试信息"""
@@ -416,8 +429,72 @@ class ConfigManager:
         """获取默认角色配置数据"""
         return deepcopy(DEFAULT_CHARACTERS_CONFIG)
 
+    # --- Config snapshot helpers ---
+
+    def _config_signature(self, filename):
+        """
+        配置文件的签名 (路径, mtime_ns, size)，文件不存在时后两项为 None
+        CONFIG_SNAPSHOT_CHECK_INTERVAL 内重复调用直接返回上次的结果，不访问磁盘
+        """
+        now = time.monotonic()
+        checked = self._signatures.get(filename)
+        if checked is not None and now - checked[0] < CONFIG_SNAPSHOT_CHECK_INTERVAL:
+            return checked[1]
+        path = str(self.get_config_path(filename))
+        try:
+            st = os.stat(path)
+            signature = (path, st.st_mtime_ns, st.st_size)
+        except OSError:
+            signature = (path, None, None)
+        self._signatures[filename] = (now, signature)
+        return signature
+
+    def _get_snapshot(self, filename, kind, build):
+        """返回基于 filename 构建的快照；文件签名未变化时复用缓存，否则调用 build() 重新构建"""
+        signature = self._config_signature(filename)
+        cached = self._snapshots.get((filename, kind))
+        if cached is not None and cached[0] == signature:
+            self._snapshot_stats['hits'] += 1
+            return cached[1]
+        snapshot = build()
+        self._snapshots[(filename, kind)] = (signature, snapshot)
+        self.config_version += 1
+        self._snapshot_stats['rebuilds'] += 1
+        return snapshot
+
+    def invalidate_config_cache(self, filename=None):
+        """
+        丢弃配置快照，下次读取时重新加载
+        通过 save_* 方法保存的配置会自动调用；直接写入配置文件后应手动调用
+
+        Args:
+            filename: 配置文件名，为 None 时丢弃全部快照
+        """
+        if filename is None:
+            self._signatures.clear()
+            self._snapshots.clear()
+            return
+        self._signatures.pop(filename, None)
+        for key in [key for key in self._snapshots if key[0] == filename]:
+            self._snapshots.pop(key, None)
+
+    def get_config_cache_stats(self):
+        """配置快照的命中与重建统计"""
+        return {
+            'version': self.config_version,
+            'snapshots': sorted(f'{filename}:{kind}' for filename, kind in self._snapshots),
+            **self._snapshot_stats,
+        }
+
+    # --- Character helpers ---
+
     def load_characters(self, character_json_path=None):
-        """加载角色配置"""
+        """加载角色配置（返回副本，可自由修改后交给 save_characters 保存）"""
+        if character_json_path is None:
+            return deepcopy(self._get_snapshot('characters.json', 'raw', self._read_characters))
+        return self._read_characters(character_json_path)
+
+    def _read_characters(self, character_json_path=None):
         if character_json_path is None:
             character_json_path = str(self.get_config_path('characters.json'))
 
@@ -440,8 +517,11 @@ class ConfigManager:
         # 确保config目录存在
         self.ensure_config_directory()
 
-        with open(character_json_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        try:
+            with open(character_json_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+        finally:
+            self.invalidate_config_cache('characters.json')
 
     # --- Voice storage helpers ---
 
@@ -463,7 +543,7 @@ class ConfigManager:
 
     def get_voices_for_current_api(self):
         """获取当前 AUDIO_API_KEY 对应的所有音色"""
-        core_config = self.get_core_config()
+        core_config = self.get_core_config_snapshot()
         audio_api_key = core_config.get('AUDIO_API_KEY', '')
 
         if not audio_api_key:
@@ -477,7 +557,7 @@ class ConfigManager:
 
     def save_voice_for_current_api(self, voice_id, voice_data):
         """为当前 AUDIO_API_KEY 保存音色"""
-        core_config = self.get_core_config()
+        core_config = self.get_core_config_snapshot()
         audio_api_key = core_config.get('AUDIO_API_KEY', '')
 
         if not audio_api_key:
@@ -529,7 +609,33 @@ class ConfigManager:
     # --- Character metadata helpers ---
 
     def get_character_data(self):
-        """获取角色基础数据及相关路径"""
+        """获取角色基础数据及相关路径（基于缓存的快照，返回的容器均为副本）"""
+        (
+            master_name,
+            her_name,
+            master_basic_config,
+            catgirl_data,
+            name_mapping,
+            lanlan_prompt_map,
+            semantic_store,
+            time_store,
+            setting_store,
+            recent_log,
+        ) = self._get_snapshot('characters.json', 'derived', self._build_character_data)
+        return (
+            master_name,
+            her_name,
+            deepcopy(master_basic_config),
+            deepcopy(catgirl_data),
+            dict(name_mapping),
+            dict(lanlan_prompt_map),
+            dict(semantic_store),
+            dict(time_store),
+            dict(setting_store),
+            dict(recent_log),
+        )
+
+    def _build_character_data(self):
         character_data = self.load_characters()
         defaults = self.get_default_characters()
 
@@ -584,7 +690,14 @@ class ConfigManager:
     # --- Core config helpers ---
 
     def get_core_config(self):
-        """动态读取核心配置"""
+        """读取核心配置（返回副本；core_config.json 变化后自动重新加载）"""
+        return dict(self.get_core_config_snapshot())
+
+    def get_core_config_snapshot(self):
+        """核心配置的只读快照，不复制，适合只读取少量字段的高频调用"""
+        return self._get_snapshot('core_config.json', 'core', self._build_core_config)
+
+    def _build_core_config(self):
         # 从 config 模块导入所有默认配置值
         from config import (
             DEFAULT_CORE_API_KEY,
@@ -782,7 +895,7 @@ class ConfigManager:
                 # 将 core_cfg 中的 visionModelId 映射到内部的 VISION_MODEL（模型ID）
                 config['VISION_MODEL'] = core_cfg.get('visionModelId', '') or config.get('VISION_MODEL', '')
 
-        return config
+        return MappingProxyType(config)
 
     def get_model_api_config(self, model_type: str) -> dict:
         """
@@ -805,7 +918,7 @@ class ConfigManager:
                 - 'base_url': API端点URL
                 - 'is_custom': 是否使用自定义API配置
         """
-        core_config = self.get_core_config()
+        core_config = self.get_core_config_snapshot()
         enable_custom_api = core_config.get('ENABLE_CUSTOM_API', False)
         
         # 模型类型到配置字段的映射
@@ -964,6 +1077,8 @@ class ConfigManager:
         except Exception as e:
             print(f"Error saving {filename}: {e}", file=sys.stderr)
             raise
+        finally:
+            self.invalidate_config_cache(filename)
     
     def get_memory_path(self, filename):
         """
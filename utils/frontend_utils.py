@@ -165,75 +165,11 @@ def calculate_text_similarity(text1: str, text2: str) -> float:
 
 def find_models():
     """
-    递归扫描 'static' 文件夹、用户文档下的 'live2d' 文件夹和用户mod路径，查找所有包含 '.model3.json' 文件的子目录。
+    返回 'static' 文件夹、用户文档下的 'live2d' 文件夹和用户mod路径中所有包含 '.model3.json' 文件的子目录。
+    结果来自模型目录索引（utils.model_catalog），只有目录发生变化时才重新扫描。
     """
-    from utils.config_manager import get_config_manager
-    
-    found_models = []
-    search_dirs = []
-    
-    # 添加static目录
-    static_dir = 'static'
-    if os.path.exists(static_dir):
-        search_dirs.append(('static', static_dir, '/static'))
-    else:
-        logging.warning(f"警告：static文件夹路径不存在: {static_dir}")
-    
-    # 添加用户文档目录下的live2d文件夹
-    try:
-        config_mgr = get_config_manager()
-        config_mgr.ensure_live2d_directory()
-        docs_live2d_dir = str(config_mgr.live2d_dir)
-        if os.path.exists(docs_live2d_dir):
-            search_dirs.append(('documents', docs_live2d_dir, '/user_live2d'))
-    except Exception as e:
-        logging.warning(f"无法访问用户文档live2d目录: {e}")
-    
-    # 添加用户mod路径
-    try:
-        config_mgr = get_config_manager()
-        user_mod_dir = config_mgr.get_workshop_path()
-        if os.path.exists(user_mod_dir):
-            search_dirs.append(('user_mods', user_mod_dir, '/user_mods'))
-            logging.info(f"已添加用户mod路径: {user_mod_dir}")
-    except Exception as e:
-        logging.warning(f"无法访问用户mod路径: {e}")
-    
-    # 遍历所有搜索目录
-    for source, search_root_dir, url_prefix in search_dirs:
-        try:
-            # os.walk会遍历指定的根目录下的所有文件夹和文件
-            for root, dirs, files in os.walk(search_root_dir):
-                for file in files:
-                    if file.endswith('.model3.json'):
-                        # 获取模型名称 (使用其所在的文件夹名，更加直观)
-                        model_name = os.path.basename(root)
-                        
-                        # 构建可被浏览器访问的URL路径
-                        # 1. 计算文件相对于 search_root_dir 的路径
-                        relative_path = os.path.relpath(os.path.join(root, file), search_root_dir)
-                        # 2. 将本地路径分隔符 (如'\') 替换为URL分隔符 ('/')
-                        model_path = relative_path.replace(os.path.sep, '/')
-                        
-                        # 如果模型名称已存在，添加来源后缀以区分
-                        existing_names = [m["name"] for m in found_models]
-                        display_name = model_name
-                        if model_name in existing_names:
-                            display_name = f"{model_name}_{source}"
-                        
-                        found_models.append({
-                            "name": display_name,
-                            "path": f"{url_prefix}/{model_path}",
-                            "source": source
-                        })
-                        
-                        # 优化：一旦在某个目录找到模型json，就无需再继续深入该目录的子目录
-                        dirs[:] = []
-                        break
-        except Exception as e:
-            logging.error(f"搜索目录 {search_root_dir} 时出错: {e}")
-                
-    return found_models
+    from utils.model_catalog import get_model_catalog
+    return get_model_catalog().list_models()
 
 # --- 工具函数 ---
 async def get_upload_policy(api_key, model_name):
@@ -279,6 +215,7 @@ def find_model_directory(model_name: str):
     返回 (实际路径, URL前缀) 元组
     """
     from utils.config_manager import get_config_manager
+    from utils.model_catalog import get_model_catalog
     # 从配置文件获取WORKSHOP_PATH
     workshop_config_data = load_workshop_config()
     WORKSHOP_SEARCH_DIR = workshop_config_data.get("WORKSHOP_PATH")
@@ -299,22 +236,10 @@ def find_model_directory(model_name: str):
             if os.path.exists(workshop_model_dir):
                 return (workshop_model_dir, '/workshop')
             
-            # 递归搜索创意工坊目录下的所有子文件夹（处理Steam工坊使用物品ID命名的情况）
-            for item_id in os.listdir(WORKSHOP_SEARCH_DIR):
-                item_path = os.path.join(WORKSHOP_SEARCH_DIR, item_id)
-                if os.path.isdir(item_path):
-                    # 检查子文件夹中是否包含与模型名称匹配的文件夹
-                    potential_model_path = os.path.join(item_path, model_name)
-                    if os.path.exists(potential_model_path):
-                        return (potential_model_path, '/workshop')
-                    
-                    # 检查子文件夹本身是否就是模型目录（包含.model3.json文件）
-                    for file in os.listdir(item_path):
-                        if file.endswith('.model3.json'):
-                            # 提取模型名称（不带后缀）
-                            potential_model_name = os.path.splitext(os.path.splitext(file)[0])[0]
-                            if potential_model_name == model_name:
-                                return (item_path, '/workshop')
+            # 在创意工坊物品子文件夹中查找（处理Steam工坊使用物品ID命名的情况）
+            potential_model_path = get_model_catalog().find_in(WORKSHOP_SEARCH_DIR, model_name)
+            if potential_model_path:
+                return (potential_model_path, '/workshop')
     except Exception as e:
         logging.warning(f"检查创意工坊目录模型时出错: {e}")
     
@@ -328,22 +253,10 @@ def find_model_directory(model_name: str):
             if os.path.exists(user_mod_model_dir):
                 return (user_mod_model_dir, '/user_mods')
             
-            # 递归搜索用户mod目录下的所有子文件夹
-            for mod_folder in os.listdir(user_mods_path):
-                mod_path = os.path.join(user_mods_path, mod_folder)
-                if os.path.isdir(mod_path):
-                    # 检查子文件夹中是否包含与模型名称匹配的文件夹
-                    potential_model_path = os.path.join(mod_path, model_name)
-                    if os.path.exists(potential_model_path):
-                        return (potential_model_path, '/user_mods')
-                    
-                    # 检查子文件夹本身是否就是模型目录（包含.model3.json文件）
-                    for file in os.listdir(mod_path):
-                        if file.endswith('.model3.json'):
-                            # 提取模型名称（不带后缀）
-                            potential_model_name = os.path.splitext(os.path.splitext(file)[0])[0]
-                            if potential_model_name == model_name:
-                                return (mod_path, '/user_mods')
+            # 在用户mod目录的子文件夹中查找
+            potential_model_path = get_model_catalog().find_in(user_mods_path, model_name)
+            if potential_model_path:
+                return (potential_model_path, '/user_mods')
     except Exception as e:
         logging.warning(f"检查用户mod目录模型时出错: {e}")
     
@@ -376,21 +289,12 @@ def find_workshop_item_by_id(item_id: str) -> tuple:
             default_path = os.path.join("static", item_id)
             return (default_path, '/static')
         
-        # 直接使用物品ID作为文件夹名查找
+        # 直接使用物品ID作为文件夹名查找：物品目录或其子文件夹中包含.model3.json文件
+        from utils.model_catalog import get_model_catalog
         item_path = os.path.join(workshop_dir, item_id)
-        if os.path.isdir(item_path):
-            # 检查是否包含.model3.json文件
-            has_model_file = any(file.endswith('.model3.json') for file in os.listdir(item_path))
-            if has_model_file:
+        for model_dir, _ in get_model_catalog().item_models(workshop_dir, item_id):
+            if model_dir == item_path or os.path.dirname(model_dir) == item_path:
                 return (item_path, '/workshop')
-            
-            # 检查子文件夹中是否有模型文件
-            for subdir in os.listdir(item_path):
-                subdir_path = os.path.join(item_path, subdir)
-                if os.path.isdir(subdir_path):
-                    # 检查子文件夹中是否有模型文件
-                    if any(file.endswith('.model3.json') for file in os.listdir(subdir_path)):
-                        return (item_path, '/workshop')
         
         # 如果找不到匹配的文件夹，返回默认路径
         default_path = os.path.join(workshop_dir, item_id)
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+本地创意工坊内容（mod 文件夹）的目录索引
+
+扫描本地物品时原先对每个物品完整 os.walk + 逐个 os.path.getsize 计算大小，
+并用 8 次 os.path.exists 查找预览图，大的 mod 文件夹会让创意工坊页面卡住。这里：
+
+- 每个目录用一次 os.scandir 取得直接文件的总大小、子目录列表与预览图，按目录 mtime 缓存
+- 再次查询时每个目录只需一次 stat，mtime 未变的目录直接复用，只有变化的子树重新扫描
+- 文件夹大小 = 各级目录直接文件大小之和（与原 os.walk 的统计口径一致：不进入符号链接目录）
+- 批量扫描在专用线程池中并发执行，不阻塞事件循环
+
+注意：原地改写文件内容不会改变所在目录的 mtime，这种情况下大小要等目录本身发生变化
+（增删、重命名文件）后才会更新。
+"""
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# 预览图文件名，按优先级排列
+PREVIEW_IMAGE_NAMES = ('preview.jpg', 'preview.png', 'thumbnail.jpg', 'thumbnail.png',
+                       'icon.jpg', 'icon.png', 'header.jpg', 'header.png')
+# 批量扫描的线程数
+LOCAL_SCAN_WORKERS = 4
+
+
+class LocalContentIndex:
+    """线程安全；缓存项为 目录 -> (mtime_ns, 直接文件总大小, 子目录名, 预览图文件名)"""
+
+    def __init__(self):
+        self._dirs = {}
+        self._lock = threading.Lock()
+        self.stats = {'scanned': 0, 'reused': 0}
+
+    def _forget(self, path):
+        """移除目录及其所有子目录的缓存"""
+        prefix = os.path.join(path, '')
+        with self._lock:
+            self._dirs.pop(path, None)
+            for key in [key for key in self._dirs if key.startswith(prefix)]:
+                del self._dirs[key]
+
+    def _entry(self, path):
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            self._forget(path)
+            return None
+        entry = self._dirs.get(path)
+        if entry is not None and entry[0] == mtime:
+            self.stats['reused'] += 1
+            return entry
+
+        file_bytes = 0
+        subdirs = []
+        names = set()
+        try:
+            with os.scandir(path) as it:
+                for item in it:
+                    try:
+                        if item.is_dir(follow_symlinks=False):
+                            subdirs.append(item.name)
+                        elif item.is_file():
+                            file_bytes += item.stat().st_size
+                            names.add(os.path.normcase(item.name))
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.debug(f"扫描目录 {path} 失败: {e}")
+        preview = next((name for name in PREVIEW_IMAGE_NAMES if os.path.normcase(name) in names), None)
+
+        # 被删除的子目录不再保留缓存
+        if entry is not None:
+            for removed in set(entry[2]) - set(subdirs):
+                self._forget(os.path.join(path, removed))
+        entry = (mtime, file_bytes, tuple(subdirs), preview)
+        with self._lock:
+            self._dirs[path] = entry
+        self.stats['scanned'] += 1
+        return entry
+
+    def folder_size(self, folder_path):
+        """文件夹大小（字节）"""
+        total_size = 0
+        stack = [folder_path]
+        while stack:
+            path = stack.pop()
+            entry = self._entry(path)
+            if entry is None:
+                continue
+            total_size += entry[1]
+            stack.extend(os.path.join(path, name) for name in entry[2])
+        return total_size
+
+    def preview_image(self, folder_path):
+        """文件夹中的预览图路径（只查找 PREVIEW_IMAGE_NAMES 中的文件名），没有则返回 None"""
+        entry = self._entry(folder_path)
+        if entry is None or entry[3] is None:
+            return None
+        return os.path.join(folder_path, entry[3])
+
+    def describe(self, folder_path):
+        """文件夹的修改时间、大小与预览图"""
+        return {
+            'lastModified': os.stat(folder_path).st_mtime,
+            'size': self.folder_size(folder_path),
+            'previewImage': self.preview_image(folder_path),
+        }
+
+    async def describe_many(self, folder_paths):
+        """在线程池中并发获取多个文件夹的信息，结果与输入顺序一致；无法访问的文件夹为 None"""
+        loop = asyncio.get_running_loop()
+
+        def describe_safe(folder_path):
+            try:
+                return self.describe(folder_path)
+            except OSError as e:
+                logger.warning(f"读取文件夹 {folder_path} 信息失败: {e}")
+                return None
+
+        return await asyncio.gather(*(
+            loop.run_in_executor(_get_executor(), describe_safe, folder_path) for folder_path in folder_paths))
+
+    def snapshot(self):
+        return {'cached_dirs': len(self._dirs), **self.stats}
+
+
+_executor = None
+_local_content_index = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=LOCAL_SCAN_WORKERS, thread_name_prefix='LocalContentScan')
+    return _executor
+
+
+def get_local_content_index():
+    global _local_content_index
+    if _local_content_index is None:
+        _local_content_index = LocalContentIndex()
+    return _local_content_index
@@ -0,0 +1,406 @@
+# -*- coding: utf-8 -*-
+"""
+Live2D 模型目录索引
+
+find_models / find_model_directory / 创意工坊物品查找原先每次调用都要完整遍历
+static、用户文档 live2d 目录、用户mod目录与创意工坊目录，订阅了几百个工坊模型时页面加载需要数秒。
+这里把扫描结果建成索引：
+
+- 每个根目录按一级子目录（工坊中即物品ID）分条目，记录条目内访问过的每个目录的 mtime
+- 查询时（最多每 CATALOG_CHECK_INTERVAL 秒一次）只 stat 记录过的目录，mtime 变化的条目才重新扫描，
+  根目录 mtime 变化时只扫描新增的子目录
+- 索引持久化到配置目录下的缓存文件，重启后只需 stat 校验，无需重新遍历
+- 提供按模型名、按工坊物品ID的 O(1) 查询
+- 上传/删除模型后调用 invalidate()，下一次查询立即校验
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 两次 mtime 校验之间的最短间隔（秒）
+CATALOG_CHECK_INTERVAL = 2.0
+CATALOG_CACHE_FILE = 'model_catalog_cache.json'
+CATALOG_CACHE_VERSION = 1
+
+MODEL_SUFFIX = '.model3.json'
+
+
+def _model_stem(filename):
+    return filename[:-len(MODEL_SUFFIX)]
+
+
+def _scan_tree(top):
+    """
+    遍历 top，遇到包含 .model3.json 的目录即不再深入（与原 find_models 一致）
+    返回 {'mtimes': {目录: mtime_ns}, 'models': [[目录, 模型文件名], ...]}
+    """
+    mtimes = {}
+    models = []
+    for root, dirs, files in os.walk(top):
+        try:
+            mtimes[root] = os.stat(root).st_mtime_ns
+        except OSError:
+            dirs[:] = []
+            continue
+        dirs.sort()
+        for file in sorted(files):
+            if file.endswith(MODEL_SUFFIX):
+                models.append([root, file])
+                dirs[:] = []
+                break
+    return {'mtimes': mtimes, 'models': models}
+
+
+def _scan_item(folder):
+    """
+    扫描一个已安装的工坊物品目录：目录本身的所有 .model3.json，以及 子目录/子目录名.model3.json
+    """
+    mtimes = {}
+    models = []
+    try:
+        mtimes[folder] = os.stat(folder).st_mtime_ns
+        with os.scandir(folder) as it:
+            entries = sorted(it, key=lambda e: e.name)
+    except OSError:
+        return {'mtimes': mtimes, 'models': models}
+    for entry in entries:
+        if entry.name.endswith(MODEL_SUFFIX) and entry.is_file():
+            models.append([folder, entry.name])
+    for entry in entries:
+        if entry.is_dir():
+            try:
+                mtimes[entry.path] = entry.stat().st_mtime_ns
+            except OSError:
+                continue
+            if os.path.isfile(os.path.join(entry.path, entry.name + MODEL_SUFFIX)):
+                models.append([entry.path, entry.name + MODEL_SUFFIX])
+    return {'mtimes': mtimes, 'models': models}
+
+
+def _entry_changed(entry):
+    for path, mtime in entry['mtimes'].items():
+        try:
+            if os.stat(path).st_mtime_ns != mtime:
+                return True
+        except OSError:
+            return True
+    return False
+
+
+class ModelCatalog:
+    """线程安全：sync 路由在线程池中调用"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._trees = {}  # 根目录 -> {'mtime', 'root_models', 'entries': {子目录名: 条目}}
+        self._items = {}  # 已安装的工坊物品目录 -> 条目
+        self._by_name = {}  # 根目录 -> {名称: 模型目录}
+        self._extra_roots = set()  # 不在默认查找范围内、被直接查询过的根目录
+        self._roots_cache = []
+        self._models_cache = None
+        self._checked_at = 0.0
+        self._loaded = False
+        self._dirty = False
+        self.stats = {'checks': 0, 'rescanned_entries': 0, 'full_scans': 0, 'last_check_ms': 0.0}
+
+    # ---------- 根目录 ----------
+
+    @staticmethod
+    def _roots():
+        """(来源, 根目录, URL前缀)；与原 find_models / find_model_directory 的查找范围一致"""
+        from utils.config_manager import get_config_manager
+        from utils.workshop_utils import load_workshop_config
+
+        roots = []
+        if os.path.exists('static'):
+            roots.append(('static', 'static', '/static'))
+        else:
+            logging.warning("警告：static文件夹路径不存在: static")
+        try:
+            config_mgr = get_config_manager()
+            config_mgr.ensure_live2d_directory()
+            docs_live2d_dir = str(config_mgr.live2d_dir)
+            if os.path.exists(docs_live2d_dir):
+                roots.append(('documents', docs_live2d_dir, '/user_live2d'))
+        except Exception as e:
+            logging.warning(f"无法访问用户文档live2d目录: {e}")
+        try:
+            user_mod_dir = get_config_manager().get_workshop_path()
+            if user_mod_dir and os.path.exists(user_mod_dir):
+                roots.append(('user_mods', user_mod_dir, '/user_mods'))
+        except Exception as e:
+            logging.warning(f"无法访问用户mod路径: {e}")
+        try:
+            workshop_dir = load_workshop_config().get("WORKSHOP_PATH")
+            if workshop_dir and os.path.exists(workshop_dir):
+                roots.append(('workshop', workshop_dir, '/workshop'))
+        except Exception as e:
+            logging.warning(f"无法访问创意工坊目录: {e}")
+        return roots
+
+    # ---------- 持久化 ----------
+
+    @staticmethod
+    def _cache_path():
+        from utils.config_manager import get_config_manager
+        return os.path.join(str(get_config_manager().config_dir), CATALOG_CACHE_FILE)
+
+    def _load(self):
+        self._loaded = True
+        try:
+            with open(self._cache_path(), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('version') != CATALOG_CACHE_VERSION:
+            return
+        self._trees = data.get('trees', {})
+        self._items = data.get('items', {})
+        logger.info(f"📚 已加载模型目录缓存：{sum(len(t['entries']) for t in self._trees.values())} 个条目")
+
+    def _save(self):
+        if not self._dirty:
+            return
+        self._dirty = False
+        try:
+            path = self._cache_path()
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': CATALOG_CACHE_VERSION, 'trees': self._trees, 'items': self._items},
+                          f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"保存模型目录缓存失败: {e}")
+
+    # ---------- 增量更新 ----------
+
+    def _refresh_tree(self, root):
+        """返回该根目录的索引是否发生变化"""
+        tree = self._trees.get(root)
+        try:
+            root_mtime = os.stat(root).st_mtime_ns
+        except OSError:
+            return self._trees.pop(root, None) is not None
+        changed = False
+        if tree is None or tree['mtime'] != root_mtime:
+            if tree is None:
+                self.stats['full_scans'] += 1
+                tree = {'entries': {}}
+            # 根目录内容变化：重新列出一级子目录，已有条目保留（下面按 mtime 校验）
+            root_models = []
+            children = []
+            try:
+                with os.scandir(root) as it:
+                    for entry in it:
+                        if entry.is_dir():
+                            children.append(entry.name)
+                        elif entry.name.endswith(MODEL_SUFFIX):
+                            root_models.append(entry.name)
+            except OSError as e:
+                logger.warning(f"扫描模型目录 {root} 失败: {e}")
+            entries = tree['entries']
+            tree['entries'] = {}
+            # 根目录本身就是模型目录时不再深入（与 os.walk 剪枝一致）
+            if not root_models:
+                for name in sorted(children):
+                    tree['entries'][name] = entries.get(name) or self._scan_entry(os.path.join(root, name))
+            tree['root_models'] = sorted(root_models)[:1]
+            tree['mtime'] = root_mtime
+            self._trees[root] = tree
+            changed = True
+        for name, entry in tree['entries'].items():
+            if _entry_changed(entry):
+                tree['entries'][name] = self._scan_entry(os.path.join(root, name))
+                changed = True
+        return changed
+
+    def _scan_entry(self, path):
+        self.stats['rescanned_entries'] += 1
+        return _scan_tree(path)
+
+    def _changed(self):
+        self._by_name.clear()
+        self._models_cache = None
+        self._dirty = True
+
+    def _check(self, force=False):
+        """最多每 CATALOG_CHECK_INTERVAL 秒校验一次；返回当前根目录列表"""
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._loaded and now - self._checked_at < CATALOG_CHECK_INTERVAL:
+                return self._roots_cache
+            if not self._loaded:
+                self._load()
+            started = time.perf_counter()
+            roots = self._roots_cache = self._roots()
+            active = {root for _, root, _ in roots} | self._extra_roots
+            changed = False
+            for root in active:
+                changed |= self._refresh_tree(root)
+            # 不再使用的根目录（配置中的路径改变）
+            for root in set(self._trees) - active:
+                del self._trees[root]
+                changed = True
+            for folder, entry in list(self._items.items()):
+                if _entry_changed(entry):
+                    if os.path.isdir(folder):
+                        self._items[folder] = _scan_item(folder)
+                        self.stats['rescanned_entries'] += 1
+                    else:
+                        del self._items[folder]
+                    changed = True
+            if changed:
+                self._changed()
+                self._save()
+            self._checked_at = time.monotonic()
+            self.stats['checks'] += 1
+            self.stats['last_check_ms'] = round((time.perf_counter() - started) * 1000, 2)
+            return roots
+
+    def invalidate(self):
+        """模型目录被修改后调用，下一次查询立即校验 mtime"""
+        with self._lock:
+            self._checked_at = 0.0
+
+    def warm(self):
+        """在后台线程中建立/校验索引（启动时调用）"""
+        def _run():
+            try:
+                self._check(force=True)
+                logger.info(f"📚 模型目录索引就绪（{self.stats['last_check_ms']}ms）")
+            except Exception as e:
+                logger.warning(f"建立模型目录索引失败: {e}")
+        threading.Thread(target=_run, name='ModelCatalogWarmup', daemon=True).start()
+
+    # ---------- 查询 ----------
+
+    def _tree_models(self, root):
+        tree = self._trees.get(root)
+        if tree is None:
+            return
+        for file in tree.get('root_models', []):
+            yield root, file
+        for entry in tree['entries'].values():
+            for model_dir, file in entry['models']:
+                yield model_dir, file
+
+    def list_models(self):
+        """与原 find_models 返回格式一致：[{name, path, source}]"""
+        roots = self._check()
+        with self._lock:
+            if self._models_cache is None:
+                found_models = []
+                names = set()
+                for source, root, url_prefix in roots:
+                    if source == 'workshop':
+                        continue
+                    for model_dir, file in self._tree_models(root):
+                        model_name = os.path.basename(model_dir)
+                        relative_path = os.path.relpath(os.path.join(model_dir, file), root)
+                        model_path = relative_path.replace(os.path.sep, '/')
+                        # 如果模型名称已存在，添加来源后缀以区分
+                        display_name = f"{model_name}_{source}" if model_name in names else model_name
+                        names.add(display_name)
+                        found_models.append({
+                            "name": display_name,
+                            "path": f"{url_prefix}/{model_path}",
+                            "source": source,
+                        })
+                self._models_cache = found_models
+            return [dict(model) for model in self._models_cache]
+
+    def _name_index(self, root):
+        """
+        名称 -> 目录：一级子目录下名为 name 的目录（其中含有模型），
+        或一级子目录中直接放置的 name.model3.json 所在目录
+        """
+        index = self._by_name.get(root)
+        if index is None:
+            index = {}
+            tree = self._trees.get(root, {'entries': {}})
+            for child, entry in tree['entries'].items():
+                top = os.path.join(root, child)
+                for model_dir, file in entry['models']:
+                    if model_dir == top:
+                        index.setdefault(_model_stem(file), top)
+                        continue
+                    parts = os.path.relpath(model_dir, top).split(os.sep)
+                    index.setdefault(parts[0], os.path.join(top, parts[0]))
+            self._by_name[root] = index
+        return index
+
+    def _tree(self, root):
+        """根目录的索引；不在默认查找范围内的目录首次查询时加入并扫描"""
+        self._check()
+        with self._lock:
+            if root not in self._trees and root not in self._extra_roots and os.path.isdir(root):
+                self._extra_roots.add(root)
+                if self._refresh_tree(root):
+                    self._changed()
+                    self._save()
+            return self._trees.get(root)
+
+    def find_in(self, root, model_name):
+        """在 root 的一级子目录（工坊物品）中按模型名查找模型目录，找不到返回 None"""
+        if self._tree(root) is None:
+            return None
+        with self._lock:
+            return self._name_index(root).get(model_name)
+
+    def item_models(self, root, item_id):
+        """
+        root 下 物品ID 子目录中的模型：[(模型目录, 模型文件名)]；
+        物品不存在或不含模型时返回空列表
+        """
+        tree = self._tree(root)
+        if tree is None:
+            return []
+        with self._lock:
+            entry = tree['entries'].get(str(item_id))
+            return [tuple(model) for model in entry['models']] if entry else []
+
+    def installed_item_models(self, installed_folder):
+        """已安装的订阅物品目录中的模型：[(模型名, 相对物品目录的路径)]"""
+        self._check()
+        with self._lock:
+            entry = self._items.get(installed_folder)
+            if entry is None:
+                entry = self._items[installed_folder] = _scan_item(installed_folder)
+                self.stats['rescanned_entries'] += 1
+                self._dirty = True
+            models = []
+            for model_dir, file in entry['models']:
+                if model_dir == installed_folder:
+                    models.append((_model_stem(file), file))
+                else:
+                    subdir = os.path.basename(model_dir)
+                    models.append((subdir, f"{subdir}/{file}"))
+            return models
+
+    def flush(self):
+        """把新扫描的已安装物品写入缓存文件"""
+        with self._lock:
+            self._save()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'roots': {root: len(tree['entries']) for root, tree in self._trees.items()},
+                'installed_items': len(self._items),
+                'models': len(self._models_cache) if self._models_cache is not None else None,
+                **self.stats,
+            }
+
+
+_model_catalog = None
+
+
+def get_model_catalog():
+    global _model_catalog
+    if _model_catalog is None:
+        _model_catalog = ModelCatalog()
+    return _model_catalog
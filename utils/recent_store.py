@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+近期记忆（recent_{name}.json）的存储引擎
+
+- recent_{name}.json 仍是完整的消息列表快照（与记忆浏览器等外部读写方兼容），
+  只在压缩（compaction）或整体替换时通过 写临时文件 + rename 原子更新
+- 每轮对话的增量写入 recent_{name}.journal.jsonl：追加式日志，每行一个操作
+- 日志首行记录它所基于的快照哈希；快照被重写（本进程压缩或外部编辑）后，
+  旧日志的哈希不再匹配，加载时自动忽略，因此崩溃在任意时刻都不会重复回放或损坏文件
+- 内存中的消息列表是权威副本，只有文件的 mtime/size 变化时才重新加载
+"""
+import hashlib
+import json
+import logging
+import os
+
+from langchain_core.messages import messages_to_dict, messages_from_dict
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_SUFFIX = '.journal.jsonl'
+# 日志累计多少条操作后合并进快照
+JOURNAL_COMPACT_OPS = 32
+
+
+def journal_path_for(snapshot_path):
+    base = snapshot_path[:-len('.json')] if snapshot_path.endswith('.json') else snapshot_path
+    return base + JOURNAL_SUFFIX
+
+
+def _snapshot_token(data):
+    return hashlib.sha1(data).hexdigest()[:16] if data else ''
+
+
+def _atomic_write(path, data):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _encode_line(record):
+    return (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+def _apply_op(state, record):
+    op = record.get('op')
+    if op == 'append':
+        state.extend(record['messages'])
+    elif op == 'compress':
+        state[:record['count']] = [record['summary']]
+    else:
+        raise ValueError(f"unknown journal op: {op}")
+
+
+def _load_state(snapshot_path, truncate=False):
+    """
+    读取快照并回放有效日志
+
+    Args:
+        truncate: 是否截掉日志末尾不完整的行。只有拥有该日志的写入方（RecentHistoryStore）在打开时才可截断，
+            其他进程的只读方可能正好读到写入方追加到一半的行，只能忽略，不能截断
+
+    Returns:
+        (消息字典列表, 快照哈希, 有效日志字节数或None, 已回放的操作数)
+        日志字节数为 None 表示没有与当前快照匹配的日志
+    """
+    snapshot = b''
+    if os.path.exists(snapshot_path):
+        with open(snapshot_path, 'rb') as f:
+            snapshot = f.read()
+    token = _snapshot_token(snapshot)
+    state = []
+    if snapshot:
+        try:
+            state = json.loads(snapshot) or []
+        except json.JSONDecodeError as e:
+            logger.warning(f"读取历史记录快照 {snapshot_path} 失败: {e}，使用空列表")
+            state = []
+
+    journal_path = journal_path_for(snapshot_path)
+    if not os.path.exists(journal_path):
+        return state, token, None, 0
+
+    valid_bytes = 0
+    ops = 0
+    with open(journal_path, 'rb') as f:
+        for i, line in enumerate(f):
+            # 写了一半的最后一行（崩溃或正在追加）不回放
+            if not line.endswith(b'\n'):
+                break
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                break
+            if i == 0:
+                if record.get('op') != 'base' or record.get('base') != token:
+                    # 快照已被重写，日志内容已包含在快照中（或已被外部编辑覆盖）
+                    return state, token, None, 0
+            else:
+                try:
+                    _apply_op(state, record)
+                except Exception as e:
+                    logger.warning(f"回放历史记录日志 {journal_path} 失败: {e}")
+                    break
+                ops += 1
+            valid_bytes += len(line)
+
+    if valid_bytes == 0:
+        return state, token, None, 0
+    if truncate and os.path.getsize(journal_path) != valid_bytes:
+        with open(journal_path, 'r+b') as f:
+            f.truncate(valid_bytes)
+    return state, token, valid_bytes, ops
+
+
+def read_recent_file(snapshot_path):
+    """读取完整的近期记忆（快照 + 日志），返回消息字典列表"""
+    return _load_state(snapshot_path)[0]
+
+
+def write_recent_file(snapshot_path, message_dicts):
+    """整体替换近期记忆：原子写入快照并丢弃旧日志"""
+    _atomic_write(snapshot_path, json.dumps(message_dicts, ensure_ascii=False).encode('utf-8'))
+    remove_journal(snapshot_path)
+
+
+def remove_journal(snapshot_path):
+    journal_path = journal_path_for(snapshot_path)
+    if os.path.exists(journal_path):
+        os.remove(journal_path)
+
+
+class RecentHistoryStore:
+    """单个角色近期记忆的存储，messages 为内存中的权威副本"""
+
+    def __init__(self, snapshot_path):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path_for(snapshot_path)
+        self.messages = []
+        # 每次内容变化都会递增，供上层缓存判断是否失效
+        self.version = 0
+        self._token = ''
+        self._journal_bytes = None
+        self._journal_ops = 0
+        self._signature = None
+        self.load()
+
+    def _stat_signature(self):
+        sig = []
+        for path in (self.snapshot_path, self.journal_path):
+            try:
+                st = os.stat(path)
+                sig.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                sig.append(None)
+        return tuple(sig)
+
+    def load(self):
+        # 本对象是日志唯一的写入方，打开时截掉崩溃遗留的半行，之后的追加才能从行首开始
+        state, self._token, self._journal_bytes, self._journal_ops = _load_state(self.snapshot_path, truncate=True)
+        try:
+            self.messages = messages_from_dict(state)
+        except Exception as e:
+            logger.warning(f"解析历史记录 {self.snapshot_path} 失败: {e}，使用空列表")
+            self.messages = []
+        self.version += 1
+        self._signature = self._stat_signature()
+
+    def is_stale(self):
+        return self._stat_signature() != self._signature
+
+    def ensure_fresh(self):
+        """只有文件被外部修改时才重新加载"""
+        if self.is_stale():
+            logger.info(f"[RecentHistory] 检测到 {self.snapshot_path} 被外部修改，重新加载")
+            self.load()
+        return self.messages
+
+    def _append_record(self, record):
+        line = _encode_line(record)
+        if self._journal_bytes is None:
+            # 没有与当前快照匹配的日志：新建日志并写入基准哈希
+            data = _encode_line({'op': 'base', 'base': self._token}) + line
+            _atomic_write(self.journal_path, data)
+            self._journal_bytes = len(data)
+        else:
+            with open(self.journal_path, 'ab') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self._journal_bytes += len(line)
+        self._journal_ops += 1
+        self.version += 1
+        self._signature = self._stat_signature()
+        if self._journal_ops >= JOURNAL_COMPACT_OPS:
+            self.compact()
+
+    def append(self, new_messages):
+        if not new_messages:
+            return
+        self.messages.extend(new_messages)
+        self._append_record({'op': 'append', 'messages': messages_to_dict(new_messages)})
+
+    def compress_head(self, count, summary_message):
+        """将最早的 count 条消息替换为一条摘要消息"""
+        self.messages[:count] = [summary_message]
+        self._append_record({'op': 'compress', 'count': count, 'summary': messages_to_dict([summary_message])[0]})
+
+    def replace(self, messages):
+        """整体替换（例如记忆整理），直接写新快照"""
+        self.messages = list(messages)
+        self.compact()
+
+    def compact(self):
+        data = json.dumps(messages_to_dict(self.messages), ensure_ascii=False).encode('utf-8')
+        _atomic_write(self.snapshot_path, data)
+        # 快照替换成功后旧日志自动失效，这里删除只是为了回收空间
+        try:
+            remove_journal(self.snapshot_path)
+        except OSError as e:
+            logger.warning(f"删除历史记录日志 {self.journal_path} 失败: {e}")
+        self._token = _snapshot_token(data)
+        self._journal_bytes = None
+        self._journal_ops = 0
+        self.version += 1
+        self._signature = self._stat_signature()
@@ -1,12 +1,22 @@
 """
 截图分析工具库
 提供截图分析功能，包括前端浏览器发送的截图和屏幕分享数据流处理
+
+屏幕分享/摄像头的帧由 FrameIngest 统一入口处理：
+- 在缩小的灰度缩略图上计算感知签名（64位 dHash + 640x360 缩略图），与上一张已发送的帧几乎相同则直接丢弃；
+  dHash 只能看出布局变化，文字内容的变化靠缩略图分块比较：变化像素按 16x16 的窗口（步长半个窗口）统计，
+  任何一个窗口内变化像素足够多就视为画面已变化，一个字的改动不会被整张图的像素总数稀释
+- 按每个会话的带宽预算（令牌桶）自适应选择分辨率与 JPEG 质量，预算耗尽时丢帧
+- 视觉模型的分析结果按感知签名缓存，画面没有变化时不再重复调用
 """
 import base64
 import logging
+import time
+from collections import deque
 from typing import Optional
 import asyncio
 from io import BytesIO
+import numpy as np
 from PIL import Image
 from openai import AsyncOpenAI
 from config import get_extra_body
@@ -17,6 +27,28 @@ logger = logging.getLogger(__name__)
 MAX_IMAGE_SIZE_BYTES = 10 * 1024 * 1024
 MAX_BASE64_SIZE = MAX_IMAGE_SIZE_BYTES * 4 // 3 + 100
 
+# dHash 汉明距离超过该值直接视为画面已变化
+FRAME_HASH_THRESHOLD = 10
+# 灰度缩略图尺寸（720p 画面上 JPEG 解码器直接按 1/2 解码得到）
+FRAME_THUMB_SIZE = (640, 360)
+# 像素差超过该值视为变化像素
+FRAME_PIXEL_DELTA = 16
+# 分块比较的窗口边长（缩略图像素），窗口之间重叠半个窗口，跨块的文字不会被拆散
+FRAME_TILE_SIZE = 16
+# 任一窗口内变化像素达到该数即视为画面已变化。按 720p 下 14-16px 文字实测：
+# 改动一个字符约 13-15 个，改动一个词 35 个以上；闪烁的文本光标约 10 个，不会触发（鼠标指针移动约 25 个，会触发）
+FRAME_TILE_CHANGED_PIXELS = 12
+# 画面不变时，最久多少秒仍重新发送一帧
+FRAME_MAX_STALE_SECONDS = 30
+# 每个会话发往上游的图片带宽预算（字节/秒）与突发容量
+FRAME_BYTES_PER_SECOND = 48 * 1024
+FRAME_BUDGET_BURST = 256 * 1024
+# (最长边, JPEG质量)，预算越紧张选择越靠后的档位
+FRAME_QUALITY_LEVELS = ((1280, 80), (1024, 70), (768, 60), (512, 50))
+# 视觉模型分析结果缓存
+VISION_CACHE_SIZE = 64
+VISION_CACHE_TTL = 600
+
 def _validate_image_data(image_bytes: bytes) -> Optional[Image.Image]:
     """验证图片数据有效性"""
     try:
@@ -29,6 +61,179 @@ def _validate_image_data(image_bytes: bytes) -> Optional[Image.Image]:
         return None
 
 
+def _decode_screen_data(data: str) -> Optional[bytes]:
+    """校验屏幕数据格式与大小，返回 JPEG 字节；无效时返回 None"""
+    if not isinstance(data, str) or not data.startswith('data:image/jpeg;base64,'):
+        logger.error("无效的屏幕数据格式")
+        return None
+
+    img_b64 = data.split(',')[1]
+
+    if len(img_b64) > MAX_BASE64_SIZE:
+        logger.error(f"屏幕数据过大: {len(img_b64)} 字节，超过限制 {MAX_BASE64_SIZE}")
+        return None
+
+    return base64.b64decode(img_b64)
+
+
+def compute_signature(image: Image.Image):
+    """
+    感知签名 (dhash, thumb)：thumb 为灰度缩略图，dhash 为其上 9x8 相邻像素明暗关系构成的64位差异哈希
+    """
+    if image.format == 'JPEG':
+        # 让 JPEG 解码器直接按缩小的比例解码（720p 为 1/2），不必解出整张图
+        image.draft('L', FRAME_THUMB_SIZE)
+    thumb = image.convert('L').resize(FRAME_THUMB_SIZE, Image.BOX)
+    pixels = np.asarray(thumb.resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    bits = 0
+    for bit in (pixels[:, :-1] > pixels[:, 1:]).ravel():
+        bits = (bits << 1) | int(bit)
+    # 以 uint8 保存，视觉缓存中的签名占用减半
+    return bits, np.asarray(thumb, dtype=np.uint8)
+
+
+def _max_tile_changes(a, b) -> int:
+    """两张缩略图在所有重叠窗口中变化像素数的最大值（积分图求窗口和）"""
+    changed = np.abs(a.astype(np.int16) - b) > FRAME_PIXEL_DELTA
+    size = FRAME_TILE_SIZE
+    height, width = changed.shape
+    if height < size or width < size:
+        return int(np.count_nonzero(changed))
+    integral = np.zeros((height + 1, width + 1), dtype=np.int32)
+    np.cumsum(np.cumsum(changed, axis=0, dtype=np.int32), axis=1, out=integral[1:, 1:])
+    ys = np.arange(0, height - size + 1, size // 2)
+    xs = np.arange(0, width - size + 1, size // 2)
+    sums = integral[np.ix_(ys + size, xs + size)] - integral[np.ix_(ys, xs + size)] \
+        - integral[np.ix_(ys + size, xs)] + integral[np.ix_(ys, xs)]
+    return int(sums.max())
+
+
+def is_same_frame(a, b) -> bool:
+    """两个感知签名是否为同一画面"""
+    if bin(a[0] ^ b[0]).count('1') > FRAME_HASH_THRESHOLD:
+        return False
+    return _max_tile_changes(a[1], b[1]) < FRAME_TILE_CHANGED_PIXELS
+
+
+def image_signature_from_b64(image_b64: str):
+    try:
+        return compute_signature(Image.open(BytesIO(base64.b64decode(image_b64))))
+    except Exception:
+        return None
+
+
+class FrameIngest:
+    """
+    一个会话的屏幕/摄像头帧入口。process() 返回 (要发往上游的 base64 JPEG, candidate)，
+    与上一帧几乎相同或带宽预算不足时返回 (None, None)；帧真正被上游接收后调用 commit(candidate)，
+    之后的相同画面才会被视为重复（语音模式下没有语音输入时上游并不接收图片）。
+    candidate 由调用方持有，并发处理的多帧各自提交自己的签名；去重与预算判断在锁内依次进行。
+    """
+
+    def __init__(self, bytes_per_second=FRAME_BYTES_PER_SECOND, burst=FRAME_BUDGET_BURST,
+                 max_stale=FRAME_MAX_STALE_SECONDS):
+        self.bytes_per_second = bytes_per_second
+        self.burst = burst
+        self.max_stale = max_stale
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._last_signature = None
+        self._last_sent_at = 0.0
+        self._lock = asyncio.Lock()
+        self.stats = {'received': 0, 'accepted': 0, 'sent': 0, 'dropped_duplicate': 0, 'dropped_budget': 0,
+                      'invalid': 0, 'bytes_in': 0, 'bytes_out': 0, 'reencoded': 0}
+
+    def reset(self):
+        """新的上游会话没有之前的画面，下一帧无论是否变化都要发送"""
+        self._last_signature = None
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.bytes_per_second)
+        self._refilled_at = now
+
+    def _pick_level(self):
+        fill = self._tokens / self.burst
+        if fill > 0.75:
+            return FRAME_QUALITY_LEVELS[0]
+        if fill > 0.5:
+            return FRAME_QUALITY_LEVELS[1]
+        if fill > 0.25:
+            return FRAME_QUALITY_LEVELS[2]
+        return FRAME_QUALITY_LEVELS[-1]
+
+    @staticmethod
+    def _encode(img_bytes, max_side, quality):
+        image = Image.open(BytesIO(img_bytes))
+        width, height = image.size
+        if max(width, height) > max_side:
+            scale = max_side / max(width, height)
+            target = (max(1, int(width * scale)), max(1, int(height * scale)))
+            image.draft('RGB', target)
+            image = image.convert('RGB').resize(target, Image.BILINEAR)
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        buffer = BytesIO()
+        image.save(buffer, format='JPEG', quality=quality)
+        return buffer.getvalue()
+
+    def _process_sync(self, data):
+        img_bytes = _decode_screen_data(data)
+        if img_bytes is None:
+            return None, None, 'invalid'
+        self.stats['bytes_in'] += len(img_bytes)
+        image = _validate_image_data(img_bytes)
+        if image is None:
+            logger.error("无效的图片数据")
+            return None, None, 'invalid'
+        original_size = image.size
+        signature = compute_signature(image)
+
+        now = time.monotonic()
+        if self._last_signature is not None and is_same_frame(signature, self._last_signature) \
+                and now - self._last_sent_at < self.max_stale:
+            return None, None, 'dropped_duplicate'
+
+        self._refill(now)
+        if self._tokens <= 0:
+            return None, None, 'dropped_budget'
+        max_side, quality = self._pick_level()
+        if max(original_size) <= max_side and len(img_bytes) <= self._tokens:
+            # 前端已压缩且预算充足，原样发送
+            out_bytes = img_bytes
+        else:
+            out_bytes = self._encode(img_bytes, max_side, quality)
+            self.stats['reencoded'] += 1
+        return base64.b64encode(out_bytes).decode('ascii'), (signature, len(out_bytes)), 'accepted'
+
+    async def process(self, data: str):
+        self.stats['received'] += 1
+        try:
+            # 解码与重编码放到线程中，不阻塞事件循环；同一会话的帧依次处理，去重基准与预算不会交错读写
+            async with self._lock:
+                image_b64, candidate, outcome = await asyncio.to_thread(self._process_sync, data)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"处理屏幕数据错误: {e}")
+            image_b64, candidate, outcome = None, None, 'invalid'
+        self.stats[outcome] += 1
+        return image_b64, candidate
+
+    def commit(self, candidate):
+        """process() 返回的这一帧已发往上游：计入带宽并作为去重基准"""
+        if candidate is None:
+            return
+        signature, size = candidate
+        self._tokens -= size
+        self._last_signature = signature
+        self._last_sent_at = time.monotonic()
+        self.stats['sent'] += 1
+        self.stats['bytes_out'] += size
+
+    def snapshot(self):
+        return {**self.stats, 'budget_bytes': int(self._tokens)}
+
+
 async def process_screen_data(data: str) -> Optional[str]:
     """
     处理前端发送的屏幕分享数据流
@@ -40,18 +245,11 @@ async def process_screen_data(data: str) -> Optional[str]:
     返回: 验证后的base64字符串（不含data:前缀），如果验证失败则返回None
     """
     try:
-        if not isinstance(data, str) or not data.startswith('data:image/jpeg;base64,'):
-            logger.error("无效的屏幕数据格式")
+        img_bytes = _decode_screen_data(data)
+        if img_bytes is None:
             return None
-        
         img_b64 = data.split(',')[1]
         
-        if len(img_b64) > MAX_BASE64_SIZE:
-            logger.error(f"屏幕数据过大: {len(img_b64)} 字节，超过限制 {MAX_BASE64_SIZE}")
-            return None
-        
-        img_bytes = base64.b64decode(img_b64)
-        
         image = _validate_image_data(img_bytes)
         if image is None:
             logger.error("无效的图片数据")
@@ -72,12 +270,30 @@ async def process_screen_data(data: str) -> Optional[str]:
         return None
 
 
+_vision_cache = deque(maxlen=VISION_CACHE_SIZE)  # [(感知签名, 描述, 时间)]，最近使用的在末尾
+
+
+def _vision_cache_lookup(signature) -> Optional[str]:
+    now = time.time()
+    # 在线程中执行，遍历快照，避免与事件循环中的 append 交错
+    for entry in reversed(list(_vision_cache)):
+        cached_signature, description, cached_at = entry
+        if now - cached_at <= VISION_CACHE_TTL and is_same_frame(signature, cached_signature):
+            try:
+                _vision_cache.remove(entry)
+            except ValueError:
+                pass
+            _vision_cache.append(entry)
+            return description
+    return None
+
+
 async def analyze_image_with_vision_model(
     image_b64: str,
     max_tokens: int = 500
 ) -> Optional[str]:
     """
-    使用视觉模型分析图片
+    使用视觉模型分析图片，结果按感知签名缓存（相同画面不重复分析）
     
     参数:
         image_b64: 图片的base64编码（不含data:前缀）
@@ -85,6 +301,20 @@ async def analyze_image_with_vision_model(
         
     返回: 图片描述文本，失败则返回 None
     """
+    signature = await asyncio.to_thread(image_signature_from_b64, image_b64)
+    if signature is not None:
+        cached = await asyncio.to_thread(_vision_cache_lookup, signature)
+        if cached is not None:
+            logger.info("🖼️ 画面未变化，使用缓存的视觉分析结果")
+            return cached
+
+    description = await _analyze_image_uncached(image_b64, max_tokens)
+    if description and signature is not None:
+        _vision_cache.append((signature, description, time.time()))
+    return description
+
+
+async def _analyze_image_uncached(image_b64: str, max_tokens: int) -> Optional[str]:
     try:
         from utils.config_manager import get_config_manager
         
@@ -1,12 +1,21 @@
 """
 Web scraper for fetching trending content from Bilibili and Weibo
 Also supports fetching active window title and Baidu search
+
+主动搭话的内容获取：
+- 所有请求共用一个带连接池的 httpx.AsyncClient（keep-alive，省去每次的 TCP/TLS 握手）
+- 首页推荐、窗口标题生成的搜索关键词、每个关键词的搜索结果都有 TTL 缓存，并发的相同请求只发一次
+- 多个搜索关键词并发搜索
+- 热门内容被主动搭话使用后启动后台预取，在缓存过期前刷新，主动搭话直接命中热缓存；长时间不用则停止。
+  窗口上下文（窗口标题、由它生成的搜索）只在主动搭话实际请求时获取，不在后台读取窗口或发起搜索
 """
 import asyncio
 import httpx
 import random
 import re
+import time
 import platform
+from collections import OrderedDict
 from typing import Dict, List, Any, Optional, Union
 import logging
 from urllib.parse import quote
@@ -29,6 +38,106 @@ def get_random_user_agent() -> str:
     return random.choice(USER_AGENTS)
 
 
+# 缓存有效期（秒）
+TRENDING_CACHE_TTL = 300
+WINDOW_QUERY_CACHE_TTL = 1800
+SEARCH_CACHE_TTL = 600
+# 热门内容后台预取间隔（秒）；超过 PREFETCH_IDLE_STOP 秒没有使用则停止预取
+PREFETCH_INTERVAL = 120
+PREFETCH_IDLE_STOP = 1800
+
+_http_client = None
+_http_client_loop = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """共享的 HTTP 客户端（每个事件循环一个）"""
+    global _http_client, _http_client_loop
+    loop = asyncio.get_running_loop()
+    if _http_client is None or _http_client.is_closed or _http_client_loop is not loop:
+        _http_client = httpx.AsyncClient(
+            timeout=10.0,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=120),
+        )
+        _http_client_loop = loop
+    return _http_client
+
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None and not _http_client.is_closed:
+        await _http_client.aclose()
+    _http_client = None
+
+
+class TTLCache:
+    """
+    带过期时间的异步结果缓存；同一个 key 的并发请求共享一次获取。
+    只缓存 is_ok(value) 为真的结果，失败的结果下次重新获取。
+    """
+
+    def __init__(self, ttl, max_entries=128):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data = OrderedDict()  # key -> (fetched_at, value)
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+
+    def age(self, key) -> Optional[float]:
+        entry = self._data.get(key)
+        return time.monotonic() - entry[0] if entry else None
+
+    async def _fetch(self, key, fetch, is_ok):
+        value = await fetch()
+        if is_ok(value):
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+        return value
+
+    def refresh(self, key, fetch, is_ok=lambda value: True) -> asyncio.Future:
+        """忽略缓存重新获取（已有进行中的获取时复用它）"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(key, fetch, is_ok))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        return task
+
+    def _done(self, key, task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # 调用方已取消时避免 "exception was never retrieved"
+
+    async def get_or_fetch(self, key, fetch, is_ok=lambda value: True):
+        age = self.age(key)
+        if age is not None and age < self.ttl:
+            self.hits += 1
+            return self._data[key][1]
+        self.misses += 1
+        # shield：调用方被取消时获取仍会完成并写入缓存
+        return await asyncio.shield(self.refresh(key, fetch, is_ok))
+
+    def stats(self):
+        return {'entries': len(self._data), 'hits': self.hits, 'misses': self.misses}
+
+
+def _is_success(result) -> bool:
+    return isinstance(result, dict) and bool(result.get('success'))
+
+
+_trending_cache = TTLCache(TRENDING_CACHE_TTL, max_entries=8)
+_query_cache = TTLCache(WINDOW_QUERY_CACHE_TTL)
+_search_cache = TTLCache(SEARCH_CACHE_TTL, max_entries=256)
+_query_llm = None  # (配置, ChatOpenAI)
+_last_used = {}  # 'trending' -> 最近一次使用时间
+_trending_limits = set()
+_prefetch_task = None
+
+
 async def fetch_bilibili_trending(limit: int = 10) -> Dict[str, Any]:
     """
     获取B站首页推荐视频
@@ -63,35 +172,35 @@ async def fetch_bilibili_trending(limit: int = 10) -> Dict[str, Any]:
         # 添加随机延迟，避免请求过快
         await asyncio.sleep(random.uniform(0.1, 0.5))
         
-        async with httpx.AsyncClient(timeout=10.0, follow_redirects=True) as client:
-            response = await client.get(url, params=params, headers=headers)
-            response.raise_for_status()
-            data = response.json()
+        client = get_http_client()
+        response = await client.get(url, params=params, headers=headers)
+        response.raise_for_status()
+        data = response.json()
+        
+        if data.get('code') == 0:
+            videos = []
+            items = data.get('data', {}).get('item', [])
+            for item in items[:limit]:
+                videos.append({
+                    'title': item.get('title', ''),
+                    'desc': item.get('desc', ''),
+                    'author': item.get('owner', {}).get('name', ''),
+                    'view': item.get('stat', {}).get('view', 0),
+                    'like': item.get('stat', {}).get('like', 0),
+                    'bvid': item.get('bvid', '')
+                })
+            
+            return {
+                'success': True,
+                'videos': videos
+            }
+        else:
+            logger.error(f"B站API返回错误: {data.get('message', '未知错误')}")
+            return {
+                'success': False,
+                'error': data.get('message', '未知错误')
+            }
             
-            if data.get('code') == 0:
-                videos = []
-                items = data.get('data', {}).get('item', [])
-                for item in items[:limit]:
-                    videos.append({
-                        'title': item.get('title', ''),
-                        'desc': item.get('desc', ''),
-                        'author': item.get('owner', {}).get('name', ''),
-                        'view': item.get('stat', {}).get('view', 0),
-                        'like': item.get('stat', {}).get('like', 0),
-                        'bvid': item.get('bvid', '')
-                    })
-                
-                return {
-                    'success': True,
-                    'videos': videos
-                }
-            else:
-                logger.error(f"B站API返回错误: {data.get('message', '未知错误')}")
-                return {
-                    'success': False,
-                    'error': data.get('message', '未知错误')
-                }
-                
     except httpx.TimeoutException:
         logger.exception("获取B站首页推荐超时")
         return {
@@ -130,38 +239,38 @@ async def fetch_weibo_trending(limit: int = 10) -> Dict[str, Any]:
         # 添加随机延迟，避免请求过快
         await asyncio.sleep(random.uniform(0.1, 0.5))
         
-        async with httpx.AsyncClient(timeout=10.0, follow_redirects=True) as client:
-            response = await client.get(url, headers=headers)
-            response.raise_for_status()
-            data = response.json()
+        client = get_http_client()
+        response = await client.get(url, headers=headers)
+        response.raise_for_status()
+        data = response.json()
+        
+        if data.get('ok') == 1:
+            trending_list = []
+            realtime_list = data.get('data', {}).get('realtime', [])
             
-            if data.get('ok') == 1:
-                trending_list = []
-                realtime_list = data.get('data', {}).get('realtime', [])
-                
-                for item in realtime_list[:limit]:
-                    # 跳过广告
-                    if item.get('is_ad'):
-                        continue
-                    
-                    trending_list.append({
-                        'word': item.get('word', ''),
-                        'raw_hot': item.get('raw_hot', 0),
-                        'note': item.get('note', ''),
-                        'rank': item.get('rank', 0)
-                    })
-                
-                return {
-                    'success': True,
-                    'trending': trending_list[:limit]
-                }
-            else:
-                logger.error(f"微博API返回错误")
-                return {
-                    'success': False,
-                    'error': '微博API返回错误'
-                }
+            for item in realtime_list[:limit]:
+                # 跳过广告
+                if item.get('is_ad'):
+                    continue
                 
+                trending_list.append({
+                    'word': item.get('word', ''),
+                    'raw_hot': item.get('raw_hot', 0),
+                    'note': item.get('note', ''),
+                    'rank': item.get('rank', 0)
+                })
+            
+            return {
+                'success': True,
+                'trending': trending_list[:limit]
+            }
+        else:
+            logger.error(f"微博API返回错误")
+            return {
+                'success': False,
+                'error': '微博API返回错误'
+            }
+            
     except httpx.TimeoutException:
         logger.exception("获取微博热议话题超时")
         return {
@@ -178,7 +287,7 @@ async def fetch_weibo_trending(limit: int = 10) -> Dict[str, Any]:
 
 async def fetch_trending_content(bilibili_limit: int = 10, weibo_limit: int = 10) -> Dict[str, Any]:
     """
-    并发获取B站首页推荐和微博热议话题
+    并发获取B站首页推荐和微博热议话题（结果缓存 TRENDING_CACHE_TTL 秒）
     
     Args:
         bilibili_limit: B站视频数量限制
@@ -187,6 +296,14 @@ async def fetch_trending_content(bilibili_limit: int = 10, weibo_limit: int = 10
     Returns:
         包含成功状态、B站首页视频和微博热议话题的字典
     """
+    key = (bilibili_limit, weibo_limit)
+    _trending_limits.add(key)
+    _mark_used('trending')
+    return await _trending_cache.get_or_fetch(
+        key, lambda: _fetch_trending_uncached(bilibili_limit, weibo_limit), _is_success)
+
+
+async def _fetch_trending_uncached(bilibili_limit: int, weibo_limit: int) -> Dict[str, Any]:
     try:
         # 并发请求
         bilibili_task = fetch_bilibili_trending(bilibili_limit)
@@ -344,15 +461,27 @@ async def generate_diverse_queries(window_title: str) -> List[str]:
     注意：
         为保护隐私，调用此函数前应先使用clean_window_title()清理标题，
         避免将文件路径、账号等敏感信息发送给LLM API
+        同一标题的结果缓存 WINDOW_QUERY_CACHE_TTL 秒，停留在同一窗口时不会重复调用LLM
     """
     try:
-        # 导入配置管理器
-        from utils.config_manager import ConfigManager
-        config_manager = ConfigManager()
-        
-        # 使用correction模型配置（或者使用emotion等轻量级模型）
-        correction_config = config_manager.get_model_api_config('correction')
-        
+        return await _query_cache.get_or_fetch(window_title, lambda: _generate_queries_uncached(window_title))
+    except Exception as e:
+        # 异常日志中也使用脱敏标题
+        sanitized_title = window_title[:30] + '...' if len(window_title) > 30 else window_title
+        logger.warning(f"为窗口标题「{sanitized_title}」生成多样化查询失败，使用默认清理方法: {e}")
+        # 失败时回退到原始清理方法（不缓存，下次重新尝试）
+        clean_title = clean_window_title(window_title)
+        return [clean_title, clean_title, clean_title]
+
+
+def _get_query_llm() -> ChatOpenAI:
+    """生成搜索关键词用的LLM客户端，配置不变时复用（连同其HTTP连接池）"""
+    global _query_llm
+    from utils.config_manager import get_config_manager
+    # 使用correction模型配置（或者使用emotion等轻量级模型）
+    correction_config = get_config_manager().get_model_api_config('correction')
+    config_key = (correction_config['model'], correction_config['base_url'], correction_config['api_key'])
+    if _query_llm is None or _query_llm[0] != config_key:
         llm = ChatOpenAI(
             model=correction_config['model'],
             base_url=correction_config['base_url'],
@@ -360,11 +489,17 @@ async def generate_diverse_queries(window_title: str) -> List[str]:
             temperature=0.8,  # 提高temperature以获得更多样化的结果
             timeout=10.0
         )
-        
-        # 清理/脱敏窗口标题用于日志显示
-        sanitized_title = window_title[:30] + '...' if len(window_title) > 30 else window_title
-        
-        prompt = f"""基于以下窗口标题，生成3个不同的搜索关键词，用于在百度上搜索相关内容。
+        _query_llm = (config_key, llm)
+    return _query_llm[1]
+
+
+async def _generate_queries_uncached(window_title: str) -> List[str]:
+    llm = _get_query_llm()
+    
+    # 清理/脱敏窗口标题用于日志显示
+    sanitized_title = window_title[:30] + '...' if len(window_title) > 30 else window_title
+    
+    prompt = f"""基于以下窗口标题，生成3个不同的搜索关键词，用于在百度上搜索相关内容。
 
 窗口标题：{window_title}
 
@@ -379,39 +514,31 @@ async def generate_diverse_queries(window_title: str) -> List[str]:
 关键词2
 关键词3"""
 
-        # 使用异步调用
-        response = await llm.ainvoke([SystemMessage(content=prompt)])
-        
-        # 解析响应，提取3个关键词
-        queries = []
-        lines = response.content.strip().split('\n')
-        for line in lines:
-            line = line.strip()
-            # 移除可能的序号、标点等
-            line = re.sub(r'^[\d\.\-\*\)\]】]+\s*', '', line)
-            line = line.strip('.,;:，。；：')
-            if line and len(line) >= 2:
-                queries.append(line)
-                if len(queries) >= 3:
-                    break
-        
-        # 如果生成的查询不足3个，用原始标题填充
-        if len(queries) < 3:
-            clean_title = clean_window_title(window_title)
-            while len(queries) < 3 and clean_title:
-                queries.append(clean_title)
-        
-        # 使用脱敏后的标题记录日志
-        logger.info(f"为窗口标题「{sanitized_title}」生成的查询关键词: {queries}")
-        return queries[:3]
-        
-    except Exception as e:
-        # 异常日志中也使用脱敏标题
-        sanitized_title = window_title[:30] + '...' if len(window_title) > 30 else window_title
-        logger.warning(f"为窗口标题「{sanitized_title}」生成多样化查询失败，使用默认清理方法: {e}")
-        # 失败时回退到原始清理方法
+    # 使用异步调用
+    response = await llm.ainvoke([SystemMessage(content=prompt)])
+    
+    # 解析响应，提取3个关键词
+    queries = []
+    lines = response.content.strip().split('\n')
+    for line in lines:
+        line = line.strip()
+        # 移除可能的序号、标点等
+        line = re.sub(r'^[\d\.\-\*\)\]】]+\s*', '', line)
+        line = line.strip('.,;:，。；：')
+        if line and len(line) >= 2:
+            queries.append(line)
+            if len(queries) >= 3:
+                break
+    
+    # 如果生成的查询不足3个，用原始标题填充
+    if len(queries) < 3:
         clean_title = clean_window_title(window_title)
-        return [clean_title, clean_title, clean_title]
+        while len(queries) < 3 and clean_title:
+            queries.append(clean_title)
+    
+    # 使用脱敏后的标题记录日志
+    logger.info(f"为窗口标题「{sanitized_title}」生成的查询关键词: {queries}")
+    return queries[:3]
 
 
 def clean_window_title(title: str) -> str:
@@ -476,17 +603,22 @@ async def search_baidu(query: str, limit: int = 5) -> Dict[str, Any]:
         limit: 返回结果数量限制
     
     Returns:
-        包含搜索结果的字典
+        包含搜索结果的字典（成功的结果缓存 SEARCH_CACHE_TTL 秒）
     """
+    if not query or len(query.strip()) < 2:
+        return {
+            'success': False,
+            'error': '搜索关键词太短'
+        }
+    
+    # 清理查询词
+    query = query.strip()
+    return await _search_cache.get_or_fetch(
+        (query, limit), lambda: _search_baidu_uncached(query, limit), _is_success)
+
+
+async def _search_baidu_uncached(query: str, limit: int) -> Dict[str, Any]:
     try:
-        if not query or len(query.strip()) < 2:
-            return {
-                'success': False,
-                'error': '搜索关键词太短'
-            }
-        
-        # 清理查询词
-        query = query.strip()
         encoded_query = quote(query)
         
         # 百度搜索URL
@@ -505,27 +637,27 @@ async def search_baidu(query: str, limit: int = 5) -> Dict[str, Any]:
         # 添加随机延迟
         await asyncio.sleep(random.uniform(0.2, 0.5))
         
-        async with httpx.AsyncClient(timeout=10.0, follow_redirects=True) as client:
-            response = await client.get(url, headers=headers)
-            response.raise_for_status()
-            html_content = response.text
-            
-            # 解析搜索结果
-            results = parse_baidu_results(html_content, limit)
+        client = get_http_client()
+        response = await client.get(url, headers=headers)
+        response.raise_for_status()
+        html_content = response.text
+        
+        # 解析搜索结果
+        results = parse_baidu_results(html_content, limit)
+        
+        if results:
+            return {
+                'success': True,
+                'query': query,
+                'results': results
+            }
+        else:
+            return {
+                'success': False,
+                'error': '未能解析到搜索结果',
+                'query': query
+            }
             
-            if results:
-                return {
-                    'success': True,
-                    'query': query,
-                    'results': results
-                }
-            else:
-                return {
-                    'success': False,
-                    'error': '未能解析到搜索结果',
-                    'query': query
-                }
-                
     except httpx.TimeoutException:
         logger.exception("百度搜索超时")
         return {
@@ -707,17 +839,14 @@ async def fetch_window_context_content(limit: int = 5) -> Dict[str, Any]:
         # 日志中使用截断版本
         logger.info(f"从窗口标题「{sanitized_title}」生成多样化查询: {search_queries}")
         
-        # 依次使用每个查询进行搜索，合并结果
+        # 并发使用每个查询进行搜索（重复的关键词只搜一次），按查询顺序合并结果
+        queries = list(dict.fromkeys(q for q in search_queries if q and len(q) >= 2))
+        logger.info(f"使用查询关键词: {queries}")
+        search_results = await asyncio.gather(*(search_baidu(query, limit) for query in queries))
+        
         all_results = []
         successful_queries = []
-        
-        for query in search_queries:
-            if not query or len(query) < 2:
-                continue
-                
-            logger.info(f"使用查询关键词: {query}")
-            search_result = await search_baidu(query, limit)
-            
+        for query, search_result in zip(queries, search_results):
             if search_result.get('success') and search_result.get('results'):
                 all_results.extend(search_result['results'])
                 successful_queries.append(query)
@@ -762,6 +891,50 @@ async def fetch_window_context_content(limit: int = 5) -> Dict[str, Any]:
         }
 
 
+def _mark_used(mode: str):
+    """记录主动搭话使用了哪种内容，并确保后台预取在运行"""
+    global _prefetch_task
+    _last_used[mode] = time.monotonic()
+    if _prefetch_task is None or _prefetch_task.done():
+        _prefetch_task = asyncio.create_task(_prefetch_loop())
+
+
+async def _prefetch_loop():
+    """
+    后台预取：只刷新最近 PREFETCH_IDLE_STOP 秒内用过的热门内容，赶在缓存过期前更新；
+    长时间未使用时退出，下次使用时重新启动
+    """
+    logger.info("🔄 主动搭话内容预取已启动")
+    while True:
+        await asyncio.sleep(PREFETCH_INTERVAL)
+        now = time.monotonic()
+        active = [mode for mode, used_at in _last_used.items() if now - used_at < PREFETCH_IDLE_STOP]
+        if not active:
+            logger.info("主动搭话长时间未使用，停止内容预取")
+            return
+        try:
+            if 'trending' in active:
+                for key in list(_trending_limits):
+                    age = _trending_cache.age(key)
+                    if age is None or age > TRENDING_CACHE_TTL - PREFETCH_INTERVAL:
+                        await _trending_cache.refresh(
+                            key, lambda key=key: _fetch_trending_uncached(*key), _is_success)
+        except Exception as e:
+            logger.warning(f"主动搭话内容预取失败: {e}")
+
+
+def get_prefetch_stats() -> Dict[str, Any]:
+    """缓存命中情况与预取状态"""
+    now = time.monotonic()
+    return {
+        'prefetch_running': _prefetch_task is not None and not _prefetch_task.done(),
+        'last_used_seconds_ago': {mode: round(now - used_at, 1) for mode, used_at in _last_used.items()},
+        'trending': _trending_cache.stats(),
+        'window_queries': _query_cache.stats(),
+        'search': _search_cache.stats(),
+    }
+
+
 def format_window_context_content(content: Dict[str, Any]) -> str:
     """
     格式化窗口上下文内容为可读字符串
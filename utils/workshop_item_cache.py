@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+Steam 创意工坊物品详情的批量查询与持久化缓存
+
+订阅物品列表原先为每个物品单独发一次 CreateQueryUGCDetailsRequest 并 time.sleep(0.5) 等待，
+订阅 200 个物品时要等上几分钟。这里：
+
+- query_ugc_details：所有物品按 UGC_QUERY_BATCH 个一批（Steam 单次详情查询的上限）一次查询，
+  用 SteamUGCQueryCompleted 回调 + run_callbacks 驱动的异步等待代替固定的 sleep
+- WorkshopItemCache：物品详情（标题、描述、时间、作者、大小）按物品ID持久化到配置目录，
+  从未获取过的物品当场批量查询；已缓存但过期（超过 WORKSHOP_DETAILS_MAX_AGE，
+  或本地安装的版本比缓存的 timeUpdated 新）的物品先返回缓存，再在后台刷新
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# 单次 UGC 详情查询的物品数上限（kNumUGCResultsPerPage）
+UGC_QUERY_BATCH = 50
+# 等待查询回调的超时（秒）
+UGC_QUERY_TIMEOUT = 5.0
+# 等待期间执行 run_callbacks 的间隔（秒）
+UGC_POLL_INTERVAL = 0.05
+# 缓存的物品详情多久后在后台刷新（秒）
+WORKSHOP_DETAILS_MAX_AGE = 6 * 3600
+# 查询不到详情的物品（已删除、隐藏）多久后重试（秒）
+WORKSHOP_DETAILS_MISSING_RETRY = 600
+# 缓存保留的物品数上限
+WORKSHOP_CACHE_MAX_ITEMS = 2000
+WORKSHOP_CACHE_FILE = 'workshop_items_cache.json'
+
+# EResult.k_EResultOK
+_RESULT_OK = 1
+_INVALID_QUERY_HANDLE = 0xFFFFFFFFFFFFFFFF
+
+# 查询句柄 -> (事件循环, future)
+_pending_queries = {}
+
+
+def _on_query_completed(result):
+    """SteamUGCQueryCompleted 回调，在调用 run_callbacks 的线程中执行"""
+    pending = _pending_queries.pop(int(result.handle), None)
+    if pending is None:
+        return  # 不是由 query_ugc_details 发出的查询
+    loop, future = pending
+    summary = (int(result.result), int(result.numResultsReturned))
+
+    def _resolve():
+        if not future.done():
+            future.set_result(summary)
+
+    loop.call_soon_threadsafe(_resolve)
+
+
+def _decode(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    return value or ''
+
+
+async def query_ugc_details(steamworks, item_ids, timeout=UGC_QUERY_TIMEOUT):
+    """
+    批量查询物品详情
+    返回 {物品ID(int): SteamUGCDetails_t}，查询失败或超时未返回的物品不在结果中
+    """
+    loop = asyncio.get_running_loop()
+    item_ids = [int(item_id) for item_id in item_ids]
+    batches = []
+    for start in range(0, len(item_ids), UGC_QUERY_BATCH):
+        batch = item_ids[start:start + UGC_QUERY_BATCH]
+        handle = steamworks.Workshop.CreateQueryUGCDetailsRequest(batch)
+        if not handle or handle == _INVALID_QUERY_HANDLE:
+            logger.warning(f"创建UGC详情查询失败（{len(batch)} 个物品）")
+            continue
+        future = loop.create_future()
+        _pending_queries[int(handle)] = (loop, future)
+        steamworks.Workshop.SendQueryUGCRequest(handle, callback=_on_query_completed, override_callback=True)
+        batches.append((handle, batch, future))
+
+    futures = [future for _, _, future in batches]
+    deadline = loop.time() + timeout
+    while futures and not all(future.done() for future in futures) and loop.time() < deadline:
+        try:
+            steamworks.run_callbacks()
+        except Exception as e:
+            logger.debug(f"执行Steam回调时出错: {e}")
+        await asyncio.wait(futures, timeout=UGC_POLL_INTERVAL)
+
+    details = {}
+    for handle, batch, future in batches:
+        _pending_queries.pop(int(handle), None)
+        if future.done():
+            eresult, count = future.result()
+            if eresult != _RESULT_OK:
+                logger.warning(f"UGC详情查询失败，EResult={eresult}（{len(batch)} 个物品）")
+                continue
+        else:
+            # 超时未收到回调：仍尝试读取结果（查询可能已完成，只是回调尚未分发）
+            logger.warning(f"UGC详情查询 {timeout} 秒内未收到回调（{len(batch)} 个物品）")
+            count = len(batch)
+        for index in range(count):
+            try:
+                result = steamworks.Workshop.GetQueryUGCResult(handle, index)
+            except Exception as e:
+                logger.warning(f"读取UGC查询结果时出错: {e}")
+                break
+            if result is not None and result.result == _RESULT_OK and result.publishedFileId:
+                details[int(result.publishedFileId)] = result
+    return details
+
+
+def details_to_dict(result):
+    """SteamUGCDetails_t -> 可序列化的详情字典"""
+    return {
+        'title': _decode(result.title),
+        'description': _decode(result.description),
+        'timeCreated': int(result.timeCreated),
+        'timeUpdated': int(result.timeUpdated),
+        'steamIDOwner': str(result.steamIDOwner),
+        'fileSize': int(result.fileSize),
+    }
+
+
+class WorkshopItemCache:
+    """所有方法在主事件循环中调用"""
+
+    def __init__(self):
+        self._items = None  # 物品ID(str) -> 详情字典 + fetchedAt（查询不到时为 {'missing': True, 'fetchedAt'}）
+        self._refresh_task = None
+        self._refresh_ids = set()
+        self.stats = {'hits': 0, 'fetched': 0, 'background_refreshes': 0, 'queries': 0, 'last_query_ms': 0.0}
+
+    # ---------- 持久化 ----------
+
+    @staticmethod
+    def _cache_path():
+        from utils.config_manager import get_config_manager
+        return os.path.join(str(get_config_manager().config_dir), WORKSHOP_CACHE_FILE)
+
+    def _ensure_loaded(self):
+        if self._items is None:
+            self._items = {}
+            try:
+                with open(self._cache_path(), 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if isinstance(data, dict):
+                    self._items = data
+            except (OSError, ValueError):
+                pass
+        return self._items
+
+    def _save(self):
+        items = self._items
+        if len(items) > WORKSHOP_CACHE_MAX_ITEMS:
+            oldest = sorted(items, key=lambda key: items[key].get('fetchedAt', 0))
+            for key in oldest[:len(items) - WORKSHOP_CACHE_MAX_ITEMS]:
+                del items[key]
+        try:
+            path = self._cache_path()
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(items, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"保存创意工坊物品缓存失败: {e}")
+
+    # ---------- 查询 ----------
+
+    def _is_stale(self, entry, installed_timestamp, now):
+        if entry.get('missing'):
+            return now - entry['fetchedAt'] > WORKSHOP_DETAILS_MISSING_RETRY
+        if installed_timestamp and installed_timestamp > entry.get('timeUpdated', 0):
+            return True  # 本地已安装更新的版本，标题/描述可能已修改
+        return now - entry['fetchedAt'] > WORKSHOP_DETAILS_MAX_AGE
+
+    async def _fetch(self, steamworks, item_ids):
+        started = time.perf_counter()
+        results = await query_ugc_details(steamworks, item_ids)
+        self.stats['queries'] += 1
+        self.stats['last_query_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        now = time.time()
+        for item_id in item_ids:
+            result = results.get(int(item_id))
+            if result is not None:
+                self._items[str(item_id)] = {**details_to_dict(result), 'fetchedAt': now}
+            else:
+                previous = self._items.get(str(item_id))
+                if previous is None or previous.get('missing'):
+                    self._items[str(item_id)] = {'missing': True, 'fetchedAt': now}
+        self.stats['fetched'] += len(results)
+        self._save()
+        logger.info(f"📦 批量获取了 {len(results)}/{len(item_ids)} 个创意工坊物品的详情（{self.stats['last_query_ms']}ms）")
+
+    def _schedule_refresh(self, steamworks, item_ids):
+        self._refresh_ids.update(item_ids)
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh(steamworks))
+
+    async def _refresh(self, steamworks):
+        while self._refresh_ids:
+            item_ids = list(self._refresh_ids)
+            self._refresh_ids.clear()
+            self.stats['background_refreshes'] += 1
+            try:
+                await self._fetch(steamworks, item_ids)
+            except Exception as e:
+                logger.warning(f"后台刷新创意工坊物品详情失败: {e}")
+
+    async def get_details(self, steamworks, item_ids, installed_timestamps=None):
+        """
+        返回 {物品ID(int): 详情字典}；查询不到详情的物品不在结果中
+        installed_timestamps: {物品ID: GetItemInstallInfo 的 timestamp}，用于发现物品已更新
+        """
+        items = self._ensure_loaded()
+        installed_timestamps = installed_timestamps or {}
+        now = time.time()
+        missing, stale = [], []
+        for item_id in item_ids:
+            entry = items.get(str(item_id))
+            if entry is None:
+                missing.append(item_id)
+            elif self._is_stale(entry, installed_timestamps.get(item_id), now):
+                stale.append(item_id)
+            else:
+                self.stats['hits'] += 1
+        if missing:
+            await self._fetch(steamworks, missing)
+        if stale:
+            self._schedule_refresh(steamworks, stale)
+        details = {}
+        for item_id in item_ids:
+            entry = items.get(str(item_id))
+            if entry is not None and not entry.get('missing'):
+                details[int(item_id)] = entry
+        return details
+
+    def snapshot(self):
+        items = self._ensure_loaded()
+        return {
+            'cached_items': len(items),
+            'refreshing': self._refresh_task is not None and not self._refresh_task.done(),
+            **self.stats,
+        }
+
+
+_workshop_item_cache = None
+
+
+def get_workshop_item_cache():
+    global _workshop_item_cache
+    if _workshop_item_cache is None:
+        _workshop_item_cache = WorkshopItemCache()
+    return _workshop_item_cache